@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+
+"""
+  Abgleich von Referenzdaten mit der HYSTEM-EXTRAN-Datenbank
+  ==========================================================
+
+  Für Referenztabellen wie Regenschreiber, Bodenklassen und Abflussparameter gilt beim Export
+  "Einfügen, falls nicht vorhanden". Statt für jeden Datensatz einzeln mit NOT IN (SELECT ...)
+  zu prüfen, werden die in der HE-Datenbank vorhandenen Namen mit einer einzigen Abfrage gelesen,
+  die fehlenden Namen per Mengendifferenz bestimmt und nur diese in Paketen eingefügt.
+
+  | Dateiname            : abgleich.py
+  | Date                 : Oktober 2018
+  | Copyright            : (C) 2018 by Joerg Hoettges
+  | Email                : hoettges@fh-aachen.de
+  | git sha              : $Format:%H$
+
+  This program is free software; you can redistribute it and/or modify
+  it under the terms of the GNU General Public License as published by
+  the Free Software Foundation; either version 2 of the License, or
+  (at your option) any later version.
+
+"""
+
+import logging
+
+logger = logging.getLogger('QKan')
+
+# Begrenzung eines EXECUTE BLOCK, damit die maximale Länge einer Firebird-Anweisung (64 kB)
+# nicht überschritten wird
+maxanzahl_block = 100
+maxlaenge_block = 32000
+
+
+def vorhandene_namen(dbHE, tabelle, repref):
+    '''Liest die Namen aller Datensätze einer HE-Tabelle mit einer Abfrage.
+
+    :dbHE:                  Datenbankobjekt der HE-Datenbank
+    :type dbHE:             FBConnection
+
+    :tabelle:               Name der HE-Tabelle, z.B. 'REGENSCHREIBER'
+    :type tabelle:          string
+
+    :returns:               Menge der vorhandenen Namen oder None im Fehlerfall
+    :rtype:                 set
+    '''
+    if not dbHE.sql(u'SELECT NAME FROM {}'.format(tabelle), repref):
+        return None
+    vorhanden = set()
+    for (name,) in dbHE.fetchall():
+        if isinstance(name, bytes):
+            name = name.decode('iso-8859-1')
+        vorhanden.add(name)
+    return vorhanden
+
+
+def fehlende_namen(dbHE, tabelle, namen, repref):
+    '''Bestimmt die Namen, die in der HE-Tabelle noch nicht vorhanden sind.
+
+    :namen:                 Namen aus der QKan-Datenbank. Reihenfolge bleibt erhalten, doppelte
+                            Namen werden nur einmal geliefert.
+    :type namen:            list
+
+    :returns:               Liste der fehlenden Namen oder None im Fehlerfall
+    :rtype:                 list
+    '''
+    vorhanden = vorhandene_namen(dbHE, tabelle, repref)
+    if vorhanden is None:
+        return None
+    fehlend = []
+    for name in namen:
+        if name not in vorhanden:
+            fehlend.append(name)
+            vorhanden.add(name)
+    logger.debug(u'{}: {} von {} Namen fehlen in der HE-Datenbank'.format(tabelle, len(fehlend), len(namen)))
+    return fehlend
+
+
+def einfuegen_paketweise(dbHE, anweisungen, repref):
+    '''Führt INSERT-Anweisungen paketweise als EXECUTE BLOCK aus, so dass für viele Datensätze
+    nur wenige Anweisungen an die Firebird-Datenbank übergeben werden.
+
+    :anweisungen:           INSERT-Anweisungen ohne abschließendes Semikolon
+    :type anweisungen:      list
+
+    :returns:               Erfolg
+    :rtype:                 Boolean
+    '''
+    paket = []
+    laenge = 0
+    for anw in anweisungen:
+        anw = anw.strip().rstrip(u';')
+        if paket and (len(paket) >= maxanzahl_block or laenge + len(anw) > maxlaenge_block):
+            if not _block_ausfuehren(dbHE, paket, repref):
+                return False
+            paket = []
+            laenge = 0
+        paket.append(anw)
+        laenge += len(anw) + 2
+    if paket:
+        return _block_ausfuehren(dbHE, paket, repref)
+    return True
+
+
+def _block_ausfuehren(dbHE, paket, repref):
+    if len(paket) == 1:
+        return dbHE.sql(paket[0], repref)
+    sql = u'EXECUTE BLOCK AS BEGIN\n{};\nEND'.format(u';\n'.join(paket))
+    return dbHE.sql(sql, repref)
@@ -27,7 +27,7 @@ import os.path
 import site
 
 from PyQt4.QtCore import QSettings, QTranslator, qVersion, QCoreApplication
-from PyQt4.QtGui import QFileDialog, QListWidgetItem
+from PyQt4.QtGui import QFileDialog, QListWidgetItem, QMessageBox
 from qgis.core import QgsProject, QgsMessageLog
 from qgis.gui import QgsMessageBar
 from qgis.utils import iface, pluginDirectory
@@ -38,6 +38,9 @@ import resources
 # Import the code for the dialog
 from application_dialog import ExportToHEDialog
 from k_qkhe import exportKanaldaten
+from checkpoint import lese_checkpoint
+from sqlskript import kennung_export, skript_aktuell, speichere_kennung, lade_skript
+from pruefung import pruefe_export
 from qkan_he7 import Dummy
 from qkan.database.dbfunc import DBConnection
 from qkan.database.qkan_utils import get_database_QKan, get_editable_layers, fortschritt, fehlermeldung
@@ -439,6 +442,40 @@ class ExportToHE:
         return liste
 
 
+    # -------------------------------------------------------------------------
+    # Export über ein Ladeskript
+
+    def export_skript(self, database_QKan, database_HE, dbtemplate_HE, liste_teilgebiete, autokorrektur,
+                      fangradius, mindestflaeche, mit_verschneidung, datenbanktyp, check_export,
+                      paketgroesse_flaechen=0):
+        """Schreibt den Export in ein Ladeskript neben der HE-Datenbank und lädt dieses in
+        einer Transaktion. Ein vorhandenes Skript zum selben Datenstand wird wiederverwendet."""
+
+        skriptdatei = os.path.splitext(database_HE)[0] + u'.sql'
+        optionen = dict(check_export)
+        optionen.update(liste_teilgebiete=liste_teilgebiete, autokorrektur=autokorrektur, fangradius=fangradius,
+                        mindestflaeche=mindestflaeche, mit_verschneidung=mit_verschneidung)
+
+        if skript_aktuell(skriptdatei, kennung_export(database_QKan, dbtemplate_HE, optionen)):
+            fortschritt(u'Vorhandenes Ladeskript {} wird verwendet'.format(skriptdatei))
+        else:
+            if os.path.exists(skriptdatei):
+                os.remove(skriptdatei)
+            exportKanaldaten(iface, database_HE, dbtemplate_HE, self.dbQK, liste_teilgebiete, autokorrektur,
+                             fangradius, mindestflaeche, mit_verschneidung, datenbanktyp, check_export,
+                             skriptdatei=skriptdatei, paketgroesse_flaechen=paketgroesse_flaechen)
+            if not os.path.exists(skriptdatei):
+                # Export abgebrochen, Fehlermeldung erfolgte schon
+                return False
+            # Erst nach dem Export ermitteln, da dabei die Verknüpfungen aktualisiert werden
+            speichere_kennung(skriptdatei, kennung_export(database_QKan, dbtemplate_HE, optionen))
+
+        if lade_skript(skriptdatei, database_HE, dbtemplate_HE):
+            iface.messageBar().pushMessage(u"Information", u"Ladeskript in die HE-Datenbank geladen",
+                                           level=QgsMessageBar.INFO, duration=3)
+            return True
+        return False
+
     # Ende Eigene Funktionen ---------------------------------------------------
 
     def run(self):
@@ -546,6 +583,27 @@ class ExportToHE:
         else:
             fangradius = u'0.1'
 
+        # Export direkt in die Firebird-Datenbank ('firebird') oder über ein Ladeskript ('skript')
+        # Kann über Menü "Optionen" eingegeben werden
+        if 'export_backend' in self.config:
+            export_backend = self.config['export_backend']
+        else:
+            export_backend = u'firebird'
+
+        # Paketweiser Export der Flächen für sehr große Gebiete: Anzahl Haltungen je Paket (0: ohne Pakete)
+        # Kann über Menü "Optionen" eingegeben werden
+        if 'paketgroesse_flaechen' in self.config:
+            paketgroesse_flaechen = self.config['paketgroesse_flaechen']
+        else:
+            paketgroesse_flaechen = 0
+
+        # Prüfung des Exports durch Vergleich von QKan- und HE-Datenbank
+        # Kann über Menü "Optionen" eingegeben werden
+        if 'pruefung_export' in self.config:
+            pruefung_export = self.config['pruefung_export']
+        else:
+            pruefung_export = True
+
         # Haltungsflächen (tezg) berücksichtigen
         if 'mit_verschneidung' in self.config:
             mit_verschneidung = self.config['mit_verschneidung']
@@ -625,6 +683,9 @@ class ExportToHE:
             self.config['fangradius'] = fangradius
             self.config['mit_verschneidung'] = mit_verschneidung
             self.config['mindestflaeche'] = mindestflaeche
+            self.config['export_backend'] = export_backend
+            self.config['paketgroesse_flaechen'] = paketgroesse_flaechen
+            self.config['pruefung_export'] = pruefung_export
 
             for el in check_export:
                 self.config[el] = check_export[el]
@@ -633,5 +694,28 @@ class ExportToHE:
                 # logger.debug(u"Config-Dictionary: {}".format(self.config))
                 fileconfig.write(json.dumps(self.config))
 
-            exportKanaldaten(iface, database_HE, dbtemplate_HE, self.dbQK, liste_teilgebiete, autokorrektur, 
-                             fangradius, mindestflaeche, mit_verschneidung, datenbanktyp, check_export)
+            if export_backend == u'skript':
+                if self.export_skript(database_QKan, database_HE, dbtemplate_HE, liste_teilgebiete, autokorrektur,
+                                      fangradius, mindestflaeche, mit_verschneidung, datenbanktyp, check_export,
+                                      paketgroesse_flaechen) and pruefung_export:
+                    pruefe_export(self.dbQK, database_HE, liste_teilgebiete, check_export, mindestflaeche,
+                                  mit_verschneidung, paketgroesse_flaechen)
+                return
+
+            # Falls ein vorheriger Export in dieselbe HE-Datenbank abgebrochen wurde, kann
+            # dieser ab dem letzten Checkpoint fortgesetzt werden.
+            resume = False
+            checkpoint = lese_checkpoint(database_HE)
+            if checkpoint is not None:
+                antwort = QMessageBox.question(self.dlg, u'Abgebrochener Export',
+                                               u'Der letzte Export in diese HE-Datenbank wurde am {} '
+                                               u'abgebrochen.\nSoll der Export fortgesetzt werden?'.format(
+                                                   checkpoint.get(u'zeitpunkt', u'?')),
+                                               QMessageBox.Yes | QMessageBox.No, QMessageBox.Yes)
+                resume = (antwort == QMessageBox.Yes)
+
+            if exportKanaldaten(iface, database_HE, dbtemplate_HE, self.dbQK, liste_teilgebiete, autokorrektur,
+                                fangradius, mindestflaeche, mit_verschneidung, datenbanktyp, check_export,
+                                resume, paketgroesse_flaechen=paketgroesse_flaechen) and pruefung_export:
+                pruefe_export(self.dbQK, database_HE, liste_teilgebiete, check_export, mindestflaeche,
+                              mit_verschneidung, paketgroesse_flaechen)
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+
+"""
+  Checkpoints für den Export nach HYSTEM-EXTRAN
+  =============================================
+
+  Nach jedem abgeschlossenen (committeten) Abschnitt bzw. Teilpaket des Exports wird ein
+  Checkpoint in eine json-Datei neben der HE-Datenbank geschrieben. Ein mit resume=True
+  gestarteter Export setzt dann in derselben IDBF-Datei beim letzten Checkpoint fort, ohne
+  die Vorlage erneut zu kopieren.
+
+  | Dateiname            : checkpoint.py
+  | Date                 : Oktober 2018
+  | Copyright            : (C) 2018 by Joerg Hoettges
+  | Email                : hoettges@fh-aachen.de
+  | git sha              : $Format:%H$
+
+  This program is free software; you can redistribute it and/or modify
+  it under the terms of the GNU General Public License as published by
+  the Free Software Foundation; either version 2 of the License, or
+  (at your option) any later version.
+
+"""
+
+import json
+import logging
+import os
+import time
+
+logger = logging.getLogger('QKan')
+
+
+def checkpointdatei(database_HE):
+    '''Name der Checkpoint-Datei zur HE-Datenbank
+
+    :database_HE:           Pfad zur HE-Firebird-Datenbank
+    :type database_HE:      string
+
+    :returns:               Pfad zur Checkpoint-Datei
+    :rtype:                 string
+    '''
+    return database_HE + u'.checkpoint.json'
+
+
+def lese_checkpoint(database_HE):
+    '''Liest den letzten Checkpoint zur HE-Datenbank.
+
+    :database_HE:           Pfad zur HE-Firebird-Datenbank
+    :type database_HE:      string
+
+    :returns:               Checkpoint mit den Schlüsseln 'erledigt' (Liste der abgeschlossenen Abschnitte),
+                            'abschnitt', 'schluessel' (zuletzt geschriebener QKan-Schlüssel) und 'nextid',
+                            oder None, falls kein (lesbarer) Checkpoint vorhanden ist.
+    :rtype:                 dict
+    '''
+    dateiname = checkpointdatei(database_HE)
+    if not os.path.exists(dateiname) or not os.path.exists(database_HE):
+        return None
+    try:
+        with open(dateiname, 'r') as fileckp:
+            checkpoint = json.loads(fileckp.read())
+    except BaseException as err:
+        logger.error(u'Checkpoint-Datei {} konnte nicht gelesen werden: {}'.format(dateiname, repr(err)))
+        return None
+
+    if checkpoint.get('database_HE') != os.path.abspath(database_HE):
+        logger.error(u'Checkpoint-Datei {} gehört zu einer anderen HE-Datenbank'.format(dateiname))
+        return None
+
+    return checkpoint
+
+
+def neuer_checkpoint(database_HE, aktiv=True):
+    '''Erzeugt einen leeren Checkpoint für einen neu beginnenden Export.
+
+    :aktiv:                 Checkpoints werden geschrieben. Beim Export in ein Ladeskript
+                            entfällt dies, weil die HE-Datenbank erst beim Laden entsteht.
+    :type aktiv:            Boolean
+    '''
+    return {u'database_HE': os.path.abspath(database_HE),
+            u'aktiv': aktiv,
+            u'erledigt': [],
+            u'abschnitt': None,
+            u'schluessel': None,
+            u'nextid': None}
+
+
+def schreibe_checkpoint(database_HE, checkpoint, abschnitt, nextid, schluessel=None, abgeschlossen=False):
+    '''Schreibt den Checkpoint nach einem commit in der HE-Datenbank.
+
+    Die Datei wird zunächst unter einem temporären Namen geschrieben und dann umbenannt,
+    damit ein Abbruch während des Schreibens keinen unlesbaren Checkpoint hinterlässt.
+
+    :checkpoint:            Checkpoint, wird hier aktualisiert
+    :type checkpoint:       dict
+
+    :abschnitt:             Bezeichnung des Exportabschnitts, z.B. 'flaechenrw'
+    :type abschnitt:        string
+
+    :nextid:                Stand von ITWH$PROGINFO.NEXTID nach dem commit
+    :type nextid:           int
+
+    :schluessel:            Zuletzt geschriebener QKan-Schlüssel bei Teilpaketen
+    :type schluessel:       string
+
+    :abgeschlossen:         Der Abschnitt ist vollständig exportiert
+    :type abgeschlossen:    Boolean
+
+    :returns:               void
+    '''
+    if abgeschlossen:
+        if abschnitt not in checkpoint[u'erledigt']:
+            checkpoint[u'erledigt'].append(abschnitt)
+        checkpoint[u'abschnitt'] = None
+        checkpoint[u'schluessel'] = None
+    else:
+        checkpoint[u'abschnitt'] = abschnitt
+        checkpoint[u'schluessel'] = schluessel
+    checkpoint[u'nextid'] = nextid
+    checkpoint[u'zeitpunkt'] = time.strftime(u'%d.%m.%Y %H:%M:%S', time.localtime())
+
+    if not checkpoint.get(u'aktiv', True):
+        return
+
+    dateiname = checkpointdatei(database_HE)
+    try:
+        with open(dateiname + u'.tmp', 'w') as fileckp:
+            fileckp.write(json.dumps(checkpoint))
+        if os.path.exists(dateiname):
+            os.remove(dateiname)
+        os.rename(dateiname + u'.tmp', dateiname)
+    except BaseException as err:
+        # Ein fehlender Checkpoint verhindert nur die Fortsetzung, nicht den Export
+        logger.error(u'Checkpoint-Datei {} konnte nicht geschrieben werden: {}'.format(dateiname, repr(err)))
+
+
+def loesche_checkpoint(database_HE):
+    '''Entfernt den Checkpoint nach einem erfolgreich abgeschlossenen Export.'''
+    dateiname = checkpointdatei(database_HE)
+    if os.path.exists(dateiname):
+        try:
+            os.remove(dateiname)
+        except BaseException as err:
+            logger.error(u'Checkpoint-Datei {} konnte nicht gelöscht werden: {}'.format(dateiname, repr(err)))
+
+
+def flaechen_schluessel(paketgroesse, wert):
+    '''Schlüssel des Checkpoints beim Export der Flächen. Neben dem zuletzt geschriebenen
+    flnam bzw. der oberen Grenze des zuletzt abgeschlossenen Pakets wird die Paketgröße
+    gespeichert, da sich die Sortierung der Flächen im Paketmodus unterscheidet.
+
+    :paketgroesse:          Paketgröße des Exports, 0 ohne Paketmodus
+    :type paketgroesse:     int
+
+    :wert:                  flnam bzw. haltnam der Paketgrenze
+    :type wert:             string
+    '''
+    if paketgroesse > 0:
+        return [u'paket', wert, paketgroesse]
+    return [u'flnam', wert, 0]
+
+
+def lese_flaechen_schluessel(checkpoint):
+    '''Liest den Schlüssel des Checkpoints beim Export der Flächen.
+
+    :returns:               (Art 'paket' oder 'flnam', Wert, Paketgröße). Die Paketgröße ist None,
+                            wenn der Schlüssel nicht von flaechen_schluessel stammt. Der Export
+                            wird dann nicht fortgesetzt.
+    :rtype:                 tuple
+    '''
+    schluessel = checkpoint[u'schluessel']
+    if isinstance(schluessel, list) and len(schluessel) == 3:
+        return tuple(schluessel)
+    return None, None, None
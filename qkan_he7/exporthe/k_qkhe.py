@@ -40,16 +40,253 @@ from qkan.linkflaechen.updatelinks import updatelinkfl, updatelinksw, updatelink
 from qkan.database.reflists import abflusstypen
 from qkan.database.qkan_database import versionolder
 
+from checkpoint import (lese_checkpoint, neuer_checkpoint, schreibe_checkpoint, loesche_checkpoint,
+                        flaechen_schluessel, lese_flaechen_schluessel)
+from sqlskript import SkriptConnection
+from abgleich import fehlende_namen, einfuegen_paketweise, maxanzahl_block
+
 logger = logging.getLogger('QKan')
 
 progress_bar = None
 
+# Anzahl Datensätze, nach denen beim Flächenexport ein Checkpoint geschrieben wird
+batchsize_checkpoint = 5000
+
+
+def sql_flaechenrw(combine, mit_verschneidung, mindestflaeche, auswahl_c=u'', auswahl_paket=u''):
+    '''Abfrage der zu exportierenden Flächen in der QKan-Datenbank. Wird auch von der Prüfung
+    des Exports (Modul pruefung) verwendet, damit dort dieselben Flächennamen entstehen.
+
+    :combine:               Flächen je Haltung und Abflusseigenschaften zusammenfassen
+    :type combine:          Boolean
+
+    :mit_verschneidung:     Flächen werden mit Haltungsflächen verschnitten (abhängig von Attribut "aufteilen")
+    :type mit_verschneidung: Boolean
+
+    :mindestflaeche:        Kleinere Flächen werden nicht exportiert
+    :type mindestflaeche:   float
+
+    :auswahl_c:             Einschränkung auf Teilgebiete (Bedingung für haltungen AS ha)
+    :auswahl_paket:         Einschränkung auf die Haltungen eines Pakets (Bedingung für linkfl AS lf)
+
+    :returns:               SQL-Abfrage mit den Spalten flnam, haltnam, neigkl, abflusstyp, speicherzahl,
+                            speicherkonst, fliesszeitflaeche, fliesszeitkanal, flaeche, regenschreiber,
+                            abflussparameter, createdat, kommentar
+    :rtype:                 string
+    '''
+
+    # Verschneidung nur, wenn (mit_verschneidung)
+    if mit_verschneidung:
+        case_verschneidung = "fl.aufteilen IS NULL or fl.aufteilen <> 'ja'"
+        join_verschneidung = """
+            LEFT JOIN tezg AS tg
+            ON lf.tezgnam = tg.flnam"""
+    else:
+        case_verschneidung = "1"
+        join_verschneidung = ""
+
+    if combine:
+        sql = u"""
+          WITH flintersect AS (
+            SELECT lf.flnam AS flnam, lf.pk AS pl, lf.haltnam AS haltnam, fl.neigkl AS neigkl, lf.abflusstyp AS abflusstyp, 
+              lf.speicherzahl AS speicherzahl, lf.speicherkonst AS speicherkonst,
+              lf.fliesszeitflaeche AS fliesszeitflaeche, lf.fliesszeitkanal AS fliesszeitkanal,
+              fl.regenschreiber AS regenschreiber,
+              fl.abflussparameter AS abflussparameter, fl.createdat AS createdat,
+              fl.kommentar AS kommentar, 
+              CASE WHEN {case_verschneidung} THEN fl.geom 
+              ELSE CastToMultiPolygon(CollectionExtract(intersection(fl.geom,tg.geom),3)) END AS geom
+            FROM linkfl AS lf
+            INNER JOIN flaechen AS fl
+            ON lf.flnam = fl.flnam{join_verschneidung}
+            WHERE lf.haltnam IS NOT NULL{auswahl_paket})
+          SELECT substr(printf('%s-%d', fi.flnam, fi.pl),1,30) AS flnam, 
+            ha.haltnam AS haltnam, fi.neigkl AS neigkl,
+            fi.abflusstyp AS abflusstyp, fi.speicherzahl AS speicherzahl, avg(fi.speicherkonst) AS speicherkonst,
+            max(fi.fliesszeitflaeche) AS fliesszeitflaeche, max(fi.fliesszeitkanal) AS fliesszeitkanal,
+            sum(area(fi.geom)/10000) AS flaeche, fi.regenschreiber AS regenschreiber,
+            abflussparameter AS abflussparameter, max(fi.createdat) AS createdat,
+            max(fi.kommentar) AS kommentar
+          FROM flintersect AS fi
+          INNER JOIN haltungen AS ha
+          ON fi.haltnam = ha.haltnam
+          WHERE area(fi.geom) > {mindestflaeche}{auswahl_c}
+          GROUP BY ha.haltnam, fi.abflussparameter, fi.regenschreiber, fi.speicherzahl, 
+            fi.abflusstyp, fi.neigkl
+          ORDER BY flnam""".format(mindestflaeche=mindestflaeche, auswahl_c=auswahl_c,
+                                                auswahl_paket=auswahl_paket,
+                                                case_verschneidung=case_verschneidung, 
+                                                join_verschneidung=join_verschneidung)
+    else:
+        sql = u"""
+          WITH flintersect AS (
+            SELECT substr(printf('%s-%d', fl.flnam, lf.pk),1,30) AS flnam, 
+              ha.haltnam AS haltnam, fl.neigkl AS neigkl,
+              lf.abflusstyp AS abflusstyp, lf.speicherzahl AS speicherzahl, lf.speicherkonst AS speicherkonst,
+              lf.fliesszeitflaeche AS fliesszeitflaeche, lf.fliesszeitkanal AS fliesszeitkanal,
+              CASE WHEN {case_verschneidung} THEN area(fl.geom)/10000 
+              ELSE area(CastToMultiPolygon(CollectionExtract(intersection(fl.geom,tg.geom),3)))/10000 END AS flaeche, 
+              fl.regenschreiber AS regenschreiber,
+              fl.abflussparameter AS abflussparameter, fl.createdat AS createdat,
+              fl.kommentar AS kommentar
+            FROM linkfl AS lf
+            INNER JOIN flaechen AS fl
+            ON lf.flnam = fl.flnam
+            INNER JOIN haltungen AS ha
+            ON lf.haltnam = ha.haltnam{join_verschneidung}
+            WHERE lf.haltnam IS NOT NULL{auswahl_c}{auswahl_paket})
+          SELECT flnam, haltnam, neigkl, abflusstyp, speicherzahl, speicherkonst, 
+          fliesszeitflaeche, fliesszeitkanal, flaeche, regenschreiber, abflussparameter,
+          createdat, kommentar
+          FROM flintersect AS fi
+          WHERE flaeche*10000 > {mindestflaeche}
+          ORDER BY flnam""".format(mindestflaeche=mindestflaeche, auswahl_c=auswahl_c,
+                                                auswahl_paket=auswahl_paket,
+                                                case_verschneidung=case_verschneidung, 
+                                                join_verschneidung=join_verschneidung)
+    return sql
+
+
+def flaechen_pakete(dbQK, auswahl_c, paketgroesse_flaechen, repref):
+    '''Grenzen der Pakete beim Export der Flächen. Jedes Paket umfasst paketgroesse_flaechen
+    Haltungen (nach Namen sortiert). Wird auch von der Prüfung des Exports verwendet.
+
+    Ohne Indizes würde jede Abfrage eines Pakets linkfl vollständig durchsuchen und für
+    haltungen, flaechen und tezg automatische Indizes aufbauen, so dass der Aufwand mit der
+    Anzahl der Pakete wächst. Daher werden die Indizes hier angelegt, falls sie fehlen.
+
+    :auswahl_c:             Einschränkung auf Teilgebiete (Bedingung für haltungen AS ha)
+
+    :paketgroesse_flaechen: Anzahl Haltungen je Paket, 0 ohne Paketmodus
+    :type paketgroesse_flaechen: int
+
+    :returns:               Liste der Paketgrenzen (von, bis) mit None für offene Grenzen
+                            oder None im Fehlerfall
+    :rtype:                 list
+    '''
+    if paketgroesse_flaechen <= 0:
+        return [(None, None)]
+
+    sql = u"""SELECT haltnam FROM haltungen AS ha
+              WHERE haltnam IS NOT NULL{auswahl_c}
+              ORDER BY haltnam""".format(auswahl_c=auswahl_c)
+    if not dbQK.sql(sql, u'{} (3)'.format(repref)):
+        return None
+    grenzen = [el[0] for el in dbQK.fetchall()][paketgroesse_flaechen - 1::paketgroesse_flaechen]
+
+    for tabelle, spalte in [(u'linkfl', u'haltnam'), (u'haltungen', u'haltnam'),
+                            (u'flaechen', u'flnam'), (u'tezg', u'flnam')]:
+        sql = u'CREATE INDEX IF NOT EXISTS {0}_{1} ON {0} ({1})'.format(tabelle, spalte)
+        if not dbQK.sql(sql, u'{} (5)'.format(repref)):
+            return None
+
+    return list(zip([None] + grenzen, grenzen + [None]))
+
+
+def sql_auswahl_paket(von, bis):
+    '''Einschränkung der Abfrage sql_flaechenrw auf die Haltungen eines Pakets (von, bis].'''
+    auswahl_paket = u''
+    if von is not None:
+        auswahl_paket += u" AND lf.haltnam > '{}'".format(von.replace(u"'", u"''"))
+    if bis is not None:
+        auswahl_paket += u" AND lf.haltnam <= '{}'".format(bis.replace(u"'", u"''"))
+    return auswahl_paket
+
+
+def sql_einleitdirekt(combine, auswahl=u''):
+    '''Abfrage der zu exportierenden Direkteinleiter in der QKan-Datenbank. Wird auch von der Prüfung
+    des Exports (Modul pruefung) verwendet.
+
+    :combine:               Direkteinleiter je Haltung zusammenfassen
+    :type combine:          Boolean
+
+    :auswahl:               Einschränkung auf Teilgebiete (Bedingung für einleit)
+
+    :returns:               SQL-Abfrage mit den Spalten elnam, xel, yel, haltnam, wverbrauch, stdmittel,
+                            fremdwas, einwohner, zuflussdirekt, herkunft, createdat
+    :rtype:                 string
+    '''
+
+    if combine:
+        sql = u"""SELECT
+          elnam,
+          avg(x(geom)) AS xel,
+          avg(y(geom)) AS yel,
+          haltnam AS haltnam,
+          NULL AS wverbrauch, 
+          NULL AS stdmittel,
+          NULL AS fremdwas, 
+          NULL AS einwohner,
+          sum(zufluss) AS zuflussdirekt, 
+          1 AS herkunft,
+          einleit.createdat AS createdat
+          FROM einleit
+          WHERE zufluss IS NOT NULL {auswahl}
+          GROUP BY haltnam
+      UNION
+          SELECT
+          el.elnam AS elnam,
+          avg(x(el.geom)) AS xel,
+          avg(y(el.geom)) AS yel,
+          el.haltnam AS haltnam,
+          printf('%.6f',tg.wverbrauch) AS wverbrauch, 
+          printf('%.1f',tg.stdmittel) AS stdmittel,
+          printf('%.3f',tg.fremdwas) AS fremdwas, 
+          printf('%.6f',el.ew) AS einwohner,
+          NULL AS zuflussdirekt, 
+          3 AS herkunft,
+          el.createdat AS createdat
+          FROM einleit AS el
+          INNER JOIN einzugsgebiete AS tg
+          ON el.einzugsgebiet = tg.tgnam
+          WHERE zufluss IS NULL {auswahl}
+          GROUP BY el.haltnam, 
+            printf('%.6f',tg.wverbrauch), 
+            printf('%.1f',tg.stdmittel),
+            printf('%.3f',tg.fremdwas),
+            printf('%.6f',el.ew)
+        """.format(auswahl=auswahl)
+    else:
+        sql = u"""SELECT
+          elnam,
+          x(geom) AS xel,
+          y(geom) AS yel,
+          haltnam AS haltnam,
+          NULL AS wverbrauch, 
+          NULL AS stdmittel,
+          NULL AS fremdwas, 
+          NULL AS einwohner,
+          zufluss AS zuflussdirekt, 
+          1 AS herkunft,
+          einleit.createdat AS createdat
+          FROM einleit
+          WHERE zufluss IS NOT NULL {auswahl}
+      UNION
+          SELECT
+          el.elnam AS elnam,
+          x(el.geom) AS xel,
+          y(el.geom) AS yel,
+          el.haltnam AS haltnam,
+          tg.wverbrauch AS wverbrauch, 
+          tg.stdmittel AS stdmittel,
+          tg.fremdwas AS fremdwas, 
+          el.ew AS einwohner,
+          NULL AS zuflussdirekt, 
+          3 AS herkunft,
+          el.createdat AS createdat
+          FROM einleit AS el
+          INNER JOIN einzugsgebiete AS tg
+          ON el.einzugsgebiet = tg.tgnam 
+          WHERE zufluss IS NULL {auswahl}
+        """.format(auswahl=auswahl)
+    return sql
+
 
 # Hauptprogramm ---------------------------------------------------------------------------------------------
 
 def exportKanaldaten(iface, database_HE, dbtemplate_HE, dbQK, liste_teilgebiete, autokorrektur, 
                      fangradius=0.1, mindestflaeche=0.5, mit_verschneidung=True, datenbanktyp=u'spatialite', 
-                     check_export={}):
+                     check_export={}, resume=False, skriptdatei=None, paketgroesse_flaechen=0):
     '''Export der Kanaldaten aus einer QKan-SpatiaLite-Datenbank und Schreiben in eine HE-Firebird-Datenbank.
 
     :database_HE:           Pfad zur HE-Firebird-Datenbank
@@ -85,7 +322,21 @@ def exportKanaldaten(iface, database_HE, dbtemplate_HE, dbQK, liste_teilgebiete,
     :check_export:          Liste von Export-Optionen
     :type check_export:     Dictionary
 
-    :returns:               void
+    :resume:                Fortsetzung eines abgebrochenen Exports in dieselbe HE-Datenbank ab dem
+                            letzten Checkpoint. Die Vorlage wird dabei nicht erneut kopiert.
+    :type resume:           Boolean
+
+    :skriptdatei:           Falls angegeben, werden die Daten nicht direkt in die HE-Datenbank geschrieben,
+                            sondern in dieses Ladeskript (s. sqlskript.py). Die HE-Datenbank wird
+                            anschließend mit lade_skript() oder isql erstellt.
+    :type skriptdatei:      string
+
+    :paketgroesse_flaechen: Falls > 0, werden die Flächen paketweise für jeweils so viele Haltungen exportiert,
+                            so dass der Speicherbedarf auch bei sehr großen Gebieten begrenzt bleibt.
+    :type paketgroesse_flaechen: int
+
+    :returns:               Erfolg
+    :rtype:                 Boolean
     '''
 
     # Statusmeldung in der Anzeige
@@ -99,26 +350,65 @@ def exportKanaldaten(iface, database_HE, dbtemplate_HE, dbQK, liste_teilgebiete,
     # Referenzliste der Abflusstypen für HYSTEM-EXTRAN
     he_fltyp_ref = abflusstypen('he')
 
-    # ITWH-Datenbank aus gewählter Vorlage kopieren
-    if os.path.exists(database_HE):
+    # Checkpoint eines abgebrochenen Exports. Nur wenn vorhanden, wird fortgesetzt
+    if skriptdatei is not None:
+        # Das Ladeskript wird immer vollständig erzeugt
+        resume = False
+    elif resume:
+        checkpoint = lese_checkpoint(database_HE)
+        if checkpoint is None:
+            meldung(u'Export kann nicht fortgesetzt werden', 
+                    u'Zur HE-Datenbank wurde kein Checkpoint gefunden. Der Export wird neu gestartet.')
+            resume = False
+        else:
+            logger.debug(u'Export wird fortgesetzt. Checkpoint: {}'.format(checkpoint))
+
+            # Ein unterbrochener Export der Flächen kann nur mit derselben Paketgröße fortgesetzt
+            # werden, da die Flächen im Paketmodus nur innerhalb eines Pakets nach flnam sortiert sind.
+            if checkpoint[u'abschnitt'] == u'flaechenrw':
+                art, wert, paketgroesse = lese_flaechen_schluessel(checkpoint)
+                if paketgroesse != max(paketgroesse_flaechen, 0):
+                    fehlermeldung(u'Export kann nicht fortgesetzt werden',
+                                  u'Der Export der Flächen wurde mit der Paketgröße {} unterbrochen und kann nur '
+                                  u'mit derselben Paketgröße fortgesetzt werden (gewählt: {}). Bitte die '
+                                  u'Paketgröße anpassen oder den Export neu starten.'.format(
+                                      u'unbekannt' if paketgroesse is None else paketgroesse,
+                                      max(paketgroesse_flaechen, 0)))
+                    return False
+
+    if skriptdatei is not None:
+        checkpoint = neuer_checkpoint(database_HE, aktiv=False)
+    elif not resume:
+        checkpoint = neuer_checkpoint(database_HE)
+        loesche_checkpoint(database_HE)
+
+        # ITWH-Datenbank aus gewählter Vorlage kopieren
+        if os.path.exists(database_HE):
+            try:
+                os.remove(database_HE)
+            except BaseException as err:
+                fehlermeldung(u'Fehler (33) in QKan_Export', 
+                    u'Die HE-Datenbank ist schon vorhanden und kann nicht ersetzt werden: {}'.format(repr(err)))
+                return False
         try:
-            os.remove(database_HE)
+            shutil.copyfile(dbtemplate_HE, database_HE)
         except BaseException as err:
-            fehlermeldung(u'Fehler (33) in QKan_Export', 
-                u'Die HE-Datenbank ist schon vorhanden und kann nicht ersetzt werden: {}'.format(repr(err)))
+            fehlermeldung(u'Fehler (34) in QKan_Export', 
+                u'Kopieren der Vorlage HE-Datenbank fehlgeschlagen: {}\nVorlage: {}\nZiel: {}\n'.format(repr(err), dbtemplate_HE, database_HE))
             return False
-    try:
-        shutil.copyfile(dbtemplate_HE, database_HE)
-    except BaseException as err:
-        fehlermeldung(u'Fehler (34) in QKan_Export', 
-            u'Kopieren der Vorlage HE-Datenbank fehlgeschlagen: {}\nVorlage: {}\nZiel: {}\n'.format(repr(err), dbtemplate_HE, database_HE))
-        return False
-    fortschritt(u"Firebird-Datenbank aus Vorlage kopiert...", 0.01)
+        fortschritt(u"Firebird-Datenbank aus Vorlage kopiert...", 0.01)
     progress_bar.setValue(1)
 
+    def offen(abschnitt):
+        '''Prüft, ob ein Abschnitt beim Fortsetzen noch (teilweise) zu exportieren ist'''
+        return abschnitt not in checkpoint[u'erledigt']
+
     # Verbindung zur Hystem-Extran-Datenbank
 
-    dbHE = FBConnection(database_HE)  # Datenbankobjekt der HE-Datenbank zum Schreiben
+    if skriptdatei is None:
+        dbHE = FBConnection(database_HE)  # Datenbankobjekt der HE-Datenbank zum Schreiben
+    else:
+        dbHE = SkriptConnection(skriptdatei, dbtemplate_HE)
 
     if dbHE is None:
         fehlermeldung(u"(1) Fehler",
@@ -158,10 +448,15 @@ def exportKanaldaten(iface, database_HE, dbtemplate_HE, dbQK, liste_teilgebiete,
     heDBVersion = data[1].split('.')
     logger.debug(u'HE IDBF-Version {}'.format(heDBVersion))
 
+    # NEXTID wird zusammen mit den Daten committet und ist deshalb maßgebend. Eine Abweichung
+    # entsteht nur, wenn der Abbruch zwischen commit und dem Schreiben des Checkpoints lag.
+    if resume and checkpoint[u'nextid'] is not None and checkpoint[u'nextid'] != nextid - 1:
+        logger.debug(u'NEXTID laut Checkpoint: {}, in HE-Datenbank: {}'.format(checkpoint[u'nextid'], nextid - 1))
+
     # --------------------------------------------------------------------------------------------
     # Export der Schaechte
 
-    if check_export['export_schaechte'] or check_export['modify_schaechte']:
+    if (check_export['export_schaechte'] or check_export['modify_schaechte']) and offen(u'schaechte'):
 
         # Nur Daten fuer ausgewaehlte Teilgebiete
         if len(liste_teilgebiete) != 0:
@@ -266,6 +561,7 @@ def exportKanaldaten(iface, database_HE, dbtemplate_HE, dbQK, liste_teilgebiete,
 
         dbHE.sql(u"UPDATE ITWH$PROGINFO SET NEXTID = {:d}".format(nextid))
         dbHE.commit()
+        schreibe_checkpoint(database_HE, checkpoint, u'schaechte', nextid, abgeschlossen=True)
 
         fortschritt(u'{} Schaechte eingefuegt'.format(nextid - nr0), 0.30)
         progress_bar.setValue(30)
@@ -276,7 +572,7 @@ def exportKanaldaten(iface, database_HE, dbtemplate_HE, dbQK, liste_teilgebiete,
     # Beim Export werden die IDs mitgeschrieben, um bei den Speicherkennlinien
     # wiederverwertet zu werden.
 
-    if check_export['export_speicher'] or check_export['modify_speicher']:
+    if (check_export['export_speicher'] or check_export['modify_speicher']) and offen(u'speicher'):
 
         # Nur Daten fuer ausgewaehlte Teilgebiete
         if len(liste_teilgebiete) != 0:
@@ -450,12 +746,15 @@ def exportKanaldaten(iface, database_HE, dbtemplate_HE, dbQK, liste_teilgebiete,
             dbHE.commit()
 
             fortschritt(u'{} Speicher eingefuegt'.format(nextid - nr0), 0.40)
+
+        # Die Kennlinien verweisen auf die IDs der Speicher, deshalb erst danach als erledigt markieren
+        schreibe_checkpoint(database_HE, checkpoint, u'speicher', nextid, abgeschlossen=True)
     progress_bar.setValue(45)
 
     # --------------------------------------------------------------------------------------------
     # Export der Auslaesse
 
-    if check_export['export_auslaesse'] or check_export['modify_auslaesse']:
+    if (check_export['export_auslaesse'] or check_export['modify_auslaesse']) and offen(u'auslaesse'):
 
         # Nur Daten fuer ausgewaehlte Teilgebiete
         if len(liste_teilgebiete) != 0:
@@ -563,6 +862,7 @@ def exportKanaldaten(iface, database_HE, dbtemplate_HE, dbQK, liste_teilgebiete,
 
         dbHE.sql(u"UPDATE ITWH$PROGINFO SET NEXTID = {:d}".format(nextid))
         dbHE.commit()
+        schreibe_checkpoint(database_HE, checkpoint, u'auslaesse', nextid, abgeschlossen=True)
 
         fortschritt(u'{} Auslässe eingefuegt'.format(nextid - nr0), 0.40)
     progress_bar.setValue(50)
@@ -575,7 +875,7 @@ def exportKanaldaten(iface, database_HE, dbtemplate_HE, dbQK, liste_teilgebiete,
     # in HYSTEM-EXTRAN in der Karteikarte "Haltungen > Trockenwetter". Solange dort kein
     # Siedlungstyp zugeordnet ist, wird diese Fläche nicht wirksam und dient nur der Information!
 
-    if check_export['export_haltungen'] or check_export['modify_haltungen']:
+    if (check_export['export_haltungen'] or check_export['modify_haltungen']) and offen(u'haltungen'):
 
         # Nur Daten fuer ausgewaehlte Teilgebiete
         if len(liste_teilgebiete) != 0:
@@ -757,6 +1057,7 @@ def exportKanaldaten(iface, database_HE, dbtemplate_HE, dbQK, liste_teilgebiete,
                     nextid += 1
         dbHE.sql(u"UPDATE ITWH$PROGINFO SET NEXTID = {:d}".format(nextid))
         dbHE.commit()
+        schreibe_checkpoint(database_HE, checkpoint, u'haltungen', nextid, abgeschlossen=True)
 
         fortschritt(u'{} Haltungen eingefuegt'.format(nextid - nr0), 0.60)
     progress_bar.setValue(70)
@@ -764,7 +1065,7 @@ def exportKanaldaten(iface, database_HE, dbtemplate_HE, dbQK, liste_teilgebiete,
     # --------------------------------------------------------------------------------------------
     # Export der Bodenklassen
 
-    if check_export['export_bodenklassen'] or check_export['modify_bodenklassen']:
+    if (check_export['export_bodenklassen'] or check_export['modify_bodenklassen']) and offen(u'bodenklassen'):
 
         sql = u"""
             SELECT
@@ -786,7 +1087,19 @@ def exportKanaldaten(iface, database_HE, dbtemplate_HE, dbQK, liste_teilgebiete,
 
         nr0 = nextid
 
-        for attr in dbQK.fetchall():
+        daten = dbQK.fetchall()
+
+        # Abgleich mit den in HE vorhandenen Bodenklassen
+        if check_export['export_bodenklassen']:
+            fehlend = fehlende_namen(dbHE, u'BODENKLASSE', [attr[0] for attr in daten if attr[0] is not None],
+                                     u'dbHE: export_bodenklassen (0)')
+            if fehlend is None:
+                del dbQK
+                return False
+            fehlend = set(fehlend)
+        neu = []
+
+        for attr in daten:
 
             # In allen Feldern None durch NULL ersetzen
             (bknam, infiltrationsrateanfang, infiltrationsrateende, infiltrationsratestart,
@@ -837,19 +1150,17 @@ def exportKanaldaten(iface, database_HE, dbtemplate_HE, dbQK, liste_teilgebiete,
                     del dbQK
                     return False
 
-            # Einfuegen in die Datenbank
-            if check_export['export_bodenklassen']:
-                sql = u"""
+            # Sammeln der fehlenden Bodenklassen zum Einfuegen in die Datenbank
+            if check_export['export_bodenklassen'] and bknam in fehlend:
+                neu.append(u"""
                   INSERT INTO BODENKLASSE
                   ( INFILTRATIONSRATEANFANG, INFILTRATIONSRATEENDE,
                     INFILTRATIONSRATESTART, RUECKGANGSKONSTANTE, REGENERATIONSKONSTANTE,
                     SAETTIGUNGSWASSERGEHALT, NAME, LASTMODIFIED, KOMMENTAR,  ID)
-                  SELECT
+                  VALUES (
                     {infiltrationsrateanfang}, {infiltrationsrateende},
                     {infiltrationsratestart}, {rueckgangskonstante}, {regenerationskonstante},
-                    {saettigungswassergehalt}, '{name}', '{lastmodified}', '{kommentar}', {id}
-                    FROM RDB$DATABASE
-                    WHERE '{name}' NOT IN (SELECT NAME FROM BODENKLASSE);
+                    {saettigungswassergehalt}, '{name}', '{lastmodified}', '{kommentar}', {id})
                     """.format(infiltrationsrateanfang=infiltrationsrateanfang,
                                infiltrationsrateende=infiltrationsrateende,
                                infiltrationsratestart=infiltrationsratestart,
@@ -857,16 +1168,18 @@ def exportKanaldaten(iface, database_HE, dbtemplate_HE, dbQK, liste_teilgebiete,
                                regenerationskonstante=regenerationskonstante,
                                saettigungswassergehalt=saettigungswassergehalt,
                                name=bknam, lastmodified=createdat,
-                               kommentar=kommentar, id=nextid)
-
-                if not dbHE.sql(sql, u'dbHE: export_bodenklassen (2)'):
-                    del dbQK
-                    return False
+                               kommentar=kommentar, id=nextid))
 
                 nextid += 1
+                fehlend.discard(bknam)
+
+        if not einfuegen_paketweise(dbHE, neu, u'dbHE: export_bodenklassen (2)'):
+            del dbQK
+            return False
 
         dbHE.sql(u"UPDATE ITWH$PROGINFO SET NEXTID = {:d}".format(nextid))
         dbHE.commit()
+        schreibe_checkpoint(database_HE, checkpoint, u'bodenklassen', nextid, abgeschlossen=True)
 
         fortschritt(u'{} Bodenklassen eingefuegt'.format(nextid - nr0), 0.62)
     progress_bar.setValue(80)
@@ -874,7 +1187,7 @@ def exportKanaldaten(iface, database_HE, dbtemplate_HE, dbQK, liste_teilgebiete,
     # --------------------------------------------------------------------------------------------
     # Export der Abflussparameter
 
-    if check_export['export_abflussparameter'] or check_export['modify_abflussparameter']:
+    if (check_export['export_abflussparameter'] or check_export['modify_abflussparameter']) and offen(u'abflussparameter'):
 
         sql = u"""
             SELECT
@@ -897,7 +1210,19 @@ def exportKanaldaten(iface, database_HE, dbtemplate_HE, dbQK, liste_teilgebiete,
 
         fortschritt(u'Export Abflussparameter...', .7)
 
-        for attr in dbQK.fetchall():
+        daten = dbQK.fetchall()
+
+        # Abgleich mit den in HE vorhandenen Abflussparametern
+        if check_export['export_abflussparameter']:
+            fehlend = fehlende_namen(dbHE, u'ABFLUSSPARAMETER', [attr[0] for attr in daten],
+                                     u'dbHE: export_abflussparameter (0)')
+            if fehlend is None:
+                del dbQK
+                return False
+            fehlend = set(fehlend)
+        neu = []
+
+        for attr in daten:
 
             # In allen Feldern None durch NULL ersetzen
             (apnam, anfangsabflussbeiwert_t, endabflussbeiwert_t,
@@ -933,7 +1258,7 @@ def exportKanaldaten(iface, database_HE, dbtemplate_HE, dbQK, liste_teilgebiete,
                 typ = 1  # durchlässig
 
             # Ändern vorhandener Datensätze (geschickterweise vor dem Einfügen!)
-            if check_export['modify_auslaesse']:
+            if check_export['modify_abflussparameter']:
                 sql = u"""
                   UPDATE ABFLUSSPARAMETER SET
                   ABFLUSSBEIWERTANFANG={anfangsabflussbeiwert},
@@ -963,9 +1288,9 @@ def exportKanaldaten(iface, database_HE, dbtemplate_HE, dbQK, liste_teilgebiete,
                     del dbQK
                     return False
 
-            # Einfuegen in die Datenbank
-            if check_export['export_auslaesse']:
-                sql = u"""
+            # Sammeln der fehlenden Abflussparameter zum Einfuegen in die Datenbank
+            if check_export['export_abflussparameter'] and apnam in fehlend:
+                neu.append(u"""
                   INSERT INTO ABFLUSSPARAMETER
                   ( NAME, ABFLUSSBEIWERTANFANG, ABFLUSSBEIWERTENDE, BENETZUNGSVERLUST,
                     MULDENVERLUST, BENETZUNGSPEICHERSTART, MULDENAUFFUELLGRADSTART, SPEICHERKONSTANTEKONSTANT,
@@ -973,15 +1298,13 @@ def exportKanaldaten(iface, database_HE, dbtemplate_HE, dbQK, liste_teilgebiete,
                     SPEICHERKONSTANTEMIN2, SPEICHERKONSTANTEMAX2,
                     BODENKLASSE, CHARAKTERISTISCHEREGENSPENDE, CHARAKTERISTISCHEREGENSPENDE2,
                     TYP, JAHRESGANGVERLUSTE, LASTMODIFIED, KOMMENTAR, ID)
-                  SELECT
+                  VALUES (
                     '{apnam}', {anfangsabflussbeiwert}, {endabflussbeiwert}, {benetzungsverlust},
                     {muldenverlust}, {benetzung_startwert}, {mulden_startwert}, {speicherkonstantekonstant},
                     {speicherkonstantemin}, {speicherkonstantemax}, {speicherkonstantekonstant2},
                     {speicherkonstantemin2}, {speicherkonstantemax2},
                     '{bodenklasse}', {charakteristischeregenspende}, {charakteristischeregenspende2},
-                    {typ}, {jahresgangverluste}, '{createdat}', '{kommentar}', {id}
-                  FROM RDB$DATABASE
-                  WHERE '{apnam}' NOT IN (SELECT NAME FROM ABFLUSSPARAMETER);
+                    {typ}, {jahresgangverluste}, '{createdat}', '{kommentar}', {id})
                 """.format(apnam=apnam, anfangsabflussbeiwert=anfangsabflussbeiwert,
                            endabflussbeiwert=endabflussbeiwert, benetzungsverlust=benetzungsverlust,
                            muldenverlust=muldenverlust, benetzung_startwert=benetzung_startwert,
@@ -989,16 +1312,18 @@ def exportKanaldaten(iface, database_HE, dbtemplate_HE, dbQK, liste_teilgebiete,
                            speicherkonstantemin=0, speicherkonstantemax=0, speicherkonstantekonstant2=1,
                            speicherkonstantemin2=0, speicherkonstantemax2=0,
                            bodenklasse=bodenklasse, charakteristischeregenspende=0, charakteristischeregenspende2=0,
-                           typ=typ, jahresgangverluste=0, createdat=createdat, kommentar=kommentar, id=nextid)
-
-                if not dbHE.sql(sql, u'dbHE: export_abflussparameter (2)'):
-                    del dbQK
-                    return False
+                           typ=typ, jahresgangverluste=0, createdat=createdat, kommentar=kommentar, id=nextid))
 
                 nextid += 1
+                fehlend.discard(apnam)
+
+        if not einfuegen_paketweise(dbHE, neu, u'dbHE: export_abflussparameter (2)'):
+            del dbQK
+            return False
 
         dbHE.sql(u"UPDATE ITWH$PROGINFO SET NEXTID = {:d}".format(nextid))
         dbHE.commit()
+        schreibe_checkpoint(database_HE, checkpoint, u'abflussparameter', nextid, abgeschlossen=True)
 
         fortschritt(u'{} Abflussparameter eingefuegt'.format(nextid - nr0), 0.65)
     progress_bar.setValue(85)
@@ -1008,7 +1333,7 @@ def exportKanaldaten(iface, database_HE, dbtemplate_HE, dbQK, liste_teilgebiete,
     #
     # Wenn in QKan keine Regenschreiber eingetragen sind, wird als Name "Regenschreiber1" angenommen.
 
-    if check_export['export_regenschreiber'] or check_export['modify_regenschreiber']:
+    if (check_export['export_regenschreiber'] or check_export['modify_regenschreiber']) and offen(u'regenschreiber'):
 
         # # Pruefung, ob Regenschreiber fuer Export vorhanden
         # if len(liste_teilgebiete) != 0:
@@ -1025,68 +1350,51 @@ def exportKanaldaten(iface, database_HE, dbtemplate_HE, dbQK, liste_teilgebiete,
             del dbHE
             return False
 
-        attr = dbQK.fetchall()
-        if attr == [(None,)]:
-            reglis = tuple([u'Regenschreiber1'])
-            logger.debug(u'In QKan war kein Regenschreiber vorhanden. "Regenschreiber1" ergänzt')
-        else:
-            reglis = tuple([str(el[0]) for el in attr])
-            logger.debug(u'In QKan wurden folgende Regenschreiber referenziert: {}'.format(str(reglis)))
-
-        logger.debug(u'Regenschreiber - reglis: {}'.format(str(reglis)))
+        # Flächen ohne Regenschreiber werden mit "Regenschreiber1" exportiert
+        reglis = [u'Regenschreiber1' if el[0] is None else el[0] for el in dbQK.fetchall()]
+        logger.debug(u'In QKan wurden folgende Regenschreiber referenziert: {}'.format(u', '.join(reglis)))
 
         # Liste der fehlenden Regenschreiber in der Ziel- (*.idbf-) Datenbank
-        # Hier muss eine Besonderheit von tuple berücksichtigt werden. Ein Tuple mit einem Element
-        # endet mit ",)", z.B. (1,), während ohne oder bei mehr als einem Element alles wie üblich
-        # ist: () oder (1,2,3,4)
-        if len(reglis) == 1:
-            sql = u"""SELECT NAME FROM REGENSCHREIBER WHERE NAME NOT IN {})""".format(str(reglis)[:-2])
-        else:
-            sql = u"""SELECT NAME FROM REGENSCHREIBER WHERE NAME NOT IN {}""".format(str(reglis))
-
-        if not dbHE.sql(sql, u'dbHE: export_regenschreiber (1)'):
+        fehlend = fehlende_namen(dbHE, u'REGENSCHREIBER', reglis, u'dbHE: export_regenschreiber (1)')
+        if fehlend is None:
             del dbQK
             return False
 
-        attr = dbHE.fetchall()
-        logger.debug(u'Regenschreiber - attr: {}'.format(str(attr)))
-
         nr0 = nextid
 
         createdat = time.strftime(u'%d.%m.%Y %H:%M:%S', time.localtime())
 
-        regschnr = 1
-        for regenschreiber in reglis:
-            if regenschreiber not in attr:
-                sql = u"""
-                  INSERT INTO REGENSCHREIBER
-                  ( NUMMER, STATION,
-                    XKOORDINATE, YKOORDINATE, ZKOORDINATE, NAME,
-                    FLAECHEGESAMT, FLAECHEDURCHLAESSIG, FLAECHEUNDURCHLAESSIG,
-                    ANZAHLHALTUNGEN, INTERNENUMMER,
-                    LASTMODIFIED, KOMMENTAR, ID) SELECT
-                      {nummer}, '{station}',
-                      {xkoordinate}, {ykoordinate}, {zkoordinate}, '{name}',
-                      {flaechegesamt}, {flaechedurchlaessig}, {flaecheundurchlaessig},
-                      {anzahlhaltungen}, {internenummer},
-                      '{lastmodified}', '{kommentar}', {id}
-                    FROM RDB$DATABASE
-                    WHERE '{name}' NOT IN (SELECT NAME FROM REGENSCHREIBER);
-                  """.format(nummer=regschnr, station=10000 + regschnr,
-                             xkoordinate=0, ykoordinate=0, zkoordinate=0, name=regenschreiber,
-                             flaechegesamt=0, flaechedurchlaessig=0, flaecheundurchlaessig=0,
-                             anzahlhaltungen=0, internenummer=0,
-                             lastmodified=createdat, kommentar=u'Ergänzt durch QKan', id=nextid)
-
-                if not dbHE.sql(sql, u'dbHE: export_regenschreiber (2)'):
-                    del dbQK
-                    return False
+        neu = []
+        for regschnr, regenschreiber in enumerate(fehlend, 1):
+            neu.append(u"""
+              INSERT INTO REGENSCHREIBER
+              ( NUMMER, STATION,
+                XKOORDINATE, YKOORDINATE, ZKOORDINATE, NAME,
+                FLAECHEGESAMT, FLAECHEDURCHLAESSIG, FLAECHEUNDURCHLAESSIG,
+                ANZAHLHALTUNGEN, INTERNENUMMER,
+                LASTMODIFIED, KOMMENTAR, ID) VALUES (
+                  {nummer}, '{station}',
+                  {xkoordinate}, {ykoordinate}, {zkoordinate}, '{name}',
+                  {flaechegesamt}, {flaechedurchlaessig}, {flaecheundurchlaessig},
+                  {anzahlhaltungen}, {internenummer},
+                  '{lastmodified}', '{kommentar}', {id})
+              """.format(nummer=regschnr, station=10000 + regschnr,
+                         xkoordinate=0, ykoordinate=0, zkoordinate=0, name=regenschreiber,
+                         flaechegesamt=0, flaechedurchlaessig=0, flaecheundurchlaessig=0,
+                         anzahlhaltungen=0, internenummer=0,
+                         lastmodified=createdat, kommentar=u'Ergänzt durch QKan', id=nextid))
+            nextid += 1
+
+        if not einfuegen_paketweise(dbHE, neu, u'dbHE: export_regenschreiber (2)'):
+            del dbQK
+            return False
 
-                logger.debug(u'In HE folgenden Regenschreiber ergänzt: {}'.format(sql))
+        if len(fehlend) > 0:
+            logger.debug(u'In HE folgende Regenschreiber ergänzt: {}'.format(u', '.join(fehlend)))
 
-                nextid += 1
         dbHE.sql(u"UPDATE ITWH$PROGINFO SET NEXTID = {:d}".format(nextid))
         dbHE.commit()
+        schreibe_checkpoint(database_HE, checkpoint, u'regenschreiber', nextid, abgeschlossen=True)
 
         fortschritt(u'{} Regenschreiber eingefuegt'.format(nextid - nr0), 0.68)
     progress_bar.setValue(90)
@@ -1094,7 +1402,7 @@ def exportKanaldaten(iface, database_HE, dbtemplate_HE, dbQK, liste_teilgebiete,
     # ------------------------------------------------------------------------------------------------
     # Export der Flächen
 
-    if check_export['export_flaechenrw'] or check_export['modify_flaechenrw']:
+    if (check_export['export_flaechenrw'] or check_export['modify_flaechenrw']) and offen(u'flaechenrw'):
         """
         Export der Flaechendaten
 
@@ -1134,82 +1442,19 @@ def exportKanaldaten(iface, database_HE, dbtemplate_HE, dbQK, liste_teilgebiete,
         # Nur Daten fuer ausgewaehlte Teilgebiete
         if len(liste_teilgebiete) != 0:
             auswahl_c = u" AND ha.teilgebiet in ('{}')".format(u"', '".join(liste_teilgebiete))
-            auswahl_a = u" WHERE ha.teilgebiet in ('{}')".format(u"', '".join(liste_teilgebiete))
         else:
             auswahl_c = u""
-            auswahl_a = u""
-
-        # Verschneidung nur, wenn (mit_verschneidung)
-        if mit_verschneidung:
-            case_verschneidung = "fl.aufteilen IS NULL or fl.aufteilen <> 'ja'"
-            join_verschneidung = """
-                LEFT JOIN tezg AS tg
-                ON lf.tezgnam = tg.flnam"""
-        else:
-            case_verschneidung = "1"
-            join_verschneidung = ""
-
-        if check_export['combine_flaechenrw']:
-            sql = u"""
-              WITH flintersect AS (
-                SELECT lf.flnam AS flnam, lf.pk AS pl, lf.haltnam AS haltnam, fl.neigkl AS neigkl, lf.abflusstyp AS abflusstyp, 
-                  lf.speicherzahl AS speicherzahl, lf.speicherkonst AS speicherkonst,
-                  lf.fliesszeitflaeche AS fliesszeitflaeche, lf.fliesszeitkanal AS fliesszeitkanal,
-                  fl.regenschreiber AS regenschreiber,
-                  fl.abflussparameter AS abflussparameter, fl.createdat AS createdat,
-                  fl.kommentar AS kommentar, 
-                  CASE WHEN {case_verschneidung} THEN fl.geom 
-                  ELSE CastToMultiPolygon(CollectionExtract(intersection(fl.geom,tg.geom),3)) END AS geom
-                FROM linkfl AS lf
-                INNER JOIN flaechen AS fl
-                ON lf.flnam = fl.flnam{join_verschneidung})
-              SELECT substr(printf('%s-%d', fi.flnam, fi.pl),1,30) AS flnam, 
-                ha.haltnam AS haltnam, fi.neigkl AS neigkl,
-                fi.abflusstyp AS abflusstyp, fi.speicherzahl AS speicherzahl, avg(fi.speicherkonst) AS speicherkonst,
-                max(fi.fliesszeitflaeche) AS fliesszeitflaeche, max(fi.fliesszeitkanal) AS fliesszeitkanal,
-                sum(area(fi.geom)/10000) AS flaeche, fi.regenschreiber AS regenschreiber,
-                abflussparameter AS abflussparameter, max(fi.createdat) AS createdat,
-                max(fi.kommentar) AS kommentar
-              FROM flintersect AS fi
-              INNER JOIN haltungen AS ha
-              ON fi.haltnam = ha.haltnam
-              WHERE area(fi.geom) > {mindestflaeche}{auswahl_c}
-              GROUP BY ha.haltnam, fi.abflussparameter, fi.regenschreiber, fi.speicherzahl, 
-                fi.abflusstyp, fi.neigkl""".format(mindestflaeche=mindestflaeche, auswahl_c=auswahl_c, 
-                                                    case_verschneidung=case_verschneidung, 
-                                                    join_verschneidung=join_verschneidung)
-            logger.debug(u'combine_flaechenrw = True')
-            logger.debug(u'Abfrage zum Export der Flächendaten: \n{}'.format(sql))
-        else:
-            sql = u"""
-              WITH flintersect AS (
-                SELECT substr(printf('%s-%d', fl.flnam, lf.pk),1,30) AS flnam, 
-                  ha.haltnam AS haltnam, fl.neigkl AS neigkl,
-                  lf.abflusstyp AS abflusstyp, lf.speicherzahl AS speicherzahl, lf.speicherkonst AS speicherkonst,
-                  lf.fliesszeitflaeche AS fliesszeitflaeche, lf.fliesszeitkanal AS fliesszeitkanal,
-                  CASE WHEN {case_verschneidung} THEN area(fl.geom)/10000 
-                  ELSE area(CastToMultiPolygon(CollectionExtract(intersection(fl.geom,tg.geom),3)))/10000 END AS flaeche, 
-                  fl.regenschreiber AS regenschreiber,
-                  fl.abflussparameter AS abflussparameter, fl.createdat AS createdat,
-                  fl.kommentar AS kommentar
-                FROM linkfl AS lf
-                INNER JOIN flaechen AS fl
-                ON lf.flnam = fl.flnam
-                INNER JOIN haltungen AS ha
-                ON lf.haltnam = ha.haltnam{join_verschneidung}{auswahl_a})
-              SELECT flnam, haltnam, neigkl, abflusstyp, speicherzahl, speicherkonst, 
-              fliesszeitflaeche, fliesszeitkanal, flaeche, regenschreiber, abflussparameter,
-              createdat, kommentar
-              FROM flintersect AS fi
-              WHERE flaeche*10000 > {mindestflaeche}""".format(mindestflaeche=mindestflaeche, auswahl_a=auswahl_a, 
-                                                    case_verschneidung=case_verschneidung, 
-                                                    join_verschneidung=join_verschneidung)
-            logger.debug(u'combine_flaechenrw = False')
-            logger.debug(u'Abfrage zum Export der Flächendaten: \n{}'.format(sql))
 
-        if not dbQK.sql(sql, u'dbQK: k_qkhe.export_flaechenrw (4)'):
+        # Im Paketmodus werden die Flächen jeweils für ein Paket von paketgroesse_flaechen Haltungen
+        # (nach Namen sortiert) abgefragt und exportiert, so dass nie das gesamte Ergebnis der
+        # Verschneidung im Speicher liegt. Da die Zusammenfassung (combine_flaechenrw) je Haltung
+        # erfolgt, ergeben sich dieselben Flächen wie beim Export in einem Stück.
+        pakete = flaechen_pakete(dbQK, auswahl_c, paketgroesse_flaechen, u'dbQK: k_qkhe.export_flaechenrw')
+        if pakete is None:
             del dbHE
             return False
+        if paketgroesse_flaechen > 0:
+            logger.debug(u'Export der Flächen in {} Paketen'.format(len(pakete)))
 
         fortschritt(u'Export befestigte Flaechen...', 0.70)
 
@@ -1217,145 +1462,206 @@ def exportKanaldaten(iface, database_HE, dbtemplate_HE, dbQK, liste_teilgebiete,
 
         fehler_abflusstyp = False               # Um wiederholte Fehlermeldung zu unterdrücken...
 
-        for attr in dbQK.fetchall():
+        # Beim Fortsetzen werden die bereits committeten Flächen übersprungen. Dazu ist die
+        # Abfrage nach flnam sortiert. Im Paketmodus ist der Schlüssel die obere Grenze des
+        # zuletzt abgeschlossenen Pakets.
+        resume_flnam = None
+        resume_paket = None
+        if checkpoint[u'abschnitt'] == u'flaechenrw':
+            art, wert, paketgroesse = lese_flaechen_schluessel(checkpoint)
+            if art == u'paket':
+                resume_paket = wert
+            else:
+                resume_flnam = wert
+        anz_batch = 0
+        neu = []                                # Gesammelte INSERT-Anweisungen
 
-            # In allen Feldern None durch NULL ersetzen
-            (flnam, haltnam, neigkl,
-             abflusstyp, speicherzahl, speicherkonst,
-             fliesszeitflaeche, fliesszeitkanal,
-             flaeche, regenschreiber,
-             abflussparameter, createdat_t,
-             kommentar) = \
-                (u'NULL' if el is None else el for el in attr)
+        for von, bis in pakete:
 
-            # Datenkorrekturen
-            if regenschreiber == u'NULL':
-                regenschreiber = u'Regenschreiber1'
+            if resume_paket is not None and bis is not None and bis <= resume_paket:
+                continue
 
-            if abflusstyp in he_fltyp_ref:
-                he_typ = he_fltyp_ref[abflusstyp]
-            elif abflusstyp == u'NULL':
-                he_typ = 0  # Flächentyp 'Direkt'
-            else:
-                if not fehler_abflusstyp:
-                    meldung(u'Datenfehler in Tabelle "flaechen", Feld "abflusstyp"', u'Wert: {}'.format(abflusstyp))
-                    he_typ = 0  # Flächentyp 'Direkt'
-                    fehler_abflusstyp = True
+            sql = sql_flaechenrw(check_export['combine_flaechenrw'], mit_verschneidung, mindestflaeche,
+                                 auswahl_c, sql_auswahl_paket(von, bis))
+            logger.debug(u'combine_flaechenrw = {}'.format(check_export['combine_flaechenrw']))
+            logger.debug(u'Abfrage zum Export der Flächendaten: \n{}'.format(sql))
 
-            if flaeche != u'NULL':
-                flaeche = '{0:.4f}'.format(flaeche)
+            if not dbQK.sql(sql, u'dbQK: k_qkhe.export_flaechenrw (4)'):
+                del dbHE
+                return False
 
-            if neigkl != u'NULL':
-                neigkl = '{0:.0f}'.format(neigkl)
-            else:
-                neigkl = 0
+            for attr in dbQK.fetchall():
 
-            if speicherzahl != u'NULL':
-                speicherzahl = '{0:.0f}'.format(speicherzahl)
-            else:
-                speicherzahl = '0'
+                # In allen Feldern None durch NULL ersetzen
+                (flnam, haltnam, neigkl,
+                 abflusstyp, speicherzahl, speicherkonst,
+                 fliesszeitflaeche, fliesszeitkanal,
+                 flaeche, regenschreiber,
+                 abflussparameter, createdat_t,
+                 kommentar) = \
+                    (u'NULL' if el is None else el for el in attr)
+
+                if resume_flnam is not None and flnam <= resume_flnam:
+                    continue
+
+                # Datenkorrekturen
+                if regenschreiber == u'NULL':
+                    regenschreiber = u'Regenschreiber1'
+
+                if abflusstyp in he_fltyp_ref:
+                    he_typ = he_fltyp_ref[abflusstyp]
+                elif abflusstyp == u'NULL':
+                    he_typ = 0  # Flächentyp 'Direkt'
+                else:
+                    if not fehler_abflusstyp:
+                        meldung(u'Datenfehler in Tabelle "flaechen", Feld "abflusstyp"', u'Wert: {}'.format(abflusstyp))
+                        he_typ = 0  # Flächentyp 'Direkt'
+                        fehler_abflusstyp = True
 
-            if speicherkonst != u'NULL':
-                speicherkonst = '{0:.3f}'.format(speicherkonst)
-            else:
-                speicherkonst = '0'
+                if flaeche != u'NULL':
+                    flaeche = '{0:.4f}'.format(flaeche)
 
-            if fliesszeitflaeche != u'NULL':
-                fliesszeitflaeche = '{0:.2f}'.format(fliesszeitflaeche)
-            else:
-                fliesszeitflaeche = '0'
+                if neigkl != u'NULL':
+                    neigkl = '{0:.0f}'.format(neigkl)
+                else:
+                    neigkl = 0
 
-            if fliesszeitkanal != u'NULL':
-                fliesszeitkanal = '{0:.2f}'.format(fliesszeitkanal)
-            else:
-                fliesszeitkanal = '0'
+                if speicherzahl != u'NULL':
+                    speicherzahl = '{0:.0f}'.format(speicherzahl)
+                else:
+                    speicherzahl = '0'
 
-            # Feld "fliesszeitflaeche" in QKan entspricht je nach he_typ zwei unterschiedlichen Feldern in HE, s.o.
-            fliesszeitschwerp = 0.
-            fliesszeitoberfl = 0.
-            if he_typ == 1:
-                fliesszeitoberfl = fliesszeitflaeche
-            elif he_typ == 2:
-                fliesszeitschwerp = fliesszeitflaeche
+                if speicherkonst != u'NULL':
+                    speicherkonst = '{0:.3f}'.format(speicherkonst)
+                else:
+                    speicherkonst = '0'
 
-            # Standardwerte, falls keine Vorgaben
-            if createdat_t == u'NULL':
-                createdat = time.strftime(u'%d.%m.%Y %H:%M:%S', time.localtime())
-            else:
-                try:
-                    if createdat_t.count(':') == 1:
-                        createdat_s = time.strptime(createdat_t, '%d.%m.%Y %H:%M')
-                    else:
-                        createdat_s = time.strptime(createdat_t, '%d.%m.%Y %H:%M:%S')
-                except:
-                    createdat_s = time.localtime()
-                createdat = time.strftime(u'%d.%m.%Y %H:%M:%S', createdat_s)
+                if fliesszeitflaeche != u'NULL':
+                    fliesszeitflaeche = '{0:.2f}'.format(fliesszeitflaeche)
+                else:
+                    fliesszeitflaeche = '0'
 
-            if kommentar == u'NULL' or kommentar == u'':
-                kommentar = u'eingefuegt von k_qkhe'
+                if fliesszeitkanal != u'NULL':
+                    fliesszeitkanal = '{0:.2f}'.format(fliesszeitkanal)
+                else:
+                    fliesszeitkanal = '0'
+
+                # Feld "fliesszeitflaeche" in QKan entspricht je nach he_typ zwei unterschiedlichen Feldern in HE, s.o.
+                fliesszeitschwerp = 0.
+                fliesszeitoberfl = 0.
+                if he_typ == 1:
+                    fliesszeitoberfl = fliesszeitflaeche
+                elif he_typ == 2:
+                    fliesszeitschwerp = fliesszeitflaeche
+
+                # Standardwerte, falls keine Vorgaben
+                if createdat_t == u'NULL':
+                    createdat = time.strftime(u'%d.%m.%Y %H:%M:%S', time.localtime())
+                else:
+                    try:
+                        if createdat_t.count(':') == 1:
+                            createdat_s = time.strptime(createdat_t, '%d.%m.%Y %H:%M')
+                        else:
+                            createdat_s = time.strptime(createdat_t, '%d.%m.%Y %H:%M:%S')
+                    except:
+                        createdat_s = time.localtime()
+                    createdat = time.strftime(u'%d.%m.%Y %H:%M:%S', createdat_s)
+
+                if kommentar == u'NULL' or kommentar == u'':
+                    kommentar = u'eingefuegt von k_qkhe'
+
+                # Ändern vorhandener Datensätze (geschickterweise vor dem Einfügen!)
+                if check_export['modify_flaechenrw']:
+                    sql = u"""
+                      UPDATE FLAECHE SET
+                      GROESSE={flaeche}, REGENSCHREIBER='{regenschreiber}', HALTUNG='{haltnam}',
+                      BERECHNUNGSPEICHERKONSTANTE={he_typ}, TYP={fltyp}, ANZAHLSPEICHER={speicherzahl},
+                      SPEICHERKONSTANTE={speicherkonst}, SCHWERPUNKTLAUFZEIT={fliesszeitschwerp},
+                      FLIESSZEITOBERFLAECHE={fliesszeitoberfl}, LAENGSTEFLIESSZEITKANAL={fliesszeitkanal},
+                      PARAMETERSATZ='{abflussparameter}', NEIGUNGSKLASSE={neigkl},
+                      LASTMODIFIED='{createdat}',
+                      KOMMENTAR='{kommentar}', ZUORDNUNABHEZG={zuordnunabhezg}
+                      WHERE NAME = '{flnam}';
+                      """.format(flaeche=flaeche, regenschreiber=regenschreiber, haltnam=haltnam,
+                                 he_typ=he_typ, fltyp=0, speicherzahl=speicherzahl,
+                                 speicherkonst=speicherkonst, fliesszeitschwerp=fliesszeitschwerp,
+                                 fliesszeitoberfl=fliesszeitoberfl, fliesszeitkanal=fliesszeitkanal,
+                                 abflussparameter=abflussparameter, neigkl=neigkl,
+                                 flnam=flnam, createdat=createdat,
+                                 kommentar=kommentar, zuordnunabhezg=0)
+
+                    if not dbHE.sql(sql, u'dbHE: export_flaechenrw (1)'):
+                        del dbQK
+                        return False
 
-            # Ändern vorhandener Datensätze (geschickterweise vor dem Einfügen!)
-            if check_export['modify_flaechenrw']:
-                sql = u"""
-                  UPDATE FLAECHE SET
-                  GROESSE={flaeche}, REGENSCHREIBER='{regenschreiber}', HALTUNG='{haltnam}',
-                  BERECHNUNGSPEICHERKONSTANTE={he_typ}, TYP={fltyp}, ANZAHLSPEICHER={speicherzahl},
-                  SPEICHERKONSTANTE={speicherkonst}, SCHWERPUNKTLAUFZEIT={fliesszeitschwerp},
-                  FLIESSZEITOBERFLAECHE={fliesszeitoberfl}, LAENGSTEFLIESSZEITKANAL={fliesszeitkanal},
-                  PARAMETERSATZ='{abflussparameter}', NEIGUNGSKLASSE={neigkl},
-                  LASTMODIFIED='{createdat}',
-                  KOMMENTAR='{kommentar}', ZUORDNUNABHEZG={zuordnunabhezg}
-                  WHERE NAME = '{flnam}';
-                  """.format(flaeche=flaeche, regenschreiber=regenschreiber, haltnam=haltnam,
-                             he_typ=he_typ, fltyp=0, speicherzahl=speicherzahl,
-                             speicherkonst=speicherkonst, fliesszeitschwerp=fliesszeitschwerp,
-                             fliesszeitoberfl=fliesszeitoberfl, fliesszeitkanal=fliesszeitkanal,
-                             abflussparameter=abflussparameter, neigkl=neigkl,
-                             flnam=flnam, createdat=createdat,
-                             kommentar=kommentar, zuordnunabhezg=0)
-
-                if not dbHE.sql(sql, u'dbHE: export_flaechenrw (1)'):
-                    del dbQK
-                    return False
+                # Einfuegen in die Datenbank (gesammelt)
+                if check_export['export_flaechenrw']:
+                    neu.append(u"""
+                      INSERT INTO FLAECHE
+                      ( GROESSE, REGENSCHREIBER, HALTUNG,
+                        BERECHNUNGSPEICHERKONSTANTE, TYP, ANZAHLSPEICHER,
+                        SPEICHERKONSTANTE, SCHWERPUNKTLAUFZEIT,
+                        FLIESSZEITOBERFLAECHE, LAENGSTEFLIESSZEITKANAL,
+                        PARAMETERSATZ, NEIGUNGSKLASSE,
+                        NAME, LASTMODIFIED,
+                        KOMMENTAR, ID, ZUORDNUNABHEZG)
+                      SELECT
+                        {flaeche}, '{regenschreiber}', '{haltnam}',
+                        {he_typ}, {fltyp}, {speicherzahl},
+                        {speicherkonst}, {fliesszeitschwerp},
+                        {fliesszeitoberfl}, {fliesszeitkanal},
+                        '{abflussparameter}', {neigkl},
+                        '{flnam}', '{createdat}',
+                        '{kommentar}', {nextid}, {zuordnunabhezg}
+                      FROM RDB$DATABASE
+                      WHERE '{flnam}' NOT IN (SELECT NAME FROM FLAECHE)
+                      """.format(flaeche=flaeche, regenschreiber=regenschreiber, haltnam=haltnam,
+                                 he_typ=he_typ, fltyp=0, speicherzahl=speicherzahl,
+                                 speicherkonst=speicherkonst, fliesszeitschwerp=fliesszeitschwerp,
+                                 fliesszeitoberfl=fliesszeitoberfl, fliesszeitkanal=fliesszeitkanal,
+                                 abflussparameter=abflussparameter, neigkl=neigkl,
+                                 flnam=flnam, createdat=createdat,
+                                 kommentar=kommentar, nextid=nextid, zuordnunabhezg=0))
 
-            # Einfuegen in die Datenbank
-            if check_export['export_flaechenrw']:
-                sql = u"""
-                  INSERT INTO FLAECHE
-                  ( GROESSE, REGENSCHREIBER, HALTUNG,
-                    BERECHNUNGSPEICHERKONSTANTE, TYP, ANZAHLSPEICHER,
-                    SPEICHERKONSTANTE, SCHWERPUNKTLAUFZEIT,
-                    FLIESSZEITOBERFLAECHE, LAENGSTEFLIESSZEITKANAL,
-                    PARAMETERSATZ, NEIGUNGSKLASSE,
-                    NAME, LASTMODIFIED,
-                    KOMMENTAR, ID, ZUORDNUNABHEZG)
-                  SELECT
-                    {flaeche}, '{regenschreiber}', '{haltnam}',
-                    {he_typ}, {fltyp}, {speicherzahl},
-                    {speicherkonst}, {fliesszeitschwerp},
-                    {fliesszeitoberfl}, {fliesszeitkanal},
-                    '{abflussparameter}', {neigkl},
-                    '{flnam}', '{createdat}',
-                    '{kommentar}', {nextid}, {zuordnunabhezg}
-                  FROM RDB$DATABASE
-                  WHERE '{flnam}' NOT IN (SELECT NAME FROM FLAECHE);
-                  """.format(flaeche=flaeche, regenschreiber=regenschreiber, haltnam=haltnam,
-                             he_typ=he_typ, fltyp=0, speicherzahl=speicherzahl,
-                             speicherkonst=speicherkonst, fliesszeitschwerp=fliesszeitschwerp,
-                             fliesszeitoberfl=fliesszeitoberfl, fliesszeitkanal=fliesszeitkanal,
-                             abflussparameter=abflussparameter, neigkl=neigkl,
-                             flnam=flnam, createdat=createdat,
-                             kommentar=kommentar, nextid=nextid, zuordnunabhezg=0)
-
-                # logger.debug(u'Abfrage zum Export der Flächendaten in die ITWH-DB: \n{}'.format(sql))
-                if not dbHE.sql(sql, u'dbHE: export_flaechenrw (2)'):
+                    nextid += 1
+
+                    if len(neu) >= 10 * maxanzahl_block:
+                        if not einfuegen_paketweise(dbHE, neu, u'dbHE: export_flaechenrw (2)'):
+                            del dbQK
+                            return False
+                        neu = []
+
+                # Teilpaket committen und Checkpoint schreiben. Im Paketmodus erst am Ende des Pakets.
+                anz_batch += 1
+                if anz_batch >= batchsize_checkpoint and paketgroesse_flaechen <= 0:
+                    if not einfuegen_paketweise(dbHE, neu, u'dbHE: export_flaechenrw (2)'):
+                        del dbQK
+                        return False
+                    neu = []
+                    dbHE.sql(u"UPDATE ITWH$PROGINFO SET NEXTID = {:d}".format(nextid))
+                    dbHE.commit()
+                    schreibe_checkpoint(database_HE, checkpoint, u'flaechenrw', nextid,
+                                        schluessel=flaechen_schluessel(paketgroesse_flaechen, flnam))
+                    anz_batch = 0
+
+            # Paket abschließen
+            if paketgroesse_flaechen > 0 and bis is not None:
+                if not einfuegen_paketweise(dbHE, neu, u'dbHE: export_flaechenrw (2)'):
                     del dbQK
                     return False
+                neu = []
+                dbHE.sql(u"UPDATE ITWH$PROGINFO SET NEXTID = {:d}".format(nextid))
+                dbHE.commit()
+                schreibe_checkpoint(database_HE, checkpoint, u'flaechenrw', nextid,
+                                    schluessel=flaechen_schluessel(paketgroesse_flaechen, bis))
 
-                nextid += 1
+        if not einfuegen_paketweise(dbHE, neu, u'dbHE: export_flaechenrw (2)'):
+            del dbQK
+            return False
 
         dbHE.sql(u"UPDATE ITWH$PROGINFO SET NEXTID = {:d}".format(nextid))
         dbHE.commit()
+        schreibe_checkpoint(database_HE, checkpoint, u'flaechenrw', nextid, abgeschlossen=True)
 
         fortschritt(u'{} Flaechen eingefuegt'.format(nextid - nr0), 0.80)
     progress_bar.setValue(90)
@@ -1363,7 +1669,7 @@ def exportKanaldaten(iface, database_HE, dbtemplate_HE, dbQK, liste_teilgebiete,
     # ------------------------------------------------------------------------------------------------
     # Export der Direkteinleitungen
 
-    if check_export['export_einleitdirekt'] or check_export['modify_einleitdirekt']:
+    if (check_export['export_einleitdirekt'] or check_export['modify_einleitdirekt']) and offen(u'einleitdirekt'):
         # Herkunft = 1 (Direkt) und 3 (Einwohnerbezogen)
 
         """
@@ -1606,78 +1912,7 @@ def exportKanaldaten(iface, database_HE, dbtemplate_HE, dbQK, liste_teilgebiete,
         else:
             auswahl = u""
 
-        if check_export['combine_einleitdirekt']:
-            sql = u"""SELECT
-              elnam,
-              avg(x(geom)) AS xel,
-              avg(y(geom)) AS yel,
-              haltnam AS haltnam,
-              NULL AS wverbrauch, 
-              NULL AS stdmittel,
-              NULL AS fremdwas, 
-              NULL AS einwohner,
-              sum(zufluss) AS zuflussdirekt, 
-              1 AS herkunft,
-              einleit.createdat AS createdat
-              FROM einleit
-              WHERE zufluss IS NOT NULL {auswahl}
-              GROUP BY haltnam
-          UNION
-              SELECT
-              el.elnam AS elnam,
-              avg(x(el.geom)) AS xel,
-              avg(y(el.geom)) AS yel,
-              el.haltnam AS haltnam,
-              printf('%.6f',tg.wverbrauch) AS wverbrauch, 
-              printf('%.1f',tg.stdmittel) AS stdmittel,
-              printf('%.3f',tg.fremdwas) AS fremdwas, 
-              printf('%.6f',el.ew) AS einwohner,
-              NULL AS zuflussdirekt, 
-              3 AS herkunft,
-              el.createdat AS createdat
-              FROM einleit AS el
-              INNER JOIN einzugsgebiete AS tg
-              ON el.einzugsgebiet = tg.tgnam
-              WHERE zufluss IS NULL {auswahl}
-              GROUP BY el.haltnam, 
-                printf('%.6f',tg.wverbrauch), 
-                printf('%.1f',tg.stdmittel),
-                printf('%.3f',tg.fremdwas),
-                printf('%.6f',el.ew)
-            """.format(auswahl=auswahl)
-        else:
-            sql = u"""SELECT
-              elnam,
-              x(geom) AS xel,
-              y(geom) AS yel,
-              haltnam AS haltnam,
-              NULL AS wverbrauch, 
-              NULL AS stdmittel,
-              NULL AS fremdwas, 
-              NULL AS einwohner,
-              zufluss AS zuflussdirekt, 
-              1 AS herkunft,
-              einleit.createdat AS createdat
-              FROM einleit
-              WHERE zufluss IS NOT NULL {auswahl}
-          UNION
-              SELECT
-              el.elnam AS elnam,
-              x(el.geom) AS xel,
-              y(el.geom) AS yel,
-              el.haltnam AS haltnam,
-              tg.wverbrauch AS wverbrauch, 
-              tg.stdmittel AS stdmittel,
-              tg.fremdwas AS fremdwas, 
-              el.ew AS einwohner,
-              NULL AS zuflussdirekt, 
-              3 AS herkunft,
-              el.createdat AS createdat
-              FROM einleit AS el
-              INNER JOIN einzugsgebiete AS tg
-              ON el.einzugsgebiet = tg.tgnam 
-              WHERE zufluss IS NULL {auswahl}
-            """.format(auswahl=auswahl)
+        sql = sql_einleitdirekt(check_export['combine_einleitdirekt'], auswahl)
 
         logger.debug(u'\nSQL-4e:\n{}\n'.format(sql))
 
@@ -1780,6 +2015,7 @@ def exportKanaldaten(iface, database_HE, dbtemplate_HE, dbQK, liste_teilgebiete,
 
         dbHE.sql(u"UPDATE ITWH$PROGINFO SET NEXTID = {:d}".format(nextid))
         dbHE.commit()
+        schreibe_checkpoint(database_HE, checkpoint, u'einleitdirekt', nextid, abgeschlossen=True)
 
         fortschritt(u'{} Einzeleinleiter (direkt) eingefuegt'.format(nextid - nr0), 0.95)
 
@@ -1788,7 +2024,7 @@ def exportKanaldaten(iface, database_HE, dbtemplate_HE, dbQK, liste_teilgebiete,
     # ------------------------------------------------------------------------------------------------
     # Export der Aussengebiete
 
-    if check_export['export_aussengebiete'] or check_export['modify_aussengebiete']:
+    if (check_export['export_aussengebiete'] or check_export['modify_aussengebiete']) and offen(u'aussengebiete'):
 
         # Aktualisierung der Anbindungen, insbesondere wird der richtige Schacht in die 
         # Tabelle "aussengebiete" eingetragen.
@@ -1925,6 +2161,7 @@ def exportKanaldaten(iface, database_HE, dbtemplate_HE, dbQK, liste_teilgebiete,
 
         dbHE.sql(u"UPDATE ITWH$PROGINFO SET NEXTID = {:d}".format(nextid))
         dbHE.commit()
+        schreibe_checkpoint(database_HE, checkpoint, u'aussengebiete', nextid, abgeschlossen=True)
 
         fortschritt(u'{} Aussengebiete eingefuegt'.format(nextid - nr0), 0.98)
 
@@ -2004,7 +2241,7 @@ def exportKanaldaten(iface, database_HE, dbtemplate_HE, dbQK, liste_teilgebiete,
     # --------------------------------------------------------------------------------------------
     # Export der Aussengebiete
 
-    if check_export['export_aussengebiete'] or check_export['modify_aussengebiete']:
+    if (check_export['export_aussengebiete'] or check_export['modify_aussengebiete']) and offen(u'auslaesse_2'):
 
         # Nur Daten fuer ausgewaehlte Teilgebiete
         if len(liste_teilgebiete) != 0:
@@ -2111,15 +2348,23 @@ def exportKanaldaten(iface, database_HE, dbtemplate_HE, dbQK, liste_teilgebiete,
 
         dbHE.sql(u"UPDATE ITWH$PROGINFO SET NEXTID = {:d}".format(nextid))
         dbHE.commit()
+        schreibe_checkpoint(database_HE, checkpoint, u'auslaesse_2', nextid, abgeschlossen=True)
 
 
     # Zum Schluss: Schließen der Datenbankverbindungen
 
+    if skriptdatei is not None:
+        dbHE.abschliessen()
+
     del dbQK
     del dbHE
 
+    # Export vollständig, ein Fortsetzen ist nicht mehr nötig
+    loesche_checkpoint(database_HE)
+
     fortschritt(u'Ende...', 1)
     progress_bar.setValue(100)
     status_message.setText(u"Datenexport abgeschlossen.")
     status_message.setLevel(QgsMessageBar.SUCCESS)
 
+    return True
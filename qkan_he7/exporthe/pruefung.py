@@ -0,0 +1,323 @@
+# -*- coding: utf-8 -*-
+
+"""
+  Prüfung des Exports nach HYSTEM-EXTRAN
+  ======================================
+
+  Vergleich der exportierten Objekte zwischen QKan- und HE-Datenbank nach dem Export. Je
+  Objektart werden Anzahl und Summe eines Kennwerts (z.B. Sohlhöhe, Länge) per GROUP BY in
+  beiden Datenbanken ermittelt (QKan je Teilgebiet, HE je Tabelle) und verglichen. Nur bei
+  Abweichungen werden die Namen gelesen. Gemeldet werden fehlende, doppelte und abweichende
+  Objekte. Doppelte Namen werden beim Export stillschweigend
+  übersprungen (NOT IN-Bedingung) und fallen erst hier auf.
+
+  Die QKan-Daten einer Objektart werden einmal in eine temporäre Tabelle geschrieben, auf
+  der alle Vergleiche laufen. Die Flächen werden dabei wie beim Export paketweise abgefragt.
+
+  | Dateiname            : pruefung.py
+  | Date                 : Oktober 2018
+  | Copyright            : (C) 2018 by Joerg Hoettges
+  | Email                : hoettges@fh-aachen.de
+  | git sha              : $Format:%H$
+
+  This program is free software; you can redistribute it and/or modify
+  it under the terms of the GNU General Public License as published by
+  the Free Software Foundation; either version 2 of the License, or
+  (at your option) any later version.
+
+"""
+
+import codecs
+import logging
+import os
+import time
+
+from qkan.database.fbfunc import FBConnection
+from qkan.database.qkan_utils import fortschritt, fehlermeldung, meldung
+
+from k_qkhe import flaechen_pakete, sql_auswahl_paket, sql_einleitdirekt, sql_flaechenrw
+
+logger = logging.getLogger('QKan')
+
+# Zulässige Abweichung der Kennwerte je Objekt (Export mit 2 bis 4 Nachkommastellen)
+toleranz = 0.01
+
+# Anzahl der im Bericht je Objektart und Fehlerart aufgeführten Namen
+maxanzahl_bericht = 50
+
+# Temporäre Tabelle mit den QKan-Daten der gerade geprüften Objektart
+tabelle_qkan = u'temp.pruefung_qkan'
+
+# Prüfobjekte: (Schalter in check_export, Bezeichnung, Abfrage QKan mit den Spalten name, teilgebiet
+#               und kennwert, HE-Tabelle, HE-Feld mit Kennwert). Die Abfragen der Flächen und
+#               Direkteinleiter werden aus dem Export übernommen (Platzhalter {flaechenrw} und
+#               {einleitdirekt}), damit dieselben (gekürzten) Namen entstehen. Pumpen und Wehre
+#               werden von exportKanaldaten nicht geschrieben und daher auch nicht geprüft.
+pruefobjekte = [
+    (u'schaechte', u'Schächte',
+     u"""SELECT schnam AS name, teilgebiet, sohlhoehe AS kennwert FROM schaechte
+         WHERE schachttyp = 'Schacht'{auswahl}""",
+     u'SCHACHT', u'SOHLHOEHE'),
+    (u'speicher', u'Speicher',
+     u"""SELECT schnam AS name, teilgebiet, sohlhoehe AS kennwert FROM schaechte
+         WHERE schachttyp = 'Speicher'{auswahl}""",
+     u'SPEICHERSCHACHT', u'SOHLHOEHE'),
+    (u'auslaesse', u'Auslässe',
+     u"""SELECT schnam AS name, teilgebiet, sohlhoehe AS kennwert FROM schaechte
+         WHERE schachttyp = 'Auslass'{auswahl}""",
+     u'AUSLASS', u'SOHLHOEHE'),
+    (u'haltungen', u'Haltungen',
+     u"""SELECT ha.haltnam AS name, ha.teilgebiet AS teilgebiet,
+           coalesce(ha.laenge, glength(ha.geom)) AS kennwert
+         FROM haltungen AS ha
+         LEFT JOIN simulationsstatus AS st ON ha.simstatus = st.bezeichnung
+         WHERE (st.he_nr IN ('0', '1', '2') OR st.he_nr IS NULL){auswahl}""",
+     u'ROHR', u'LAENGE'),
+    (u'flaechenrw', u'Flächen',
+     u"""SELECT fr.flnam AS name, ha.teilgebiet AS teilgebiet, fr.flaeche AS kennwert
+         FROM ({flaechenrw}) AS fr
+         INNER JOIN haltungen AS ha ON fr.haltnam = ha.haltnam""",
+     u'FLAECHE', u'GROESSE'),
+    (u'einleitdirekt', u'Direkteinleiter',
+     u"""SELECT substr(ed.elnam, 1, 27) AS name, el.teilgebiet AS teilgebiet,
+           coalesce(ed.zuflussdirekt, ed.einwohner) AS kennwert
+         FROM ({einleitdirekt}) AS ed
+         LEFT JOIN (SELECT elnam, max(teilgebiet) AS teilgebiet FROM einleit GROUP BY elnam) AS el
+         ON ed.elnam = el.elnam""",
+     u'EINZELEINLEITER', u'COALESCE(ZUFLUSSDIREKT, EINWOHNER)'),
+    (u'aussengebiete', u'Außengebiete',
+     u"""SELECT gebnam AS name, teilgebiet, area(geom)/10000 AS kennwert FROM aussengebiete
+         WHERE gebnam IS NOT NULL{auswahl}""",
+     u'AUSSENGEBIET', u'GESAMTFLAECHE'),
+    (u'regenschreiber', u'Regenschreiber',
+     u"""SELECT coalesce(regenschreiber, 'Regenschreiber1') AS name, NULL AS teilgebiet, 0 AS kennwert
+         FROM flaechen GROUP BY coalesce(regenschreiber, 'Regenschreiber1')""",
+     u'REGENSCHREIBER', u'0'),
+    (u'bodenklassen', u'Bodenklassen',
+     u"""SELECT bknam AS name, NULL AS teilgebiet, infiltrationsrateanfang AS kennwert FROM bodenklassen
+         WHERE bknam IS NOT NULL""",
+     u'BODENKLASSE', u'INFILTRATIONSRATEANFANG'),
+    (u'abflussparameter', u'Abflussparameter',
+     u"""SELECT apnam AS name, NULL AS teilgebiet, anfangsabflussbeiwert AS kennwert FROM abflussparameter""",
+     u'ABFLUSSPARAMETER', u'ABFLUSSBEIWERTANFANG'),
+]
+
+
+def _text(wert):
+    '''Zeichenketten aus der Firebird-Datenbank in unicode umwandeln'''
+    if isinstance(wert, bytes):
+        return wert.decode('iso-8859-1')
+    return wert
+
+
+def _abweichend(wert_qk, wert_he, anzahl=1):
+    if wert_qk is None or wert_he is None:
+        return (wert_qk is None) != (wert_he is None)
+    return abs(float(wert_qk) - float(wert_he)) > toleranz * max(anzahl, 1)
+
+
+def vergleiche(dbQK, dbHE, tabelle, feld, repref):
+    '''Vergleicht eine Objektart zwischen QKan- und HE-Datenbank. Die QKan-Daten stehen in der
+    temporären Tabelle tabelle_qkan.
+
+    Anzahl und Summe des Kennwerts werden in beiden Datenbanken per GROUP BY ermittelt, in QKan
+    je Teilgebiet, in HE je Tabelle (HE kennt keine Teilgebiete). Doppelte Namen werden ebenfalls
+    per GROUP BY ... HAVING abgefragt. Nur wenn Anzahl oder Summe nicht übereinstimmen, werden die
+    Namen gelesen, um die fehlenden und abweichenden Objekte zu benennen.
+
+    :returns:               Ergebnis mit den Schlüsseln 'fehlend', 'doppelt_qkan', 'doppelt_he',
+                            'geaendert' (Namenslisten), 'nur_he' (Anzahl), 'teilgebiete' ({teilgebiet:
+                            [Anzahl, Summe]}) sowie 'qkan' und 'he' ([Anzahl, Summe] gesamt), oder None
+                            im Fehlerfall
+    :rtype:                 dict
+    '''
+    ergebnis = {u'fehlend': [], u'doppelt_qkan': [], u'doppelt_he': [], u'geaendert': [], u'nur_he': 0,
+                u'teilgebiete': {}}
+
+    # Anzahl und Summe je Teilgebiet in QKan
+    sql = u"""SELECT teilgebiet, count(*), count(DISTINCT name), sum(kennwert)
+              FROM {tabelle_qkan} GROUP BY teilgebiet""".format(tabelle_qkan=tabelle_qkan)
+    if not dbQK.sql(sql, u'dbQK: {} (1)'.format(repref)):
+        return None
+    anz_qk = anz_eindeutig_qk = 0
+    sum_qk = 0.
+    for teilgebiet, anzahl, anz_eindeutig, summe in dbQK.fetchall():
+        ergebnis[u'teilgebiete'][teilgebiet] = [anzahl, float(summe or 0)]
+        anz_qk += anzahl
+        anz_eindeutig_qk += anz_eindeutig
+        sum_qk += float(summe or 0)
+
+    # Anzahl und Summe der gesamten HE-Tabelle
+    sql = u'SELECT count(*), count(DISTINCT NAME), sum({feld}) FROM {tabelle}'.format(feld=feld, tabelle=tabelle)
+    if not dbHE.sql(sql, u'dbHE: {} (1)'.format(repref)):
+        return None
+    anz_he, anz_eindeutig_he, sum_he = dbHE.fetchone()
+    sum_he = float(sum_he or 0)
+    ergebnis[u'qkan'] = [anz_qk, sum_qk]
+    ergebnis[u'he'] = [anz_he, sum_he]
+
+    # Doppelte Namen
+    if anz_eindeutig_qk < anz_qk:
+        sql = u"""SELECT name FROM {tabelle_qkan} GROUP BY name HAVING count(*) > 1
+                  ORDER BY name""".format(tabelle_qkan=tabelle_qkan)
+        if not dbQK.sql(sql, u'dbQK: {} (2)'.format(repref)):
+            return None
+        ergebnis[u'doppelt_qkan'] = [u'NULL' if el[0] is None else el[0] for el in dbQK.fetchall()]
+    if anz_eindeutig_he < anz_he:
+        sql = u'SELECT NAME FROM {tabelle} GROUP BY NAME HAVING count(*) > 1 ORDER BY NAME'.format(tabelle=tabelle)
+        if not dbHE.sql(sql, u'dbHE: {} (2)'.format(repref)):
+            return None
+        ergebnis[u'doppelt_he'] = [_text(el[0]) for el in dbHE.fetchall()]
+
+    # Stimmen Anzahl und Summe überein, ist jedes Objekt genau einmal und unverändert in HE vorhanden
+    if anz_eindeutig_he == anz_eindeutig_qk and not _abweichend(sum_qk, sum_he, anz_eindeutig_qk):
+        return ergebnis
+
+    # Sonst: Namen lesen, um fehlende und abweichende Objekte zu benennen
+    if not dbHE.sql(u'SELECT NAME, {feld} FROM {tabelle}'.format(feld=feld, tabelle=tabelle),
+                    u'dbHE: {} (3)'.format(repref)):
+        return None
+    daten_he = dict((_text(name), wert) for name, wert in dbHE.fetchall())
+
+    sql = u"""SELECT name, min(kennwert) FROM {tabelle_qkan} GROUP BY name
+              ORDER BY name""".format(tabelle_qkan=tabelle_qkan)
+    if not dbQK.sql(sql, u'dbQK: {} (3)'.format(repref)):
+        return None
+    gefunden = 0
+    for name, wert in dbQK.fetchall():
+        if name not in daten_he:
+            ergebnis[u'fehlend'].append(u'NULL' if name is None else name)
+            continue
+        gefunden += 1
+        if _abweichend(wert, daten_he[name]):
+            ergebnis[u'geaendert'].append(name)
+
+    ergebnis[u'nur_he'] = len(daten_he) - gefunden
+    return ergebnis
+
+
+def pruefe_export(dbQK, database_HE, liste_teilgebiete, check_export, mindestflaeche=0.5,
+                  mit_verschneidung=True, paketgroesse_flaechen=0):
+    '''Prüft den Export durch Vergleich der QKan- mit der HE-Datenbank und schreibt einen Bericht.
+
+    :dbQK:                  Datenbankobjekt, das die Verknüpfung zur QKan-SpatiaLite-Datenbank verwaltet.
+    :type dbQK:             DBConnection
+
+    :database_HE:           Pfad zur HE-Firebird-Datenbank
+    :type database_HE:      string
+
+    :liste_teilgebiete:     Liste der ausgewählten Teilgebiete
+    :type liste_teilgebiete: list
+
+    :check_export:          Liste von Export-Optionen
+    :type check_export:     Dictionary
+
+    :mindestflaeche:        Kleinere Flächen wurden nicht exportiert
+    :type mindestflaeche:   float
+
+    :mit_verschneidung:     Flächen wurden mit Haltungsflächen verschnitten
+    :type mit_verschneidung: Boolean
+
+    :paketgroesse_flaechen: Paketgröße des Flächenexports, 0 ohne Paketmodus
+    :type paketgroesse_flaechen: int
+
+    :returns:               Anzahl der festgestellten Fehler oder None, falls die Prüfung nicht möglich war
+    :rtype:                 int
+    '''
+
+    dbHE = FBConnection(database_HE)
+    if dbHE is None:
+        fehlermeldung(u"Fehler in QKan_Export",
+                      u'ITWH-Datenbank {:s} wurde nicht gefunden!\nAbbruch!'.format(database_HE))
+        return None
+
+    if len(liste_teilgebiete) != 0:
+        auswahl = u" AND teilgebiet in ('{}')".format(u"', '".join(liste_teilgebiete))
+        auswahl_c = u" AND ha.teilgebiet in ('{}')".format(u"', '".join(liste_teilgebiete))
+    else:
+        auswahl = u""
+        auswahl_c = u""
+
+    # Abfrage des Exports für Direkteinleiter
+    einleitdirekt = sql_einleitdirekt(check_export.get(u'combine_einleitdirekt'), auswahl)
+
+    sql = u'CREATE TEMP TABLE IF NOT EXISTS pruefung_qkan (name, teilgebiet, kennwert)'
+    if not dbQK.sql(sql, u'dbQK: pruefung (1)'):
+        del dbHE
+        return None
+
+    bericht = [u'Prüfung des Exports nach HYSTEM-EXTRAN, {}'.format(
+                   time.strftime(u'%d.%m.%Y %H:%M:%S', time.localtime())),
+               u'HE-Datenbank: {}'.format(database_HE), u'']
+    anzfehler = 0
+
+    for schalter, bezeichnung, sql_qk, tabelle, feld in pruefobjekte:
+        if not (check_export.get(u'export_' + schalter) or check_export.get(u'modify_' + schalter)):
+            continue
+
+        # QKan-Daten einmal lesen, die Flächen wie beim Export paketweise
+        if schalter == u'flaechenrw':
+            pakete = flaechen_pakete(dbQK, auswahl_c, paketgroesse_flaechen, u'dbQK: pruefung_flaechenrw')
+        else:
+            pakete = [(None, None)]
+        if pakete is None or not dbQK.sql(u'DELETE FROM {}'.format(tabelle_qkan), u'dbQK: pruefung (2)'):
+            del dbHE
+            return None
+        for von, bis in pakete:
+            flaechenrw = sql_flaechenrw(check_export.get(u'combine_flaechenrw'), mit_verschneidung,
+                                        mindestflaeche, auswahl_c, sql_auswahl_paket(von, bis))
+            sql = u"""INSERT INTO {tabelle_qkan} (name, teilgebiet, kennwert)
+                      SELECT name, teilgebiet, kennwert FROM ({sql_qk})""".format(
+                tabelle_qkan=tabelle_qkan,
+                sql_qk=sql_qk.format(auswahl=auswahl, flaechenrw=flaechenrw, einleitdirekt=einleitdirekt))
+            if not dbQK.sql(sql, u'dbQK: pruefung_{} (0)'.format(schalter)):
+                del dbHE
+                return None
+
+        ergebnis = vergleiche(dbQK, dbHE, tabelle, feld, u'pruefung_{}'.format(schalter))
+        if ergebnis is None:
+            del dbHE
+            return None
+
+        bericht.append(u'{} ({})'.format(bezeichnung, tabelle))
+        bericht.append(u'    {:<20s} {:>10s} {:>14s}'.format(u'Teilgebiet', u'Anzahl', u'Summe'))
+        for teilgebiet in sorted(ergebnis[u'teilgebiete'], key=lambda tg: u'' if tg is None else tg):
+            anzahl, summe = ergebnis[u'teilgebiete'][teilgebiet]
+            bericht.append(u'    {:<20s} {:>10d} {:>14.3f}'.format(
+                u'-' if teilgebiet is None else teilgebiet, anzahl, summe))
+        for bezeichnung_db, (anzahl, summe) in ((u'QKan gesamt', ergebnis[u'qkan']),
+                                                (u'HE gesamt', ergebnis[u'he'])):
+            bericht.append(u'    {:<20s} {:>10d} {:>14.3f}'.format(bezeichnung_db, anzahl, summe))
+
+        for schluessel, text in ((u'fehlend', u'fehlen in HE'),
+                                 (u'doppelt_qkan', u'doppelt in QKan (nur einmal exportiert)'),
+                                 (u'doppelt_he', u'doppelt in HE'),
+                                 (u'geaendert', u'abweichend in HE ({})'.format(feld))):
+            namen = ergebnis[schluessel]
+            if len(namen) == 0:
+                continue
+            anzfehler += len(namen)
+            bericht.append(u'    {} {}: {}{}'.format(
+                len(namen), text, u', '.join(namen[:maxanzahl_bericht]),
+                u', ...' if len(namen) > maxanzahl_bericht else u''))
+        if ergebnis[u'nur_he'] > 0:
+            bericht.append(u'    {} weitere Objekte nur in HE vorhanden'.format(ergebnis[u'nur_he']))
+        bericht.append(u'')
+
+    del dbHE
+    dbQK.sql(u'DROP TABLE IF EXISTS {}'.format(tabelle_qkan), u'dbQK: pruefung (3)')
+
+    berichtdatei = os.path.splitext(database_HE)[0] + u'_pruefung.txt'
+    try:
+        with codecs.open(berichtdatei, 'w', encoding='utf-8') as fileber:
+            fileber.write(u'\n'.join(bericht))
+    except BaseException as err:
+        logger.error(u'Prüfbericht {} konnte nicht geschrieben werden: {}'.format(berichtdatei, repr(err)))
+
+    logger.debug(u'\n'.join(bericht))
+    if anzfehler > 0:
+        meldung(u'Prüfung des Exports', u'{} Abweichungen zwischen QKan und HE festgestellt. '
+                                        u'Details siehe {}'.format(anzfehler, berichtdatei))
+    else:
+        fortschritt(u'Prüfung des Exports ohne Abweichungen')
+    return anzfehler
@@ -0,0 +1,243 @@
+# -*- coding: utf-8 -*-
+
+"""
+  Export nach HYSTEM-EXTRAN in ein Ladeskript
+  ===========================================
+
+  Alternative zur direkten Verbindung mit der Firebird-Datenbank: Alle schreibenden
+  SQL-Anweisungen des Exports werden in kompakter Form und in der Reihenfolge ihrer
+  Erzeugung in ein Ladeskript geschrieben. Lesende Abfragen werden an die Vorlage-Datenbank
+  gerichtet, da die Zieldatenbank beim Laden aus dieser Vorlage erstellt wird.
+
+  Das Skript kann mit isql (isql -i skript.sql ziel.idbf) oder mit lade_skript() in einer
+  einzigen Transaktion in die HE-Datenbank geladen werden. Über eine zum Skript gespeicherte
+  Kennung wird erkannt, ob ein vorhandenes Skript zum aktuellen Stand der QKan-Datenbank
+  und den gewählten Optionen passt und wiederverwendet werden kann.
+
+  | Dateiname            : sqlskript.py
+  | Date                 : Oktober 2018
+  | Copyright            : (C) 2018 by Joerg Hoettges
+  | Email                : hoettges@fh-aachen.de
+  | git sha              : $Format:%H$
+
+  This program is free software; you can redistribute it and/or modify
+  it under the terms of the GNU General Public License as published by
+  the Free Software Foundation; either version 2 of the License, or
+  (at your option) any later version.
+
+"""
+
+import codecs
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+
+from qkan.database.fbfunc import FBConnection
+from qkan.database.qkan_utils import fehlermeldung
+
+logger = logging.getLogger('QKan')
+
+# Kopf- und Schlusszeile des Skripts. Ein Skript ohne Schlusszeile ist unvollständig.
+KOPFZEILE = u'-- QKan-Exportskript'
+SCHLUSSZEILE = u'-- Ende QKan-Exportskript'
+
+
+def kennung_export(database_QKan, dbtemplate_HE, optionen):
+    '''Erzeugt eine Kennung für den Stand der QKan-Datenbank, der Vorlage und der Exportoptionen.
+
+    :database_QKan:         Pfad zur QKan-SpatiaLite-Datenbank
+    :type database_QKan:    string
+
+    :dbtemplate_HE:         Vorlage für die zu erstellende Firebird-Datenbank
+    :type dbtemplate_HE:    string
+
+    :optionen:              Exportoptionen (Teilgebiete, check_export, Fangradius, ...)
+    :type optionen:         Dictionary
+
+    :returns:               Kennung als Hex-String
+    :rtype:                 string
+    '''
+    merkmale = []
+    for dateiname in (database_QKan, dbtemplate_HE):
+        stat = os.stat(dateiname)
+        merkmale.append([os.path.abspath(dateiname), stat.st_size, int(stat.st_mtime)])
+    merkmale.append(optionen)
+    return hashlib.md5(json.dumps(merkmale, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def speichere_kennung(skriptdatei, kennung):
+    '''Speichert die Kennung des Datenstandes, aus dem das Skript erzeugt wurde.
+
+    Die Kennung wird erst nach dem Export ermittelt, weil dabei die Verknüpfungen in der
+    QKan-Datenbank aktualisiert werden.
+    '''
+    with open(skriptdatei + u'.kennung', 'w') as filekennung:
+        filekennung.write(kennung)
+
+
+def skript_aktuell(skriptdatei, kennung):
+    '''Prüft, ob ein vollständiges Skript mit der angegebenen Kennung vorhanden ist.'''
+    if not os.path.exists(skriptdatei) or not os.path.exists(skriptdatei + u'.kennung'):
+        return False
+    with open(skriptdatei + u'.kennung', 'r') as filekennung:
+        if filekennung.read().strip() != kennung:
+            return False
+    with open(skriptdatei, 'rb') as fileskript:
+        fileskript.seek(0, os.SEEK_END)
+        laenge = fileskript.tell()
+        fileskript.seek(max(0, laenge - 200))
+        schluss = fileskript.read().decode('utf-8', 'ignore').strip()
+    return schluss.endswith(SCHLUSSZEILE)
+
+
+def kompakt(sql):
+    '''Entfernt überflüssige Leerzeichen und Zeilenumbrüche außerhalb von Zeichenketten
+    sowie ein abschließendes Semikolon.'''
+    teile = sql.split(u"'")
+    for i in range(0, len(teile), 2):
+        teile[i] = re.sub(r'\s+', u' ', teile[i])
+    return u"'".join(teile).strip().rstrip(u';').strip()
+
+
+def anweisungen(skript):
+    '''Zerlegt den Text eines Ladeskripts in SQL-Anweisungen. Semikolons in Zeichenketten
+    sowie isql-Befehle (SET ...), ein mit SET TERM geändertes Abschlusszeichen und
+    Kommentarzeilen werden berücksichtigt.'''
+    stmt = []
+    in_text = False
+    term = u';'
+    for zeile in skript.splitlines(True):
+        if not in_text and not stmt and (zeile.startswith(u'--') or zeile.strip() == u''):
+            continue
+        for zeichen in zeile:
+            if zeichen == u"'":
+                in_text = not in_text
+            if zeichen == term and not in_text:
+                anw = u''.join(stmt).strip()
+                stmt = []
+                if anw.upper().startswith(u'SET TERM '):
+                    term = anw.split()[2]
+                elif anw and not anw.upper().startswith(u'SET ') and anw.upper() != u'COMMIT':
+                    yield anw
+            elif stmt or not zeichen.isspace():
+                stmt.append(zeichen)
+
+
+class SkriptConnection:
+    '''Ersatz für FBConnection, der schreibende Anweisungen in ein Ladeskript schreibt.
+
+    Die Schnittstelle entspricht FBConnection (sql, fetchone, fetchall, commit), so dass
+    exportKanaldaten unverändert verwendet werden kann.
+    '''
+
+    def __init__(self, skriptdatei, dbtemplate_HE):
+        self.skriptdatei = skriptdatei
+        self.anzahl = 0
+        self.nextid = None                  # Nur die letzte Änderung von NEXTID wird geschrieben
+
+        # Lesende Abfragen an die Vorlage, aus der die Zieldatenbank erstellt wird
+        self.dbvorlage = FBConnection(dbtemplate_HE)
+
+        self.fileskript = codecs.open(skriptdatei + u'.tmp', 'w', encoding='utf-8')
+        self.fileskript.write(KOPFZEILE + u'\n')
+        self.fileskript.write(u'SET SQL DIALECT 3;\nSET NAMES UTF8;\nSET AUTODDL OFF;\n')
+
+    def __del__(self):
+        if self.fileskript is not None and not self.fileskript.closed:
+            self.fileskript.close()
+
+    def sql(self, sql, repref=None):
+        '''Abfragen werden an die Vorlage gerichtet, alle anderen Anweisungen ins Skript geschrieben'''
+        anw = kompakt(sql)
+        if anw.upper().startswith(u'SELECT'):
+            return self.dbvorlage.sql(sql, repref)
+        if anw.upper().startswith(u'UPDATE ITWH$PROGINFO SET NEXTID'):
+            self.nextid = anw
+            return True
+        try:
+            if anw.upper().startswith(u'EXECUTE BLOCK'):
+                # Anweisungsblöcke enthalten Semikolons und benötigen für isql ein anderes Abschlusszeichen
+                self.fileskript.write(u'SET TERM ^ ;\n' + anw + u'^\nSET TERM ; ^\n')
+            else:
+                self.fileskript.write(anw + u';\n')
+        except BaseException as err:
+            fehlermeldung(u'Fehler beim Schreiben des Ladeskripts ({})'.format(repref), repr(err))
+            return False
+        self.anzahl += 1
+        return True
+
+    def fetchone(self):
+        return self.dbvorlage.fetchone()
+
+    def fetchall(self):
+        return self.dbvorlage.fetchall()
+
+    def commit(self):
+        '''Das Skript wird als Ganzes in einer Transaktion geladen'''
+        pass
+
+    def abschliessen(self):
+        '''Schreibt den Abschluss des Skripts und macht es unter dem endgültigen Namen verfügbar.'''
+        if self.nextid is not None:
+            self.fileskript.write(self.nextid + u';\n')
+        self.fileskript.write(u'COMMIT;\n' + SCHLUSSZEILE + u'\n')
+        self.fileskript.close()
+        for dateiname in (self.skriptdatei, self.skriptdatei + u'.kennung'):
+            if os.path.exists(dateiname):
+                os.remove(dateiname)
+        os.rename(self.skriptdatei + u'.tmp', self.skriptdatei)
+        logger.debug(u'Ladeskript {} mit {} Anweisungen geschrieben'.format(self.skriptdatei, self.anzahl))
+
+
+def lade_skript(skriptdatei, database_HE, dbtemplate_HE):
+    '''Erstellt die HE-Datenbank aus der Vorlage und lädt das Skript in einer Transaktion.
+
+    :skriptdatei:           Pfad zum Ladeskript
+    :type skriptdatei:      string
+
+    :database_HE:           Pfad zur zu erstellenden HE-Firebird-Datenbank
+    :type database_HE:      string
+
+    :dbtemplate_HE:         Vorlage für die zu erstellende Firebird-Datenbank
+    :type dbtemplate_HE:    string
+
+    :returns:               Erfolg
+    :rtype:                 Boolean
+    '''
+    with codecs.open(skriptdatei, 'r', encoding='utf-8') as fileskript:
+        skript = fileskript.read()
+    if not skript.rstrip().endswith(SCHLUSSZEILE):
+        fehlermeldung(u'Fehler in QKan_Export', u'Das Ladeskript {} ist unvollständig!'.format(skriptdatei))
+        return False
+
+    if os.path.exists(database_HE):
+        try:
+            os.remove(database_HE)
+        except BaseException as err:
+            fehlermeldung(u'Fehler in QKan_Export',
+                u'Die HE-Datenbank ist schon vorhanden und kann nicht ersetzt werden: {}'.format(repr(err)))
+            return False
+    try:
+        shutil.copyfile(dbtemplate_HE, database_HE)
+    except BaseException as err:
+        fehlermeldung(u'Fehler in QKan_Export',
+            u'Kopieren der Vorlage HE-Datenbank fehlgeschlagen: {}\nVorlage: {}\nZiel: {}\n'.format(
+                repr(err), dbtemplate_HE, database_HE))
+        return False
+
+    dbHE = FBConnection(database_HE)
+    if dbHE is None:
+        fehlermeldung(u"Fehler in QKan_Export",
+                      u'ITWH-Datenbank {:s} wurde nicht gefunden!\nAbbruch!'.format(database_HE))
+        return False
+
+    for nr, anw in enumerate(anweisungen(skript)):
+        if not dbHE.sql(anw, u'dbHE: lade_skript ({})'.format(nr + 1)):
+            del dbHE
+            return False
+    dbHE.commit()
+    del dbHE
+    return True
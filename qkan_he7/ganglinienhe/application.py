@@ -34,6 +34,7 @@ import slider as s
 from Enums import SliderMode, Type, LayerType
 from application_dialog import LaengsschnittDialog
 from ganglinie import Ganglinie
+from zeitreihen import Zeitreihen
 from qkan_he7 import Dummy
 from qkan.database.fbfunc import FBConnection
 from qkan.database.navigation import Navigator
@@ -490,16 +491,19 @@ class Application:
         # init methods
 
         self.__dlg.checkbox_maximum.setChecked(True)
+        # Die Zeitreihen werden einmal gelesen und von Animator, Ganglinie und Maximizer gemeinsam genutzt
+        zeitreihen = Zeitreihen(FBConnection(self.__result_db), route.get("haltungen"), route.get("schaechte"))
         self.__animator = None
         self.__animator = plotter.Animator(copy.deepcopy(route),
                                            self.__result_db, self.__dlg.slider, self.__dlg.btn_forward,
-                                           self.__dlg.btn_backward, self.__dlg.label_timestamp)
+                                           self.__dlg.btn_backward, self.__dlg.label_timestamp,
+                                           zeitreihen=zeitreihen)
         self.__ganglinie.refresh(haltungen=route.get("haltungen"),
                                  schaechte=route.get("schaechte"), dbname=self.__result_db,
-                                 laengsschnitt=laengsschnitt)
+                                 laengsschnitt=laengsschnitt, zeitreihen=zeitreihen)
         self.__ganglinie.draw_at(self.__animator.get_timestamps()[self.__animator.get_last_index()])
         self.__maximizer = None
-        self.__maximizer = plotter.Maximizer(copy.deepcopy(route), self.__result_db)
+        self.__maximizer = plotter.Maximizer(copy.deepcopy(route), self.__result_db, zeitreihen=zeitreihen)
         self.__switch_max_values(2)
         self.__animator.set_ganglinie(self.__ganglinie)
         self.__dlg2.auto_update.hide()
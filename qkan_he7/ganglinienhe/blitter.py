@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+
+import logging
+
+main_logger = logging.getLogger("QKan")
+
+
+class Blitter:
+    def __init__(self, figure, artists):
+        """
+        Constructor
+        Zeichnet bei jedem Bild nur die übergebenen, veränderlichen Elemente neu (Blitting). Der statische
+        Hintergrund der Figure wird nach jedem vollständigen Zeichnen zwischengespeichert, also z.B. nach einer
+        Größenänderung oder einem Zoom.
+
+        :param figure: Entspricht der Figure, in die gezeichnet wird.
+        :type figure: Figure
+        :param artists: Entspricht den veränderlichen Elementen, z.B. der Wasserstandslinie.
+        :type artists: list
+        """
+        self.__log = logging.getLogger("QKan.blitter.Blitter")
+        self.__figure = figure
+        self.__artists = []
+        self.__canvas = None
+        self.__cid = None
+        self.__background = None
+        for artist in artists:
+            self.add_artist(artist)
+
+    def add_artist(self, artist):
+        """
+        Fügt ein veränderliches Element hinzu. Dieses wird beim vollständigen Zeichnen nicht mehr in den
+        Hintergrund übernommen.
+
+        :param artist: Entspricht dem veränderlichen Element.
+        :type artist: Artist
+        """
+        artist.set_animated(True)
+        self.__artists.append(artist)
+
+    def __connect(self):
+        """
+        Verbindet den Blitter mit der aktuellen Zeichenfläche der Figure. Diese wird beim Einbetten in einen
+        Dialog ausgetauscht.
+        """
+        canvas = self.__figure.canvas
+        if canvas is self.__canvas:
+            return
+        if self.__canvas is not None:
+            self.__canvas.mpl_disconnect(self.__cid)
+        self.__canvas = canvas
+        self.__cid = canvas.mpl_connect("draw_event", self.__on_draw)
+        self.__background = None
+        self.__log.info(u"Blitter wurde mit der Zeichenfläche verbunden")
+
+    def trennen(self):
+        """
+        Trennt den Blitter von der Zeichenfläche, damit er nach dem Zurücksetzen nicht mehr auf Draw-Events
+        reagiert.
+        """
+        if self.__canvas is not None:
+            self.__canvas.mpl_disconnect(self.__cid)
+            self.__log.info(u"Blitter wurde von der Zeichenfläche getrennt")
+        self.__canvas = None
+        self.__cid = None
+        self.__background = None
+
+    def __on_draw(self, event):
+        """
+        Wird nach jedem vollständigen Zeichnen aufgerufen. Speichert den Hintergrund und zeichnet die veränderlichen
+        Elemente darüber, da diese beim vollständigen Zeichnen ausgelassen werden.
+
+        :param event: Entspricht dem Draw-Event.
+        :type event: DrawEvent
+        """
+        if event.canvas is self.__canvas:
+            self.__background = self.__canvas.copy_from_bbox(self.__figure.bbox)
+            self.__log.debug(u"Hintergrund wurde zwischengespeichert")
+        self.__draw_artists()
+
+    def __draw_artists(self):
+        """
+        Zeichnet die veränderlichen Elemente.
+        """
+        for artist in self.__artists:
+            if artist.axes is not None:
+                artist.axes.draw_artist(artist)
+
+    def update(self):
+        """
+        Zeichnet ein neues Bild. Der Hintergrund wird wiederhergestellt, nur die veränderlichen Elemente werden neu
+        gezeichnet. Liegt noch kein Hintergrund vor, wird die Figure einmal vollständig gezeichnet.
+        """
+        self.__connect()
+        if self.__background is None:
+            self.__canvas.draw()
+            return
+        self.__canvas.restore_region(self.__background)
+        self.__draw_artists()
+        self.__canvas.blit(self.__figure.bbox)
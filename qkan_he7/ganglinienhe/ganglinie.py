@@ -9,8 +9,10 @@ from matplotlib.backends.backend_qt4agg import FigureCanvasQTAgg as FigureCanvas
 from matplotlib.backends.backend_qt4agg import NavigationToolbar2QT as NavigationToolbar
 
 from Enums import LayerType
+from blitter import Blitter
 from ganglinie_dialog import GanglinieDialog
 from qkan.database.fbfunc import FBConnection
+from zeitreihen import Zeitreihen
 
 main_logger = logging.getLogger("QKan")
 main_logger.info("Ganglinien-Modul gestartet")
@@ -41,6 +43,7 @@ class Ganglinie:
         self.__colors = {}
         self.__time_plot = None
         self.__time_axes = None
+        self.__blitter = None
         self.__dialog.combo_type.currentIndexChanged.connect(self.__type_changed)
         self.__dialog.combo_method.currentIndexChanged.connect(self.draw)
 
@@ -68,42 +71,24 @@ class Ganglinie:
             self.__log.info(u"Ganglinie wird geschlossen und Farben des Längsschnitts zurückgesetzt")
             self.__laengsschnitt.reset_colors()
 
-    def __get_route(self, haltungen, schaechte):
+    def __get_route(self, haltungen, schaechte, zeitreihen=None):
         """
-        Fragt die Datenbank nach allen nötigen Informationen der ausgewählten Elemente ab, die für die Ganglinie 
-        benötigt werden.
+        Stellt die ausgewählten Elemente und die Zeitreihen zusammen, die für die Ganglinie benötigt werden.
+        Ohne übergebenen Speicher der Zeitreihen wird die Datenbank abgefragt.
 
         :param haltungen: Enthält alle selektierten Haltungs-Namen aus QGis
         :type haltungen: list
         :param schaechte: Enthält alle selektierten Schacht-Namen aus QGis
         :type schaechte: list
+        :param zeitreihen: Entspricht dem gemeinsamen Speicher der Zeitreihen, z.B. des Längsschnitts.
+        :type zeitreihen: Zeitreihen
         :return: Gibt ein Dictionary zurück mit allen nötigen Datensätzen
         :rtype: dict
         """
-        _haltungen = {}
-        _schaechte = {}
-        for haltung in haltungen:
-            self.__db.sql(
-                u'SELECT zeitpunkt,auslastung,durchfluss,geschwindigkeit FROM lau_gl_el WHERE "KANTE"={}'.format(
-                    u"'{}'".format(haltung)))
-            res = self.__db.fetchall()
-            for zeitpunkt, auslastung, durchfluss, geschwindigkeit in res:
-                if _haltungen.get(zeitpunkt) is None:
-                    _haltungen[zeitpunkt] = {}
-                _haltungen[zeitpunkt][haltung] = dict(auslastung=auslastung, durchfluss=durchfluss,
-                                                      geschwindigkeit=geschwindigkeit)
-        self.__log.info(u"Messdaten der Haltungen wurden abgefragt")
-        for schacht in schaechte:
-            self.__db.sql(u'SELECT zeitpunkt,zufluss,wasserstand,durchfluss FROM lau_gl_s WHERE "KNOTEN"={}'.format(
-                u"'{}'".format(schacht)))
-            res = self.__db.fetchall()
-            for zeitpunkt, zufluss, wasserstand, durchfluss in res:
-                if _schaechte.get(zeitpunkt) is None:
-                    _schaechte[zeitpunkt] = {}
-                _schaechte[zeitpunkt][schacht] = dict(zufluss=zufluss, durchfluss=durchfluss, wasserstand=wasserstand)
-
-        self.__log.info(u"Messdaten der Schächte wurden abgefragt")
-        return dict(schaechte=schaechte, haltungen=haltungen, haltunginfo=_haltungen, schachtinfo=_schaechte)
+        if zeitreihen is None:
+            zeitreihen = Zeitreihen(self.__db, haltungen, schaechte)
+        self.__log.info(u"Messdaten der Haltungen und Schächte wurden abgefragt")
+        return dict(schaechte=schaechte, haltungen=haltungen, zeitreihen=zeitreihen)
 
     def draw(self):
         """
@@ -119,11 +104,10 @@ class Ganglinie:
             :rtype: dict
             """
             _y = {}
+            zeitreihen = self.__route.get("zeitreihen")
+            werte = zeitreihen.werte("haltungen", method)
             for haltung in self.__route.get("haltungen"):
-                for zeitpunkt in self.__x:
-                    if _y.get(haltung) is None:
-                        _y[haltung] = []
-                    _y[haltung].append(self.__route.get("haltunginfo").get(zeitpunkt).get(haltung).get(method))
+                _y[haltung] = werte[:, zeitreihen.spalte("haltungen", haltung)]
             self.__log.info(u"Y-Werte der Haltungen wurden zusammengefasst")
             return _y
 
@@ -135,11 +119,10 @@ class Ganglinie:
             :rtype: dict
             """
             _y = {}
+            zeitreihen = self.__route.get("zeitreihen")
+            werte = zeitreihen.werte("schaechte", method)
             for schacht in self.__route.get("schaechte"):
-                for zeitpunkt in self.__x:
-                    if _y.get(schacht) is None:
-                        _y[schacht] = []
-                    _y[schacht].append(self.__route.get("schachtinfo").get(zeitpunkt).get(schacht).get(method))
+                _y[schacht] = werte[:, zeitreihen.spalte("schaechte", schacht)]
             self.__log.info(u"Y-Werte der Schächte wurden zusammengefasst")
             return _y
 
@@ -203,11 +186,7 @@ class Ganglinie:
         """
         Schreibt alle Zeitpunkte in eine Liste. Wichtig, um durch diese später zu iterieren.
         """
-        for zeitpunkt in (
-                self.__route.get("haltunginfo") if len(self.__route.get("haltunginfo")) > 0 else self.__route.get(
-                    "schachtinfo")):
-            self.__x.append(zeitpunkt)
-        self.__x = sorted(self.__x)
+        self.__x = list(self.__route.get("zeitreihen").zeitpunkte)
         self.__log.debug(u"Alle möglichen Zeitpunkte:\t{}".format(self.__x))
 
     def __get_widget(self):
@@ -247,7 +226,8 @@ class Ganglinie:
     def draw_at(self, timestamp):
         """
         Schreibt die Zeitlinie der Ganglinie zu dem Zeitpunkt, in dem sich die Simulation befindet.
-        Nur wichtig im Zusammenhang mit dem Längsschnitt.
+        Nur wichtig im Zusammenhang mit dem Längsschnitt. Nach dem ersten Zeichnen wird nur noch die Zeitlinie über
+        den Blitter neu gezeichnet.
 
         :param timestamp: Entspricht dem Zeitpunkt, welcher visualisiert werden soll.
         :type timestamp: datetime
@@ -260,14 +240,17 @@ class Ganglinie:
                                                            marker=None,
                                                            label="Zeitlinie", alpha=0.5)
             self.__time_axes.set_ylim(y_lim)
+            if self.__blitter is not None:
+                self.__blitter.trennen()
+            self.__blitter = Blitter(self.__fig, [self.__time_plot])
         else:
             self.__time_plot.set_data([timestamp, timestamp], self.__time_axes.get_ylim())
         try:
-            self.__fig.canvas.draw()
+            self.__blitter.update()
         except ValueError:
             pass
 
-    def refresh(self, haltungen, schaechte, dbname, laengsschnitt=None):
+    def refresh(self, haltungen, schaechte, dbname, laengsschnitt=None, zeitreihen=None):
         """
         Wird aufgerufen, um die Ganglinie mit allen wichtigen Datensätzen abzudaten.
         Wichtig bspw. wenn neue Elemente ausgewählt wurden.
@@ -280,9 +263,12 @@ class Ganglinie:
         :type dbname: str
         :param laengsschnitt: Entspricht einer verknüpften Laengsschnitt-Instanz
         :type laengsschnitt: Laengsschnitt
+        :param zeitreihen: Entspricht dem gemeinsamen Speicher der Zeitreihen des Längsschnitts
+        :type zeitreihen: Zeitreihen
         """
-        self.__db = FBConnection(dbname)
-        self.__route = self.__get_route(haltungen, schaechte)
+        if zeitreihen is None:
+            self.__db = FBConnection(dbname)
+        self.__route = self.__get_route(haltungen, schaechte, zeitreihen)
         self.__laengsschnitt = laengsschnitt
         self.__init_x()
         self.__get_widget()
@@ -314,6 +300,9 @@ class Ganglinie:
         if self.__time_plot is not None:
             self.__time_plot = None
             self.__time_axes = None
+            if self.__blitter is not None:
+                self.__blitter.trennen()
+            self.__blitter = None
             self.__log.info(u"Vertikale Linie wurde zurückgesetzt")
 
     def __refresh_colors(self):
@@ -3,10 +3,10 @@
 import datetime
 import logging
 
-import matplotlib.animation as animation
 import matplotlib.lines as lines
 import matplotlib.text as mtext
 import matplotlib.transforms as mtransforms
+import numpy as np
 from PyQt4.QtGui import QWidget
 from matplotlib import pyplot as plt
 from matplotlib.backends.backend_qt4agg import FigureCanvasQTAgg as FigureCanvas
@@ -14,7 +14,9 @@ from matplotlib.backends.backend_qt4agg import NavigationToolbar2QT as Navigatio
 from matplotlib.lines import Line2D
 
 from Enums import SliderMode, LayerType
+from blitter import Blitter
 from qkan.database.fbfunc import FBConnection
+from zeitreihen import Zeitreihen
 
 main_logger = logging.getLogger("QKan")
 main_logger.info("Plotter-Modul gestartet")
@@ -197,7 +199,7 @@ class Laengsschnitt:
 
 
 class Maximizer:
-    def __init__(self, _route, _dbname):
+    def __init__(self, _route, _dbname, zeitreihen=None):
         """
         Constructor
 
@@ -206,9 +208,13 @@ class Maximizer:
         :type _route: dict
         :param _dbname: Entspricht dem Datenbank-Pfad der Ereignis-Datenbank
         :type _dbname: str
+        :param zeitreihen: Entspricht dem gemeinsamen Speicher der Zeitreihen. Fehlt dieser, wird er angelegt.
+        :type zeitreihen: Zeitreihen
         """
         self.__log = logging.getLogger("QKan.plotter.Maximizer")
-        self.__db = FBConnection(_dbname)
+        if zeitreihen is None:
+            zeitreihen = Zeitreihen(FBConnection(_dbname), _route.get("haltungen"), _route.get("schaechte"))
+        self.__simulation = zeitreihen
         self.__route = _route
         self.__fig = plt.figure(0)
         self.__ax = None
@@ -217,7 +223,6 @@ class Maximizer:
         self.__x = []
         self.__y = []
         self.__plot = None
-        self.__simulation = self.__fetch_max_simulation_data()
         self.__draw()
 
     def __del__(self):
@@ -227,37 +232,15 @@ class Maximizer:
         del self.__fig
         self.__log.info(u"Figure wurde gelöscht")
 
-    def __fetch_max_simulation_data(self):
-        """
-        Berechnet die maximalen Wasserstände über den gesamten Zeitraum einer Simulation und gibt diese zurück.
-
-        :return: Gibt ein Dictionary zurück, welche alle Haltungen und Schächte und deren maximale Wasserstände
-        beinhaltet.
-        :rtype: dict
-        """
-        haltungen = {}
-        schaechte = {}
-        for haltung in self.__route.get("haltungen"):
-            statement = u'SELECT wasserstandoben,wasserstandunten FROM lau_max_el WHERE "KANTE"={}'.format(
-                u"'{}'".format(haltung))
-            self.__db.sql(statement)
-            wasserstandoben, wasserstandunten = self.__db.fetchone()
-            haltungen[haltung] = dict(wasserstandoben=wasserstandoben, wasserstandunten=wasserstandunten)
-
-        self.__log.info(u"Maximalwerte der Haltungen wurden abgefragt")
-        for schacht in self.__route.get("schaechte"):
-            self.__db.sql(u'SELECT wasserstand FROM lau_max_s WHERE "KNOTEN"={}'.format(u"'{}'".format(schacht)))
-            wasserstand, = self.__db.fetchone()
-            schaechte[schacht] = wasserstand
-        self.__log.info(u"Maximalwerte der Schächte wurden abgefragt")
-        return dict(haltungen=haltungen, schaechte=schaechte)
-
     def __draw(self):
         """
         Zeichnet den Plot für den maximalen Wasserstand.
         """
         self.__ax = self.__fig.add_subplot(111)
         switch = True
+        wasserstand = self.__simulation.maxima("schaechte", "wasserstand")
+        wasserstandoben = self.__simulation.maxima("haltungen", "wasserstandoben")
+        wasserstandunten = self.__simulation.maxima("haltungen", "wasserstandunten")
 
         def draw_schacht(name):
             """
@@ -266,9 +249,9 @@ class Maximizer:
             :param name: Entspricht dem Namen des Schachts.
             :type name: str
             """
-            wasserstand = self.__simulation.get("schaechte").get(name)
+            wert = wasserstand[self.__simulation.spalte("schaechte", name)]
             self.__x += [self.__x_pointer, self.__x_pointer + self.__schacht_breite]
-            self.__y += [wasserstand, wasserstand]
+            self.__y += [wert, wert]
             self.__x_pointer += self.__schacht_breite
 
         def draw_haltung(name):
@@ -280,8 +263,9 @@ class Maximizer:
             """
             haltung = self.__route.get("haltunginfo").get(name)
             laenge = haltung.get("laenge") - self.__schacht_breite
-            wasseroben = self.__simulation.get("haltungen").get(name).get("wasserstandoben")
-            wasserunten = self.__simulation.get("haltungen").get(name).get("wasserstandunten")
+            spalte = self.__simulation.spalte("haltungen", name)
+            wasseroben = wasserstandoben[spalte]
+            wasserunten = wasserstandunten[spalte]
 
             self.__x += [self.__x_pointer, self.__x_pointer + laenge]
             self.__y += [wasseroben, wasserunten]
@@ -320,7 +304,7 @@ class Maximizer:
 
 
 class Animator:
-    def __init__(self, _route, _dbname, slider, _forward, _backward, _label):
+    def __init__(self, _route, _dbname, slider, _forward, _backward, _label, zeitreihen=None):
         """
         Constructor
 
@@ -335,22 +319,27 @@ class Animator:
         :type _forward: QPushButton
         :param _backward: Entspricht einer Referenz auf den "Zurück"-Button innerhalb der GUI.
         :type _backward: QPushButton
+        :param zeitreihen: Entspricht dem gemeinsamen Speicher der Zeitreihen. Fehlt dieser, wird er angelegt.
+        :type zeitreihen: Zeitreihen
         """
         self.__log = logging.getLogger("QKan.plotter.Animator")
-        self.__db = FBConnection(_dbname)
+        if zeitreihen is None:
+            zeitreihen = Zeitreihen(FBConnection(_dbname), _route.get("haltungen"), _route.get("schaechte"))
         self.__label = _label
         self.__ganglinie = None
         self.__route = _route
         self.__fig = plt.figure(0)
         self.__ax = self.__fig.add_subplot(111)
-        self.__x_pointer = 0
         self.__schacht_breite = 1
-        self.__x = []
-        self.__y = []
         self.__plot, = self.__ax.plot([], [], "b:", label="Wasserstand", alpha=1)
         if plots.get("waterlevel") is None:
             plots["waterlevel"] = self.__plot
-        self.__max_value, self.__simulation, self.__timestamps = self.__fetch_simulation_data()
+        self.__simulation = zeitreihen
+        self.__timestamps = zeitreihen.zeitpunkte
+        self.__max_value = len(self.__timestamps) - 1
+        self.__x, self.__frames = self.__init_frames()
+        self.__y = []
+        self.__blitter = Blitter(self.__fig, [self.__plot])
         slider.setRange(0, self.__max_value)
         self.__slider = slider
         self.__animation = None
@@ -394,90 +383,45 @@ class Animator:
         del self.__fig
         self.__log.info(u"Figure wurde gelöscht")
 
-    def __fetch_simulation_data(self):
-        """
-        Liest die Datenbank aus, um alle nötigen Datensätze für die Animation zu erhalten.
-
-        :return: Gibt die Anzahl an zuzeichnenden Elementen, ein Dictionary, das die Wasserstände zu jedem Zeitpunkt
-        aller Haltungen und Schächte beinhaltet und alle Schacht-Namen in der richtigen Reihenfolge zurück.
-        :rtype: (int,dict,list)
-        """
-        haltungen = {}
-        schaechte = {}
-        for haltung in self.__route.get("haltungen"):
-            self.__db.sql(u'SELECT wasserstandoben,wasserstandunten,zeitpunkt FROM lau_gl_el WHERE "KANTE"={}'.format(
-                u"'{}'".format(haltung)))
-            wasserstaende = self.__db.fetchall()
-            for wasserstandoben, wasserstandunten, zeitpunkt in wasserstaende:
-                if haltungen.get(zeitpunkt) is None:
-                    haltungen[zeitpunkt] = {}
-                haltungen[zeitpunkt][haltung] = dict(wasserstandoben=wasserstandoben, wasserstandunten=wasserstandunten)
-
-        self.__log.info(u"Wasserstände und Zeitpunkte der Haltungen wurden abgefragt")
-        for schacht in self.__route.get("schaechte"):
-            self.__db.sql(
-                u'SELECT wasserstand,zeitpunkt FROM lau_gl_s WHERE "KNOTEN"={}'.format(u"'{}'".format(schacht)))
-            wasserstaende = self.__db.fetchall()
-            for wasserstand, zeitpunkt in wasserstaende:
-                if schaechte.get(zeitpunkt) is None:
-                    schaechte[zeitpunkt] = {}
-                schaechte[zeitpunkt][schacht] = wasserstand
-        self.__log.info(u"Wasserstände und Zeitpunkte der Schächte wurden abgefragt")
-        return len(schaechte.keys()) - 1, dict(haltungen=haltungen, schaechte=schaechte), sorted(schaechte.keys())
+    def __init_frames(self):
+        """
+        Berechnet die X-Werte des Wasserstands einmalig für die Route und die Y-Werte aller Zeitpunkte als Matrix.
+        Jeder Schacht und jede Haltung tragen zwei Punkte bei, in der Reihenfolge Schacht, Haltung, ..., Schacht.
+
+        :return: Gibt die X-Werte und die Y-Werte (Zeitpunkte x Punkte) zurück.
+        :rtype: (numpy.ndarray,numpy.ndarray)
+        """
+        schaechte = self.__route.get("schaechte")
+        haltungen = self.__route.get("haltungen")[:len(schaechte) - 1]
+        laengen = [self.__route.get("haltunginfo").get(name).get("laenge") - self.__schacht_breite
+                   for name in haltungen]
+
+        breiten = np.empty(len(schaechte) + len(haltungen))
+        breiten[0::2] = self.__schacht_breite
+        breiten[1::2] = laengen
+        x = np.empty(2 * len(breiten))
+        x[0::2] = np.concatenate(([0.], np.cumsum(breiten)[:-1]))
+        x[1::2] = x[0::2] + breiten
+
+        spalten_s = self.__simulation.spalten("schaechte", schaechte)
+        spalten_h = self.__simulation.spalten("haltungen", haltungen)
+        wasserstand = self.__simulation.werte("schaechte", "wasserstand")[:, spalten_s]
+        frames = np.empty((len(self.__timestamps), len(x)))
+        frames[:, 0::4] = wasserstand
+        frames[:, 1::4] = wasserstand
+        frames[:, 2::4] = self.__simulation.werte("haltungen", "wasserstandoben")[:, spalten_h]
+        frames[:, 3::4] = self.__simulation.werte("haltungen", "wasserstandunten")[:, spalten_h]
+        self.__log.info(u"Wasserstände von {} Zeitpunkten an {} Punkten wurden vorberechnet".format(*frames.shape))
+        return x, frames
 
     def draw(self, timestamp):
         """
-        Sammelt alle X- und Y-Werte für den jeweiligen Zeitpunkt
+        Übernimmt die Y-Werte für den jeweiligen Zeitpunkt aus den vorberechneten Wasserständen.
 
         :param timestamp: Entspricht dem zu zeichnenden Zeitpunkt.
         :type timestamp: datetime
         """
-        self.__x_pointer = 0
-        self.__x = []
-        self.__y = []
-        switch = True
-        haltungen = list(self.__route.get("haltungen"))
-        schaechte = list(self.__route.get("schaechte"))
-
-        def draw_schacht(name):
-            #         if name == "Auslass":  # todo
-            #             return
-            """
-            Fragt die X- und Y-Werte der Schächte für den Zeitpunkt ab.
-
-            :param name: Entspricht dem Namen des Schachts.
-            :type name: str
-            """
-            wasserstand = self.__simulation.get("schaechte").get(timestamp).get(name)
-
-            self.__x += [self.__x_pointer, self.__x_pointer + self.__schacht_breite]
-            self.__y += [wasserstand, wasserstand]
-            self.__x_pointer += self.__schacht_breite
-
-        def draw_haltung(name):
-            """
-            Fragt die X- und Y-Werte der Haltungen für den Zeitpunkt ab.
-
-            :param name: Entspricht dem Namen der Haltung
-            :type name: str
-            """
-            haltung = self.__route.get("haltunginfo").get(name)
-
-            laenge = haltung.get("laenge") - self.__schacht_breite
-            wasseroben = self.__simulation.get("haltungen").get(timestamp).get(name).get("wasserstandoben")
-            wasserunten = self.__simulation.get("haltungen").get(timestamp).get(name).get("wasserstandunten")
-            self.__x += [self.__x_pointer, self.__x_pointer + laenge]
-            self.__y += [wasseroben, wasserunten]
-            self.__x_pointer += laenge
-
-        while True:
-            if switch:
-                draw_schacht(schaechte.pop(0))
-                if len(schaechte) == 0:
-                    break
-            else:
-                draw_haltung(haltungen.pop(0))
-            switch = not switch
+        self.__y = self.__frames[self.__simulation.index(timestamp)]
 
     def __update_coordinates(self, value):
         """
@@ -488,7 +432,7 @@ class Animator:
         """
         if self.__ganglinie is not None:
             self.__ganglinie.draw_at(self.__timestamps[value])
-        self.draw(self.__timestamps[value])
+        self.__y = self.__frames[value]
 
     def go_step(self, value):
         """
@@ -504,7 +448,7 @@ class Animator:
         self.__update_coordinates(value)
         self.__update_timestamp(value)
         self.__plot.set_data(self.__x, self.__y)
-        self.__fig.canvas.draw()
+        self.__blitter.update()
 
     def play(self, value, mode):
         """
@@ -521,7 +465,7 @@ class Animator:
         self.__mode = mode
         self.__log.debug(u"Modus:\t{}".format(u"Vorwärts" if mode == SliderMode.Forward else u"Rückwärts"))
         self.__last_time = datetime.datetime.today()
-        self.__animation.event_source.start()
+        self.__animation.start()
         self.__log.info(u"Animation wird fortgesetzt")
 
     def __get_speed(self, x):
@@ -542,7 +486,7 @@ class Animator:
         Stoppt die Simulation.
         """
         try:
-            self.__animation.event_source.stop()
+            self.__animation.stop()
         except AttributeError:
             pass
         self.__log.info(u"Animation wurde pausiert")
@@ -593,20 +537,25 @@ class Animator:
     def __init_animation(self):
         """
         Initialisiert die Animation mit den nötigen Daten.
+        Die Animation läuft über einen Timer der Zeichenfläche. Jedes Bild wird über den Blitter gezeichnet, ein
+        vollständiges Neuzeichnen der Figure ist nicht nötig.
         """
         self.pause()
         self.__last_time = datetime.datetime.today()
 
-        def animate(i):
+        def animate():
             tmp = self.__last_index
-            index = self.__get_next_timestamp(i, self.__speed, self.__mode)
+            index = self.__get_next_timestamp(0, self.__speed, self.__mode)
             if index != tmp:
                 self.__update_coordinates(index)
                 self.__plot.set_data(self.__x, self.__y)
+                self.__blitter.update()
                 self.__update_timestamp(index)
                 self.__slider.setValue(index)
 
-        self.__animation = animation.FuncAnimation(self.__fig, animate, frames=self.__max_value, interval=200)
+        # 60 Bilder je Sekunde
+        self.__animation = self.__fig.canvas.new_timer(interval=1000 // 60)
+        self.__animation.add_callback(animate)
         self.pause()
         self.__log.info(u"Animation wurde initialisiert und pausiert")
 
@@ -672,7 +621,10 @@ def set_legend():
     if _max is not None:
         legend_plots.append(_max)
     plt.figure(0)
-    plt.legend(handles=legend_plots)
+    legend = plt.legend(handles=legend_plots)
+    # Die Legende übernimmt die Eigenschaften der Wasserstandslinie, die nur über den Blitter gezeichnet wird.
+    for line in legend.get_lines():
+        line.set_animated(False)
     main_logger.info(u"Legende wurde gesetzt")
 
 
@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+
+import bisect
+import itertools
+import logging
+
+import numpy as np
+
+main_logger = logging.getLogger("QKan")
+
+# Firebird erlaubt höchstens 1500 Ausdrücke in einer IN-Liste
+max_in_liste = 1500
+
+# Je Elementart: Tabelle der Zeitreihen, Spalte mit dem Namen des Elements und Größen
+tabellen = dict(haltungen=(u"lau_gl_el", u"KANTE",
+                           [u"wasserstandoben", u"wasserstandunten", u"auslastung", u"durchfluss", u"geschwindigkeit"]),
+                schaechte=(u"lau_gl_s", u"KNOTEN", [u"wasserstand", u"zufluss", u"durchfluss"]))
+
+# Je Elementart: Tabelle der Maximalwerte, Spalte mit dem Namen des Elements und Größen
+tabellen_max = dict(haltungen=(u"lau_max_el", u"KANTE", [u"wasserstandoben", u"wasserstandunten"]),
+                    schaechte=(u"lau_max_s", u"KNOTEN", [u"wasserstand"]))
+
+
+def _text(wert):
+    """
+    Namen aus der Ergebnis-Datenbank sind iso-8859-1-kodiert.
+    """
+    if isinstance(wert, bytes):
+        return wert.decode('iso-8859-1')
+    return wert
+
+
+def zeitreihen_lesen(db, tabelle, schluessel, spalten, namen, sortierung=u"zeitpunkt"):
+    """
+    Liest die Zeitreihen aller übergebenen Elemente mit einer parametrisierten Abfrage je Paket von höchstens
+    max_in_liste Elementen. Die Datensätze werden nach Element und Zeitpunkt sortiert abgefragt und in einem
+    Durchlauf den Elementen zugeordnet.
+
+    :param db: Entspricht der Verbindung zur Ergebnis-Datenbank.
+    :type db: FBConnection
+    :param tabelle: Entspricht der Tabelle der Zeitreihen, z.B. lau_gl_el.
+    :type tabelle: str
+    :param schluessel: Entspricht der Spalte mit dem Namen des Elements, z.B. KANTE.
+    :type schluessel: str
+    :param spalten: Entspricht den abzufragenden Spalten.
+    :type spalten: list
+    :param namen: Entspricht den Namen der Elemente.
+    :type namen: list
+    :param sortierung: Entspricht der Spalte, nach der die Datensätze eines Elements sortiert werden.
+    :type sortierung: str
+    :return: Gibt je Element den Namen und die sortierten Datensätze zurück.
+    :rtype: generator
+    """
+    namen = sorted(set(namen))
+    reihenfolge = u'"{}",{}'.format(schluessel, sortierung) if sortierung else u'"{}"'.format(schluessel)
+    for start in range(0, len(namen), max_in_liste):
+        paket = namen[start:start + max_in_liste]
+        statement = u'SELECT "{schluessel}",{spalten} FROM {tabelle} WHERE "{schluessel}" IN ({platzhalter}) ' \
+                    u'ORDER BY {reihenfolge}'.format(schluessel=schluessel, spalten=u",".join(spalten), tabelle=tabelle,
+                                                     platzhalter=u",".join([u"?"] * len(paket)),
+                                                     reihenfolge=reihenfolge)
+        db.curfb.execute(statement, paket)
+        for name, datensaetze in itertools.groupby(db.curfb.fetchall(), lambda datensatz: datensatz[0]):
+            yield _text(name), [datensatz[1:] for datensatz in datensaetze]
+    main_logger.debug(u"{}: Zeitreihen von {} Elementen in {} Abfragen gelesen".format(
+        tabelle, len(namen), (len(namen) + max_in_liste - 1) // max_in_liste))
+
+
+def zeitpunkte_lesen(db, tabelle, schluessel, namen):
+    """
+    Liest die Zeitpunkte, zu denen für die übergebenen Elemente Datensätze vorliegen, in Paketen von höchstens
+    max_in_liste Elementen.
+
+    :param db: Entspricht der Verbindung zur Ergebnis-Datenbank.
+    :type db: FBConnection
+    :param tabelle: Entspricht der Tabelle der Zeitreihen, z.B. lau_gl_el.
+    :type tabelle: str
+    :param schluessel: Entspricht der Spalte mit dem Namen des Elements, z.B. KANTE.
+    :type schluessel: str
+    :param namen: Entspricht den Namen der Elemente.
+    :type namen: list
+    :return: Gibt die Zeitpunkte zurück.
+    :rtype: set
+    """
+    namen = sorted(set(namen))
+    zeitpunkte = set()
+    for start in range(0, len(namen), max_in_liste):
+        paket = namen[start:start + max_in_liste]
+        statement = u'SELECT DISTINCT zeitpunkt FROM {tabelle} WHERE "{schluessel}" IN ({platzhalter})'.format(
+            tabelle=tabelle, schluessel=schluessel, platzhalter=u",".join([u"?"] * len(paket)))
+        db.curfb.execute(statement, paket)
+        zeitpunkte.update(datensatz[0] for datensatz in db.curfb.fetchall())
+    return zeitpunkte
+
+
+def _eindeutig(namen):
+    """
+    Entfernt doppelte Namen unter Beibehaltung der Reihenfolge.
+    """
+    ergebnis = []
+    vorhanden = set()
+    for name in namen:
+        if name not in vorhanden:
+            vorhanden.add(name)
+            ergebnis.append(name)
+    return ergebnis
+
+
+class Zeitreihen:
+    def __init__(self, db, haltungen, schaechte):
+        """
+        Constructor
+        Spaltenweiser Speicher der Zeitreihen aller übergebenen Elemente, den Animator, Maximizer und Ganglinie
+        gemeinsam nutzen. Je Elementart und Größe wird ein Array (Zeitpunkte x Elemente) gehalten, das erst beim
+        ersten Abruf über werte() gelesen wird. Die Zeilen entsprechen den sortierten Zeitpunkten, die Spalten
+        werden über den Namen des Elements gefunden. Fehlende Werte sind NaN.
+
+        :param db: Entspricht der Verbindung zur Ergebnis-Datenbank.
+        :type db: FBConnection
+        :param haltungen: Entspricht den Namen der Haltungen.
+        :type haltungen: list
+        :param schaechte: Entspricht den Namen der Schächte.
+        :type schaechte: list
+        """
+        self.__log = logging.getLogger("QKan.zeitreihen.Zeitreihen")
+        self.__db = db
+        self.__namen = dict(haltungen=_eindeutig(haltungen), schaechte=_eindeutig(schaechte))
+        self.__spalten = {}
+        self.__werte = dict((art, {}) for art in tabellen)
+        self.__maxima = None
+
+        zeitpunkte = set()
+        for art, (tabelle, schluessel, groessen) in tabellen.items():
+            self.__spalten[art] = dict((name, index) for index, name in enumerate(self.__namen[art]))
+            zeitpunkte.update(zeitpunkte_lesen(db, tabelle, schluessel, self.__namen[art]))
+        self.zeitpunkte = sorted(zeitpunkte)
+        self.__zeilen = dict((zeitpunkt, index) for index, zeitpunkt in enumerate(self.zeitpunkte))
+        self.__log.info(u"Zeitpunkte von {} Haltungen und {} Schächten wurden gelesen: {}".format(
+            len(self.__namen["haltungen"]), len(self.__namen["schaechte"]), len(self.zeitpunkte)))
+
+    def werte(self, art, groesse):
+        """
+        Getter der Werte einer Größe. Diese werden beim ersten Aufruf aus der Ergebnis-Datenbank gelesen.
+
+        :param art: Entspricht der Elementart, "haltungen" oder "schaechte".
+        :type art: str
+        :param groesse: Entspricht der Größe, z.B. "wasserstand".
+        :type groesse: str
+        :return: Gibt die Werte aller Elemente zu allen Zeitpunkten zurück.
+        :rtype: numpy.ndarray (Zeitpunkte x Elemente)
+        """
+        if groesse not in self.__werte[art]:
+            tabelle, schluessel, groessen = tabellen[art]
+            if groesse not in groessen:
+                raise KeyError(u"Unbekannte Größe {} der {}".format(groesse, art))
+            werte = np.empty((len(self.zeitpunkte), len(self.__namen[art])))
+            werte.fill(np.nan)
+            for name, datensaetze in zeitreihen_lesen(self.__db, tabelle, schluessel, [groesse, u"zeitpunkt"],
+                                                      self.__namen[art]):
+                spalte = self.__spalten[art].get(name)
+                if spalte is not None:
+                    werte[[self.__zeilen[zeitpunkt] for wert, zeitpunkt in datensaetze], spalte] = \
+                        np.array([wert for wert, zeitpunkt in datensaetze], dtype=float)
+            self.__werte[art][groesse] = werte
+            self.__log.info(u"Zeitreihen {} der {} wurden gelesen".format(groesse, art))
+        return self.__werte[art][groesse]
+
+    def spalte(self, art, name):
+        """
+        Getter des Spaltenindex eines Elements
+        """
+        return self.__spalten[art][name]
+
+    def spalten(self, art, namen):
+        """
+        Getter der Spaltenindizes mehrerer Elemente in der übergebenen Reihenfolge
+
+        :rtype: numpy.ndarray
+        """
+        return np.array([self.__spalten[art][name] for name in namen], dtype=int)
+
+    def index(self, zeitpunkt):
+        """
+        Getter des Zeilenindex eines Zeitpunkts. Liegt für den Zeitpunkt kein Datensatz vor, wird der letzte
+        vorhergehende Zeitpunkt verwendet, vor dem ersten Zeitpunkt der erste.
+
+        :rtype: int
+        """
+        return max(bisect.bisect_right(self.zeitpunkte, zeitpunkt) - 1, 0)
+
+    def maxima(self, art, groesse):
+        """
+        Getter der Maximalwerte einer Größe über den gesamten Zeitraum der Simulation. Diese werden beim ersten
+        Aufruf aus den Maximalwert-Tabellen der Ergebnis-Datenbank gelesen.
+
+        :return: Gibt die Maximalwerte aller Elemente zurück.
+        :rtype: numpy.ndarray (Elemente)
+        """
+        if self.__maxima is None:
+            self.__maxima = {}
+            for _art, (tabelle, schluessel, groessen) in tabellen_max.items():
+                werte = np.empty((len(groessen), len(self.__namen[_art])))
+                werte.fill(np.nan)
+                for name, datensaetze in zeitreihen_lesen(self.__db, tabelle, schluessel, groessen,
+                                                          self.__namen[_art], sortierung=None):
+                    spalte = self.__spalten[_art].get(name)
+                    if spalte is not None:
+                        werte[:, spalte] = np.array(datensaetze[0], dtype=float)
+                self.__maxima[_art] = dict(zip(groessen, werte))
+            self.__log.info(u"Maximalwerte wurden gelesen")
+        return self.__maxima[art][groesse]
@@ -28,15 +28,17 @@ import site
 from PyQt4.QtCore import QSettings, QTranslator, qVersion, QCoreApplication
 from PyQt4.QtGui import QFileDialog  # (jh, 20.09.2016)
 from qgis.core import QgsProject
-from qgis.gui import QgsGenericProjectionSelector
+from qgis.gui import QgsGenericProjectionSelector, QgsMessageBar
 from qkan.database.qkan_utils import get_database_QKan
 
 # Initialize Qt resources from file resources.py
 # Import the code for the dialog
 import resources
 from application_dialog import ImportFromHEDialog, ResultsFromHEDialog
+from hintergrund import ImportImHintergrund
 from import_from_he import importKanaldaten
-from results_from_he import importResults
+from results_from_he import importResults, importResultsMehrfach, vergleichslayer
+from zusammenfuehren import importZusammenfuehren
 from qkan_he7 import Dummy
 # noinspection PyUnresolvedReferences
 
@@ -76,6 +78,9 @@ class ImportFromHE:
         self.dlg_he = ImportFromHEDialog()
         self.dlg_lz = ResultsFromHEDialog()
 
+        # Laufender Import im Hintergrund (Modul hintergrund)
+        self.import_hintergrund = None
+
         # Anfang Eigene Funktionen -------------------------------------------------
         # (jh, 09.10.2016)
 
@@ -115,6 +120,10 @@ class ImportFromHE:
         self.dlg_lz.rb_uebvol.clicked.connect(self.disable_tf_qmlfile)
         self.dlg_lz.rb_none.clicked.connect(self.disable_tf_qmlfile)
 
+        # Liste der weiteren HE-Ergebnisdatenbanken zum Vergleich
+        self.dlg_lz.pb_addVergleichHeDB.clicked.connect(self.selectFiles_VergleichErgDB)
+        self.dlg_lz.pb_removeVergleichHeDB.clicked.connect(self.removeVergleichErgDB)
+
     # noinspection PyMethodMayBeStatic
     def tr(self, message):
         """Get the translation for a string using Qt translation API.
@@ -241,6 +250,49 @@ class ImportFromHE:
             projectfile = ''
         self.dlg_he.tf_projectFile.setText(projectfile)
 
+        # Räumliche Indizes während des Imports aussetzen (keine Formularoption)
+        if 'massenimport' in self.config:
+            massenimport = self.config['massenimport']
+        else:
+            massenimport = True
+
+        # Anzahl der Verbindungen zum gleichzeitigen Lesen der HE-Tabellen (keine Formularoption)
+        if 'parallel_lesen' in self.config:
+            parallel_lesen = self.config['parallel_lesen']
+        else:
+            parallel_lesen = 3
+
+        # Nur die seit dem letzten Import geänderten Datensätze importieren (keine Formularoption)
+        if 'inkrementell' in self.config:
+            inkrementell = self.config['inkrementell']
+        else:
+            inkrementell = False
+
+        # Auch Flächen, Einzeleinleiter, Außengebiete und Bodenklassen importieren (keine Formularoption)
+        if 'mit_flaechen' in self.config:
+            mit_flaechen = self.config['mit_flaechen']
+        else:
+            mit_flaechen = False
+
+        # Import in einem eigenen Thread ausführen, damit QGIS bedienbar bleibt und der Import
+        # abgebrochen werden kann (keine Formularoption)
+        if 'hintergrund' in self.config:
+            hintergrund = self.config['hintergrund']
+        else:
+            hintergrund = True
+
+        # Weitere HE-Datenbanken, die mit der ausgewählten HE-Datenbank zusammengeführt werden, und
+        # Behandlung gleicher Namen ('teilgebiet' oder 'praefix') (keine Formularoptionen)
+        if 'zusammenfuehren' in self.config:
+            zusammenfuehren = self.config['zusammenfuehren']
+        else:
+            zusammenfuehren = []
+
+        if 'namenskonflikte' in self.config:
+            namenskonflikte = self.config['namenskonflikte']
+        else:
+            namenskonflikte = u'teilgebiet'
+
         # Ende Eigene Funktionen ---------------------------------------------------
 
 
@@ -269,13 +321,45 @@ class ImportFromHE:
             self.config['database_QKan'] = database_QKan
             self.config['database_HE'] = database_HE
             self.config['projectfile'] = projectfile
+            self.config['massenimport'] = massenimport
+            self.config['parallel_lesen'] = parallel_lesen
+            self.config['inkrementell'] = inkrementell
+            self.config['mit_flaechen'] = mit_flaechen
+            self.config['hintergrund'] = hintergrund
+            self.config['zusammenfuehren'] = zusammenfuehren
+            self.config['namenskonflikte'] = namenskonflikte
 
             with open(self.configfil, 'w') as fileconfig:
                 fileconfig.write(json.dumps(self.config))
 
             # Start der Verarbeitung
 
-            importKanaldaten(database_HE, database_QKan, projectfile, self.epsg)
+            if not hintergrund and zusammenfuehren:
+                importZusammenfuehren([database_HE] + zusammenfuehren, database_QKan, projectfile, self.epsg,
+                                      strategie=namenskonflikte, massenimport=massenimport,
+                                      parallel_lesen=parallel_lesen, mit_flaechen=mit_flaechen)
+            elif not hintergrund:
+                importKanaldaten(database_HE, database_QKan, projectfile, self.epsg,
+                                 massenimport=massenimport, parallel_lesen=parallel_lesen,
+                                 inkrementell=inkrementell, mit_flaechen=mit_flaechen)
+            elif self.import_hintergrund is not None and self.import_hintergrund.laeuft():
+                self.iface.messageBar().pushMessage(u"Information", u"Es läuft bereits ein Import aus HE.",
+                                                    level=QgsMessageBar.WARNING)
+            elif zusammenfuehren:
+                self.import_hintergrund = ImportImHintergrund(database_HE, database_QKan, projectfile, self.epsg,
+                                                              quellen=zusammenfuehren,
+                                                              strategie=namenskonflikte,
+                                                              massenimport=massenimport,
+                                                              parallel_lesen=parallel_lesen,
+                                                              mit_flaechen=mit_flaechen)
+                self.import_hintergrund.starten()
+            else:
+                self.import_hintergrund = ImportImHintergrund(database_HE, database_QKan, projectfile, self.epsg,
+                                                              massenimport=massenimport,
+                                                              parallel_lesen=parallel_lesen,
+                                                              inkrementell=inkrementell,
+                                                              mit_flaechen=mit_flaechen)
+                self.import_hintergrund.starten()
 
     # Formularfunktionen -------------------------------------------------------
 
@@ -300,6 +384,28 @@ class ImportFromHE:
         self.dlg_lz.tf_qmlfile.setEnabled(False)
         self.dlg_lz.pb_selectqmlfile.setEnabled(False)
 
+    def selectFiles_VergleichErgDB(self):
+        """Weitere HE-Ergebnisdatenbanken zum Vergleich auswählen"""
+
+        filenames = QFileDialog.getOpenFileNames(self.dlg_lz,
+                                                 u"Weitere HE-Ergebnisdatenbanken zum Vergleich auswählen",
+                                                 self.default_dir,
+                                                 u"*.idbf")
+        vorhanden = [self.dlg_lz.lw_vergleichHeDB.item(nr).text()
+                     for nr in range(self.dlg_lz.lw_vergleichHeDB.count())]
+        for filename in filenames:
+            if filename not in vorhanden:
+                self.dlg_lz.lw_vergleichHeDB.addItem(filename)
+                vorhanden.append(filename)
+        if len(filenames) > 0 and os.path.dirname(filenames[0]) != '':
+            os.chdir(os.path.dirname(filenames[0]))
+
+    def removeVergleichErgDB(self):
+        """Ausgewählte HE-Ergebnisdatenbanken aus der Vergleichsliste entfernen"""
+
+        for item in self.dlg_lz.lw_vergleichHeDB.selectedItems():
+            self.dlg_lz.lw_vergleichHeDB.takeItem(self.dlg_lz.lw_vergleichHeDB.row(item))
+
     def selectqmlfileResults(self):
         """qml-Stildatei auswählen"""
 
@@ -354,7 +460,16 @@ class ImportFromHE:
         else:
             qmlfileResults = ''
         self.dlg_lz.tf_qmlfile.setText(qmlfileResults)
-        
+
+        # Weitere HE-Ergebnisdatenbanken zum Vergleich mit der ausgewählten (Bezugslauf)
+        if 'vergleich_ErgHE' in self.config:
+            vergleich_ErgHE = self.config['vergleich_ErgHE']
+        else:
+            vergleich_ErgHE = []
+        self.dlg_lz.lw_vergleichHeDB.clear()
+        for filename in vergleich_ErgHE:
+            self.dlg_lz.lw_vergleichHeDB.addItem(filename)
+
         # show the dialog
         self.dlg_lz.show()
         # Run the dialog event loop
@@ -367,6 +482,17 @@ class ImportFromHE:
             database_ErgHE = self.dlg_lz.tf_heDB.text()
             qmlfileResults =  self.dlg_lz.tf_qmlfile.text()
 
+            # Vergleichsliste ohne Doppel und ohne den Bezugslauf
+            vergleich_ErgHE = []
+            bezug = os.path.normcase(os.path.abspath(database_ErgHE))
+            pfade = [bezug]
+            for nr in range(self.dlg_lz.lw_vergleichHeDB.count()):
+                filename = self.dlg_lz.lw_vergleichHeDB.item(nr).text()
+                pfad = os.path.normcase(os.path.abspath(filename))
+                if pfad not in pfade:
+                    pfade.append(pfad)
+                    vergleich_ErgHE.append(filename)
+
             if self.dlg_lz.rb_uebh.isChecked():
                 qml_choice = u'uebh'
             elif self.dlg_lz.rb_uebvol.isChecked():
@@ -384,10 +510,17 @@ class ImportFromHE:
             self.config['database_ErgHE'] = database_ErgHE
             self.config['qmlfileResults'] = qmlfileResults
             self.config['qml_choice'] = qml_choice
+            self.config['vergleich_ErgHE'] = vergleich_ErgHE
 
             with open(self.configfil, 'w') as fileconfig:
                 fileconfig.write(json.dumps(self.config))
 
             # Start der Verarbeitung
 
-            importResults(database_ErgHE, database_QKan, qml_choice, qmlfileResults, epsg)
+            if vergleich_ErgHE:
+                laeufe = importResultsMehrfach([database_ErgHE] + vergleich_ErgHE, database_QKan, epsg,
+                                               bezug=database_ErgHE)
+                if laeufe:
+                    vergleichslayer(database_QKan, laeufe[database_ErgHE], qml_choice, qmlfileResults)
+            else:
+                importResults(database_ErgHE, database_QKan, qml_choice, qmlfileResults, epsg)
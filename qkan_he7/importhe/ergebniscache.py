@@ -0,0 +1,270 @@
+# -*- coding: utf-8 -*-
+
+'''
+
+  Zwischenspeicher der Simulationsergebnisse
+  ==========================================
+
+  Die Ergebnisse jeder HE-Ergebnisdatenbank werden in der QKan-Datenbank unter einem
+  Fingerabdruck (Pfad sowie Anzahl und Summen der importierten Ergebniswerte) gespeichert.
+  Änderungszeit und Dateikopf eignen sich dafür nicht, da Firebird bei jeder Transaktion,
+  auch beim Lesen, in die erste Seite der Datenbank schreibt. Die Tabellen ResultsSch und ResultsHal enthalten dazu die Spalte lauf, die
+  Tabelle ResultsLaeufe verzeichnet die gespeicherten Läufe. Wird eine bereits importierte,
+  unveränderte Ergebnisdatenbank erneut gewählt, werden nur die Layer auf diesen Lauf
+  umgeschaltet. Ältere Stände derselben Datei werden beim Import eines neuen Standes gelöscht.
+
+  Für den Vergleich mehrerer Läufe (Szenarien) werden Sichten über die zuletzt gemeinsam
+  importierten Läufe angelegt (Spalte vergleich in ResultsLaeufe): Maximum je Schacht bzw. Haltung
+  und Differenz jedes Laufes zum Bezugslauf. Weitere gespeicherte Läufe bleiben unberücksichtigt.
+
+  | Dateiname            : ergebniscache.py
+  | Date                 : Oktober 2018
+  | Copyright            : (C) 2018 by Joerg Hoettges
+  | Email                : hoettges@fh-aachen.de
+  | git sha              : $Format:%H$
+
+  This program is free software; you can redistribute it and/or modify
+  it under the terms of the GNU General Public License as published by
+  the Free Software Foundation; either version 2 of the License, or
+  (at your option) any later version.
+
+'''
+
+import hashlib
+import json
+import logging
+import os
+import time
+
+logger = logging.getLogger(u'QKan')
+
+# Kennwerte der Ergebnistabellen für den Fingerabdruck. Sie umfassen alle importierten Werte
+# und ändern sich nur mit einer neuen Simulation.
+kennwerte_ergebnis = [
+    (u'LAU_MAX_S', u'count(*), sum(UEBERSTAUVOLUMEN)'),
+    (u'LANGZEITKNOTEN', u'count(*), sum(HAEUFIGKEITUEBERSTAU), sum(ANZAHLUEBERSTAU)'),
+    (u'LAU_MAX_EL', u'count(*), sum(AUSLASTUNG), sum(DURCHFLUSS), sum(GESCHWINDIGKEIT), '
+                    u'sum(WASSERSTANDOBEN), sum(WASSERSTANDUNTEN)'),
+    (u'LANGZEITKANTEN', u'count(*), sum(HAEUFIGKEITVOLLFUELLUNG), sum(ANZAHLVOLLFUELLUNG)')]
+
+# Ergebnistabellen mit Lauf und Schlüsselspalte
+ergebnistabellen = [(u'ResultsSch', u'schnam'), (u'ResultsHal', u'haltnam')]
+
+
+def fingerabdruck(dbHE, database_HE):
+    '''Kennung eines Standes der HE-Ergebnisdatenbank. Sie wird aus dem Pfad und den Kennwerten
+    der Ergebnistabellen (kennwerte_ergebnis) gebildet und bleibt beim Lesen unverändert.
+
+    :dbHE:          Datenbankobjekt der HE-Ergebnisdatenbank
+    :type dbHE:     FBConnection
+
+    :database_HE:   Pfad zur HE-Ergebnisdatenbank
+    :type database_HE: string
+
+    :returns:       (Kennung als Hex-String, Größe, Änderungszeit) oder None im Fehlerfall
+    :rtype:         tuple
+    '''
+    merkmale = [os.path.normcase(os.path.abspath(database_HE))]
+    for tabelle, kennwerte in kennwerte_ergebnis:
+        if not dbHE.sql(u'SELECT {} FROM {}'.format(kennwerte, tabelle), u'ergebniscache.fingerabdruck'):
+            return None
+        merkmale.append([u'{}'.format(wert) for wert in dbHE.fetchone()])
+    kennung = hashlib.md5(json.dumps(merkmale).encode('utf-8')).hexdigest()
+    stat = os.stat(database_HE)
+    return kennung, stat.st_size, time.strftime(u'%Y-%m-%d %H:%M:%S', time.localtime(stat.st_mtime))
+
+
+def cache_anlegen(dbQK):
+    '''Legt die Tabelle der Läufe an und ergänzt die Ergebnistabellen um die Spalte lauf.
+    Ergebnisse ohne Lauf (Import vor Einführung des Zwischenspeichers) werden gelöscht.
+
+    Die Ergebnistabellen müssen bereits angelegt sein.
+
+    :returns:   Erfolg
+    :rtype:     Boolean
+    '''
+    sql = u'''CREATE TABLE IF NOT EXISTS ResultsLaeufe(
+            pk INTEGER PRIMARY KEY AUTOINCREMENT,
+            lauf TEXT UNIQUE,
+            database_HE TEXT,
+            groesse INTEGER,
+            geaendert TEXT,
+            kommentar TEXT,
+            bezug INTEGER DEFAULT 0,
+            vergleich INTEGER DEFAULT 0,
+            createdat TEXT DEFAULT CURRENT_TIMESTAMP)'''
+    if not dbQK.sql(sql, u'ergebniscache.cache_anlegen (1)'):
+        return False
+
+    if not dbQK.sql(u'PRAGMA table_info(ResultsLaeufe)', u'ergebniscache.cache_anlegen (2)'):
+        return False
+    spalten = [attr[1] for attr in dbQK.fetchall()]
+    for spalte in (u'bezug', u'vergleich'):
+        if spalte not in spalten:
+            if not dbQK.sql(u'ALTER TABLE ResultsLaeufe ADD COLUMN {} INTEGER DEFAULT 0'.format(spalte),
+                            u'ergebniscache.cache_anlegen (3)'):
+                return False
+
+    for tabelle, spalte in ergebnistabellen:
+        if not dbQK.sql(u'PRAGMA table_info({})'.format(tabelle), u'ergebniscache.cache_anlegen (2)'):
+            return False
+        if u'lauf' not in [attr[1] for attr in dbQK.fetchall()]:
+            logger.debug(u'Ergebniscache: Spalte lauf in {} ergänzt'.format(tabelle))
+            for sql in (u'ALTER TABLE {} ADD COLUMN lauf TEXT'.format(tabelle),
+                        u'DELETE FROM {}'.format(tabelle)):
+                if not dbQK.sql(sql, u'ergebniscache.cache_anlegen (3)'):
+                    return False
+        sql = u'CREATE INDEX IF NOT EXISTS {0}_lauf ON {0} (lauf, {1})'.format(tabelle, spalte)
+        if not dbQK.sql(sql, u'ergebniscache.cache_anlegen (4)'):
+            return False
+    return True
+
+
+def lauf_vorhanden(dbQK, lauf):
+    '''Prüft, ob die Ergebnisse zum Lauf bereits gespeichert sind.
+
+    :returns:   True, falls vorhanden, None im Fehlerfall
+    :rtype:     Boolean
+    '''
+    if not dbQK.sql(u"SELECT count(*) FROM ResultsLaeufe WHERE lauf = '{}'".format(lauf),
+                    u'ergebniscache.lauf_vorhanden'):
+        return None
+    return dbQK.fetchone()[0] > 0
+
+
+def lauf_loeschen(dbQK, lauf):
+    '''Löscht die Ergebnisse eines Laufes (ohne commit).
+
+    :returns:   Erfolg
+    :rtype:     Boolean
+    '''
+    for tabelle in [tab for tab, spalte in ergebnistabellen] + [u'ResultsLaeufe']:
+        if not dbQK.sql(u"DELETE FROM {} WHERE lauf = '{}'".format(tabelle, lauf), u'ergebniscache.lauf_loeschen'):
+            return False
+    return True
+
+
+def lauf_eintragen(dbQK, lauf, database_HE, groesse, geaendert):
+    '''Verzeichnet einen neu importierten Lauf und löscht ältere Stände derselben
+    HE-Ergebnisdatenbank (ohne commit).
+
+    :returns:   Erfolg
+    :rtype:     Boolean
+    '''
+    if not dbQK.sql(u"SELECT lauf, database_HE FROM ResultsLaeufe WHERE lauf <> '{}'".format(lauf),
+                    u'ergebniscache.lauf_eintragen (1)'):
+        return False
+    pfad = os.path.normcase(os.path.abspath(database_HE))
+    veraltet = [alt for alt, datei in dbQK.fetchall()
+                if datei is not None and os.path.normcase(os.path.abspath(datei)) == pfad]
+    for alt in veraltet:
+        logger.debug(u'Ergebniscache: veralteter Lauf {} von {} gelöscht'.format(alt, database_HE))
+        if not lauf_loeschen(dbQK, alt):
+            return False
+
+    sql = u"""INSERT OR REPLACE INTO ResultsLaeufe (lauf, database_HE, groesse, geaendert, kommentar)
+              VALUES ('{lauf}', '{datei}', {groesse}, '{geaendert}', '{kommentar}')""".format(
+        lauf=lauf, datei=database_HE.replace(u"'", u"''"), groesse=groesse, geaendert=geaendert,
+        kommentar=os.path.basename(database_HE).replace(u"'", u"''"))
+    return dbQK.sql(sql, u'ergebniscache.lauf_eintragen (2)')
+
+
+def bezug_setzen(dbQK, lauf):
+    '''Legt den Bezugslauf für die Differenzen fest (ohne commit).
+
+    :returns:   Erfolg
+    :rtype:     Boolean
+    '''
+    sql = u"UPDATE ResultsLaeufe SET bezug = CASE WHEN lauf = '{}' THEN 1 ELSE 0 END".format(lauf)
+    return dbQK.sql(sql, u'ergebniscache.bezug_setzen')
+
+
+def vergleich_setzen(dbQK, laeufe):
+    '''Legt die Läufe fest, die in den Sichten zum Vergleich berücksichtigt werden (ohne commit).
+
+    :laeufe:    Kennungen der Läufe
+    :type laeufe: list
+
+    :returns:   Erfolg
+    :rtype:     Boolean
+    '''
+    sql = u"UPDATE ResultsLaeufe SET vergleich = CASE WHEN lauf IN ('{}') THEN 1 ELSE 0 END".format(
+        u"', '".join(laeufe))
+    return dbQK.sql(sql, u'ergebniscache.vergleich_setzen')
+
+
+# Sichten zum Vergleich der Läufe: Name -> (Abfrage, Basistabelle). Die Geometrie wird aus einem
+# Datensatz der Basistabelle übernommen, dessen pk als rowid der Sicht dient.
+vergleichssichten = [
+    (u'ResultsSch_Maximum', u'''
+        SELECT rs.pk AS pk, rs.schnam AS schnam, mx.anzahl AS anzahl_laeufe,
+            mx.uebstauhaeuf AS uebstauhaeuf, mx.uebstauanz AS uebstauanz, mx.maxuebstauvol AS maxuebstauvol,
+            rs.geom AS geom
+        FROM ResultsSch AS rs
+        JOIN (SELECT min(pk) AS pk, count(*) AS anzahl, max(uebstauhaeuf) AS uebstauhaeuf,
+                max(uebstauanz) AS uebstauanz, max(maxuebstauvol) AS maxuebstauvol
+              FROM ResultsSch
+              WHERE lauf IN (SELECT lauf FROM ResultsLaeufe WHERE vergleich = 1)
+              GROUP BY schnam) AS mx
+        ON rs.pk = mx.pk''', u'ResultsSch'),
+    (u'ResultsHal_Maximum', u'''
+        SELECT rh.pk AS pk, rh.haltnam AS haltnam, mx.anzahl AS anzahl_laeufe,
+            mx.auslastung AS auslastung, mx.durchfluss AS durchfluss, mx.geschwindigkeit AS geschwindigkeit,
+            mx.vollfuellhaeuf AS vollfuellhaeuf, rh.geom AS geom
+        FROM ResultsHal AS rh
+        JOIN (SELECT min(pk) AS pk, count(*) AS anzahl, max(auslastung) AS auslastung,
+                max(durchfluss) AS durchfluss, max(geschwindigkeit) AS geschwindigkeit,
+                max(vollfuellhaeuf) AS vollfuellhaeuf
+              FROM ResultsHal
+              WHERE lauf IN (SELECT lauf FROM ResultsLaeufe WHERE vergleich = 1)
+              GROUP BY haltnam) AS mx
+        ON rh.pk = mx.pk''', u'ResultsHal'),
+    (u'ResultsSch_Differenz', u'''
+        SELECT rs.pk AS pk, rs.lauf AS lauf, la.kommentar AS laufname, rs.schnam AS schnam,
+            rs.maxuebstauvol AS maxuebstauvol, bz.maxuebstauvol AS bezug_maxuebstauvol,
+            rs.maxuebstauvol - bz.maxuebstauvol AS diff_maxuebstauvol,
+            rs.uebstauhaeuf - bz.uebstauhaeuf AS diff_uebstauhaeuf,
+            rs.geom AS geom
+        FROM ResultsSch AS rs
+        JOIN ResultsLaeufe AS la ON la.lauf = rs.lauf AND la.vergleich = 1
+        JOIN ResultsLaeufe AS lb ON lb.bezug = 1
+        LEFT JOIN ResultsSch AS bz ON bz.lauf = lb.lauf AND bz.schnam = rs.schnam
+        WHERE rs.lauf <> lb.lauf''', u'ResultsSch'),
+    (u'ResultsHal_Differenz', u'''
+        SELECT rh.pk AS pk, rh.lauf AS lauf, la.kommentar AS laufname, rh.haltnam AS haltnam,
+            rh.auslastung AS auslastung, bz.auslastung AS bezug_auslastung,
+            rh.auslastung - bz.auslastung AS diff_auslastung,
+            rh.durchfluss - bz.durchfluss AS diff_durchfluss,
+            rh.geschwindigkeit - bz.geschwindigkeit AS diff_geschwindigkeit,
+            rh.geom AS geom
+        FROM ResultsHal AS rh
+        JOIN ResultsLaeufe AS la ON la.lauf = rh.lauf AND la.vergleich = 1
+        JOIN ResultsLaeufe AS lb ON lb.bezug = 1
+        LEFT JOIN ResultsHal AS bz ON bz.lauf = lb.lauf AND bz.haltnam = rh.haltnam
+        WHERE rh.lauf <> lb.lauf''', u'ResultsHal'),
+]
+
+
+def sichten_anlegen(dbQK):
+    '''Legt die Sichten zum Vergleich der Läufe an und registriert deren Geometrie, so dass
+    sie als Layer geladen werden können.
+
+    :returns:   Erfolg
+    :rtype:     Boolean
+    '''
+    if not dbQK.sql(u"SELECT count(*) FROM sqlite_master WHERE name = 'views_geometry_columns'",
+                    u'ergebniscache.sichten_anlegen (1)'):
+        return False
+    registrieren = dbQK.fetchone()[0] > 0
+
+    for sicht, sql, tabelle in vergleichssichten:
+        for anw in (u'DROP VIEW IF EXISTS {}'.format(sicht), u'CREATE VIEW {} AS {}'.format(sicht, sql)):
+            if not dbQK.sql(anw, u'ergebniscache.sichten_anlegen (2)'):
+                return False
+        if registrieren:
+            sql = u"""INSERT OR REPLACE INTO views_geometry_columns
+                      (view_name, view_geometry, view_rowid, f_table_name, f_geometry_column, read_only)
+                      VALUES ('{}', 'geom', 'pk', '{}', 'geom', 1)""".format(sicht.lower(), tabelle.lower())
+            if not dbQK.sql(sql, u'ergebniscache.sichten_anlegen (3)'):
+                return False
+    return True
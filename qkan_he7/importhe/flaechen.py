@@ -0,0 +1,364 @@
+# -*- coding: utf-8 -*-
+
+'''
+
+  Import der Flächendaten aus HYSTEM-EXTRAN
+  =========================================
+
+  Import der Tabellen FLAECHE, EINZELEINLEITER, AUSSENGEBIET und BODENKLASSE, so dass ein mit
+  k_qkhe exportiertes Modell wieder vollständig nach QKan übernommen werden kann.
+
+  Da diese Tabellen bei großen Gebieten den größten Teil der Daten ausmachen, werden sie nicht
+  vollständig gelesen, sondern paketweise mit fetchmany. Jedes Paket wird mit den Geo-Objekten
+  (Modul geometrie) in einem Durchgang aufbereitet und über den StapelSchreiber geschrieben.
+  Das commit erfolgt wie beim übrigen Import erst am Ende durch den Aufrufer.
+
+  HYSTEM-EXTRAN verwaltet zu Flächen und Außengebieten keine Umringe. Als Geo-Objekt wird deshalb
+  ein Kreis mit der in HE angegebenen Größe erzeugt:
+  - Flächen liegen neben der Mitte ihrer Haltung, mehrere Flächen einer Haltung übereinander.
+    Die Verknüpfung (linkfl) führt vom Mittelpunkt der Fläche zur Mitte der Haltung.
+  - Außengebiete liegen um den in HE angegebenen Punkt.
+  Einzeleinleiter werden als Punkt mit einer Verknüpfung (linksw) zur Mitte der Haltung angelegt.
+
+  | Dateiname            : flaechen.py
+  | Date                 : Oktober 2018
+  | Copyright            : (C) 2018 by Joerg Hoettges
+  | Email                : hoettges@fh-aachen.de
+  | git sha              : $Format:%H$
+
+  This program is free software; you can redistribute it and/or modify
+  it under the terms of the GNU General Public License as published by
+  the Free Software Foundation; either version 2 of the License, or
+  (at your option) any later version.
+
+'''
+
+import logging
+
+from qkan.database.reflists import abflusstypen
+
+from geometrie import punkte, linien, kreise, radius
+
+logger = logging.getLogger(u'QKan')
+
+# Anzahl der Datensätze, die je Paket gelesen und geschrieben werden
+paketgroesse = 5000
+
+# Mitte der Haltungen zu den Flächen und Einzeleinleitern
+_knoten_oben = u'''(SELECT NAME, XKOORDINATE, YKOORDINATE FROM SCHACHT
+         UNION SELECT NAME, XKOORDINATE, YKOORDINATE FROM SPEICHERSCHACHT)'''
+_knoten_unten = u'''(SELECT NAME, XKOORDINATE, YKOORDINATE FROM SCHACHT
+         UNION SELECT NAME, XKOORDINATE, YKOORDINATE FROM AUSLASS
+         UNION SELECT NAME, XKOORDINATE, YKOORDINATE FROM SPEICHERSCHACHT)'''
+_haltungsmitte = u'''
+    LEFT JOIN ROHR ON {tab}.{feld} = ROHR.NAME
+    LEFT JOIN {oben} AS SO ON ROHR.SCHACHTOBEN = SO.NAME
+    LEFT JOIN {unten} AS SU ON ROHR.SCHACHTUNTEN = SU.NAME'''
+
+sql_flaechen = u'''
+    SELECT
+        FLAECHE.NAME AS flnam,
+        FLAECHE.HALTUNG AS haltnam,
+        FLAECHE.GROESSE AS flaeche,
+        FLAECHE.REGENSCHREIBER AS regenschreiber,
+        FLAECHE.BERECHNUNGSPEICHERKONSTANTE AS he_typ,
+        FLAECHE.ANZAHLSPEICHER AS speicherzahl,
+        FLAECHE.SPEICHERKONSTANTE AS speicherkonst,
+        FLAECHE.SCHWERPUNKTLAUFZEIT AS fliesszeitschwerp,
+        FLAECHE.FLIESSZEITOBERFLAECHE AS fliesszeitoberfl,
+        FLAECHE.LAENGSTEFLIESSZEITKANAL AS fliesszeitkanal,
+        FLAECHE.PARAMETERSATZ AS abflussparameter,
+        FLAECHE.NEIGUNGSKLASSE AS neigkl,
+        FLAECHE.KOMMENTAR AS kommentar,
+        FLAECHE.LASTMODIFIED AS createdat,
+        (SO.XKOORDINATE + SU.XKOORDINATE) / 2 AS xha,
+        (SO.YKOORDINATE + SU.YKOORDINATE) / 2 AS yha
+    FROM FLAECHE''' + _haltungsmitte.format(tab=u'FLAECHE', feld=u'HALTUNG', oben=_knoten_oben,
+                                            unten=_knoten_unten)
+
+sql_einleiter = u'''
+    SELECT
+        EINZELEINLEITER.NAME AS elnam,
+        EINZELEINLEITER.ROHR AS haltnam,
+        EINZELEINLEITER.XKOORDINATE AS xel,
+        EINZELEINLEITER.YKOORDINATE AS yel,
+        EINZELEINLEITER.HERKUNFT AS herkunft,
+        EINZELEINLEITER.EINWOHNER AS ew,
+        EINZELEINLEITER.ZUFLUSSDIREKT AS zufluss,
+        EINZELEINLEITER.LASTMODIFIED AS createdat,
+        (SO.XKOORDINATE + SU.XKOORDINATE) / 2 AS xha,
+        (SO.YKOORDINATE + SU.YKOORDINATE) / 2 AS yha
+    FROM EINZELEINLEITER''' + _haltungsmitte.format(tab=u'EINZELEINLEITER', feld=u'ROHR', oben=_knoten_oben,
+                                                    unten=_knoten_unten)
+
+sql_aussengebiete = u'''
+    SELECT
+        NAME AS gebnam,
+        SCHACHT AS schnam,
+        HOEHEOBEN AS hoeheob,
+        HOEHEUNTEN AS hoeheun,
+        XKOORDINATE AS xag,
+        YKOORDINATE AS yag,
+        GESAMTFLAECHE AS flaeche,
+        CNMITTELWERT AS cn,
+        BASISZUFLUSS AS basisabfluss,
+        FLIESSLAENGE AS fliessweg,
+        REGENSCHREIBER AS regenschreiber,
+        KOMMENTAR AS kommentar,
+        LASTMODIFIED AS createdat
+    FROM AUSSENGEBIET'''
+
+sql_bodenklassen = u'''
+    SELECT
+        NAME AS bknam,
+        INFILTRATIONSRATEANFANG AS infiltrationsrateanfang,
+        INFILTRATIONSRATEENDE AS infiltrationsrateende,
+        INFILTRATIONSRATESTART AS infiltrationsratestart,
+        RUECKGANGSKONSTANTE AS rueckgangskonstante,
+        REGENERATIONSKONSTANTE AS regenerationskonstante,
+        SAETTIGUNGSWASSERGEHALT AS saettigungswassergehalt,
+        KOMMENTAR AS kommentar,
+        LASTMODIFIED AS createdat
+    FROM BODENKLASSE'''
+
+
+def _text(wert):
+    '''Text aus der HE-Datenbank (iso-8859-1). Fehlende Werte bleiben 'NULL'.'''
+    if isinstance(wert, bytes):
+        return wert.decode('iso-8859-1')
+    return wert
+
+
+def _paketweise(dbHE, sql, repref, verarbeiten, abfrage=None, namensraum=None):
+    '''Führt die Abfrage aus und übergibt das Ergebnis paketweise an verarbeiten.
+
+    :verarbeiten:   Wird je Paket mit der Liste der Datensätze aufgerufen, fehlende Werte sind
+                    durch 'NULL' ersetzt. Liefert False im Fehlerfall.
+    :type verarbeiten: function
+
+    :abfrage:       Name der Abfrage für die Umbenennung durch den Namensraum
+    :namensraum:    Umbenennung beim Zusammenführen mehrerer HE-Datenbanken (Modul zusammenfuehren)
+
+    :returns:       Anzahl der Datensätze oder None im Fehlerfall
+    :rtype:         int
+    '''
+    if not dbHE.sql(sql, repref):
+        return None
+    anzahl = 0
+    while True:
+        daten = dbHE.curfb.fetchmany(paketgroesse)
+        if not daten:
+            break
+        if namensraum is not None:
+            daten = namensraum.anwenden(abfrage, daten)
+        daten = [[u'NULL' if el is None else el for el in attr] for attr in daten]
+        if not verarbeiten(daten):
+            return None
+        anzahl += len(daten)
+        logger.debug(u'{}: {} Datensätze'.format(repref, anzahl))
+    return anzahl
+
+
+def importFlaechen(dbHE, schreiber, epsg, geoformat, geo_param, namensraum=None):
+    '''Import der Flächen in die Tabellen flaechen und linkfl.
+
+    :dbHE:          Verbindung zur HE-Datenbank
+    :type dbHE:     FBConnection
+
+    :schreiber:     Stapel für die QKan-Datenbank
+    :type schreiber: StapelSchreiber
+
+    :epsg:          EPSG-Code der Geo-Objekte
+    :geoformat:     'spatialite' oder 'wkb', siehe Modul geometrie
+    :geo_param:     Platzhalter für ein Geo-Objekt in den INSERT-Anweisungen
+    :namensraum:    Umbenennung beim Zusammenführen mehrerer HE-Datenbanken (Modul zusammenfuehren)
+
+    :returns:       Anzahl der Flächen oder None im Fehlerfall
+    :rtype:         int
+    '''
+
+    # Abflusstyp in QKan zur BERECHNUNGSPEICHERKONSTANTE in HE
+    qkan_fltyp_ref = dict((he_typ, abflusstyp) for abflusstyp, he_typ in abflusstypen('he').items())
+
+    vorhanden_fl = schreiber.vorhandene(u'flaechen', u'flnam', u'importflaechen_he (1)')
+    vorhanden_lf = schreiber.vorhandene(u'linkfl', u'flnam', u'importflaechen_he (2)')
+    if vorhanden_fl is None or vorhanden_lf is None:
+        return None
+
+    # Flächen einer Haltung werden übereinander angeordnet: Haltung -> bereits belegte Höhe
+    belegt = {}
+
+    sql_fl = u"""INSERT INTO flaechen (flnam, neigkl, regenschreiber, abflussparameter, aufteilen,
+                    kommentar, createdat, geom)
+        VALUES (?, ?, ?, ?, 'nein', ?, ?, {geom})""".format(geom=geo_param)
+    sql_lf = u"""INSERT INTO linkfl (flnam, haltnam, abflusstyp, speicherzahl, speicherkonst,
+                    fliesszeitflaeche, fliesszeitkanal, glink)
+        VALUES (?, ?, ?, ?, ?, ?, ?, {geom})""".format(geom=geo_param)
+
+    def verarbeiten(daten):
+        flaechen = []
+        links = []
+        kreis = []
+        glink = []
+        for (flnam, haltnam, flaeche, regenschreiber, he_typ, speicherzahl, speicherkonst,
+             fliesszeitschwerp, fliesszeitoberfl, fliesszeitkanal, abflussparameter, neigkl,
+             kommentar, createdat, xha, yha) in daten:
+
+            (flnam, haltnam, regenschreiber, abflussparameter, kommentar) = [
+                _text(tt) for tt in (flnam, haltnam, regenschreiber, abflussparameter, kommentar)]
+
+            # Feld "fliesszeitflaeche" in QKan entspricht je nach he_typ zwei unterschiedlichen Feldern in HE
+            if he_typ == 1:
+                fliesszeitflaeche = fliesszeitoberfl
+            elif he_typ == 2:
+                fliesszeitflaeche = fliesszeitschwerp
+            else:
+                fliesszeitflaeche = u'NULL'
+            abflusstyp = qkan_fltyp_ref.get(he_typ, u'NULL')
+
+            # Ersatzgeometrie: Kreis mit der Größe der Fläche (ha) neben der Haltungsmitte
+            r = None if flaeche == u'NULL' else radius(float(flaeche) * 10000.)
+            if r is None or xha == u'NULL' or yha == u'NULL':
+                kreis.append((u'NULL', u'NULL', u'NULL'))
+                glink.append((u'NULL', u'NULL', u'NULL', u'NULL'))
+            else:
+                xfl = float(xha)
+                yfl = float(yha) + belegt.get(haltnam, 0.) + r
+                belegt[haltnam] = belegt.get(haltnam, 0.) + 2. * r
+                kreis.append((xfl, yfl, r))
+                glink.append((xfl, yfl, xha, yha))
+
+            flaechen.append((flnam, neigkl, regenschreiber, abflussparameter, kommentar, createdat))
+            links.append((flnam, haltnam, abflusstyp, speicherzahl, speicherkonst,
+                          fliesszeitflaeche, fliesszeitkanal))
+
+        namen = [werte[0] for werte in flaechen]
+        if not schreiber.ersetzen(u'flaechen', u'flnam', namen, u'importflaechen_he (3)', vorhanden_fl):
+            return False
+        if not schreiber.ersetzen(u'linkfl', u'flnam', namen, u'importflaechen_he (4)', vorhanden_lf):
+            return False
+        for geom, werte in zip(kreise(kreis, epsg, geoformat), flaechen):
+            schreiber.einfuegen(sql_fl, werte + (geom,))
+        for geom, werte in zip(linien(glink, epsg, geoformat), links):
+            schreiber.einfuegen(sql_lf, werte + (geom,))
+        return schreiber.schreiben(u'importflaechen_he (5)')
+
+    return _paketweise(dbHE, sql_flaechen, u'importflaechen_he (0)', verarbeiten, u'flaechen', namensraum)
+
+
+def importEinleiter(dbHE, schreiber, epsg, geoformat, geo_param, namensraum=None):
+    '''Import der Einzeleinleiter in die Tabellen einleit und linksw. Parameter siehe importFlaechen.
+
+    :returns:       Anzahl der Einzeleinleiter oder None im Fehlerfall
+    :rtype:         int
+    '''
+
+    vorhanden_el = schreiber.vorhandene(u'einleit', u'elnam', u'importeinleiter_he (1)')
+    vorhanden_lk = schreiber.vorhandene(u'linksw', u'elnam', u'importeinleiter_he (2)')
+    if vorhanden_el is None or vorhanden_lk is None:
+        return None
+
+    sql_el = u"""INSERT INTO einleit (elnam, haltnam, ew, zufluss, createdat, geom)
+        VALUES (?, ?, ?, ?, ?, {geom})""".format(geom=geo_param)
+    sql_lk = u"""INSERT INTO linksw (elnam, haltnam, glink)
+        VALUES (?, ?, {geom})""".format(geom=geo_param)
+
+    def verarbeiten(daten):
+        einleiter = []
+        punkt = []
+        glink = []
+        for (elnam, haltnam, xel, yel, herkunft, ew, zufluss, createdat, xha, yha) in daten:
+
+            (elnam, haltnam) = [_text(tt) for tt in (elnam, haltnam)]
+
+            # HERKUNFT 1: direkter Zufluss, sonst Einwohner
+            if herkunft == 1:
+                ew = u'NULL'
+            else:
+                zufluss = u'NULL'
+
+            einleiter.append((elnam, haltnam, ew, zufluss, createdat))
+            punkt.append((xel, yel))
+            glink.append((xel, yel, xha, yha))
+
+        namen = [werte[0] for werte in einleiter]
+        if not schreiber.ersetzen(u'einleit', u'elnam', namen, u'importeinleiter_he (3)', vorhanden_el):
+            return False
+        if not schreiber.ersetzen(u'linksw', u'elnam', namen, u'importeinleiter_he (4)', vorhanden_lk):
+            return False
+        for geom, werte in zip(punkte(punkt, epsg, geoformat), einleiter):
+            schreiber.einfuegen(sql_el, werte + (geom,))
+        for geom, werte in zip(linien(glink, epsg, geoformat), einleiter):
+            schreiber.einfuegen(sql_lk, werte[:2] + (geom,))
+        return schreiber.schreiben(u'importeinleiter_he (5)')
+
+    return _paketweise(dbHE, sql_einleiter, u'importeinleiter_he (0)', verarbeiten, u'einleiter', namensraum)
+
+
+def importAussengebiete(dbHE, schreiber, epsg, geoformat, geo_param, namensraum=None):
+    '''Import der Außengebiete in die Tabelle aussengebiete. Parameter siehe importFlaechen.
+
+    :returns:       Anzahl der Außengebiete oder None im Fehlerfall
+    :rtype:         int
+    '''
+
+    vorhanden = schreiber.vorhandene(u'aussengebiete', u'gebnam', u'importaussengebiete_he (1)')
+    if vorhanden is None:
+        return None
+
+    sql = u"""INSERT INTO aussengebiete (gebnam, schnam, hoeheob, hoeheun, fliessweg, basisabfluss, cn,
+                    regenschreiber, kommentar, createdat, geom)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, {geom})""".format(geom=geo_param)
+
+    def verarbeiten(daten):
+        gebiete = []
+        kreis = []
+        for (gebnam, schnam, hoeheob, hoeheun, xag, yag, flaeche, cn, basisabfluss, fliessweg,
+             regenschreiber, kommentar, createdat) in daten:
+
+            (gebnam, schnam, regenschreiber, kommentar) = [
+                _text(tt) for tt in (gebnam, schnam, regenschreiber, kommentar)]
+
+            # Ersatzgeometrie: Kreis mit der Größe des Außengebietes (ha) um den Punkt aus HE
+            r = None if flaeche == u'NULL' else radius(float(flaeche) * 10000.)
+            kreis.append((xag, yag, u'NULL' if r is None else r))
+            gebiete.append((gebnam, schnam, hoeheob, hoeheun, fliessweg, basisabfluss, cn,
+                            regenschreiber, kommentar, createdat))
+
+        if not schreiber.ersetzen(u'aussengebiete', u'gebnam', [werte[0] for werte in gebiete],
+                                  u'importaussengebiete_he (2)', vorhanden):
+            return False
+        for geom, werte in zip(kreise(kreis, epsg, geoformat), gebiete):
+            schreiber.einfuegen(sql, werte + (geom,))
+        return schreiber.schreiben(u'importaussengebiete_he (3)')
+
+    return _paketweise(dbHE, sql_aussengebiete, u'importaussengebiete_he (0)', verarbeiten, u'aussengebiete',
+                       namensraum)
+
+
+def importBodenklassen(dbHE, schreiber):
+    '''Import der Bodenklassen in die Tabelle bodenklassen.
+
+    :returns:       Anzahl der Bodenklassen oder None im Fehlerfall
+    :rtype:         int
+    '''
+
+    vorhanden = schreiber.vorhandene(u'bodenklassen', u'bknam', u'importbodenklassen_he (1)')
+    if vorhanden is None:
+        return None
+
+    sql = u"""INSERT INTO bodenklassen (bknam, infiltrationsrateanfang, infiltrationsrateende,
+                    infiltrationsratestart, rueckgangskonstante, regenerationskonstante,
+                    saettigungswassergehalt, kommentar, createdat)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"""
+
+    def verarbeiten(daten):
+        klassen = [tuple(_text(el) for el in attr) for attr in daten]
+        if not schreiber.ersetzen(u'bodenklassen', u'bknam', [werte[0] for werte in klassen],
+                                  u'importbodenklassen_he (2)', vorhanden):
+            return False
+        for werte in klassen:
+            schreiber.einfuegen(sql, werte)
+        return schreiber.schreiben(u'importbodenklassen_he (3)')
+
+    return _paketweise(dbHE, sql_bodenklassen, u'importbodenklassen_he (0)', verarbeiten)
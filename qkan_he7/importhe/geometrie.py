@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+
+'''
+
+  Erzeugung von Geo-Objekten für den Import
+  =========================================
+
+  Punkte, Linien und Kreise (als Multipolygon) werden für alle Datensätze einer Tabelle
+  gemeinsam als Binärobjekte erzeugt und beim Schreiben als Parameter gebunden. Damit entfällt
+  die Auswertung von MakePoint, MakeLine, MakeCircle in der Datenbank für jeden Datensatz und
+  die Koordinaten werden ohne Umweg über Text in voller Genauigkeit übernommen.
+
+  Unterstützt werden das interne BLOB-Format von SpatiaLite sowie WKB (z.B. für PostGIS mit
+  ST_GeomFromWKB). Die Binärobjekte werden über strukturierte NumPy-Arrays in einem Schritt
+  für alle Datensätze aufgebaut.
+
+  | Dateiname            : geometrie.py
+  | Date                 : Oktober 2018
+  | Copyright            : (C) 2018 by Joerg Hoettges
+  | Email                : hoettges@fh-aachen.de
+  | git sha              : $Format:%H$
+
+  This program is free software; you can redistribute it and/or modify
+  it under the terms of the GNU General Public License as published by
+  the Free Software Foundation; either version 2 of the License, or
+  (at your option) any later version.
+
+'''
+
+import math
+
+import numpy as np
+
+# In Python 2 werden Binärdaten von sqlite3 nur als buffer als BLOB gespeichert
+try:
+    blobtyp = buffer
+except NameError:
+    blobtyp = bytes
+
+# Geometrietypen (identisch in SpatiaLite und WKB)
+PUNKT = 1
+LINIE = 2
+POLYGON = 3
+MULTIPOLYGON = 6
+
+# Anzahl Segmente eines Kreises entsprechend MakeCircle in SpatiaLite (Schrittweite 10°)
+segmente_kreis = 36
+
+
+def _zahlen(werte):
+    '''Wandelt eine Liste von Koordinatentupeln in ein Float-Array um. Fehlende Werte
+    (None oder 'NULL') werden zu NaN.'''
+    return np.array([[np.nan if w is None or w == u'NULL' else float(w) for w in tupel]
+                     for tupel in werte], dtype='<f8')
+
+
+def _binaer(stuetzpunkte, typ, srid, geoformat):
+    '''Erzeugt die Binärobjekte zu einem Array der Stützpunkte.
+
+    :stuetzpunkte:      Array der Form (Anzahl Objekte, Anzahl Punkte, 2)
+    :typ:               PUNKT, LINIE oder MULTIPOLYGON (mit einem Polygon aus einem Ring)
+    :geoformat:         'spatialite' oder 'wkb'
+
+    :returns:           Liste der Binärobjekte, None für Objekte mit fehlenden Koordinaten
+    '''
+    anzahl, npunkte = stuetzpunkte.shape[0], stuetzpunkte.shape[1]
+    if anzahl == 0:
+        return []
+    spatialite = (geoformat == u'spatialite')
+
+    if spatialite:
+        felder = [('start', 'u1'), ('endian', 'u1'), ('srid', '<i4'), ('mbr', '<f8', (4,)),
+                  ('mbrende', 'u1'), ('typ', '<i4')]
+    else:
+        felder = [('endian', 'u1'), ('typ', '<i4')]
+    if typ == PUNKT:
+        felder.append(('xy', '<f8', (2,)))
+    elif typ == LINIE:
+        felder += [('npunkte', '<i4'), ('xy', '<f8', (npunkte, 2))]
+    else:
+        felder.append(('anzpoly', '<i4'))
+        if spatialite:
+            felder.append(('entity', 'u1'))
+        else:
+            felder.append(('endian_poly', 'u1'))
+        felder += [('polytyp', '<i4'), ('anzringe', '<i4'), ('npunkte', '<i4'), ('xy', '<f8', (npunkte, 2))]
+    if spatialite:
+        felder.append(('ende', 'u1'))
+
+    daten = np.zeros(anzahl, dtype=felder)
+    daten['endian'] = 1                     # little endian
+    daten['typ'] = typ
+    if typ == PUNKT:
+        daten['xy'] = stuetzpunkte[:, 0, :]
+    else:
+        daten['npunkte'] = npunkte
+        daten['xy'] = stuetzpunkte
+    if typ == MULTIPOLYGON:
+        daten['anzpoly'] = 1
+        daten['polytyp'] = POLYGON
+        daten['anzringe'] = 1
+        if spatialite:
+            daten['entity'] = 0x69
+        else:
+            daten['endian_poly'] = 1
+    if spatialite:
+        daten['start'] = 0x00
+        daten['srid'] = srid
+        daten['mbr'][:, 0:2] = stuetzpunkte.min(axis=1)
+        daten['mbr'][:, 2:4] = stuetzpunkte.max(axis=1)
+        daten['mbrende'] = 0x7C
+        daten['ende'] = 0xFE
+
+    gueltig = np.isfinite(stuetzpunkte).all(axis=2).all(axis=1)
+    laenge = daten.dtype.itemsize
+    puffer = daten.tobytes()
+    return [blobtyp(puffer[i * laenge:(i + 1) * laenge]) if gueltig[i] else None for i in range(anzahl)]
+
+
+def punkte(koordinaten, srid, geoformat=u'spatialite'):
+    '''Punkte aus einer Liste von (x, y)'''
+    xy = _zahlen(koordinaten)
+    return _binaer(xy.reshape(len(koordinaten), 1, 2), PUNKT, srid, geoformat)
+
+
+def linien(koordinaten, srid, geoformat=u'spatialite'):
+    '''Linien aus einer Liste von (x1, y1, x2, y2)'''
+    xy = _zahlen(koordinaten)
+    return _binaer(xy.reshape(len(koordinaten), 2, 2), LINIE, srid, geoformat)
+
+
+def radius(flaeche):
+    '''Radius eines Kreises aus kreise, dessen Polygon die angegebene Fläche hat. Fehlende
+    oder nicht positive Flächen ergeben None.'''
+    if flaeche is None or flaeche == u'NULL' or float(flaeche) <= 0.:
+        return None
+    return math.sqrt(float(flaeche) / (segmente_kreis / 2. * math.sin(2. * math.pi / segmente_kreis)))
+
+
+def kreise(koordinaten, srid, geoformat=u'spatialite'):
+    '''Kreise als Multipolygon aus einer Liste von (x, y, radius). Die Stützpunkte entsprechen
+    MakeCircle in SpatiaLite.'''
+    xyr = _zahlen(koordinaten).reshape(len(koordinaten), 3)
+    winkel = np.radians(np.arange(segmente_kreis + 1) * 360. / segmente_kreis)
+    winkel[-1] = 0.                         # Ring exakt schließen
+    stuetzpunkte = np.empty((xyr.shape[0], segmente_kreis + 1, 2))
+    stuetzpunkte[:, :, 0] = xyr[:, 0:1] + xyr[:, 2:3] * np.cos(winkel)
+    stuetzpunkte[:, :, 1] = xyr[:, 1:2] + xyr[:, 2:3] * np.sin(winkel)
+    return _binaer(stuetzpunkte, MULTIPOLYGON, srid, geoformat)
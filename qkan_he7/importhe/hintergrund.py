@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+
+'''
+
+  Import aus HYSTEM-EXTRAN im Hintergrund
+  =======================================
+
+  Der Import der Kanaldaten (importKanaldatenDB bzw. importZusammenfuehrenDB) läuft in einem eigenen Thread mit eigenen
+  Verbindungen zur HE- und zur QKan-Datenbank, so dass QGIS währenddessen bedienbar bleibt.
+  In der Meldungsleiste werden die geschriebenen Tabellen mit der Anzahl der Datensätze
+  angezeigt. Über die Schaltfläche "Abbrechen" wird der Import nach der aktuellen Tabelle
+  beendet und die Transaktion zurückgesetzt.
+
+  Das Schreiben und Laden der Projektdatei (importAbschliessen) erfolgt anschließend wieder im
+  GUI-Thread.
+
+  Fehlermeldungen dürfen nicht aus dem Import-Thread in die Meldungsleiste geschrieben werden.
+  Die Importfunktion erhält deshalb statt fehlermeldung die Funktion melden, die die Meldungen
+  über ein Signal an den GUI-Thread weiterleitet. Dort werden sie nach dem Ende des Imports
+  angezeigt. SQL-Fehler der Verbindungen werden ebenfalls an melden übergeben (Modul verbindung).
+
+  | Dateiname            : hintergrund.py
+  | Date                 : Oktober 2018
+  | Copyright            : (C) 2018 by Joerg Hoettges
+  | Email                : hoettges@fh-aachen.de
+  | git sha              : $Format:%H$
+
+  This program is free software; you can redistribute it and/or modify
+  it under the terms of the GNU General Public License as published by
+  the Free Software Foundation; either version 2 of the License, or
+  (at your option) any later version.
+
+'''
+
+import logging
+
+from qgis.PyQt.QtCore import QObject, QThread, pyqtSignal
+from qgis.PyQt.QtGui import QProgressBar, QPushButton
+
+from qgis.gui import QgsMessageBar
+from qgis.utils import iface
+
+from import_from_he import importKanaldatenDB, importAbschliessen
+from zusammenfuehren import importZusammenfuehrenDB
+
+logger = logging.getLogger(u'QKan')
+
+
+class ImportArbeiter(QObject):
+    '''Führt die Importfunktion im Thread aus, in den das Objekt verschoben wurde.'''
+
+    # Tabelle, Anzahl der Datensätze, Schritt, Anzahl der Schritte
+    fortschritt = pyqtSignal(object, int, int, int)
+
+    # Titel und Text einer Fehlermeldung aus dem Import-Thread
+    fehler = pyqtSignal(unicode, unicode)
+
+    # Ergebnis der Importfunktion
+    fertig = pyqtSignal(object)
+
+    def __init__(self, funktion, parameter):
+        '''
+        :funktion:      Importfunktion mit den Parametern rueckmeldung, abbruch und melden
+                        (importKanaldatenDB, importZusammenfuehrenDB)
+        :type funktion: function
+
+        :parameter:     Schlüsselwortparameter für die Importfunktion
+        :type parameter: dict
+        '''
+        QObject.__init__(self)
+        self.funktion = funktion
+        self.parameter = parameter
+        self.abgebrochen = False
+
+    def abbrechen(self):
+        '''Fordert den Abbruch an. Der Import wird nach der aktuellen Tabelle beendet.'''
+        self.abgebrochen = True
+
+    def ausfuehren(self):
+        try:
+            ergebnis = self.funktion(rueckmeldung=self._melden, abbruch=lambda: self.abgebrochen,
+                                     melden=self._fehler, **self.parameter)
+        except BaseException as err:
+            logger.error(u'Import im Hintergrund: {}'.format(repr(err)))
+            ergebnis = None
+        self.fertig.emit(ergebnis)
+
+    def _melden(self, tabelle, anzahl, schritt, schritte):
+        self.fortschritt.emit(tabelle, anzahl, schritt, schritte)
+
+    def _fehler(self, title, text):
+        logger.error(u'Import im Hintergrund: {}: {}'.format(title, text))
+        self.fehler.emit(u'{}'.format(title), u'{}'.format(text))
+
+
+class ImportImHintergrund(QObject):
+    '''Startet den Import im Hintergrund und zeigt den Fortschritt in der Meldungsleiste an.
+
+    Das Objekt muss bis zum Ende des Imports referenziert bleiben (z.B. als Attribut des Plugins).
+    '''
+
+    def __init__(self, database_HE, database_QKan, projectfile, epsg, quellen=None, **optionen):
+        '''
+        :quellen:       weitere HE-Datenbanken, die mit database_HE zusammengeführt werden
+                        (importZusammenfuehrenDB). Bei None wird nur database_HE importiert.
+        :type quellen:  list
+
+        :optionen:      weitere Schlüsselwortparameter für importKanaldatenDB (dbtyp, massenimport,
+                        parallel_lesen, inkrementell, mit_flaechen) bzw. importZusammenfuehrenDB
+                        (strategie, dbtyp, massenimport, parallel_lesen, mit_flaechen)
+        '''
+        QObject.__init__(self)
+        self.database_QKan = database_QKan
+        self.projectfile = projectfile
+        self.fehlermeldungen = []           # (Titel, Text) aus dem Import-Thread
+
+        if quellen:
+            funktion = importZusammenfuehrenDB
+            parameter = dict(quellen=[database_HE] + list(quellen), database_QKan=database_QKan, epsg=epsg)
+        else:
+            funktion = importKanaldatenDB
+            parameter = dict(database_HE=database_HE, database_QKan=database_QKan, epsg=epsg)
+        parameter.update(optionen)
+
+        self.thread = QThread()
+        self.arbeiter = ImportArbeiter(funktion, parameter)
+        self.arbeiter.moveToThread(self.thread)
+        self.thread.started.connect(self.arbeiter.ausfuehren)
+        self.arbeiter.fortschritt.connect(self._fortschritt)
+        self.arbeiter.fehler.connect(self._fehler)
+        self.arbeiter.fertig.connect(self._fertig)
+
+    def starten(self):
+        '''Zeigt die Fortschrittsanzeige an und startet den Thread.'''
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setRange(0, 100)
+        self.knopf = QPushButton(u'Abbrechen')
+        self.knopf.clicked.connect(self._abbrechen)
+        self.status_message = iface.messageBar().createMessage(u"", u"Import aus HE in Arbeit.")
+        self.status_message.layout().addWidget(self.progress_bar)
+        self.status_message.layout().addWidget(self.knopf)
+        iface.messageBar().pushWidget(self.status_message, QgsMessageBar.INFO)
+
+        self.thread.start()
+
+    def laeuft(self):
+        '''Liefert True, solange der Import läuft.'''
+        return self.thread.isRunning()
+
+    def _abbrechen(self):
+        self.knopf.setEnabled(False)
+        self.status_message.setText(u'Import wird abgebrochen...')
+        self.arbeiter.abbrechen()
+
+    def _fortschritt(self, tabelle, anzahl, schritt, schritte):
+        self.progress_bar.setValue(100 * schritt // schritte)
+        if not self.arbeiter.abgebrochen:
+            self.status_message.setText(u'Import aus HE: {} ({} Datensätze)'.format(tabelle, anzahl))
+
+    def _fehler(self, title, text):
+        self.fehlermeldungen.append((title, text))
+
+    def _fertig(self, ergebnis):
+        self.thread.quit()
+        self.thread.wait()
+        iface.messageBar().popWidget(self.status_message)
+
+        # Fehlermeldungen aus dem Import-Thread im GUI-Thread anzeigen
+        for title, text in self.fehlermeldungen:
+            iface.messageBar().pushMessage(title, text, level=QgsMessageBar.CRITICAL)
+
+        if ergebnis is None:
+            if self.arbeiter.abgebrochen:
+                iface.messageBar().pushMessage(u"Information", u"Datenimport wurde abgebrochen, "
+                                               u"die QKan-Datenbank ist unverändert.", level=QgsMessageBar.INFO)
+            else:
+                iface.messageBar().pushMessage(u"Fehler", u"Datenimport fehlgeschlagen, Details im Protokoll.",
+                                               level=QgsMessageBar.CRITICAL)
+            return
+
+        zoom, srid = ergebnis
+        importAbschliessen(self.database_QKan, self.projectfile, zoom, srid)
@@ -36,10 +36,10 @@ import glob
 import logging
 import os
 import shutil
-import xml.etree.ElementTree as ET
+from collections import OrderedDict
 
 from PyQt4.QtCore import QFileInfo
-from qgis.core import QgsMessageLog, QgsProject, QgsCoordinateReferenceSystem, QgsMapLayerRegistry
+from qgis.core import QgsMessageLog, QgsProject, QgsMapLayerRegistry
 from qgis.gui import QgsMessageBar
 from qgis.utils import iface, pluginDirectory
 
@@ -48,15 +48,281 @@ from qkan.database.fbfunc import FBConnection
 
 from qkan.database.qkan_utils import fortschritt, fehlermeldung, evalNodeTypes
 
+from flaechen import importFlaechen, importEinleiter, importAussengebiete, importBodenklassen
+from geometrie import punkte, linien, kreise
+from lesen import ParallelLeser
+from massenimport import Massenimport
+from projektdatei import crs_daten, projektvorlage
+from referenzen import he_werte, referenz_ergaenzen
+from stapel import StapelSchreiber
+from synchron import tabellen_he, sql_stand, lese_stand, schreibe_stand, stand_lesen, bedingungen
+from verbindung import MeldendeVerbindung
+
 logger = logging.getLogger(u'QKan')
 
 
+# Abfragen der HE-Datenbank in der Reihenfolge, in der die Ergebnisse beim Import benötigt werden.
+# Sie werden gleichzeitig über mehrere Verbindungen ausgeführt (Modul lesen). {bedingung} wird beim
+# inkrementellen Import durch die Auswahl der geänderten Datensätze ersetzt (Modul synchron).
+abfragen_he = OrderedDict([
+    (u'ref_profile', u'SELECT DISTINCT PROFILTYP, SONDERPROFILBEZEICHNUNG FROM ROHR'),
+    (u'ref_entwart', u'''SELECT KANALART FROM ROHR
+    UNION SELECT KANALART FROM SCHACHT'''),
+    (u'ref_simstatus', u'''SELECT PLANUNGSSTATUS FROM ROHR
+    UNION SELECT PLANUNGSSTATUS FROM SCHACHT
+    UNION SELECT PLANUNGSSTATUS FROM SPEICHERSCHACHT
+    UNION SELECT PLANUNGSSTATUS FROM AUSLASS
+    UNION SELECT PLANUNGSSTATUS FROM PUMPE
+    UNION SELECT PLANUNGSSTATUS FROM WEHR'''),
+    (u'ref_auslasstypen', u'SELECT DISTINCT TYP FROM AUSLASS'),
+    (u'ref_pumpentypen', u'SELECT DISTINCT TYP FROM PUMPE'),
+    (u'haltungen', u'''
+    SELECT 
+        ROHR.NAME AS haltnam, 
+        ROHR.SCHACHTOBEN AS schoben, 
+        ROHR.SCHACHTUNTEN AS schunten, 
+        ROHR.GEOMETRIE1 AS hoehe, 
+        ROHR.GEOMETRIE2 AS breite, 
+        ROHR.LAENGE AS laenge, 
+        ROHR.SOHLHOEHEOBEN AS sohleoben, 
+        ROHR.SOHLHOEHEUNTEN AS sohleunten, 
+        SO.DECKELHOEHE AS deckeloben, 
+        SU.DECKELHOEHE AS deckelunten, 
+        ROHR.TEILEINZUGSGEBIET AS teilgebiet, 
+        ROHR.PROFILTYP AS profiltyp_he, 
+        ROHR.SONDERPROFILBEZEICHNUNG AS profilnam, 
+        ROHR.KANALART AS entwaesserungsart_he, 
+        ROHR.RAUIGKEITSBEIWERT AS ks, 
+        ROHR.PLANUNGSSTATUS AS simstat_he, 
+        ROHR.KOMMENTAR AS kommentar, 
+        ROHR.LASTMODIFIED AS createdat, 
+        SO.XKOORDINATE AS xob, 
+        SO.YKOORDINATE AS yob, 
+        SU.XKOORDINATE AS xun, 
+        SU.YKOORDINATE AS yun
+    FROM ROHR 
+    INNER JOIN (SELECT NAME, DECKELHOEHE, XKOORDINATE, YKOORDINATE FROM SCHACHT
+         UNION SELECT NAME, GELAENDEHOEHE AS DECKELHOEHE, XKOORDINATE, YKOORDINATE FROM SPEICHERSCHACHT) AS SO ON ROHR.SCHACHTOBEN = SO.NAME 
+    INNER JOIN (SELECT NAME, DECKELHOEHE, XKOORDINATE, YKOORDINATE FROM SCHACHT
+         UNION SELECT NAME, GELAENDEHOEHE AS DECKELHOEHE, XKOORDINATE, YKOORDINATE FROM AUSLASS
+         UNION SELECT NAME, GELAENDEHOEHE AS DECKELHOEHE, XKOORDINATE, YKOORDINATE FROM SPEICHERSCHACHT) AS SU
+    ON ROHR.SCHACHTUNTEN = SU.NAME{bedingung}'''),
+    (u'schaechte', u'''
+    SELECT 
+        NAME AS schnam,
+        XKOORDINATE AS xsch, 
+        YKOORDINATE AS ysch, 
+        SOHLHOEHE AS sohlhoehe, 
+        DECKELHOEHE AS deckelhoehe, 
+        DURCHMESSER AS durchm, 
+        DRUCKDICHTERDECKEL AS druckdicht, 
+        KANALART AS entwaesserungsart_he, 
+        PLANUNGSSTATUS AS simstat_he, 
+        KOMMENTAR AS kommentar, 
+        LASTMODIFIED AS createdat
+        FROM SCHACHT{bedingung}'''),
+    (u'speicher', u'''
+    SELECT NAME AS schnam, 
+        GELAENDEHOEHE AS deckelhoehe, 
+        SOHLHOEHE AS sohlhoehe, 
+        XKOORDINATE AS xsch, 
+        YKOORDINATE AS ysch, 
+        UEBERSTAUFLAECHE AS ueberstauflaeche, 
+        PLANUNGSSTATUS AS simstat_he, 
+        KOMMENTAR AS kommentar, 
+        LASTMODIFIED AS createdat 
+        FROM SPEICHERSCHACHT{bedingung}'''),
+    (u'auslaesse', u'''
+    SELECT NAME AS schnam, 
+        XKOORDINATE AS xsch, 
+        YKOORDINATE AS ysch, 
+        SOHLHOEHE AS sohlhoehe, 
+        GELAENDEHOEHE AS deckelhoehe, 
+        TYP AS typ_he, 
+        PLANUNGSSTATUS AS simstat_he, 
+        KOMMENTAR AS kommentar, 
+        LASTMODIFIED AS createdat 
+        FROM AUSLASS{bedingung}'''),
+    (u'pumpen', u'''
+    SELECT 
+        PUMPE.NAME AS pnam, 
+        PUMPE.SCHACHTOBEN AS schoben, 
+        PUMPE.SCHACHTUNTEN AS schunten, 
+        PUMPE.TYP AS typ_he, 
+        PUMPE.STEUERSCHACHT AS steuersch, 
+        PUMPE.EINSCHALTHOEHE AS einschalthoehe, 
+        PUMPE.AUSSCHALTHOEHE AS ausschalthoehe,
+        SO.XKOORDINATE AS xob, 
+        SO.YKOORDINATE AS yob, 
+        SU.XKOORDINATE AS xun, 
+        SU.YKOORDINATE AS yun, 
+        PUMPE.PLANUNGSSTATUS AS simstat_he, 
+        PUMPE.KOMMENTAR AS kommentar, 
+        PUMPE.LASTMODIFIED AS createdat
+    FROM PUMPE
+    LEFT JOIN (SELECT NAME, DECKELHOEHE, XKOORDINATE, YKOORDINATE FROM SCHACHT
+         UNION SELECT NAME, GELAENDEHOEHE AS DECKELHOEHE, XKOORDINATE, YKOORDINATE FROM SPEICHERSCHACHT) AS SO ON PUMPE.SCHACHTOBEN = SO.NAME 
+    LEFT JOIN (SELECT NAME, DECKELHOEHE, XKOORDINATE, YKOORDINATE FROM SCHACHT
+         UNION SELECT NAME, GELAENDEHOEHE AS DECKELHOEHE, XKOORDINATE, YKOORDINATE FROM AUSLASS
+         UNION SELECT NAME, GELAENDEHOEHE AS DECKELHOEHE, XKOORDINATE, YKOORDINATE FROM SPEICHERSCHACHT) AS SU
+    ON PUMPE.SCHACHTUNTEN = SU.NAME{bedingung}'''),
+    (u'wehre', u'''
+    SELECT 
+        WEHR.NAME AS wnam,
+        WEHR.SCHACHTOBEN AS schoben, 
+        WEHR.SCHACHTUNTEN AS schunten, 
+        WEHR.TYP AS typ_he, 
+        WEHR.SCHWELLENHOEHE AS schwellenhoehe, 
+        WEHR.GEOMETRIE1 AS kammerhoehe, 
+        WEHR.GEOMETRIE2 AS laenge,
+        WEHR.UEBERFALLBEIWERT AS uebeiwert,
+        SO.XKOORDINATE AS xob, 
+        SO.YKOORDINATE AS yob, 
+        SU.XKOORDINATE AS xun, 
+        SU.YKOORDINATE AS yun, 
+        WEHR.PLANUNGSSTATUS AS simstat_he, 
+        WEHR.KOMMENTAR AS kommentar, 
+        WEHR.LASTMODIFIED AS createdat
+    FROM WEHR
+    LEFT JOIN (SELECT NAME, DECKELHOEHE, XKOORDINATE, YKOORDINATE FROM SCHACHT
+         UNION SELECT NAME, GELAENDEHOEHE AS DECKELHOEHE, XKOORDINATE, YKOORDINATE FROM SPEICHERSCHACHT) AS SO ON WEHR.SCHACHTOBEN = SO.NAME 
+    LEFT JOIN (SELECT NAME, DECKELHOEHE, XKOORDINATE, YKOORDINATE FROM SCHACHT
+         UNION SELECT NAME, GELAENDEHOEHE AS DECKELHOEHE, XKOORDINATE, YKOORDINATE FROM AUSLASS
+         UNION SELECT NAME, GELAENDEHOEHE AS DECKELHOEHE, XKOORDINATE, YKOORDINATE FROM SPEICHERSCHACHT) AS SU
+    ON WEHR.SCHACHTUNTEN = SU.NAME{bedingung}'''),
+    (u'einzugsgebiete', u'''
+    SELECT 
+        NAME AS tgnam,
+        EINWOHNERDICHTE AS ewdichte,
+        WASSERVERBRAUCH AS wverbrauch,
+        STUNDENMITTEL AS stdmittel,
+        FREMDWASSERANTEIL AS fremdwas,
+        FLAECHE AS flaeche,
+        KOMMENTAR AS kommentar,
+        LASTMODIFIED AS createdat
+    FROM
+        teileinzugsgebiet{bedingung}'''),
+    (u'speicherkennlinien', u'''
+        SELECT 
+            NAME AS schnam, 
+            KEYWERT + SOHLHOEHE AS wspiegel, 
+            WERT AS oberfl 
+        FROM TABELLENINHALTE 
+        JOIN SPEICHERSCHACHT 
+        ON TABELLENINHALTE.ID = SPEICHERSCHACHT.ID{bedingung}
+        ORDER BY SPEICHERSCHACHT.ID, TABELLENINHALTE.REIHENFOLGE'''),
+    (u'profildaten', u'''
+        SELECT 
+            NAME AS profilnam, 
+            KEYWERT AS wspiegel, 
+            WERT AS wbreite 
+        FROM TABELLENINHALTE 
+        JOIN SONDERPROFIL 
+        ON TABELLENINHALTE.ID = SONDERPROFIL.ID{bedingung}
+        ORDER BY SONDERPROFIL.ID, TABELLENINHALTE.REIHENFOLGE'''),
+    (u'abflussparameter', u'''
+        SELECT 
+            NAME AS apnam_ansi,
+            ABFLUSSBEIWERTANFANG AS anfangsabflussbeiwert,
+            ABFLUSSBEIWERTENDE AS endabflussbeiwert,
+            MULDENVERLUST AS muldenverlust,
+            BENETZUNGSVERLUST AS benetzungsverlust,
+            BENETZUNGSPEICHERSTART AS benetzung_startwert,
+            MULDENAUFFUELLGRADSTART AS mulden_startwert,
+            TYP AS aptyp,
+            BODENKLASSE AS bodenklasse_ansi,
+            LASTMODIFIED AS createdat,
+            KOMMENTAR AS kommentar_ansi
+        FROM ABFLUSSPARAMETER{bedingung}'''),
+])
+
+
+# ------------------------------------------------------------------------------
+# Fortschritt und Abbruch
+
+class Ablauf:
+    '''Meldet nach jeder geschriebenen Tabelle den Fortschritt und prüft, ob der Import abgebrochen
+    werden soll. Da erst am Ende festgeschrieben wird, genügt beim Abbruch das Zurücksetzen der
+    Transaktion.
+    '''
+
+    def __init__(self, dbQK, leser, massen, anzahl_schritte, rueckmeldung=None, abbruch=None):
+        '''
+        :leser:     Liste der ParallelLeser, die beim Abbruch beendet werden
+        :massen:    Massenimport oder None
+        '''
+        self.dbQK = dbQK
+        self.leser = leser
+        self.massen = massen
+        self.anzahl_schritte = anzahl_schritte
+        self.rueckmeldung = rueckmeldung
+        self.abbruch = abbruch
+        self.schritt = 0
+        self.quelle = None              # Bezeichnung der HE-Datenbank beim Zusammenführen
+
+    def weiter(self, tabelle, anzahl):
+        '''
+        :tabelle:   Name der geschriebenen Tabelle
+        :anzahl:    Anzahl der geschriebenen Datensätze
+
+        :returns:   False, wenn der Import abgebrochen wurde
+        :rtype:     Boolean
+        '''
+        self.schritt += 1
+        if self.quelle is not None:
+            tabelle = u'{}: {}'.format(self.quelle, tabelle)
+        logger.debug(u'importkanaldaten_he: {} ({} Datensätze) geschrieben'.format(tabelle, anzahl))
+        if self.rueckmeldung is not None:
+            self.rueckmeldung(tabelle, anzahl, self.schritt, self.anzahl_schritte)
+        if self.abbruch is None or not self.abbruch():
+            return True
+
+        logger.info(u'importkanaldaten_he: Abbruch nach {}, Transaktion wird zurückgesetzt'.format(tabelle))
+        self.dbQK.consl.rollback()
+        if self.massen is not None:
+            self.massen.pragmas_zuruecksetzen()
+        for leser in self.leser:
+            leser.beenden()
+        return False
+
+
 # ------------------------------------------------------------------------------
 # Hauptprogramm
 
 def importKanaldaten(database_HE, database_QKan, projectfile, epsg,
-                     dbtyp=u'SpatiaLite'):
+                     dbtyp=u'SpatiaLite', massenimport=True, parallel_lesen=3, inkrementell=False,
+                     mit_flaechen=False):
     '''Import der Kanaldaten aus einer HE-Firebird-Datenbank und Schreiben in eine QKan-SpatiaLite-Datenbank.
+    Anschließend wird die Projektdatei geschrieben und geladen.
+
+    Der Import läuft vollständig im aufrufenden Thread. Für den Import im Hintergrund werden
+    importKanaldatenDB (im Hintergrund) und importAbschliessen (im GUI-Thread) getrennt
+    aufgerufen (Modul hintergrund).
+
+    Parameter siehe importKanaldatenDB und importAbschliessen.
+
+    :returns: void
+    '''
+
+    ergebnis = importKanaldatenDB(database_HE, database_QKan, epsg, dbtyp=dbtyp, massenimport=massenimport,
+                                  parallel_lesen=parallel_lesen, inkrementell=inkrementell,
+                                  mit_flaechen=mit_flaechen)
+    if ergebnis is None:
+        return None
+
+    zoom, srid = ergebnis
+    importAbschliessen(database_QKan, projectfile, zoom, srid)
+
+
+def importKanaldatenDB(database_HE, database_QKan, epsg, dbtyp=u'SpatiaLite', massenimport=True,
+                       parallel_lesen=3, inkrementell=False, mit_flaechen=False, rueckmeldung=None,
+                       abbruch=None, melden=fehlermeldung):
+    '''Import der Kanaldaten aus einer HE-Firebird-Datenbank und Schreiben in eine QKan-SpatiaLite-Datenbank.
+
+    Die Funktion öffnet eigene Datenbankverbindungen und greift nicht auf die Benutzeroberfläche
+    zu, so dass sie auch in einem eigenen Thread ausgeführt werden kann. Alle Tabellen werden in
+    einer Transaktion geschrieben. Bei einem Fehler oder Abbruch wird diese zurückgesetzt, so dass
+    keine Tabelle nur teilweise importiert ist.
 
     :database_HE:   Datenbankobjekt, das die Verknüpfung zur HE-Firebird-Datenbank verwaltet
     :type database: DBConnection (geerbt von firebirdsql...)
@@ -66,29 +332,186 @@ def importKanaldaten(database_HE, database_QKan, projectfile, epsg,
 
     :dbtyp:         Typ der Datenbank (SpatiaLite, PostGIS)
     :type dbtyp:    String
-    
-    :returns: void
+
+    :massenimport:  Räumliche Indizes während des Imports aussetzen und anschließend neu aufbauen
+    :type massenimport: Boolean
+
+    :parallel_lesen: Anzahl der Verbindungen zum gleichzeitigen Lesen der HE-Tabellen. Bei 0 werden
+                    die Tabellen nacheinander über eine Verbindung gelesen.
+    :type parallel_lesen: int
+
+    :inkrementell:  Nur die seit dem letzten Import dieser HE-Datenbank geänderten oder neuen
+                    Datensätze importieren (Modul synchron)
+    :type inkrementell: Boolean
+
+    :mit_flaechen:  Auch Flächen, Einzeleinleiter, Außengebiete und Bodenklassen importieren
+                    (Modul flaechen). Diese werden immer vollständig gelesen.
+    :type mit_flaechen: Boolean
+
+    :rueckmeldung:  Wird nach jeder geschriebenen Tabelle mit (Tabelle, Anzahl der Datensätze,
+                    Schritt, Anzahl der Schritte) aufgerufen
+    :type rueckmeldung: function
+
+    :abbruch:       Wird nach jeder geschriebenen Tabelle aufgerufen. Liefert True, wenn der
+                    Import abgebrochen werden soll.
+    :type abbruch:  function
+
+    :melden:        Wird bei einem Fehler mit (Titel, Text) aufgerufen. Beim Import im Hintergrund
+                    werden die Meldungen damit an den GUI-Thread übergeben (Modul hintergrund).
+    :type melden:   function
+
+    :returns:       ((xmin, xmax, ymin, ymax) der Schächte, EPSG-Code der QKan-Datenbank) oder
+                    None bei Fehler oder Abbruch
+    :rtype:         tuple
     '''
 
     # ------------------------------------------------------------------------------
-    # Datenbankverbindungen
+    # Datenbankverbindungen. SQL-Fehler werden an melden übergeben (Modul verbindung).
 
     dbHE = FBConnection(database_HE)  # Datenbankobjekt der HE-Datenbank zum Lesen
 
     if dbHE is None:
-        fehlermeldung(u"Fehler in QKan_Import_from_HE",
-                      u'ITWH-Datenbank {:s} wurde nicht gefunden!\nAbbruch!'.format(database_HE))
+        melden(u"Fehler in QKan_Import_from_HE",
+               u'ITWH-Datenbank {:s} wurde nicht gefunden!\nAbbruch!'.format(database_HE))
         return None
+    dbHE = MeldendeVerbindung(dbHE, melden, u'curfb')
 
     dbQK = DBConnection(dbname=database_QKan, epsg=epsg)  # Datenbankobjekt der QKan-Datenbank zum Schreiben
     if not dbQK.connected:
         return None
 
     if dbQK is None:
-        fehlermeldung(u"Fehler in QKan_Import_from_HE",
-                      u'QKan-Datenbank {:s} wurde nicht gefunden!\nAbbruch!'.format(database_QKan))
+        melden(u"Fehler in QKan_Import_from_HE",
+               u'QKan-Datenbank {:s} wurde nicht gefunden!\nAbbruch!'.format(database_QKan))
+        return None
+    dbQK = MeldendeVerbindung(dbQK, melden, u'cursl')
+
+    # Die Datensätze werden je Zieltabelle gesammelt und mit executemany geschrieben.
+    # Alle Tabellen werden in einer Transaktion geschrieben.
+    schreiber = StapelSchreiber(dbQK, melden=melden)
+
+    geoformat, geo_param = geoparameter(dbtyp, epsg, melden)
+    if geoformat is None:
         return None
 
+    # Die HE-Tabellen werden im Hintergrund gelesen, während die Daten in die QKan-Datenbank
+    # geschrieben werden. Beim inkrementellen Import werden nur die seit dem letzten Import
+    # geänderten Datensätze gelesen. Der aktuelle Stand der HE-Tabellen wird vor den Daten abgefragt.
+    if inkrementell:
+        auswahl = bedingungen(lese_stand(database_QKan, database_HE))
+        logger.debug(u'Inkrementeller Import: Auswahl für {}'.format(sorted(auswahl)))
+    else:
+        auswahl = {}
+    abfragen = OrderedDict((u'stand_' + tabelle, sql_stand.format(tabelle)) for tabelle in tabellen_he)
+    for name, sql in abfragen_he.items():
+        abfragen[name] = sql.format(bedingung=auswahl.get(name, u''))
+
+    leser = ParallelLeser(database_HE, abfragen, anzahl=parallel_lesen, dbHE=dbHE, melden=melden)
+    leser.starten()
+
+    # Die Threads werden auch bei einem Fehler oder Abbruch beendet. Ohne erfolgreichen commit
+    # wird die Transaktion zurückgesetzt und die PRAGMAs des Massenimports werden wiederhergestellt.
+    massen = None
+    erfolg = False
+    try:
+        stand = {}
+        for tabelle in tabellen_he:
+            daten = leser.ergebnis(u'stand_' + tabelle)
+            if daten is None:
+                return None
+            stand_tabelle = stand_lesen(daten)
+            if stand_tabelle is not None:
+                stand[tabelle] = stand_tabelle
+
+        # Massenimport: Räumliche Indizes werden erst nach dem Schreiben aller Tabellen in einem
+        # Durchgang aufgebaut (nur SpatiaLite)
+        if massenimport and dbtyp == u'SpatiaLite':
+            tabellen = [u'haltungen', u'schaechte', u'pumpen', u'wehre']
+            if mit_flaechen:
+                tabellen += [u'flaechen', u'linkfl', u'einleit', u'linksw', u'aussengebiete']
+            massen = Massenimport(dbQK, tabellen)
+            massen.pragmas_setzen()
+            if not massen.indizes_aussetzen():
+                return None
+
+        # Nach jeder geschriebenen Tabelle wird der Fortschritt gemeldet und ein Abbruch geprüft
+        ablauf = Ablauf(dbQK, [leser], massen, 15 if mit_flaechen else 11, rueckmeldung, abbruch)
+
+        # Referenzlisten und Daten der HE-Datenbank schreiben
+        if not importQuelle(dbHE, dbQK, schreiber, leser, ablauf, epsg, geoformat, geo_param, mit_flaechen):
+            return None
+
+        if massen is not None:
+            if not massen.indizes_wiederherstellen():
+                melden(u"Fehler in QKan_Import_from_HE",
+                       u'Räumliche Indizes konnten nicht neu aufgebaut werden!\nAbbruch!')
+                return None
+
+        # Alle Tabellen in einer Transaktion
+        dbQK.commit()
+        erfolg = True
+    finally:
+        leser.beenden()
+        if not erfolg:
+            dbQK.consl.rollback()
+            if massen is not None:
+                massen.pragmas_zuruecksetzen()
+
+    # Stand der HE-Datenbank für den nächsten inkrementellen Import speichern
+    schreibe_stand(database_QKan, database_HE, stand)
+
+    if massen is not None:
+        massen.pragmas_zuruecksetzen()
+
+
+    # Schachttypen auswerten
+    evalNodeTypes(dbQK)                     # in qkan.database.qkan_utils
+
+
+    # --------------------------------------------------------------------------
+    # Zoom-Bereich und Projektionssystem für die Projektdatei vorbereiten
+    zoom = zoombereich(dbHE, melden)
+
+    srid = srid_qkan(dbQK)
+    if srid is None:
+        return None
+
+    # --------------------------------------------------------------------------
+    # Datenbankverbindungen schliessen
+
+    del dbHE
+    del dbQK
+
+    return zoom, srid
+
+
+def importQuelle(dbHE, dbQK, schreiber, leser, ablauf, epsg, geoformat, geo_param, mit_flaechen=False,
+                 namensraum=None):
+    '''Schreibt die Referenzlisten und Daten einer HE-Datenbank in die QKan-Datenbank, ohne die
+    Transaktion abzuschließen. Wird von importKanaldatenDB und beim Zusammenführen mehrerer
+    HE-Datenbanken (Modul zusammenfuehren) verwendet.
+
+    :dbHE:          Verbindung zur HE-Datenbank (für die paketweise gelesenen Tabellen)
+    :type dbHE:     FBConnection
+
+    :dbQK:          Verbindung zur QKan-Datenbank
+    :type dbQK:     DBConnection
+
+    :schreiber:     Stapel für die QKan-Datenbank
+    :type schreiber: StapelSchreiber
+
+    :leser:         Liefert die Ergebnisse der Abfragen aus abfragen_he
+    :type leser:    ParallelLeser
+
+    :ablauf:        Fortschritt und Abbruch
+    :type ablauf:   Ablauf
+
+    :namensraum:    Umbenennung der Objekte der paketweise gelesenen Tabellen (Modul zusammenfuehren)
+
+    :returns:       Erfolg
+    :rtype:         Boolean
+    '''
+
     # Referenztabellen laden. 
 
     # Entwässerungssystem. Attribut [bezeichnung] enthält die Bezeichnung des Benutzers.
@@ -136,6 +559,49 @@ def importKanaldaten(database_HE, database_QKan, projectfile, epsg,
     for el in daten:
         ref_simulationsstatus[el[0]] = el[1]
 
+    # Fehlende Einträge der Referenzlisten vorab ergänzen. Die verwendeten HE-Nummern werden mit
+    # je einer Abfrage ermittelt und fehlende Einträge gemeinsam geschrieben. In den folgenden
+    # Schleifen wird dann nur noch in den Referenzlisten nachgeschlagen.
+
+    # Rohrprofile. In HE werden primär Profilnummern verwendet. Ist kein Sonderprofilname vorhanden,
+    # wird ein Profilname erzeugt, z.B. (12)
+    werte = he_werte(leser.ergebnis(u'ref_profile'))
+    if werte is None:
+        return None
+    referenz_ergaenzen(schreiber, ref_profil,
+                       [(typ, u'({})'.format(typ) if nam == u'NULL' else nam) for typ, nam in werte],
+                       u'INSERT INTO profile (profilnam, he_nr) VALUES (?, ?)')
+
+    werte = he_werte(leser.ergebnis(u'ref_entwart'))
+    if werte is None:
+        return None
+    referenz_ergaenzen(schreiber, ref_entwart, [(nr, u'({})'.format(nr)) for (nr,) in werte],
+                       u'INSERT INTO entwaesserungsarten (bezeichnung, he_nr) VALUES (?, ?)')
+
+    werte = he_werte(leser.ergebnis(u'ref_simstatus'))
+    if werte is None:
+        return None
+    referenz_ergaenzen(schreiber, ref_simulationsstatus, [(nr, u'({}_he)'.format(nr)) for (nr,) in werte],
+                       u'INSERT INTO simulationsstatus (bezeichnung, he_nr) VALUES (?, ?)')
+
+    werte = he_werte(leser.ergebnis(u'ref_auslasstypen'))
+    if werte is None:
+        return None
+    referenz_ergaenzen(schreiber, ref_auslasstypen, [(nr, u'({}_he)'.format(nr)) for (nr,) in werte],
+                       u'INSERT INTO auslasstypen (bezeichnung, he_nr) VALUES (?, ?)')
+
+    werte = he_werte(leser.ergebnis(u'ref_pumpentypen'))
+    if werte is None:
+        return None
+    referenz_ergaenzen(schreiber, ref_pumpentyp, [(nr, u'({}_he)'.format(nr)) for (nr,) in werte],
+                       u'INSERT INTO pumpentypen (bezeichnung, he_nr) VALUES (?, ?)')
+
+    anzahl = schreiber.anzahl()
+    if not schreiber.schreiben(u'importkanaldaten_he (13)'):
+        return None
+    if not ablauf.weiter(u'Referenzlisten', anzahl):
+        return None
+
 
     # ------------------------------------------------------------------------------
     # Haltungsdaten
@@ -148,43 +614,16 @@ def importKanaldaten(database_HE, database_QKan, projectfile, epsg,
         # if not dbQK.sql(sql, u'importkanaldaten_he (6)'):
             # return None
 
-    # Daten aUS ITWH-Datenbank abfragen
-    sql = u'''
-    SELECT 
-        ROHR.NAME AS haltnam, 
-        ROHR.SCHACHTOBEN AS schoben, 
-        ROHR.SCHACHTUNTEN AS schunten, 
-        ROHR.GEOMETRIE1 AS hoehe, 
-        ROHR.GEOMETRIE2 AS breite, 
-        ROHR.LAENGE AS laenge, 
-        ROHR.SOHLHOEHEOBEN AS sohleoben, 
-        ROHR.SOHLHOEHEUNTEN AS sohleunten, 
-        SO.DECKELHOEHE AS deckeloben, 
-        SU.DECKELHOEHE AS deckelunten, 
-        ROHR.TEILEINZUGSGEBIET AS teilgebiet, 
-        ROHR.PROFILTYP AS profiltyp_he, 
-        ROHR.SONDERPROFILBEZEICHNUNG AS profilnam, 
-        ROHR.KANALART AS entwaesserungsart_he, 
-        ROHR.RAUIGKEITSBEIWERT AS ks, 
-        ROHR.PLANUNGSSTATUS AS simstat_he, 
-        ROHR.KOMMENTAR AS kommentar, 
-        ROHR.LASTMODIFIED AS createdat, 
-        SO.XKOORDINATE AS xob, 
-        SO.YKOORDINATE AS yob, 
-        SU.XKOORDINATE AS xun, 
-        SU.YKOORDINATE AS yun
-    FROM ROHR 
-    INNER JOIN (SELECT NAME, DECKELHOEHE, XKOORDINATE, YKOORDINATE FROM SCHACHT
-         UNION SELECT NAME, GELAENDEHOEHE AS DECKELHOEHE, XKOORDINATE, YKOORDINATE FROM SPEICHERSCHACHT) AS SO ON ROHR.SCHACHTOBEN = SO.NAME 
-    INNER JOIN (SELECT NAME, DECKELHOEHE, XKOORDINATE, YKOORDINATE FROM SCHACHT
-         UNION SELECT NAME, GELAENDEHOEHE AS DECKELHOEHE, XKOORDINATE, YKOORDINATE FROM AUSLASS
-         UNION SELECT NAME, GELAENDEHOEHE AS DECKELHOEHE, XKOORDINATE, YKOORDINATE FROM SPEICHERSCHACHT) AS SU
-    ON ROHR.SCHACHTUNTEN = SU.NAME'''
-    dbHE.sql(sql)
-    daten = dbHE.fetchall()
+    # Daten aus ITWH-Datenbank abfragen
+    daten = leser.ergebnis(u'haltungen')
+    if daten is None:
+        return None
 
     # Haltungsdaten in die QKan-DB schreiben
 
+    datensaetze = []
+    koordinaten = []
+
     for attr in daten:
         (haltnam_ansi, schoben_ansi, schunten_ansi, hoehe, breite, laenge, sohleoben, sohleunten,
          deckeloben, deckelunten, teilgebiet, profiltyp_he, profilnam_ansi,
@@ -202,82 +641,38 @@ def importKanaldaten(database_HE, database_QKan, projectfile, epsg,
         # In QKan wird ausschließlich der Profilname verwendet, so dass sichergestellt sein muss, dass die
         # Standardbezeichnungen für die HE-Profile nicht auch als Namen für ein Sonderprofil verwendet werden. 
 
-        if profiltyp_he in ref_profil:
-            profilnam = ref_profil[profiltyp_he]
-        else:
-            # Noch nicht in Tabelle [profile] enthalten, also ergqenzen
-            if profilnam == u'NULL':
-                # In HE ist nur die Profilnummer enthalten. Dann muss ein Profilname erzeugt werden, z.B. (12)
-                profilnam = u'({profiltyp_he})'.format(profiltyp_he=profiltyp_he)
-
-            # In Referenztabelle in dieser Funktion sowie in der QKan-Tabelle profile einfügen
-            ref_profil[profiltyp_he] = profilnam
-            sql = u"INSERT INTO profile (profilnam, he_nr) Values ('{profilnam}', {profiltyp_he})".format( \
-                profilnam=profilnam, profiltyp_he=profiltyp_he)
-            if not dbQK.sql(sql, u'importkanaldaten_he (7)'):
-                return None
+        profilnam = ref_profil[profiltyp_he]
 
         # Entwasserungsarten. Hier ist es einfacher als bei den Profilen...
-        if entwaesserungsart_he in ref_entwart:
-            entwart = ref_entwart[entwaesserungsart_he]
-        else:
-            # Noch nicht in Tabelle [entwaesserungsarten] enthalten, also ergqenzen
-            entwart = u'({})'.format(entwaesserungsart_he)
-            sql = u"INSERT INTO entwaesserungsarten (bezeichnung, he_nr) Values ('{entwart}', {he_nr})".format( \
-                entwart=entwart, he_nr=entwaesserungsart_he)
-            ref_entwart[entwaesserungsart_he] = entwart
-            if not dbQK.sql(sql, u'importkanaldaten_he (8)'):
-                return None
+        entwart = ref_entwart[entwaesserungsart_he]
 
         # Simstatus-Nr aus HE ersetzten
-        if simstat_he in ref_simulationsstatus:
-            simstatus = ref_simulationsstatus[simstat_he]
-        else:
-            # Noch nicht in Tabelle [simulationsstatus] enthalten, also ergqenzen
-            simstatus = u'({}_he)'.format(simstat_he)
-            sql = u"INSERT INTO simulationsstatus (bezeichnung, he_nr) Values ('{simstatus}', {he_nr})".format( \
-                simstatus=simstatus, he_nr=simstat_he)
-            ref_simulationsstatus[simstat_he] = simstatus
-            if not dbQK.sql(sql, u'importkanaldaten_he (9)'):
-                return None
+        simstatus = ref_simulationsstatus[simstat_he]
 
-        # Geo-Objekt erzeugen
+        # Datensatz aufbereiten und zum Schreiben in die QKan-DB vormerken
+
+        datensaetze.append((haltnam, schoben, schunten, hoehe,
+                            breite, laenge, sohleoben, sohleunten, deckeloben, deckelunten, teilgebiet,
+                            profilnam, entwart, ks, simstatus, kommentar, createdat))
+        koordinaten.append((xob, yob, xun, yun))
+
+    # Gleichnamige Objekte in der QKan-Datenbank werden ersetzt
+    if not schreiber.ersetzen(u'haltungen', u'haltnam', [werte[0] for werte in datensaetze],
+                              u'importkanaldaten_he (39)'):
+        return None
 
-        if dbtyp == u'SpatiaLite':
-            geom = u'MakeLine(MakePoint({0:},{1:},{4:s}),MakePoint({2:},{3:},{4:}))'.format(xob, yob, xun, yun, epsg)
-        elif dbtyp == u'postgis':
-            geom = u'ST_MakeLine(ST_SetSRID(ST_MakePoint({0:},{1:}),{4:s}),ST_SetSRID(ST_MakePoint({2:},{3:}),{4:}))'.format(
-                xob, yob, xun, yun, epsg)
-        else:
-            fehlermeldung('Programmfehler!', 
-                'Datenbanktyp ist fehlerhaft {0:s}, Endung: {1:s}!\nAbbruch!'.format(dbtyp,dbdatabase[-7:].lower()))
-
-        # Datensatz aufbereiten in die QKan-DB schreiben
-
-        try:
-            sql = u"""INSERT INTO haltungen 
-                (geom, haltnam, schoben, schunten, 
-                hoehe, breite, laenge, sohleoben, sohleunten, 
-                deckeloben, deckelunten, teilgebiet, profilnam, entwart, ks, simstatus, kommentar, createdat) VALUES (
-                {geom}, '{haltnam}', '{schoben}', '{schunten}', {hoehe}, {breite}, {laenge}, 
-                {sohleoben}, {sohleunten}, {deckeloben}, {deckelunten}, '{teilgebiet}', '{profilnam}', 
-                '{entwart}', {ks}, '{simstatus}', '{kommentar}', '{createdat}')""".format( \
-                geom=geom, haltnam=haltnam, schoben=schoben, schunten=schunten, hoehe=hoehe,
-                breite=breite, laenge=laenge, sohleoben=sohleoben, sohleunten=sohleunten,
-                deckeloben=deckeloben, deckelunten=deckelunten, teilgebiet=teilgebiet,
-                profilnam=profilnam, entwart=entwart, ks=ks, simstatus=simstatus, kommentar=kommentar,
-                createdat=createdat)
-        except BaseException as err:
-            fehlermeldung(u'SQL-Fehler', repr(err))
-            fehlermeldung(u"Fehler in QKan_Import_from_HE", u"\nFehler in sql INSERT INTO haltungen: \n" + \
-                          str((geom, haltnam, schoben, schunten,
-                               hoehe, breite, laenge, sohleoben, sohleunten,
-                               deckeloben, deckelunten, teilgebiet, profilnam, entwart, ks, simstatus)) + u'\n\n')
-
-        if not dbQK.sql(sql, u'importkanaldaten_he (10)'):
-            return None
+    sql = u"""INSERT INTO haltungen
+        (geom, haltnam, schoben, schunten,
+        hoehe, breite, laenge, sohleoben, sohleunten,
+        deckeloben, deckelunten, teilgebiet, profilnam, entwart, ks, simstatus, kommentar, createdat) VALUES (
+        {geom}, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""".format(geom=geo_param)
+    for geom, werte in zip(linien(koordinaten, epsg, geoformat), datensaetze):
+        schreiber.einfuegen(sql, (geom,) + werte)
 
-    dbQK.commit()
+    if not schreiber.schreiben(u'importkanaldaten_he (10)'):
+        return None
+    if not ablauf.weiter(u'haltungen', len(datensaetze)):
+        return None
 
     # ------------------------------------------------------------------------------
     # Schachtdaten
@@ -293,26 +688,15 @@ def importKanaldaten(database_HE, database_QKan, projectfile, epsg,
             # return None
 
     # Daten aus ITWH-Datenbank abfragen
-    sql = u'''
-    SELECT 
-        NAME AS schnam,
-        XKOORDINATE AS xsch, 
-        YKOORDINATE AS ysch, 
-        SOHLHOEHE AS sohlhoehe, 
-        DECKELHOEHE AS deckelhoehe, 
-        DURCHMESSER AS durchm, 
-        DRUCKDICHTERDECKEL AS druckdicht, 
-        KANALART AS entwaesserungsart_he, 
-        PLANUNGSSTATUS AS simstat_he, 
-        KOMMENTAR AS kommentar, 
-        LASTMODIFIED AS createdat
-        FROM SCHACHT'''
-
-    dbHE.sql(sql)
-    daten = dbHE.fetchall()
+    daten = leser.ergebnis(u'schaechte')
+    if daten is None:
+        return None
 
     # Schachtdaten aufbereiten und in die QKan-DB schreiben
 
+    datensaetze = []
+    koordinaten = []
+
     for attr in daten:
         (schnam_ansi, xsch, ysch, sohlhoehe, deckelhoehe, durchm, druckdicht, entwaesserungsart_he,
          simstat_he, kommentar_ansi, createdat) = ['NULL' if el is None else el for el in attr]
@@ -320,59 +704,33 @@ def importKanaldaten(database_HE, database_QKan, projectfile, epsg,
         (schnam, kommentar) = [tt.decode('iso-8859-1') for tt in (schnam_ansi, kommentar_ansi)]
 
         # Entwasserungsarten
-        if entwaesserungsart_he in ref_entwart:
-            entwart = ref_entwart[entwaesserungsart_he]
-        else:
-            # Noch nicht in Tabelle [entwaesserungsarten] enthalten, also ergänzen
-            sql = u"INSERT INTO entwaesserungsarten (bezeichnung, he_nr) Values ('({0:})', {0:d})".format(
-                entwaesserungsart_he)
-            entwart = u'({:})'.format(entwaesserungsart_he)
-            if not dbQK.sql(sql, u'importkanaldaten_he (12)'):
-                return None
+        entwart = ref_entwart[entwaesserungsart_he]
 
         # Simstatus-Nr aus HE ersetzten
-        if simstat_he in ref_simulationsstatus:
-            simstatus = ref_simulationsstatus[simstat_he]
-        else:
-            # Noch nicht in Tabelle [simulationsstatus] enthalten, also ergqenzen
-            simstatus = u'({}_he)'.format(simstat_he)
-            sql = u"INSERT INTO simulationsstatus (bezeichnung, he_nr) Values ('{simstatus}', {he_nr})".format( \
-                simstatus=simstatus, he_nr=simstat_he)
-            ref_simulationsstatus[simstat_he] = simstatus
-            if not dbQK.sql(sql, u'importkanaldaten_he (13)'):
-                return None
+        simstatus = ref_simulationsstatus[simstat_he]
 
-        # Geo-Objekte erzeugen
+        # Datensatz zum Schreiben in die QKan-DB vormerken
 
-        if dbtyp == u'SpatiaLite':
-            geop = u'MakePoint({0:},{1:},{2:})'.format(xsch, ysch, epsg)
-            geom = u'CastToMultiPolygon(MakePolygon(MakeCircle({0:},{1:},{2:},{3:})))'.format(xsch, ysch, 
-                                             (1. if durchm == 'NULL' else durchm/ 1000.) , epsg)
-        elif dbtyp == u'postgis':
-            geop = u'ST_SetSRID(ST_MakePoint({0:},{1:}),{2:})'.format(xsch, ysch, epsg)
-        else:
-            fehlermeldung('Programmfehler!', 
-                'Datenbanktyp ist fehlerhaft {0:s}, Endung: {1:s}!\nAbbruch!'.format(dbtyp,dbdatabase[-7:].lower()))
-
-        # Datensatz in die QKan-DB schreiben
-
-        try:
-            sql = u"""INSERT INTO schaechte (schnam, xsch, ysch, sohlhoehe, deckelhoehe, durchm, druckdicht, entwart, 
-                                        schachttyp, simstatus, kommentar, createdat, geop, geom)
-            VALUES ('{schnam}', {xsch}, {ysch}, {sohlhoehe}, {deckelhoehe}, {durchm}, {druckdicht}, '{entwart}', 
-                     '{schachttyp}', '{simstatus}', '{kommentar}', '{createdat}', 
-                     {geop}, {geom})""".format( \
-                schnam=schnam, xsch=xsch, ysch=ysch, sohlhoehe=sohlhoehe, deckelhoehe=deckelhoehe,
-                durchm=durchm, druckdicht=druckdicht, entwart=entwart,
-                schachttyp=u'Schacht', simstatus=simstatus,
-                kommentar=kommentar, createdat=createdat, geop=geop, geom=geom)
-            if not dbQK.sql(sql, u'importkanaldaten_he (14)'):
-                return None
-        except BaseException as err:
-            fehlermeldung(u'SQL-Fehler', repr(err))
-            fehlermeldung(u"Fehler in QKan_Import_from_HE (14)", u"\nSchächte: in sql: \n" + sql + u'\n\n')
+        datensaetze.append((schnam, xsch, ysch, sohlhoehe, deckelhoehe, durchm, druckdicht, entwart,
+                            simstatus, kommentar, createdat))
+        koordinaten.append((xsch, ysch, (1. if durchm == 'NULL' else float(durchm) / 1000.)))
+
+    # Gleichnamige Objekte in der QKan-Datenbank werden ersetzt
+    if not schreiber.ersetzen(u'schaechte', u'schnam', [werte[0] for werte in datensaetze],
+                              u'importkanaldaten_he (11)'):
+        return None
 
-    dbQK.commit()
+    sql = u"""INSERT INTO schaechte (schnam, xsch, ysch, sohlhoehe, deckelhoehe, durchm, druckdicht, entwart,
+                                schachttyp, simstatus, kommentar, createdat, geop, geom)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, 'Schacht', ?, ?, ?, {geop}, {geom})""".format(geop=geo_param, geom=geo_param)
+    for geop, geom, werte in zip(punkte([k[:2] for k in koordinaten], epsg, geoformat),
+                                 kreise(koordinaten, epsg, geoformat), datensaetze):
+        schreiber.einfuegen(sql, werte + (geop, geom))
+
+    if not schreiber.schreiben(u'importkanaldaten_he (14)'):
+        return None
+    if not ablauf.weiter(u'schaechte', len(datensaetze)):
+        return None
 
     # ------------------------------------------------------------------------------
     # Speicherschachtdaten
@@ -385,24 +743,16 @@ def importKanaldaten(database_HE, database_QKan, projectfile, epsg,
             # return None
 
     # Daten aus ITWH-Datenbank abfragen
-    sql = u'''
-    SELECT NAME AS schnam, 
-        GELAENDEHOEHE AS deckelhoehe, 
-        SOHLHOEHE AS sohlhoehe, 
-        XKOORDINATE AS xsch, 
-        YKOORDINATE AS ysch, 
-        UEBERSTAUFLAECHE AS ueberstauflaeche, 
-        PLANUNGSSTATUS AS simstat_he, 
-        KOMMENTAR AS kommentar, 
-        LASTMODIFIED AS createdat 
-        FROM SPEICHERSCHACHT'''
-
-    dbHE.sql(sql)
-    daten = dbHE.fetchall()
+    daten = leser.ergebnis(u'speicher')
+    if daten is None:
+        return None
 
     # Speicherschachtdaten aufbereiten und in die QKan-DB schreiben
 
     logger.debug(u'simstatus[0]: {}'.format(ref_simulationsstatus[0]))
+    datensaetze = []
+    koordinaten = []
+
     for attr in daten:
         (schnam_ansi, deckelhoehe, sohlhoehe, xsch, ysch, ueberstauflaeche, simstat_he, kommentar_ansi,
          createdat) = ['NULL' if el is None else el for el in attr]
@@ -410,45 +760,31 @@ def importKanaldaten(database_HE, database_QKan, projectfile, epsg,
         (schnam, kommentar) = [tt.decode('iso-8859-1') for tt in (schnam_ansi, kommentar_ansi)]
 
         # Simstatus-Nr aus HE ersetzten
-        if simstat_he in ref_simulationsstatus:
-            simstatus = ref_simulationsstatus[simstat_he]
-        else:
-            # Noch nicht in Tabelle [simulationsstatus] enthalten, also ergqenzen
-            simstatus = u'({}_he)'.format(simstat_he)
-            sql = u"INSERT INTO simulationsstatus (bezeichnung, he_nr) Values ('{simstatus}', {he_nr})".format( \
-                simstatus=simstatus, he_nr=simstat_he)
-            ref_simulationsstatus[simstat_he] = simstatus
-            if not dbQK.sql(sql, u'importkanaldaten_he (16)'):
-                return None
+        simstatus = ref_simulationsstatus[simstat_he]
 
-        # Geo-Objekte erzeugen
+        # Datensatz zum Schreiben in die QKan-DB vormerken. Speicherschächte haben in HE keinen
+        # Durchmesser, das Symbol erhält den Radius 1 m.
 
-        if dbtyp == u'SpatiaLite':
-            geop = u'MakePoint({0:},{1:},{2:})'.format(xsch, ysch, epsg)
-            geom = u'CastToMultiPolygon(MakePolygon(MakeCircle({0:},{1:},{2:},{3:})))'.format(xsch, ysch, 
-                                             (1. if durchm == 'NULL' else durchm/ 1000.) , epsg)
-        elif dbtyp == u'postgis':
-            geop = u'ST_SetSRID(ST_MakePoint({0:},{1:}),{2:})'.format(xsch, ysch, epsg)
-        else:
-            fehlermeldung('Programmfehler!', 
-                'Datenbanktyp ist fehlerhaft {0:s}, Endung: {1:s}!\nAbbruch!'.format(dbtyp,dbdatabase[-7:].lower()))
-
-        # Datensatz in die QKan-DB schreiben
-
-        sql = u"""INSERT INTO schaechte (schnam, deckelhoehe, sohlhoehe, xsch, ysch, ueberstauflaeche, 
-                    schachttyp, simstatus, kommentar, createdat, geop, geom)
-            VALUES ('{schnam}', {deckelhoehe}, {sohlhoehe}, {xsch}, {ysch}, {ueberstauflaeche}, 
-                    '{schachttyp}', '{simstatus}', '{kommentar}', '{createdat}', 
-                    {geop}, {geom})""".format( \
-            schnam=schnam, deckelhoehe=deckelhoehe, sohlhoehe=sohlhoehe,
-            xsch=xsch, ysch=ysch, ueberstauflaeche=ueberstauflaeche,
-            schachttyp=u'Speicher', simstatus=simstatus, kommentar=kommentar,
-            createdat=createdat, geop=geop, geom=geom)
-
-        if not dbQK.sql(sql, u'importkanaldaten_he (17)'):
-            return None
+        datensaetze.append((schnam, deckelhoehe, sohlhoehe, xsch, ysch, ueberstauflaeche,
+                            simstatus, kommentar, createdat))
+        koordinaten.append((xsch, ysch, 1.))
+
+    # Gleichnamige Objekte in der QKan-Datenbank werden ersetzt
+    if not schreiber.ersetzen(u'schaechte', u'schnam', [werte[0] for werte in datensaetze],
+                              u'importkanaldaten_he (15)'):
+        return None
+
+    sql = u"""INSERT INTO schaechte (schnam, deckelhoehe, sohlhoehe, xsch, ysch, ueberstauflaeche,
+                schachttyp, simstatus, kommentar, createdat, geop, geom)
+        VALUES (?, ?, ?, ?, ?, ?, 'Speicher', ?, ?, ?, {geop}, {geom})""".format(geop=geo_param, geom=geo_param)
+    for geop, geom, werte in zip(punkte([k[:2] for k in koordinaten], epsg, geoformat),
+                                 kreise(koordinaten, epsg, geoformat), datensaetze):
+        schreiber.einfuegen(sql, werte + (geop, geom))
 
-    dbQK.commit()
+    if not schreiber.schreiben(u'importkanaldaten_he (17)'):
+        return None
+    if not ablauf.weiter(u'speicher', len(datensaetze)):
+        return None
 
     # ------------------------------------------------------------------------------
     # Auslässe
@@ -461,24 +797,16 @@ def importKanaldaten(database_HE, database_QKan, projectfile, epsg,
         # if not dbQK.sql(sql, u'importkanaldaten_he (18)'):
             # return None
 
-    # Daten aUS ITWH-Datenbank abfragen
-    sql = u'''
-    SELECT NAME AS schnam, 
-        XKOORDINATE AS xsch, 
-        YKOORDINATE AS ysch, 
-        SOHLHOEHE AS sohlhoehe, 
-        GELAENDEHOEHE AS deckelhoehe, 
-        TYP AS typ_he, 
-        PLANUNGSSTATUS AS simstat_he, 
-        KOMMENTAR AS kommentar, 
-        LASTMODIFIED AS createdat 
-        FROM AUSLASS'''
-
-    dbHE.sql(sql)
-    daten = dbHE.fetchall()
+    # Daten aus ITWH-Datenbank abfragen
+    daten = leser.ergebnis(u'auslaesse')
+    if daten is None:
+        return None
 
     # Daten aufbereiten und in die QKan-DB schreiben
 
+    datensaetze = []
+    koordinaten = []
+
     for attr in daten:
         (schnam_ansi, xsch, ysch, sohlhoehe, deckelhoehe, typ_he, simstat_he, kommentar_ansi, createdat) = \
             ['NULL' if el is None else el for el in attr]
@@ -486,56 +814,33 @@ def importKanaldaten(database_HE, database_QKan, projectfile, epsg,
         (schnam, kommentar) = [tt.decode('iso-8859-1') for tt in (schnam_ansi, kommentar_ansi)]
 
         # Auslasstyp-Nr aus HE ersetzten
-        if typ_he in ref_auslasstypen:
-            auslasstyp = ref_auslasstypen[typ_he]
-        else:
-            # Noch nicht in Tabelle [auslasstypen] enthalten, also ergqenzen
-            auslasstyp = u'({}_he)'.format(typ_he)
-            sql = u"INSERT INTO auslasstypen (bezeichnung, he_nr) Values ('{auslasstyp}', {he_nr})".format( \
-                auslasstyp=auslasstyp, he_nr=typ_he)
-            ref_auslasstypen[typ_he] = auslasstyp
-            if not dbQK.sql(sql, u'importkanaldaten_he (19)'):
-                return None
+        auslasstyp = ref_auslasstypen[typ_he]
 
         # Simstatus-Nr aus HE ersetzten
-        if simstat_he in ref_simulationsstatus:
-            simstatus = ref_simulationsstatus[simstat_he]
-        else:
-            # Noch nicht in Tabelle [simulationsstatus] enthalten, also ergqenzen
-            simstatus = u'({}_he)'.format(simstat_he)
-            sql = u"INSERT INTO simulationsstatus (bezeichnung, he_nr) Values ('{simstatus}', {he_nr})".format( \
-                simstatus=simstatus, he_nr=simstat_he)
-            ref_simulationsstatus[simstat_he] = simstatus
-            if not dbQK.sql(sql, u'importkanaldaten_he (20)'):
-                return None
+        simstatus = ref_simulationsstatus[simstat_he]
 
-        # Geo-Objekte erzeugen
+        # Datensatz zum Schreiben in die QKan-DB vormerken
 
-        if dbtyp == u'SpatiaLite':
-            geop = u'MakePoint({0:},{1:},{2:})'.format(xsch, ysch, epsg)
-            geom = u'CastToMultiPolygon(MakePolygon(MakeCircle({0:},{1:},{2:},{3:})))'.format(xsch, ysch, 1., epsg)
-        elif dbtyp == u'postgis':
-            geop = u'ST_SetSRID(ST_MakePoint({0:},{1:}),{2:})'.format(xsch, ysch, epsg)
-        else:
-            fehlermeldung('Programmfehler!', 
-                'Datenbanktyp ist fehlerhaft {0:s}, Endung: {1:s}!\nAbbruch!'.format(dbtyp,dbdatabase[-7:].lower()))
-
-        # Datensatz in die QKan-DB schreiben
-
-        sql = u"""INSERT INTO schaechte (schnam, xsch, ysch, sohlhoehe, deckelhoehe, 
-                    auslasstyp, schachttyp, simstatus, kommentar, createdat, geop, geom)
-            VALUES ('{schnam}', {xsch}, {ysch}, {sohlhoehe}, {deckelhoehe}, '{auslasstyp}', 
-                    '{schachttyp}', '{simstatus}', '{kommentar}', 
-                    '{createdat}', {geop}, {geom})""".format(schnam=schnam, xsch=xsch, ysch=ysch,
-                                                             sohlhoehe=sohlhoehe, deckelhoehe=deckelhoehe,
-                                                             auslasstyp=auslasstyp,
-                                                             schachttyp=u'Auslass', simstatus=simstatus,
-                                                             kommentar=kommentar, createdat=createdat, geop=geop,
-                                                             geom=geom)
-        if not dbQK.sql(sql, u'importkanaldaten_he (21)'):
-            return None
+        datensaetze.append((schnam, xsch, ysch, sohlhoehe, deckelhoehe, auslasstyp,
+                            simstatus, kommentar, createdat))
+        koordinaten.append((xsch, ysch, 1.))
+
+    # Gleichnamige Objekte in der QKan-Datenbank werden ersetzt
+    if not schreiber.ersetzen(u'schaechte', u'schnam', [werte[0] for werte in datensaetze],
+                              u'importkanaldaten_he (18)'):
+        return None
+
+    sql = u"""INSERT INTO schaechte (schnam, xsch, ysch, sohlhoehe, deckelhoehe,
+                auslasstyp, schachttyp, simstatus, kommentar, createdat, geop, geom)
+        VALUES (?, ?, ?, ?, ?, ?, 'Auslass', ?, ?, ?, {geop}, {geom})""".format(geop=geo_param, geom=geo_param)
+    for geop, geom, werte in zip(punkte([k[:2] for k in koordinaten], epsg, geoformat),
+                                 kreise(koordinaten, epsg, geoformat), datensaetze):
+        schreiber.einfuegen(sql, werte + (geop, geom))
 
-    dbQK.commit()
+    if not schreiber.schreiben(u'importkanaldaten_he (21)'):
+        return None
+    if not ablauf.weiter(u'auslaesse', len(datensaetze)):
+        return None
 
     # ------------------------------------------------------------------------------
     # Pumpen
@@ -546,35 +851,16 @@ def importKanaldaten(database_HE, database_QKan, projectfile, epsg,
         # if not dbQK.sql(sql, u'importkanaldaten_he (22)'):
             # return None
 
-    # Daten aUS ITWH-Datenbank abfragen
-    sql = u'''
-    SELECT 
-        PUMPE.NAME AS pnam, 
-        PUMPE.SCHACHTOBEN AS schoben, 
-        PUMPE.SCHACHTUNTEN AS schunten, 
-        PUMPE.TYP AS typ_he, 
-        PUMPE.STEUERSCHACHT AS steuersch, 
-        PUMPE.EINSCHALTHOEHE AS einschalthoehe, 
-        PUMPE.AUSSCHALTHOEHE AS ausschalthoehe,
-        SO.XKOORDINATE AS xob, 
-        SO.YKOORDINATE AS yob, 
-        SU.XKOORDINATE AS xun, 
-        SU.YKOORDINATE AS yun, 
-        PUMPE.PLANUNGSSTATUS AS simstat_he, 
-        PUMPE.KOMMENTAR AS kommentar, 
-        PUMPE.LASTMODIFIED AS createdat
-    FROM PUMPE
-    LEFT JOIN (SELECT NAME, DECKELHOEHE, XKOORDINATE, YKOORDINATE FROM SCHACHT
-         UNION SELECT NAME, GELAENDEHOEHE AS DECKELHOEHE, XKOORDINATE, YKOORDINATE FROM SPEICHERSCHACHT) AS SO ON PUMPE.SCHACHTOBEN = SO.NAME 
-    LEFT JOIN (SELECT NAME, DECKELHOEHE, XKOORDINATE, YKOORDINATE FROM SCHACHT
-         UNION SELECT NAME, GELAENDEHOEHE AS DECKELHOEHE, XKOORDINATE, YKOORDINATE FROM AUSLASS
-         UNION SELECT NAME, GELAENDEHOEHE AS DECKELHOEHE, XKOORDINATE, YKOORDINATE FROM SPEICHERSCHACHT) AS SU
-    ON PUMPE.SCHACHTUNTEN = SU.NAME'''
-    dbHE.sql(sql)
-    daten = dbHE.fetchall()
+    # Daten aus ITWH-Datenbank abfragen
+    daten = leser.ergebnis(u'pumpen')
+    if daten is None:
+        return None
 
     # Pumpendaten in die QKan-DB schreiben
 
+    datensaetze = []
+    koordinaten = []
+
     for attr in daten:
         (pnam_ansi, schoben_ansi, schunten_ansi, typ_he, steuersch, einschalthoehe, ausschalthoehe,
          xob, yob, xun, yun, simstat_he, kommentar_ansi, createdat) = ['NULL' if el is None else el for el in attr]
@@ -583,69 +869,41 @@ def importKanaldaten(database_HE, database_QKan, projectfile, epsg,
                                                                                    schunten_ansi, kommentar_ansi)]
 
         # Pumpentyp-Nr aus HE ersetzten
-        if typ_he in ref_pumpentyp:
-            pumpentyp = ref_pumpentyp[typ_he]
-        else:
-            # Noch nicht in Tabelle [pumpentypen] enthalten, also ergqenzen
-            pumpentyp = u'({}_he)'.format(typ_he)
-            sql = u"INSERT INTO pumpentypen (bezeichnung, he_nr) Values ('{pumpentyp}', {he_nr})".format( \
-                pumpentyp=pumpentyp, he_nr=typ_he)
-            ref_pumpentyp[typ_he] = pumpentyp
-            if not dbQK.sql(sql, u'importkanaldaten_he (23)'):
-                return None
+        pumpentyp = ref_pumpentyp[typ_he]
 
         # Simstatus-Nr aus HE ersetzten
-        if simstat_he in ref_simulationsstatus:
-            simstatus = ref_simulationsstatus[simstat_he]
-        else:
-            # Noch nicht in Tabelle [simulationsstatus] enthalten, also ergqenzen
-            simstatus = u'({}_he)'.format(simstat_he)
-            sql = u"INSERT INTO simulationsstatus (bezeichnung, he_nr) Values ('{simstatus}', {he_nr})".format( \
-                simstatus=simstatus, he_nr=simstat_he)
-            ref_simulationsstatus[simstat_he] = simstatus
-            if not dbQK.sql(sql, u'importkanaldaten_he (24)'):
-                return None
+        simstatus = ref_simulationsstatus[simstat_he]
 
         # Geo-Objekt erzeugen
 
         if xun == u'NULL' or yun == u'NULL':
             # Es gibt keinen Schacht unten. Dann wird die Pumpe grafisch nach rechs oben
             # erzeugt
-            xun = u'{:.3f}'.format(float(xob) + 10.)
-            yun = u'{:.3f}'.format(float(yob) + 10.)
-
-        if dbtyp == u'SpatiaLite':
-            geom = u'MakeLine(MakePoint({0:},{1:},{4:s}),MakePoint({2:},{3:},{4:}))'.format(xob, yob, xun, yun, epsg)
-        elif dbtyp == u'postgis':
-            geom = u'''ST_MakeLine(ST_SetSRID(ST_MakePoint({0:},{1:}),{4:}),
-                      ST_SetSRID(ST_MakePoint({2:},{3:}),{4:}))'''.format(xob, yob, xun, yun, epsg)
-        else:
-            fehlermeldung('Programmfehler!', 
-                'Datenbanktyp ist fehlerhaft {0:s}, Endung: {1:s}!\nAbbruch!'.format(dbtyp,dbdatabase[-7:].lower()))
-
-        # Datensatz aufbereiten und in die QKan-DB schreiben
-
-        try:
-            sql = u"""INSERT INTO pumpen 
-                (pnam, schoben, schunten, pumpentyp, steuersch, einschalthoehe, ausschalthoehe, 
-                simstatus, kommentar, createdat, geom) 
-                VALUES ('{pnam}', '{schoben}', '{schunten}', '{pumpentyp}', '{steuersch}', 
-                {einschalthoehe}, {ausschalthoehe}, '{simstatus}', '{kommentar}', '{createdat}', {geom})""".format( \
-                pnam=pnam, schoben=schoben, schunten=schunten, pumpentyp=pumpentyp, steuersch=steuersch,
-                einschalthoehe=einschalthoehe, ausschalthoehe=ausschalthoehe, simstatus=simstatus,
-                kommentar=kommentar, createdat=createdat, geom=geom)
-
-        except BaseException as err:
-            fehlermeldung(u'SQL-Fehler', repr(err))
-            fehlermeldung(u"Fehler in QKan_Import_from_HE",
-                          u"\nFehler in sql INSERT INTO pumpen: \n" + str((pnam, schoben, \
-                                                                           schunten, pumpentyp, steuersch,
-                                                                           einschalthoehe, ausschalthoehe,
-                                                                           geom)) + u'\n\n')
-
-        if not dbQK.sql(sql, u'importkanaldaten_he (25)'):
-            return None
-    dbQK.commit()
+            xun = float(xob) + 10.
+            yun = float(yob) + 10.
+
+        # Datensatz aufbereiten und zum Schreiben in die QKan-DB vormerken
+
+        datensaetze.append((pnam, schoben, schunten, pumpentyp, steuersch, einschalthoehe, ausschalthoehe,
+                            simstatus, kommentar, createdat))
+        koordinaten.append((xob, yob, xun, yun))
+
+    # Gleichnamige Objekte in der QKan-Datenbank werden ersetzt
+    if not schreiber.ersetzen(u'pumpen', u'pnam', [werte[0] for werte in datensaetze],
+                              u'importkanaldaten_he (22)'):
+        return None
+
+    sql = u"""INSERT INTO pumpen
+        (pnam, schoben, schunten, pumpentyp, steuersch, einschalthoehe, ausschalthoehe,
+        simstatus, kommentar, createdat, geom)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, {geom})""".format(geom=geo_param)
+    for geom, werte in zip(linien(koordinaten, epsg, geoformat), datensaetze):
+        schreiber.einfuegen(sql, werte + (geom,))
+
+    if not schreiber.schreiben(u'importkanaldaten_he (25)'):
+        return None
+    if not ablauf.weiter(u'pumpen', len(datensaetze)):
+        return None
 
     # ------------------------------------------------------------------------------
     # Wehre
@@ -656,36 +914,16 @@ def importKanaldaten(database_HE, database_QKan, projectfile, epsg,
         # if not dbQK.sql(sql, u'importkanaldaten_he (26)'):
             # return None
 
-    # Daten aUS ITWH-Datenbank abfragen
-    sql = u'''
-    SELECT 
-        WEHR.NAME AS wnam,
-        WEHR.SCHACHTOBEN AS schoben, 
-        WEHR.SCHACHTUNTEN AS schunten, 
-        WEHR.TYP AS typ_he, 
-        WEHR.SCHWELLENHOEHE AS schwellenhoehe, 
-        WEHR.GEOMETRIE1 AS kammerhoehe, 
-        WEHR.GEOMETRIE2 AS laenge,
-        WEHR.UEBERFALLBEIWERT AS uebeiwert,
-        SO.XKOORDINATE AS xob, 
-        SO.YKOORDINATE AS yob, 
-        SU.XKOORDINATE AS xun, 
-        SU.YKOORDINATE AS yun, 
-        WEHR.PLANUNGSSTATUS AS simstat_he, 
-        WEHR.KOMMENTAR AS kommentar, 
-        WEHR.LASTMODIFIED AS createdat
-    FROM WEHR
-    LEFT JOIN (SELECT NAME, DECKELHOEHE, XKOORDINATE, YKOORDINATE FROM SCHACHT
-         UNION SELECT NAME, GELAENDEHOEHE AS DECKELHOEHE, XKOORDINATE, YKOORDINATE FROM SPEICHERSCHACHT) AS SO ON WEHR.SCHACHTOBEN = SO.NAME 
-    LEFT JOIN (SELECT NAME, DECKELHOEHE, XKOORDINATE, YKOORDINATE FROM SCHACHT
-         UNION SELECT NAME, GELAENDEHOEHE AS DECKELHOEHE, XKOORDINATE, YKOORDINATE FROM AUSLASS
-         UNION SELECT NAME, GELAENDEHOEHE AS DECKELHOEHE, XKOORDINATE, YKOORDINATE FROM SPEICHERSCHACHT) AS SU
-    ON WEHR.SCHACHTUNTEN = SU.NAME'''
-    dbHE.sql(sql)
-    daten = dbHE.fetchall()
+    # Daten aus ITWH-Datenbank abfragen
+    daten = leser.ergebnis(u'wehre')
+    if daten is None:
+        return None
 
     # Wehrdaten in die QKan-DB schreiben
 
+    datensaetze = []
+    koordinaten = []
+
     for attr in daten:
         (wnam_ansi, schoben_ansi, schunten_ansi, typ_he, schwellenhoehe, kammerhoehe, laenge, uebeiwert,
          xob, yob, xun, yun, simstat_he, kommentar_ansi, createdat) = ['NULL' if el is None else el for el in attr]
@@ -694,58 +932,37 @@ def importKanaldaten(database_HE, database_QKan, projectfile, epsg,
                                                                                    schunten_ansi, kommentar_ansi)]
 
         # Simstatus-Nr aus HE ersetzten
-        if simstat_he in ref_simulationsstatus:
-            simstatus = ref_simulationsstatus[simstat_he]
-        else:
-            # Noch nicht in Tabelle [simulationsstatus] enthalten, also ergqenzen
-            simstatus = u'({}_he)'.format(simstat_he)
-            sql = u"INSERT INTO simulationsstatus (bezeichnung, he_nr) Values ('{simstatus}', {he_nr})".format( \
-                simstatus=simstatus, he_nr=simstat_he)
-            ref_simulationsstatus[simstat_he] = simstatus
-            if not dbQK.sql(sql, u'importkanaldaten_he (27)'):
-                return None
+        simstatus = ref_simulationsstatus[simstat_he]
 
         # Geo-Objekt erzeugen
 
         if xun == u'NULL' or yun == u'NULL':
             # Es gibt keinen Schacht unten. Dann wird die Pumpe grafisch nach rechs oben
             # erzeugt
-            xun = u'{:.3f}'.format(float(xob) + 10.)
-            yun = u'{:.3f}'.format(float(yob) + 10.)
-
-        if dbtyp == u'SpatiaLite':
-            geom = u'MakeLine(MakePoint({0:},{1:},{4:}),MakePoint({2:},{3:},{4:}))'.format(xob, yob, xun, yun, epsg)
-        elif dbtyp == u'postgis':
-            geom = u'ST_MakeLine(ST_SetSRID(ST_MakePoint({0:},{1:}),{4:}),ST_SetSRID(ST_MakePoint({2:},{3:}),{4:}))'.format(
-                xob, yob, xun, yun, epsg)
-        else:
-            fehlermeldung('Programmfehler!', 
-                'Datenbanktyp ist fehlerhaft {0:s}, Endung: {1:s}!\nAbbruch!'.format(dbtyp,dbdatabase[-7:].lower()))
-
-        # Datensatz aufbereiten und in die QKan-DB schreiben
-
-        try:
-            sql = u"""INSERT INTO wehre (wnam, schoben, schunten, schwellenhoehe, kammerhoehe,
-                 laenge, uebeiwert, simstatus, kommentar, createdat, geom) 
-                 VALUES ('{wnam}', '{schoben}', '{schunten}', {schwellenhoehe},
-                {kammerhoehe}, {laenge}, {uebeiwert}, '{simstatus}', '{kommentar}', '{createdat}', 
-                {geom})""".format(wnam=wnam,
-                                  schoben=schoben, schunten=schunten, schwellenhoehe=schwellenhoehe,
-                                  kammerhoehe=kammerhoehe, laenge=laenge, uebeiwert=uebeiwert, simstatus=simstatus,
-                                  kommentar=kommentar, createdat=createdat, geom=geom)
-            ok = True
-        except BaseException as err:
-            fehlermeldung(u'Fehler', repr(err))
-            ok = False
-            fehlermeldung(u"Fehler in QKan_Import_from_HE",
-                          u"\nFehler in sql INSERT INTO wehre: \n" + str((wnam, schoben, schunten,
-                                                                          schwellenhoehe, kammerhoehe, laenge,
-                                                                          uebeiwert, geom)) + u'\n\n')
-
-        if ok:
-            if not dbQK.sql(sql, u'importkanaldaten_he (28)'):
-                return None
-    dbQK.commit()
+            xun = float(xob) + 10.
+            yun = float(yob) + 10.
+
+        # Datensatz aufbereiten und zum Schreiben in die QKan-DB vormerken
+
+        datensaetze.append((wnam, schoben, schunten, schwellenhoehe, kammerhoehe, laenge, uebeiwert,
+                            simstatus, kommentar, createdat))
+        koordinaten.append((xob, yob, xun, yun))
+
+    # Gleichnamige Objekte in der QKan-Datenbank werden ersetzt
+    if not schreiber.ersetzen(u'wehre', u'wnam', [werte[0] for werte in datensaetze],
+                              u'importkanaldaten_he (26)'):
+        return None
+
+    sql = u"""INSERT INTO wehre (wnam, schoben, schunten, schwellenhoehe, kammerhoehe,
+         laenge, uebeiwert, simstatus, kommentar, createdat, geom)
+         VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, {geom})""".format(geom=geo_param)
+    for geom, werte in zip(linien(koordinaten, epsg, geoformat), datensaetze):
+        schreiber.einfuegen(sql, werte + (geom,))
+
+    if not schreiber.schreiben(u'importkanaldaten_he (28)'):
+        return None
+    if not ablauf.weiter(u'wehre', len(datensaetze)):
+        return None
 
     # ------------------------------------------------------------------------------
     # Einzugsgebiete
@@ -758,24 +975,17 @@ def importKanaldaten(database_HE, database_QKan, projectfile, epsg,
     # if not dbQK.sql(sql, u'importkanaldaten_he (29)'):
     #     return None
 
-    # Daten aUS ITWH-Datenbank abfragen
-    sql = u'''
-    SELECT 
-        NAME AS tgnam,
-        EINWOHNERDICHTE AS ewdichte,
-        WASSERVERBRAUCH AS wverbrauch,
-        STUNDENMITTEL AS stdmittel,
-        FREMDWASSERANTEIL AS fremdwas,
-        FLAECHE AS flaeche,
-        KOMMENTAR AS kommentar,
-        LASTMODIFIED AS createdat
-    FROM
-        teileinzugsgebiet'''
+    # Daten aus ITWH-Datenbank abfragen
+    daten = leser.ergebnis(u'einzugsgebiete')
+    if daten is None:
+        return None
 
-    dbHE.sql(sql)
-    daten = dbHE.fetchall()
+    # Teileinzugsgebietsdaten in die QKan-DB schreiben. Vorhandene Teileinzugsgebiete werden nur
+    # aktualisiert, damit ihre Geo-Objekte erhalten bleiben.
 
-    # Teileinzugsgebietsdaten in die QKan-DB schreiben
+    if not dbQK.sql(u'SELECT tgnam FROM einzugsgebiete', u'importkanaldaten_he (29)'):
+        return None
+    vorhanden = set(el[0] for el in dbQK.fetchall())
 
     for attr in daten:
         (tgnam_ansi, ewdichte, wverbrauch, stdmittel, fremdwas, flaeche, kommentar_ansi, createdat) = [
@@ -783,28 +993,26 @@ def importKanaldaten(database_HE, database_QKan, projectfile, epsg,
 
         (tgnam, kommentar) = [tt.decode('iso-8859-1') for tt in (tgnam_ansi, kommentar_ansi)]
 
-        # Datensatz aufbereiten und in die QKan-DB schreiben
+        # Datensatz aufbereiten und zum Schreiben in die QKan-DB vormerken
 
-        try:
+        if tgnam in vorhanden:
+            sql = u"""
+              UPDATE einzugsgebiete SET ewdichte = ?, wverbrauch = ?, stdmittel = ?,
+                fremdwas = ?, kommentar = ?, createdat = ?
+              WHERE tgnam = ?"""
+            schreiber.einfuegen(sql, (ewdichte, wverbrauch, stdmittel, fremdwas, kommentar, createdat, tgnam))
+        else:
             sql = u"""
               INSERT INTO einzugsgebiete (tgnam, ewdichte, wverbrauch, stdmittel,
                 fremdwas, kommentar, createdat) 
-              VALUES ('{tgnam}', {ewdichte}, {wverbrauch}, {stdmittel}, {fremdwas},
-                '{kommentar}', '{createdat}')
-                 """.format(tgnam=tgnam, ewdichte=ewdichte, wverbrauch=wverbrauch, stdmittel=stdmittel,
-                            fremdwas=fremdwas, kommentar=kommentar, createdat=createdat)
-            ok = True
-        except BaseException as err:
-            fehlermeldung(u'SQL-Fehler', repr(err))
-            fehlermeldung(u"Fehler in QKan_Import_from_HE", u"\nFehler in sql INSERT INTO einzugsgebiete: \n" + \
-                          repr((tgnam, ewdichte, wverbrauch, stdmittel,
-                               fremdwas, kommentar, createdat)) + u'\n\n')
-            ok = False
-
-        if ok:
-            if not dbQK.sql(sql, u'importkanaldaten_he (30)'):
-                return None
-    dbQK.commit()
+              VALUES (?, ?, ?, ?, ?, ?, ?)"""
+            schreiber.einfuegen(sql, (tgnam, ewdichte, wverbrauch, stdmittel, fremdwas, kommentar, createdat))
+            vorhanden.add(tgnam)
+
+    if not schreiber.schreiben(u'importkanaldaten_he (30)'):
+        return None
+    if not ablauf.weiter(u'einzugsgebiete', len(daten)):
+        return None
 
     # ------------------------------------------------------------------------------
     # Speicherkennlinien
@@ -815,36 +1023,32 @@ def importKanaldaten(database_HE, database_QKan, projectfile, epsg,
         # if not dbQK.sql(sql, u'importkanaldaten_he (31)'):
             # return None
 
-    # Daten aUS ITWH-Datenbank abfragen
-    sql = u'''
-        SELECT 
-            NAME AS schnam, 
-            KEYWERT + SOHLHOEHE AS wspiegel, 
-            WERT AS oberfl 
-        FROM TABELLENINHALTE 
-        JOIN SPEICHERSCHACHT 
-        ON TABELLENINHALTE.ID = SPEICHERSCHACHT.ID 
-        ORDER BY SPEICHERSCHACHT.ID, TABELLENINHALTE.REIHENFOLGE'''
+    # Daten aus ITWH-Datenbank abfragen
+    daten = leser.ergebnis(u'speicherkennlinien')
+    if daten is None:
+        return None
 
-    dbHE.sql(sql)
-    daten = dbHE.fetchall()
+    # Speicherdaten in die QKan-DB schreiben. Vorhandene Kennlinien der importierten Speicher werden ersetzt.
 
-    # Speicherdaten in die QKan-DB schreiben
+    if not schreiber.ersetzen(u'speicherkennlinien', u'schnam',
+                              [attr[0].decode('iso-8859-1') for attr in daten if attr[0] is not None],
+                              u'importkanaldaten_he (31)'):
+        return None
 
     for attr in daten:
         (schnam_ansi, wspiegel, oberfl) = ['NULL' if el is None else el for el in attr]
 
         schnam = schnam_ansi.decode('iso-8859-1')
 
-        # Datensatz aufbereiten und in die QKan-DB schreiben
+        # Datensatz zum Schreiben in die QKan-DB vormerken
 
-        sql = u"""INSERT INTO speicherkennlinien (schnam, wspiegel, oberfl) 
-             VALUES ('{schnam}', {wspiegel}, {oberfl})""".format(schnam=schnam,
-                                                                 wspiegel=wspiegel, oberfl=oberfl)
+        sql = u"""INSERT INTO speicherkennlinien (schnam, wspiegel, oberfl) VALUES (?, ?, ?)"""
+        schreiber.einfuegen(sql, (schnam, wspiegel, oberfl))
 
-        if not dbQK.sql(sql, u'importkanaldaten_he (32)'):
-            return None
-    dbQK.commit()
+    if not schreiber.schreiben(u'importkanaldaten_he (32)'):
+        return None
+    if not ablauf.weiter(u'speicherkennlinien', len(daten)):
+        return None
 
     # ------------------------------------------------------------------------------
     # Sonderprofildaten
@@ -855,36 +1059,32 @@ def importKanaldaten(database_HE, database_QKan, projectfile, epsg,
         # if not dbQK.sql(sql, u'importkanaldaten_he (33)'):
             # return None
 
-    # Daten aUS ITWH-Datenbank abfragen
-    sql = u'''
-        SELECT 
-            NAME AS profilnam, 
-            KEYWERT AS wspiegel, 
-            WERT AS wbreite 
-        FROM TABELLENINHALTE 
-        JOIN SONDERPROFIL 
-        ON TABELLENINHALTE.ID = SONDERPROFIL.ID 
-        ORDER BY SONDERPROFIL.ID, TABELLENINHALTE.REIHENFOLGE'''
+    # Daten aus ITWH-Datenbank abfragen
+    daten = leser.ergebnis(u'profildaten')
+    if daten is None:
+        return None
 
-    dbHE.sql(sql)
-    daten = dbHE.fetchall()
+    # Profil in die QKan-DB schreiben. Vorhandene Profildaten der importierten Sonderprofile werden ersetzt.
 
-    # Profil in die QKan-DB schreiben
+    if not schreiber.ersetzen(u'profildaten', u'profilnam',
+                              [attr[0].decode('iso-8859-1') for attr in daten if attr[0] is not None],
+                              u'importkanaldaten_he (33)'):
+        return None
 
     for attr in daten:
         (profilnam_ansi, wspiegel, wbreite) = ['NULL' if el is None else el for el in attr]
 
         profilnam = profilnam_ansi.decode('iso-8859-1')
 
-        # Datensatz aufbereiten und in die QKan-DB schreiben
+        # Datensatz zum Schreiben in die QKan-DB vormerken
 
-        sql = u"""INSERT INTO profildaten (profilnam, wspiegel, wbreite) 
-             VALUES ('{profilnam}', {wspiegel}, {wbreite})""".format(profilnam=profilnam,
-                                                                     wspiegel=wspiegel, wbreite=wbreite)
+        sql = u"""INSERT INTO profildaten (profilnam, wspiegel, wbreite) VALUES (?, ?, ?)"""
+        schreiber.einfuegen(sql, (profilnam, wspiegel, wbreite))
 
-        if not dbQK.sql(sql, u'importkanaldaten_he (34)'):
-            return None
-    dbQK.commit()
+    if not schreiber.schreiben(u'importkanaldaten_he (34)'):
+        return None
+    if not ablauf.weiter(u'profildaten', len(daten)):
+        return None
 
     # ------------------------------------------------------------------------------
     # Abflussparameter
@@ -895,32 +1095,16 @@ def importKanaldaten(database_HE, database_QKan, projectfile, epsg,
         # if not dbQK.sql(sql, u'importkanaldaten_he (35)'):
             # return None
 
-    # Daten aUS ITWH-Datenbank abfragen
-    sql = u'''
-        SELECT 
-            NAME AS apnam_ansi,
-            ABFLUSSBEIWERTANFANG AS anfangsabflussbeiwert,
-            ABFLUSSBEIWERTENDE AS endabflussbeiwert,
-            MULDENVERLUST AS muldenverlust,
-            BENETZUNGSVERLUST AS benetzungsverlust,
-            BENETZUNGSPEICHERSTART AS benetzung_startwert,
-            MULDENAUFFUELLGRADSTART AS mulden_startwert,
-            TYP AS aptyp,
-            BODENKLASSE AS bodenklasse_ansi,
-            LASTMODIFIED AS createdat,
-            KOMMENTAR AS kommentar_ansi
-        FROM ABFLUSSPARAMETER'''
-
-    dbHE.sql(sql)
-    daten = dbHE.fetchall()
+    # Daten aus ITWH-Datenbank abfragen
+    daten = leser.ergebnis(u'abflussparameter')
+    if daten is None:
+        return None
 
     # Abflussparameter in die QKan-DB schreiben
 
-    # Zuerst sicherstellen, dass die Datensätze nicht schon vorhanden sind. Falls doch, werden sie überschrieben
-    sql = u'SELECT apnam FROM abflussparameter'
-    if not dbQK.sql(sql, u'importkanaldaten_he (36)'):
-        return None
-    datqk = [el[0] for el in dbQK.fetchall()]
+    # Bereits vorhandene Datensätze werden überschrieben. Bei mehrfach vorhandenen Namen in der
+    # HE-Datenbank gilt der letzte Datensatz.
+    datensaetze = OrderedDict()
 
     for attr in daten:
         (apnam_ansi, anfangsabflussbeiwert, endabflussbeiwert, muldenverlust, benetzungsverlust,
@@ -933,44 +1117,77 @@ def importKanaldaten(database_HE, database_QKan, projectfile, epsg,
         if aptyp == 0:
             bodenklasse = u'NULL'  # in QKan default für befestigte Flächen
 
-        # Datensatz in die QKan-DB schreiben
+        # Datensatz zum Schreiben in die QKan-DB vormerken
 
-        # Falls Datensatz bereits vorhanden: löschen
-        if apnam in datqk:
-            sql = u"DELETE FROM abflussparameter WHERE apnam = '{}'".format(apnam)
-            if not dbQK.sql(sql, u'importkanaldaten_he (37)'):
-                return None
+        datensaetze.pop(apnam, None)
+        datensaetze[apnam] = (apnam, anfangsabflussbeiwert, endabflussbeiwert, benetzungsverlust,
+                              muldenverlust, benetzung_startwert, mulden_startwert,
+                              bodenklasse, kommentar, createdat)
+
+    # Vorhandene Datensätze löschen und alle Datensätze gemeinsam schreiben
+    if not schreiber.ersetzen(u'abflussparameter', u'apnam', list(datensaetze), u'importkanaldaten_he (36)'):
+        return None
+
+    sql = u"""INSERT INTO abflussparameter
+          ( apnam, anfangsabflussbeiwert, endabflussbeiwert,
+            benetzungsverlust, muldenverlust,
+            benetzung_startwert, mulden_startwert,
+            bodenklasse, kommentar, createdat)
+          VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"""
+    for werte in datensaetze.values():
+        schreiber.einfuegen(sql, werte)
+
+    if not schreiber.schreiben(u'importkanaldaten_he (38)'):
+        return None
+    if not ablauf.weiter(u'abflussparameter', len(datensaetze)):
+        return None
+
+    # ------------------------------------------------------------------------------
+    # Bodenklassen, Flächen, Einzeleinleiter und Außengebiete
+    # Diese Tabellen werden nach allen übrigen Abfragen paketweise über die eigene Verbindung
+    # gelesen und geschrieben (Modul flaechen).
 
-        sql = u"""INSERT INTO abflussparameter
-              ( apnam, anfangsabflussbeiwert, endabflussbeiwert, 
-                benetzungsverlust, muldenverlust, 
-                benetzung_startwert, mulden_startwert, 
-                bodenklasse, kommentar, createdat) 
-              VALUES 
-              ( '{apnam}', {anfangsabflussbeiwert}, {endabflussbeiwert}, 
-                {benetzungsverlust}, {muldenverlust}, 
-                {benetzung_startwert}, {mulden_startwert}, 
-                '{bodenklasse}', '{kommentar}', '{createdat}')""".format(apnam=apnam,
-                                                                         anfangsabflussbeiwert=anfangsabflussbeiwert,
-                                                                         endabflussbeiwert=endabflussbeiwert,
-                                                                         benetzungsverlust=benetzungsverlust,
-                                                                         muldenverlust=muldenverlust,
-                                                                         benetzung_startwert=benetzung_startwert,
-                                                                         mulden_startwert=mulden_startwert,
-                                                                         bodenklasse=bodenklasse, kommentar=kommentar,
-                                                                         createdat=createdat)
-
-        if not dbQK.sql(sql, u'importkanaldaten_he (38)'):
+    if mit_flaechen:
+        anzahl = importBodenklassen(dbHE, schreiber)
+        if anzahl is None:
+            return None
+        if not ablauf.weiter(u'bodenklassen', anzahl):
             return None
-    dbQK.commit()
 
+        for tabelle, importieren in [(u'flaechen', importFlaechen), (u'einleit', importEinleiter),
+                                     (u'aussengebiete', importAussengebiete)]:
+            anzahl = importieren(dbHE, schreiber, epsg, geoformat, geo_param, namensraum)
+            if anzahl is None:
+                return None
+            if not ablauf.weiter(tabelle, anzahl):
+                return None
 
-    # Schachttypen auswerten
-    evalNodeTypes(dbQK)                     # in qkan.database.qkan_utils
+    return True
 
 
-    # --------------------------------------------------------------------------
-    # Zoom-Bereich für die Projektdatei vorbereiten
+def geoparameter(dbtyp, epsg, melden=fehlermeldung):
+    '''Geo-Objekte werden je Tabelle gemeinsam als Binärobjekte erzeugt (Modul geometrie) und
+    als Parameter gebunden. Für SpatiaLite im internen BLOB-Format, für PostGIS als WKB.
+
+    :returns:   (Format für das Modul geometrie, Platzhalter in den INSERT-Anweisungen) oder
+                (None, None) bei einem unbekannten Datenbanktyp
+    :rtype:     tuple
+    '''
+    if dbtyp == u'SpatiaLite':
+        return u'spatialite', u'?'
+    elif dbtyp == u'postgis':
+        return u'wkb', u'ST_GeomFromWKB(?, {0:})'.format(epsg)
+    melden('Programmfehler!', 
+        'Datenbanktyp ist fehlerhaft {0:s}!\nAbbruch!'.format(dbtyp))
+    return None, None
+
+
+def zoombereich(dbHE, melden=fehlermeldung):
+    '''Ausdehnung der Schächte in der HE-Datenbank
+
+    :returns:   (xmin, xmax, ymin, ymax) oder None im Fehlerfall
+    :rtype:     tuple
+    '''
     sql = u'''SELECT min(xkoordinate) AS xmin, 
                     max(xkoordinate) AS xmax, 
                     min(ykoordinate) AS ymin, 
@@ -979,18 +1196,25 @@ def importKanaldaten(database_HE, database_QKan, projectfile, epsg,
     try:
         dbHE.sql(sql)
     except BaseException as err:
-        fehlermeldung(u'SQL-Fehler', repr(err))
-        fehlermeldung(u"Fehler in QKan_Import_from_HE", u"\nFehler in sql_zoom: \n" + sql + u'\n\n')
+        melden(u'SQL-Fehler', repr(err))
+        melden(u"Fehler in QKan_Import_from_HE", u"\nFehler in sql_zoom: \n" + sql + u'\n\n')
 
     daten = dbHE.fetchone()
     try:
         zoomxmin, zoomxmax, zoomymin, zoomymax = daten
     except BaseException as err:
-        fehlermeldung(u'SQL-Fehler', repr(err))
-        fehlermeldung(u"Fehler in QKan_Import_from_HE", u"\nFehler in sql_zoom; daten= " + str(daten) + u'\n')
+        melden(u'SQL-Fehler', repr(err))
+        melden(u"Fehler in QKan_Import_from_HE", u"\nFehler in sql_zoom; daten= " + str(daten) + u'\n')
+        return None
+    return zoomxmin, zoomxmax, zoomymin, zoomymax
 
-    # --------------------------------------------------------------------------
-    # Projektionssystem für die Projektdatei vorbereiten
+
+def srid_qkan(dbQK):
+    '''EPSG-Code der Schächte in der QKan-Datenbank
+
+    :returns:   EPSG-Code oder None im Fehlerfall
+    :rtype:     int
+    '''
     sql = u"""SELECT srid
             FROM geom_cols_ref_sys
             WHERE Lower(f_table_name) = Lower('schaechte')
@@ -998,29 +1222,36 @@ def importKanaldaten(database_HE, database_QKan, projectfile, epsg,
     if not dbQK.sql(sql, u'importkanaldaten_he (45)'):
         return None
 
-    srid = dbQK.fetchone()[0]
-    try:
-        crs = QgsCoordinateReferenceSystem(srid, QgsCoordinateReferenceSystem.EpsgCrsId)
-        srsid = crs.srsid()
-        proj4text = crs.toProj4()
-        description = crs.description()
-        projectionacronym = crs.projectionAcronym()
-        if u'ellipsoidacronym' in dir(crs):
-            ellipsoidacronym = crs.ellipsoidacronym()
-        else:
-            ellipsoidacronym = None
-    except BaseException as err:
-        srid, srsid, proj4text, description, projectionacronym, ellipsoidacronym = \
-            u'dummy', u'dummy', u'dummy', u'dummy', u'dummy', u'dummy'
+    return dbQK.fetchone()[0]
 
-        fehlermeldung(u'\nFehler in "daten"', repr(err))
-        fehlermeldung(u"Fehler in QKan_Import_from_HE", u"\nFehler bei der Ermittlung der srid: \n" + str(daten))
+
+def importAbschliessen(database_QKan, projectfile, zoom, srid):
+    '''Schreibt die Projektdatei und lädt das importierte Projekt. Muss im GUI-Thread aufgerufen werden.
+
+    :database_QKan: Pfad zur QKan-Datenbank
+    :type database_QKan: string
+
+    :projectfile:   Pfad der zu schreibenden Projektdatei oder leer
+    :type projectfile: string
+
+    :zoom:          (xmin, xmax, ymin, ymax) für das Kartenfenster
+    :type zoom:     tuple
+
+    :srid:          EPSG-Code der QKan-Datenbank
+    :type srid:     int
+
+    :returns: void
+    '''
 
     # --------------------------------------------------------------------------
-    # Datenbankverbindungen schliessen
+    # Projektionssystem für die Projektdatei vorbereiten
+    try:
+        crs = crs_daten(srid)                       # in projektdatei, je EPSG-Code zwischengespeichert
+    except BaseException as err:
+        fehlermeldung(u'\nFehler in "daten"', repr(err))
+        fehlermeldung(u"Fehler in QKan_Import_from_HE", u"\nFehler bei der Ermittlung der srid: \n" + str(srid))
 
-    del dbHE
-    del dbQK
+        srid, crs = u'dummy', (u'dummy', u'dummy', u'dummy', u'dummy', u'dummy')
 
     # --------------------------------------------------------------------------
     # Projektdatei schreiben, falls ausgewählt
@@ -1034,104 +1265,11 @@ def importKanaldaten(database_HE, database_QKan, projectfile, epsg,
         else:
             datasource = database_QKan
 
-        # Liste der Geotabellen aus QKan, um andere Tabellen von der Bearbeitung auszuschliessen
-        # Liste steht in 3 Modulen: tools.k_tools, importdyna.import_from_dyna, importhe.import_from_he
-        tabliste = [u'einleit', u'einzugsgebiete', u'flaechen', u'haltungen', u'linkfl', u'linksw', 
-                    u'pumpen', u'schaechte', u'teilgebiete', u'tezg', u'wehre']
-
-        # Liste der QKan-Formulare, um individuell erstellte Formulare von der Bearbeitung auszuschliessen
-        formsliste = ['qkan_abflussparameter.ui', 'qkan_anbindungageb.ui', 'qkan_anbindungeinleit.ui', 
-                      'qkan_anbindungflaechen.ui', 'qkan_auslaesse.ui', 'qkan_auslasstypen.ui', 
-                      'qkan_aussengebiete.ui', 'qkan_bodenklassen.ui', 'qkan_einleit.ui', 
-                      'qkan_einzugsgebiete.ui', 'qkan_entwaesserungsarten.ui', 'qkan_flaechen.ui', 
-                      'qkan_haltungen.ui', 'qkan_profildaten.ui', 'qkan_profile.ui', 'qkan_pumpen.ui', 
-                      'qkan_pumpentypen.ui', 'qkan_schaechte.ui', 'qkan_simulationsstatus.ui', 
-                      'qkan_speicher.ui', 'qkan_speicherkennlinien.ui', 'qkan_swref.ui', 
-                      'qkan_teilgebiete.ui', 'qkan_tezg.ui', 'qkan_wehre.ui']
-
-        # Lesen der Projektdatei ------------------------------------------------------------------
-        qgsxml = ET.parse(projecttemplate)
-        root = qgsxml.getroot()
-
-        # Projektionssystem anpassen --------------------------------------------------------------
-
-        for tag_maplayer in root.findall(u".//projectlayers/maplayer"):
-            tag_datasource = tag_maplayer.find(u"./datasource")
-            tex = tag_datasource.text
-            # Nur QKan-Tabellen bearbeiten
-            if tex[tex.index(u'table="') + 7:].split(u'" ')[0] in tabliste:
-
-                # <extend> löschen
-                for tag_extent in tag_maplayer.findall(u"./extent"):
-                    tag_maplayer.remove(tag_extent)
-
-                for tag_spatialrefsys in tag_maplayer.findall(u"./srs/spatialrefsys"):
-                    tag_spatialrefsys.clear()
-
-                    elem = ET.SubElement(tag_spatialrefsys, u'proj4')
-                    elem.text = proj4text
-                    elem = ET.SubElement(tag_spatialrefsys, u'srsid')
-                    elem.text = u'{}'.format(srsid)
-                    elem = ET.SubElement(tag_spatialrefsys, u'srid')
-                    elem.text = u'{}'.format(srid)
-                    elem = ET.SubElement(tag_spatialrefsys, u'authid')
-                    elem.text = u'EPSG: {}'.format(srid)
-                    elem = ET.SubElement(tag_spatialrefsys, u'description')
-                    elem.text = description
-                    elem = ET.SubElement(tag_spatialrefsys, u'projectionacronym')
-                    elem.text = projectionacronym
-                    if ellipsoidacronym is not None:
-                        elem = ET.SubElement(tag_spatialrefsys, u'ellipsoidacronym')
-                        elem.text = ellipsoidacronym
-
-        # Pfad zu Formularen auf plugin-Verzeichnis setzen -----------------------------------------
-
-        formspath =  os.path.join(pluginDirectory('qkan'), u"forms")
-        for tag_maplayer in root.findall(u".//projectlayers/maplayer"):
-            tag_editform = tag_maplayer.find(u"./editform")
-            dateiname = os.path.basename(tag_editform.text)
-            if dateiname in formsliste:
-                # Nur QKan-Tabellen bearbeiten
-                tag_editform.text = os.path.join(formspath,dateiname)
-
-        # Zoom für Kartenfenster einstellen -------------------------------------------------------
-
-        for tag_extent in root.findall(u".//mapcanvas/extent"):
-            elem = tag_extent.find(u"./xmin")
-            elem.text = u'{:.3f}'.format(zoomxmin)
-            elem = tag_extent.find(u"./ymin")
-            elem.text = u'{:.3f}'.format(zoomymin)
-            elem = tag_extent.find(u"./xmax")
-            elem.text = u'{:.3f}'.format(zoomxmax)
-            elem = tag_extent.find(u"./ymax")
-            elem.text = u'{:.3f}'.format(zoomymax)
-
-        # Projektionssystem anpassen --------------------------------------------------------------
-
-        for tag_spatialrefsys in root.findall(u".//mapcanvas/destinationsrs/spatialrefsys"):
-            tag_spatialrefsys.clear()
-
-            elem = ET.SubElement(tag_spatialrefsys, u'proj4')
-            elem.text = proj4text
-            elem = ET.SubElement(tag_spatialrefsys, u'srid')
-            elem.text = u'{}'.format(srid)
-            elem = ET.SubElement(tag_spatialrefsys, u'authid')
-            elem.text = u'EPSG: {}'.format(srid)
-            elem = ET.SubElement(tag_spatialrefsys, u'description')
-            elem.text = description
-            elem = ET.SubElement(tag_spatialrefsys, u'projectionacronym')
-            elem.text = projectionacronym
-            if ellipsoidacronym is not None:
-                elem = ET.SubElement(tag_spatialrefsys, u'ellipsoidacronym')
-                elem.text = ellipsoidacronym
-
-        # Pfad zur QKan-Datenbank anpassen
-
-        for tag_datasource in root.findall(u".//projectlayers/maplayer/datasource"):
-            text = tag_datasource.text
-            tag_datasource.text = u"dbname='" + datasource + u"' " + text[text.find(u'table='):]
-
-        qgsxml.write(projectfile)  # writing modified project file
+        # Die Vorlage wird nur einmal je Sitzung gelesen, beim Schreiben werden nur die
+        # anzupassenden Stellen überschrieben (Modul projektdatei)
+        formspath = os.path.join(pluginDirectory('qkan'), u"forms")
+        vorlage = projektvorlage(projecttemplate)
+        vorlage.schreiben(projectfile, datasource, formspath, zoom, srid, crs)
         logger.debug(u'Projektdatei: {}'.format(projectfile))
         # logger.debug(u'encoded string: {}'.format(tex))
 
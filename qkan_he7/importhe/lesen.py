@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+
+'''
+
+  Paralleles Lesen der HE-Tabellen
+  ================================
+
+  Beim Import werden die Tabellen der HE-Datenbank (ROHR, SCHACHT, SPEICHERSCHACHT, AUSLASS,
+  PUMPE, WEHR, TEILEINZUGSGEBIET, TABELLENINHALTE, ABFLUSSPARAMETER) unabhängig voneinander
+  gelesen. Die Abfragen werden deshalb von mehreren Threads mit je einer eigenen, nur lesenden
+  Verbindung zur Firebird-Datenbank ausgeführt. Das Schreiben in die QKan-Datenbank erfolgt
+  weiterhin allein im aufrufenden Thread, der die Ergebnisse in der Reihenfolge der Abhängigkeiten
+  abholt und dabei nur auf die jeweils benötigte Abfrage wartet. Fehler in den Threads werden dort
+  nur festgehalten und erst beim Abholen des Ergebnisses im aufrufenden Thread gemeldet.
+
+  | Dateiname            : lesen.py
+  | Date                 : Oktober 2018
+  | Copyright            : (C) 2018 by Joerg Hoettges
+  | Email                : hoettges@fh-aachen.de
+  | git sha              : $Format:%H$
+
+  This program is free software; you can redistribute it and/or modify
+  it under the terms of the GNU General Public License as published by
+  the Free Software Foundation; either version 2 of the License, or
+  (at your option) any later version.
+
+'''
+
+import logging
+import threading
+import time
+
+try:
+    from Queue import Queue, Empty
+except ImportError:
+    from queue import Queue, Empty
+
+from qkan.database.fbfunc import FBConnection
+from qkan.database.qkan_utils import fehlermeldung
+
+logger = logging.getLogger(u'QKan')
+
+
+class ParallelLeser:
+    '''Führt Abfragen auf die HE-Datenbank in mehreren Threads aus.
+
+    Die Abfragen werden in der übergebenen Reihenfolge abgearbeitet, so dass die zuerst
+    benötigten Ergebnisse auch zuerst vorliegen. Mit anzahl = 0 werden die Abfragen erst beim
+    Abholen über die Verbindung des Aufrufers ausgeführt (bisheriges Verhalten).
+    '''
+
+    def __init__(self, database_HE, abfragen, anzahl=3, dbHE=None, melden=fehlermeldung):
+        '''
+        :database_HE:   Pfad zur HE-Firebird-Datenbank
+        :type database_HE: string
+
+        :abfragen:      Name -> SQL-Abfrage, in der Reihenfolge, in der die Ergebnisse benötigt werden
+        :type abfragen: OrderedDict
+
+        :anzahl:        Anzahl der Threads mit je einer eigenen Verbindung
+        :type anzahl:   int
+
+        :dbHE:          Verbindung des Aufrufers für die Ausführung ohne Threads
+        :type dbHE:     FBConnection
+
+        :melden:        Wird bei einem Fehler beim Lesen mit (Titel, Text) aufgerufen
+        :type melden:   function
+        '''
+        self.database_HE = database_HE
+        self.abfragen = abfragen
+        self.anzahl = min(anzahl, len(abfragen))
+        self.dbHE = dbHE
+        self.melden = melden
+
+        self.auftraege = Queue()
+        self.ergebnisse = {}                # Name -> Liste der Datensätze oder None bei Fehler
+        self.fehler = {}                    # Name -> Fehlertext
+        self.fertig = threading.Condition()
+        self.threads = []
+
+    def starten(self):
+        '''Startet die Threads. Jeder Thread öffnet eine eigene Verbindung zur HE-Datenbank.'''
+        if self.anzahl < 1:
+            return
+        for name in self.abfragen:
+            self.auftraege.put(name)
+        for nr in range(self.anzahl):
+            thread = threading.Thread(target=self._lesen, name=u'HE-Leser {}'.format(nr + 1))
+            thread.daemon = True
+            thread.start()
+            self.threads.append(thread)
+        logger.debug(u'Paralleles Lesen: {} Abfragen mit {} Verbindungen gestartet'.format(
+            len(self.abfragen), self.anzahl))
+
+    def _lesen(self):
+        '''Arbeitet die Abfragen ab. Läuft in einem eigenen Thread und darf deshalb keine Meldungen
+        an die Oberfläche ausgeben (FBConnection.sql ruft im Fehlerfall fehlermeldung auf). Die
+        Abfragen werden daher direkt über den Cursor ausgeführt.
+        '''
+        dbHE = None
+        verbindungsfehler = None
+        try:
+            dbHE = FBConnection(self.database_HE)
+        except BaseException as err:
+            verbindungsfehler = u'Verbindung zu {} nicht möglich: {}'.format(self.database_HE, repr(err))
+            logger.error(u'Paralleles Lesen: {}'.format(verbindungsfehler))
+
+        while True:
+            try:
+                name = self.auftraege.get_nowait()
+            except Empty:
+                break
+            daten = None
+            fehler = verbindungsfehler
+            if dbHE is not None:
+                zeit = time.time()
+                try:
+                    dbHE.curfb.execute(self.abfragen[name])
+                    daten = dbHE.curfb.fetchall()
+                except BaseException as err:
+                    fehler = u'{}\nAbfrage: {}'.format(repr(err), self.abfragen[name])
+                    logger.error(u'Paralleles Lesen: Fehler in Abfrage {}: {}'.format(name, repr(err)))
+                    daten = None
+                if daten is not None:
+                    logger.debug(u'Paralleles Lesen: {} ({} Datensätze) in {:.2f} s'.format(
+                        name, len(daten), time.time() - zeit))
+            with self.fertig:
+                self.ergebnisse[name] = daten
+                if daten is None:
+                    self.fehler[name] = fehler
+                self.fertig.notify_all()
+
+        del dbHE
+
+    def ergebnis(self, name):
+        '''Liefert das Ergebnis einer Abfrage und wartet gegebenenfalls, bis es vorliegt.
+        Das Ergebnis wird danach freigegeben. Ein Fehler beim Lesen wird hier, im aufrufenden
+        Thread, gemeldet.
+
+        :returns:   Liste der Datensätze oder None im Fehlerfall
+        :rtype:     list
+        '''
+        if self.anzahl < 1:
+            if not self.dbHE.sql(self.abfragen[name], u'importkanaldaten_he (lesen {})'.format(name)):
+                return None
+            return self.dbHE.fetchall()
+
+        with self.fertig:
+            while name not in self.ergebnisse:
+                self.fertig.wait(1.)
+                if name not in self.ergebnisse and not any(thread.is_alive() for thread in self.threads):
+                    logger.error(u'Paralleles Lesen: Abfrage {} wurde nicht ausgeführt'.format(name))
+                    return None
+            daten = self.ergebnisse.pop(name)
+            fehler = self.fehler.pop(name, None)
+
+        if daten is None:
+            self.melden(u'Fehler beim Lesen der HE-Datenbank',
+                        u'Abfrage {} in {}:\n{}'.format(name, self.database_HE, fehler))
+        return daten
+
+    def beenden(self):
+        '''Verwirft noch nicht abgeholte Abfragen und wartet auf das Ende der Threads.'''
+        while True:
+            try:
+                self.auftraege.get_nowait()
+            except Empty:
+                break
+        for thread in self.threads:
+            thread.join()
+        self.ergebnisse.clear()
+        self.fehler.clear()
+        self.threads = []
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+
+'''
+
+  Massenimport in die QKan-Datenbank
+  ==================================
+
+  Beim Import großer Netze wird jeder eingefügte Datensatz der Tabellen haltungen, schaechte,
+  pumpen und wehre über die Trigger von SpatiaLite in den räumlichen Index (R*Tree) eingetragen.
+  Im Massenimport werden diese Trigger für die Dauer des Imports abgeschaltet und die Indizes
+  anschließend in einem Durchgang mit RecoverSpatialIndex neu aufgebaut. Zusätzlich werden für
+  die Dauer des Imports schnellere Einstellungen (PRAGMA) für Journal, Synchronisation und
+  Cache verwendet und danach wiederhergestellt. Journal im Speicher ohne Synchronisation wird
+  nur für Datenbanken verwendet, deren Importtabellen noch leer sind. Enthält die Datenbank
+  bereits Daten, bleibt das Journal auf der Festplatte (WAL mit synchronous = NORMAL).
+
+  Das Abschalten und der Neuaufbau der Indizes erfolgen in derselben Transaktion wie der Import.
+  Bei einem Abbruch ohne commit bleiben Daten und Indizes daher unverändert.
+
+  | Dateiname            : massenimport.py
+  | Date                 : Oktober 2018
+  | Copyright            : (C) 2018 by Joerg Hoettges
+  | Email                : hoettges@fh-aachen.de
+  | git sha              : $Format:%H$
+
+  This program is free software; you can redistribute it and/or modify
+  it under the terms of the GNU General Public License as published by
+  the Free Software Foundation; either version 2 of the License, or
+  (at your option) any later version.
+
+'''
+
+import logging
+
+logger = logging.getLogger(u'QKan')
+
+# Einstellungen während des Imports in eine neue (leere) Datenbank. Ohne Journal auf der
+# Festplatte und ohne Synchronisation kann ein Absturz oder Stromausfall während des Schreibens
+# die Datenbankdatei beschädigen. Das wird nur in Kauf genommen, wenn dabei keine vorhandenen
+# Daten verloren gehen; der Import muss dann wiederholt werden.
+pragmas_import = [
+    (u'journal_mode', u'MEMORY'),
+    (u'synchronous', u'OFF'),
+    (u'cache_size', u'-200000'),             # 200 MB
+]
+
+# Einstellungen während des Imports in eine Datenbank mit vorhandenen Daten. Das Write-Ahead-Log
+# liegt auf der Festplatte, mit synchronous = NORMAL kann die Datenbank bei einem Absturz nicht
+# beschädigt werden, es geht höchstens der laufende Import verloren.
+pragmas_import_vorhanden = [
+    (u'journal_mode', u'WAL'),
+    (u'synchronous', u'NORMAL'),
+    (u'cache_size', u'-200000'),             # 200 MB
+]
+
+
+class Massenimport:
+    '''Setzt die Pflege der räumlichen Indizes während des Imports aus.
+
+    Ablauf:
+        1. pragmas_setzen()             vor dem ersten schreibenden Zugriff
+        2. indizes_aussetzen()          vor dem Schreiben der Tabellen
+        3. indizes_wiederherstellen()   nach dem Schreiben, vor dem commit
+        4. pragmas_zuruecksetzen()      nach dem commit
+    '''
+
+    def __init__(self, dbQK, tabellen):
+        '''
+        :dbQK:          Datenbankobjekt der QKan-Datenbank
+        :type dbQK:     DBConnection
+
+        :tabellen:      Namen der Tabellen, deren räumliche Indizes ausgesetzt werden
+        :type tabellen: list
+        '''
+        self.dbQK = dbQK
+        self.tabellen = tabellen
+        self.pragmas_alt = []               # (pragma, Wert vor dem Import)
+        self.indizes = []                   # (Tabelle, Geometriespalte) mit ausgesetztem Index
+
+    def daten_vorhanden(self):
+        '''Prüft, ob eine der Importtabellen bereits Datensätze enthält.
+
+        :returns:   True, falls Daten vorhanden sind oder die Prüfung nicht möglich war
+        :rtype:     Boolean
+        '''
+        for tabelle in self.tabellen:
+            if not self.dbQK.sql(u'SELECT 1 FROM "{}" LIMIT 1'.format(tabelle),
+                                 u'massenimport.daten_vorhanden'):
+                return True
+            if self.dbQK.fetchone() is not None:
+                return True
+        return False
+
+    def pragmas_setzen(self):
+        '''Setzt die Einstellungen für den Import und merkt sich die bisherigen Werte.
+
+        Änderungen des Journals sind innerhalb einer Transaktion nicht möglich, deshalb muss
+        diese Funktion vor dem ersten schreibenden Zugriff aufgerufen werden.
+        '''
+        if self.daten_vorhanden():
+            pragmas = pragmas_import_vorhanden
+        else:
+            pragmas = pragmas_import
+        for pragma, wert in pragmas:
+            if not self.dbQK.sql(u'PRAGMA {}'.format(pragma), u'massenimport.pragmas_setzen (1)'):
+                continue
+            daten = self.dbQK.fetchone()
+            if daten is None:
+                continue
+            self.pragmas_alt.append((pragma, daten[0]))
+            self.dbQK.sql(u'PRAGMA {} = {}'.format(pragma, wert), u'massenimport.pragmas_setzen (2)')
+            self.dbQK.fetchall()
+        logger.debug(u'Massenimport: PRAGMA gesetzt, bisher: {}'.format(self.pragmas_alt))
+
+    def pragmas_zuruecksetzen(self):
+        '''Stellt die vor dem Import gültigen Einstellungen wieder her. Aufruf nach dem commit.'''
+        for pragma, wert in reversed(self.pragmas_alt):
+            self.dbQK.sql(u'PRAGMA {} = {}'.format(pragma, wert), u'massenimport.pragmas_zuruecksetzen')
+            self.dbQK.fetchall()
+        self.pragmas_alt = []
+
+    def indizes_aussetzen(self):
+        '''Schaltet die Trigger der räumlichen Indizes der Importtabellen ab.
+
+        Die Indextabellen werden zuerst geleert. Damit wird die Transaktion eröffnet, bevor
+        DisableSpatialIndex die Trigger entfernt, so dass ein Abbruch alles zurücknimmt.
+
+        :returns:   Erfolg
+        :rtype:     Boolean
+        '''
+        sql = u"""SELECT f_table_name, f_geometry_column FROM geometry_columns
+                  WHERE spatial_index_enabled = 1 AND f_table_name IN ('{}')""".format(
+            u"', '".join(self.tabellen))
+        if not self.dbQK.sql(sql, u'massenimport.indizes_aussetzen (1)'):
+            return False
+        indizes = self.dbQK.fetchall()
+
+        for tabelle, spalte in indizes:
+            if not self.dbQK.sql(u'DELETE FROM "idx_{}_{}"'.format(tabelle, spalte),
+                                 u'massenimport.indizes_aussetzen (2)'):
+                return False
+            if not self.dbQK.sql(u"SELECT DisableSpatialIndex('{}', '{}')".format(tabelle, spalte),
+                                 u'massenimport.indizes_aussetzen (3)'):
+                return False
+            self.indizes.append((tabelle, spalte))
+        logger.debug(u'Massenimport: Räumliche Indizes ausgesetzt: {}'.format(self.indizes))
+        return True
+
+    def indizes_wiederherstellen(self):
+        '''Schaltet die Trigger wieder ein und baut die räumlichen Indizes in einem Durchgang neu auf.
+
+        :returns:   Erfolg
+        :rtype:     Boolean
+        '''
+        for tabelle, spalte in self.indizes:
+            if not self.dbQK.sql(u"SELECT CreateSpatialIndex('{}', '{}')".format(tabelle, spalte),
+                                 u'massenimport.indizes_wiederherstellen (1)'):
+                return False
+            if not self.dbQK.sql(u"SELECT RecoverSpatialIndex('{}', '{}')".format(tabelle, spalte),
+                                 u'massenimport.indizes_wiederherstellen (2)'):
+                return False
+            daten = self.dbQK.fetchone()
+            if daten is None or daten[0] != 1:
+                logger.error(u'Massenimport: Räumlicher Index {}.{} konnte nicht neu aufgebaut werden'.format(
+                    tabelle, spalte))
+                return False
+        logger.debug(u'Massenimport: Räumliche Indizes neu aufgebaut: {}'.format(self.indizes))
+        self.indizes = []
+        return True
@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+
+'''
+
+  Projektdatei für den Import aus HYSTEM-EXTRAN
+  =============================================
+
+  Die Vorlage projekt.qgs wird nur einmal je QGIS-Sitzung gelesen (bzw. erneut, wenn sie sich
+  geändert hat). Dabei werden die Stellen, die beim Schreiben einer Projektdatei angepasst werden
+  (Projektionssystem der QKan-Layer und des Kartenfensters, Pfade zu den Formularen, Zoombereich
+  und Datenquellen), einmal ermittelt und gespeichert. Beim Schreiben werden nur noch diese
+  Stellen überschrieben.
+
+  Die Angaben zum Projektionssystem werden je EPSG-Code nur einmal über QgsCoordinateReferenceSystem
+  ermittelt.
+
+  | Dateiname            : projektdatei.py
+  | Date                 : Oktober 2018
+  | Copyright            : (C) 2018 by Joerg Hoettges
+  | Email                : hoettges@fh-aachen.de
+  | git sha              : $Format:%H$
+
+  This program is free software; you can redistribute it and/or modify
+  it under the terms of the GNU General Public License as published by
+  the Free Software Foundation; either version 2 of the License, or
+  (at your option) any later version.
+
+'''
+
+import logging
+import os
+import xml.etree.ElementTree as ET
+
+from qgis.core import QgsCoordinateReferenceSystem
+
+logger = logging.getLogger(u'QKan')
+
+# Liste der Geotabellen aus QKan, um andere Tabellen von der Bearbeitung auszuschliessen
+# Liste steht in 3 Modulen: tools.k_tools, importdyna.import_from_dyna, importhe.projektdatei
+tabliste = [u'einleit', u'einzugsgebiete', u'flaechen', u'haltungen', u'linkfl', u'linksw',
+            u'pumpen', u'schaechte', u'teilgebiete', u'tezg', u'wehre']
+
+# Liste der QKan-Formulare, um individuell erstellte Formulare von der Bearbeitung auszuschliessen
+formsliste = ['qkan_abflussparameter.ui', 'qkan_anbindungageb.ui', 'qkan_anbindungeinleit.ui',
+              'qkan_anbindungflaechen.ui', 'qkan_auslaesse.ui', 'qkan_auslasstypen.ui',
+              'qkan_aussengebiete.ui', 'qkan_bodenklassen.ui', 'qkan_einleit.ui',
+              'qkan_einzugsgebiete.ui', 'qkan_entwaesserungsarten.ui', 'qkan_flaechen.ui',
+              'qkan_haltungen.ui', 'qkan_profildaten.ui', 'qkan_profile.ui', 'qkan_pumpen.ui',
+              'qkan_pumpentypen.ui', 'qkan_schaechte.ui', 'qkan_simulationsstatus.ui',
+              'qkan_speicher.ui', 'qkan_speicherkennlinien.ui', 'qkan_swref.ui',
+              'qkan_teilgebiete.ui', 'qkan_tezg.ui', 'qkan_wehre.ui']
+
+# Zwischenspeicher für die Dauer der QGIS-Sitzung
+_crs_cache = {}                     # srid -> (srsid, proj4text, description, projectionacronym, ellipsoidacronym)
+_vorlagen = {}                      # Pfad der Vorlage -> (Änderungszeit, ProjektVorlage)
+
+
+def crs_daten(srid):
+    '''Angaben zum Projektionssystem für die Projektdatei. Das Ergebnis wird je EPSG-Code gespeichert.
+
+    :srid:      EPSG-Code
+    :type srid: int
+
+    :returns:   (srsid, proj4text, description, projectionacronym, ellipsoidacronym)
+    :rtype:     tuple
+    '''
+    if srid not in _crs_cache:
+        crs = QgsCoordinateReferenceSystem(srid, QgsCoordinateReferenceSystem.EpsgCrsId)
+        if u'ellipsoidacronym' in dir(crs):
+            ellipsoidacronym = crs.ellipsoidacronym()
+        else:
+            ellipsoidacronym = None
+        _crs_cache[srid] = (crs.srsid(), crs.toProj4(), crs.description(), crs.projectionAcronym(),
+                            ellipsoidacronym)
+    return _crs_cache[srid]
+
+
+def projektvorlage(projecttemplate):
+    '''Liefert die vorbereitete Vorlage. Sie wird nur beim ersten Aufruf oder nach einer
+    Änderung der Vorlagendatei gelesen.
+
+    :projecttemplate:   Pfad zur Vorlage projekt.qgs
+    :type projecttemplate: string
+
+    :rtype:             ProjektVorlage
+    '''
+    zeit = os.path.getmtime(projecttemplate)
+    if projecttemplate in _vorlagen and _vorlagen[projecttemplate][0] == zeit:
+        return _vorlagen[projecttemplate][1]
+    vorlage = ProjektVorlage(projecttemplate)
+    _vorlagen[projecttemplate] = (zeit, vorlage)
+    return vorlage
+
+
+class ProjektVorlage:
+    '''Vorlage der Projektdatei mit den beim Schreiben anzupassenden Stellen.
+
+    Alle gespeicherten Stellen werden bei jedem Schreiben vollständig überschrieben, so dass
+    derselbe Elementbaum für mehrere Projektdateien verwendet werden kann.
+    '''
+
+    def __init__(self, projecttemplate):
+        self.qgsxml = ET.parse(projecttemplate)
+        root = self.qgsxml.getroot()
+
+        self.srs_layer = []         # <spatialrefsys> der QKan-Layer
+        self.editforms = []         # (<editform>, Dateiname) der QKan-Formulare
+        self.datasources = []       # (<datasource>, Text ab 'table=')
+
+        for tag_maplayer in root.findall(u".//projectlayers/maplayer"):
+            tag_datasource = tag_maplayer.find(u"./datasource")
+            tex = tag_datasource.text
+            self.datasources.append((tag_datasource, tex[tex.find(u'table='):]))
+
+            # Nur QKan-Tabellen bearbeiten
+            if tex[tex.index(u'table="') + 7:].split(u'" ')[0] in tabliste:
+                # <extend> löschen. Dies ist für alle Projektdateien gleich und erfolgt deshalb nur hier.
+                for tag_extent in tag_maplayer.findall(u"./extent"):
+                    tag_maplayer.remove(tag_extent)
+                self.srs_layer += tag_maplayer.findall(u"./srs/spatialrefsys")
+
+            tag_editform = tag_maplayer.find(u"./editform")
+            if tag_editform is not None and tag_editform.text is not None:
+                dateiname = os.path.basename(tag_editform.text)
+                if dateiname in formsliste:
+                    self.editforms.append((tag_editform, dateiname))
+
+        self.extents = []           # (<xmin>, <ymin>, <xmax>, <ymax>) des Kartenfensters
+        for tag_extent in root.findall(u".//mapcanvas/extent"):
+            self.extents.append(tuple(tag_extent.find(u"./" + el) for el in (u'xmin', u'ymin', u'xmax', u'ymax')))
+
+        self.srs_canvas = root.findall(u".//mapcanvas/destinationsrs/spatialrefsys")
+
+        logger.debug(u'Projektvorlage {} gelesen: {} Layer, {} Formulare'.format(
+            projecttemplate, len(self.datasources), len(self.editforms)))
+
+    @staticmethod
+    def _srs_schreiben(tag_spatialrefsys, srid, crs, mit_srsid):
+        srsid, proj4text, description, projectionacronym, ellipsoidacronym = crs
+        tag_spatialrefsys.clear()
+
+        elem = ET.SubElement(tag_spatialrefsys, u'proj4')
+        elem.text = proj4text
+        if mit_srsid:
+            elem = ET.SubElement(tag_spatialrefsys, u'srsid')
+            elem.text = u'{}'.format(srsid)
+        elem = ET.SubElement(tag_spatialrefsys, u'srid')
+        elem.text = u'{}'.format(srid)
+        elem = ET.SubElement(tag_spatialrefsys, u'authid')
+        elem.text = u'EPSG: {}'.format(srid)
+        elem = ET.SubElement(tag_spatialrefsys, u'description')
+        elem.text = description
+        elem = ET.SubElement(tag_spatialrefsys, u'projectionacronym')
+        elem.text = projectionacronym
+        if ellipsoidacronym is not None:
+            elem = ET.SubElement(tag_spatialrefsys, u'ellipsoidacronym')
+            elem.text = ellipsoidacronym
+
+    def schreiben(self, projectfile, datasource, formspath, zoom, srid, crs):
+        '''Passt die gespeicherten Stellen an und schreibt die Projektdatei.
+
+        :projectfile:   Pfad der zu schreibenden Projektdatei
+        :datasource:    Pfad zur QKan-Datenbank, wie er in der Projektdatei stehen soll
+        :formspath:     Verzeichnis der QKan-Formulare
+        :zoom:          (xmin, xmax, ymin, ymax) des Kartenfensters oder None
+        :srid:          EPSG-Code
+        :crs:           Angaben zum Projektionssystem, siehe crs_daten
+        '''
+
+        # Projektionssystem der QKan-Layer
+        for tag_spatialrefsys in self.srs_layer:
+            self._srs_schreiben(tag_spatialrefsys, srid, crs, True)
+
+        # Pfad zu Formularen auf plugin-Verzeichnis setzen
+        for tag_editform, dateiname in self.editforms:
+            tag_editform.text = os.path.join(formspath, dateiname)
+
+        # Zoom für Kartenfenster einstellen
+        if zoom is not None:
+            zoomxmin, zoomxmax, zoomymin, zoomymax = zoom
+            for tag_xmin, tag_ymin, tag_xmax, tag_ymax in self.extents:
+                tag_xmin.text = u'{:.3f}'.format(zoomxmin)
+                tag_ymin.text = u'{:.3f}'.format(zoomymin)
+                tag_xmax.text = u'{:.3f}'.format(zoomxmax)
+                tag_ymax.text = u'{:.3f}'.format(zoomymax)
+
+        # Projektionssystem des Kartenfensters
+        for tag_spatialrefsys in self.srs_canvas:
+            self._srs_schreiben(tag_spatialrefsys, srid, crs, False)
+
+        # Pfad zur QKan-Datenbank anpassen
+        for tag_datasource, rest in self.datasources:
+            tag_datasource.text = u"dbname='" + datasource + u"' " + rest
+
+        self.qgsxml.write(projectfile)  # writing modified project file
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+
+'''
+
+  Referenzlisten für den Import aus HYSTEM-EXTRAN
+  ===============================================
+
+  Die in der HE-Datenbank verwendeten Schlüssel für Profile, Entwässerungsarten,
+  Simulationsstatus, Auslass- und Pumpentypen werden vor dem Import der Objekte mit je einer
+  Abfrage ermittelt. Fehlende Einträge werden in einem Schritt in die Referenztabellen der
+  QKan-Datenbank eingefügt, so dass in den Schleifen des Imports nur noch in den Dictionaries
+  nachgeschlagen werden muss.
+
+  | Dateiname            : referenzen.py
+  | Date                 : Oktober 2018
+  | Copyright            : (C) 2018 by Joerg Hoettges
+  | Email                : hoettges@fh-aachen.de
+  | git sha              : $Format:%H$
+
+  This program is free software; you can redistribute it and/or modify
+  it under the terms of the GNU General Public License as published by
+  the Free Software Foundation; either version 2 of the License, or
+  (at your option) any later version.
+
+'''
+
+import logging
+
+logger = logging.getLogger(u'QKan')
+
+
+def he_werte(daten):
+    '''Ermittelt die verschiedenen Werte aus dem Ergebnis einer Abfrage der HE-Datenbank.
+
+    Wie in den Schleifen des Imports werden fehlende Werte durch 'NULL' ersetzt und Texte
+    aus iso-8859-1 umgewandelt.
+
+    :daten:     Datensätze der Abfrage oder None, falls die Abfrage fehlgeschlagen ist
+    :type daten: list
+
+    :returns:   Liste der Datensätze in der Reihenfolge der Abfrage ohne Wiederholungen
+                oder None im Fehlerfall
+    :rtype:     list
+    '''
+    if daten is None:
+        return None
+    werte = []
+    vorhanden = set()
+    for attr in daten:
+        zeile = tuple(u'NULL' if el is None else el.decode('iso-8859-1') if isinstance(el, bytes) else el
+                      for el in attr)
+        if zeile not in vorhanden:
+            vorhanden.add(zeile)
+            werte.append(zeile)
+    return werte
+
+
+def referenz_ergaenzen(schreiber, referenz, eintraege, sql):
+    '''Merkt die in der Referenzliste fehlenden Einträge zum Schreiben vor.
+
+    :schreiber:     Stapel für die QKan-Datenbank
+    :type schreiber: StapelSchreiber
+
+    :referenz:      Referenzliste HE-Nummer -> Bezeichnung in QKan. Wird um die neuen Einträge ergänzt.
+    :type referenz: dict
+
+    :eintraege:     Verwendete HE-Nummern mit der Bezeichnung, die ein neuer Eintrag erhält
+    :type eintraege: list of (he_nr, bezeichnung)
+
+    :sql:           INSERT-Anweisung mit den Platzhaltern (bezeichnung, he_nr)
+    :type sql:      string
+
+    :returns:       Anzahl der neuen Einträge
+    :rtype:         int
+    '''
+    anzahl = 0
+    for he_nr, bezeichnung in eintraege:
+        if he_nr in referenz:
+            continue
+        referenz[he_nr] = bezeichnung
+        schreiber.einfuegen(sql, (bezeichnung, he_nr))
+        anzahl += 1
+    if anzahl > 0:
+        logger.debug(u'Referenzliste ergänzt: {} neue Einträge für {}'.format(anzahl, sql))
+    return anzahl
@@ -6,7 +6,8 @@
   ==============
   
   Aus einer Hystem-Extran-Datenbank im Firebird-Format werden Ergebnisdaten
-  in die QKan-Datenbank importiert und ausgewertet.
+  in die QKan-Datenbank importiert und ausgewertet: Überstau der Schächte (ResultsSch) sowie
+  Auslastung, Durchfluss und Geschwindigkeit der Haltungen (ResultsHal).
   
   | Dateiname            : results_from_he.py
   | Date                 : September 2016
@@ -32,6 +33,12 @@ __revision__ = ':%H$'
 # import tempfile
 import logging
 import os
+import threading
+
+try:
+    from Queue import Queue, Empty
+except ImportError:
+    from queue import Queue, Empty
 
 from PyQt4.QtCore import QFileInfo
 from qgis.core import QgsMessageLog, QgsProject, QgsCoordinateReferenceSystem, QgsDataSourceURI, QgsVectorLayer, QgsMapLayerRegistry
@@ -43,51 +50,26 @@ from qkan.database.fbfunc import FBConnection
 
 from qkan.database.qkan_utils import fortschritt, fehlermeldung
 
+from ergebniscache import (bezug_setzen, cache_anlegen, fingerabdruck, lauf_eintragen, lauf_loeschen,
+                           lauf_vorhanden, sichten_anlegen, vergleich_setzen)
+from stapel import StapelSchreiber
+
 logger = logging.getLogger(u'QKan')
 
 
 # ------------------------------------------------------------------------------
-# Hauptprogramm
-
-def importResults(database_HE, database_QKan, qml_choice, qmlfileResults, epsg=25832, dbtyp=u'SpatiaLite'):
-    '''Importiert Simulationsergebnisse aus einer HE-Firebird-Datenbank und schreibt diese in Tabellen 
-       der QKan-SpatiaLite-Datenbank.
+# Ergebnistabellen
 
-    :database_HE:   Datenbankobjekt, das die Verknüpfung zur HE-Firebird-Datenbank verwaltet
-    :type database: DBConnection (geerbt von firebirdsql...)
-
-    :database_QKan: Datenbankobjekt, das die Verknüpfung zur QKan-SpatiaLite-Datenbank verwaltet.
-    :type database: DBConnection (geerbt von dbapi...)
+def ergebnistabellen_anlegen(dbQK, epsg):
+    '''Legt die Ergebnistabellen und den Zwischenspeicher (Modul ergebniscache) an.
 
-    :dbtyp:         Typ der Datenbank (SpatiaLite, PostGIS)
-    :type dbtyp:    String
-    
-    :returns: void
+    :returns:   Erfolg
+    :rtype:     Boolean
     '''
-
-    # ------------------------------------------------------------------------------
-    # Datenbankverbindungen
-
-    dbHE = FBConnection(database_HE)  # Datenbankobjekt der HE-Datenbank zum Lesen
-
-    if dbHE is None:
-        fehlermeldung(u"Fehler in QKan_Import_from_HE",
-                      u'ITWH-Datenbank {:s} wurde nicht gefunden!\nAbbruch!'.format(database_HE))
-        return None
-
-    dbQK = DBConnection(dbname=database_QKan)  # Datenbankobjekt der QKan-Datenbank zum Schreiben
-    if not dbQK.connected:
-        return None
-
-    if dbQK is None:
-        fehlermeldung(u"Fehler in QKan_Import_from_HE",
-                      u'QKan-Datenbank {:s} wurde nicht gefunden!\nAbbruch!'.format(database_QKan))
-        return None
-
-    # Vorbereiten der temporären Ergebnistabellen
     sqllist = [
         u'''CREATE TABLE IF NOT EXISTS ResultsSch(
             pk INTEGER PRIMARY KEY AUTOINCREMENT,
+            lauf TEXT,
             schnam TEXT,
             uebstauhaeuf REAL,
             uebstauanz REAL, 
@@ -95,62 +77,138 @@ def importResults(database_HE, database_QKan, qml_choice, qmlfileResults, epsg=2
             kommentar TEXT,
             createdat TEXT DEFAULT CURRENT_DATE)''',
         u"""SELECT AddGeometryColumn('ResultsSch','geom',{},'POINT',2)""".format(epsg), 
-        u'''DELETE FROM ResultsSch''']
-        # , u'''CREATE TABLE IF NOT EXISTS ResultsHal(
-            # pk INTEGER PRIMARY KEY AUTOINCREMENT,
-            # haltnam TEXT,
-            # uebstauhaeuf REAL,
-            # uebstauanz REAL, 
-            # maxuebstauvol REAL,
-            # kommentar TEXT,
-            # createdat TEXT DEFAULT CURRENT_DATE)''',
-        # u"""SELECT AddGeometryColumn('ResultsHal','geom',{},'LINESTRING',2)""".format(epsg)
-        # u'''DELETE FROM ResultsHal''']
+        u'''CREATE TABLE IF NOT EXISTS ResultsHal(
+            pk INTEGER PRIMARY KEY AUTOINCREMENT,
+            lauf TEXT,
+            haltnam TEXT,
+            auslastung REAL,
+            durchfluss REAL,
+            geschwindigkeit REAL,
+            wasserstandoben REAL,
+            wasserstandunten REAL,
+            vollfuellhaeuf REAL,
+            vollfuellanz REAL,
+            kommentar TEXT,
+            createdat TEXT DEFAULT CURRENT_DATE)''',
+        u"""SELECT AddGeometryColumn('ResultsHal','geom',{},'LINESTRING',2)""".format(epsg)]
 
     for sql in sqllist:
         if not dbQK.sql(sql, u"QKan_Import_Results (1)"):
             return False
 
+    return cache_anlegen(dbQK)
+
+
+def ergebnisse_lesen(dbHE):
+    '''Liest die Ergebnisse der Schächte und Haltungen mit je einer Abfrage.
+
+    :dbHE:      Datenbankobjekt der HE-Ergebnisdatenbank
+    :type dbHE: FBConnection
+
+    :returns:   (Datensätze Schächte, Datensätze Haltungen) oder None im Fehlerfall
+    :rtype:     tuple
+    '''
     # Die folgende Abfrage gilt sowohl bei Einzel- als auch bei Seriensimulationen:
     sql = u'''SELECT MR.KNOTEN, LZ.HAEUFIGKEITUEBERSTAU, LZ.ANZAHLUEBERSTAU, MR.UEBERSTAUVOLUMEN
             FROM LAU_MAX_S AS MR
             LEFT JOIN LANGZEITKNOTEN AS LZ
             ON MR.KNOTEN = LZ.KNOTEN
-            ORDER BY KNOTEN'''
+            ORDER BY MR.KNOTEN'''
 
     if not dbHE.sql(sql, u"QKan_Import_Results (4)"):
-        return False
+        return None
+    knoten = dbHE.fetchall()
+
+    # Haltungen: Maximalwerte der Simulation und, bei Seriensimulationen, Häufigkeiten der Vollfüllung
+    sql = u'''SELECT ME.KANTE, ME.AUSLASTUNG, ME.DURCHFLUSS, ME.GESCHWINDIGKEIT, ME.WASSERSTANDOBEN,
+                ME.WASSERSTANDUNTEN, LZ.HAEUFIGKEITVOLLFUELLUNG, LZ.ANZAHLVOLLFUELLUNG
+            FROM LAU_MAX_EL AS ME
+            LEFT JOIN LANGZEITKANTEN AS LZ
+            ON ME.KANTE = LZ.KANTE
+            ORDER BY ME.KANTE'''
+
+    if not dbHE.sql(sql, u"QKan_Import_Results (7)"):
+        return None
+    kanten = dbHE.fetchall()
+
+    return knoten, kanten
+
+
+def _geometrien(dbQK, sql, repref):
+    '''Liest Name und Geometrie aller Objekte einer QKan-Tabelle
+
+    :returns:   Name -> Geometrie oder None im Fehlerfall
+    :rtype:     dict
+    '''
+    if not dbQK.sql(sql, repref):
+        return None
+    return dict(dbQK.fetchall())
+
+
+def _name(wert):
+    return wert.decode('iso-8859-1') if isinstance(wert, bytes) else wert
 
-    for attr in dbHE.fetchall():
-        # In allen Feldern None durch NULL ersetzen
-        (schnam, uebstauhaeuf, uebstauanz, maxuebstauvol) = \
-            (u'NULL' if el is None else el for el in attr)
 
-        sql = u'''INSERT INTO ResultsSch
-                (schnam, uebstauhaeuf, uebstauanz, maxuebstauvol, kommentar)
-                VALUES ('{schnam}', {uebstauhaeuf}, {uebstauanz}, {maxuebstauvol}, '{kommentar}')'''.format(
-                schnam=schnam, uebstauhaeuf=uebstauhaeuf, uebstauanz=uebstauanz, 
-                maxuebstauvol=maxuebstauvol, kommentar=os.path.basename(database_HE))
+def ergebnisse_schreiben(dbQK, lauf, kommentar, knoten, kanten, geometrien=None):
+    '''Schreibt die Ergebnisse eines Laufes mit je einer Anweisung für Schächte und Haltungen
+    (ohne commit).
 
-        if not dbQK.sql(sql, u'QKan_Import_Results (5)'):
+    Die Geometrie wird beim Einfügen aus den Schächten bzw. Haltungen übernommen. Diese werden
+    dazu einmal gelesen, statt die Geometrie je Datensatz mit einer Unterabfrage zu ermitteln.
+
+    :lauf:          Kennung des Laufes (Modul ergebniscache)
+    :kommentar:     Kommentar, i.d.R. der Dateiname der HE-Ergebnisdatenbank
+    :knoten, kanten: Datensätze aus ergebnisse_lesen
+
+    :geometrien:    Beim Schreiben mehrerer Läufe die einmal gelesenen Geometrien
+                    (Schächte, Haltungen)
+    :type geometrien: tuple
+
+    :returns:       Erfolg
+    :rtype:         Boolean
+    '''
+    if geometrien is None:
+        geometrien = (_geometrien(dbQK, u'SELECT schnam, geop FROM schaechte', u'QKan_Import_Results (6)'),
+                      _geometrien(dbQK, u'SELECT haltnam, geom FROM haltungen', u'QKan_Import_Results (8)'))
+        if None in geometrien:
             return False
+    geo_schaechte, geo_haltungen = geometrien
 
-    sql = '''UPDATE ResultsSch
-            SET geom = 
-            (   SELECT geop
-                FROM schaechte
-                WHERE schaechte.schnam = ResultsSch.schnam)'''
-    if not dbQK.sql(sql, u'QKan_Import_Results (6)'):
-        return False
+    schreiber = StapelSchreiber(dbQK, mit_ersetzen=False)
 
-    dbQK.commit()
+    sql = u'''INSERT INTO ResultsSch
+            (lauf, schnam, uebstauhaeuf, uebstauanz, maxuebstauvol, kommentar, geom)
+            VALUES (?, ?, ?, ?, ?, ?, ?)'''
+    for schnam_ansi, uebstauhaeuf, uebstauanz, maxuebstauvol in knoten:
+        schnam = _name(schnam_ansi)
+        schreiber.einfuegen(sql, (lauf, schnam, uebstauhaeuf, uebstauanz, maxuebstauvol, kommentar,
+                                  geo_schaechte.get(schnam)))
+
+    sql = u'''INSERT INTO ResultsHal
+            (lauf, haltnam, auslastung, durchfluss, geschwindigkeit, wasserstandoben, wasserstandunten,
+             vollfuellhaeuf, vollfuellanz, kommentar, geom)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)'''
+    for attr in kanten:
+        haltnam = _name(attr[0])
+        schreiber.einfuegen(sql, (lauf, haltnam) + tuple(attr[1:]) + (kommentar, geo_haltungen.get(haltnam)))
+
+    return schreiber.schreiben(u'QKan_Import_Results (5)')
+
+
+def ergebnislayer(database_QKan, lauf, qml_choice, qmlfileResults):
+    '''Lädt die Layer der Ergebnistabellen, falls noch nicht geladen, und zeigt darin den
+    gewählten Lauf an. Bereits geladene Layer werden nur auf den Lauf umgeschaltet.
+    '''
+    auswahl = u"lauf = '{}'".format(lauf)
 
     # Einfügen der Ergebnistabelle in die Layerliste, wenn nicht schon geladen
-    layers = iface.legendInterface().layers()
-    if u'Ergebnisse_LZ' not in [lay.name() for lay in layers]:
+    layers = dict((lay.name(), lay) for lay in iface.legendInterface().layers())
+    if u'Überstau Schächte' in layers:
+        layers[u'Überstau Schächte'].setSubsetString(auswahl)
+    else:
         uri = QgsDataSourceURI()
         uri.setDatabase(database_QKan)
-        uri.setDataSource(u'', u'ResultsSch', u'geom')
+        uri.setDataSource(u'', u'ResultsSch', u'geom', auswahl)
         vlayer = QgsVectorLayer(uri.uri(), u'Überstau Schächte', u'spatialite')
         QgsMapLayerRegistry.instance().addMapLayer(vlayer)
 
@@ -177,5 +235,260 @@ def importResults(database_HE, database_QKan, qml_choice, qmlfileResults, epsg=2
                 fehlermeldung(u"Fehler in QKan_Results_from_HE",
                           u'Benutzerdefinierte Stildatei {:s} wurde nicht gefunden!\nAbbruch!'.format(qml_choice))
 
+    if u'Auslastung Haltungen' in layers:
+        layers[u'Auslastung Haltungen'].setSubsetString(auswahl)
+    else:
+        _layer_laden(database_QKan, u'ResultsHal', u'Auslastung Haltungen', auswahl)
+
+
+def _layer_laden(database_QKan, tabelle, name, auswahl=u''):
+    uri = QgsDataSourceURI()
+    uri.setDatabase(database_QKan)
+    uri.setDataSource(u'', tabelle, u'geom', auswahl)
+    vlayer = QgsVectorLayer(uri.uri(), name, u'spatialite')
+    QgsMapLayerRegistry.instance().addMapLayer(vlayer)
+    return vlayer
+
+
+# ------------------------------------------------------------------------------
+# Hauptprogramm
+
+def importResults(database_HE, database_QKan, qml_choice, qmlfileResults, epsg=25832, dbtyp=u'SpatiaLite',
+                  neu_einlesen=False):
+    '''Importiert Simulationsergebnisse aus einer HE-Firebird-Datenbank und schreibt diese in Tabellen 
+       der QKan-SpatiaLite-Datenbank.
+
+    Ergebnisse einer bereits importierten, unveränderten HE-Ergebnisdatenbank werden aus dem
+    Zwischenspeicher in der QKan-Datenbank angezeigt (Modul ergebniscache).
+
+    :database_HE:   Datenbankobjekt, das die Verknüpfung zur HE-Firebird-Datenbank verwaltet
+    :type database: DBConnection (geerbt von firebirdsql...)
+
+    :database_QKan: Datenbankobjekt, das die Verknüpfung zur QKan-SpatiaLite-Datenbank verwaltet.
+    :type database: DBConnection (geerbt von dbapi...)
+
+    :dbtyp:         Typ der Datenbank (SpatiaLite, PostGIS)
+    :type dbtyp:    String
+
+    :neu_einlesen:  Ergebnisse auch dann aus der HE-Datenbank lesen, wenn sie bereits im
+                    Zwischenspeicher vorliegen
+    :type neu_einlesen: Boolean
+    
+    :returns: void
+    '''
+
+    # ------------------------------------------------------------------------------
+    # Datenbankverbindungen
+
+    if not os.path.exists(database_HE):
+        fehlermeldung(u"Fehler in QKan_Import_from_HE",
+                      u'ITWH-Datenbank {:s} wurde nicht gefunden!\nAbbruch!'.format(database_HE))
+        return None
+
+    dbQK = DBConnection(dbname=database_QKan)  # Datenbankobjekt der QKan-Datenbank zum Schreiben
+    if not dbQK.connected:
+        return None
+
+    if dbQK is None:
+        fehlermeldung(u"Fehler in QKan_Import_from_HE",
+                      u'QKan-Datenbank {:s} wurde nicht gefunden!\nAbbruch!'.format(database_QKan))
+        return None
+
+    # Vorbereiten der Ergebnistabellen
+    if not ergebnistabellen_anlegen(dbQK, epsg):
+        return False
+
+    dbHE = FBConnection(database_HE)  # Datenbankobjekt der HE-Datenbank zum Lesen
+
+    if dbHE is None:
+        fehlermeldung(u"Fehler in QKan_Import_from_HE",
+                      u'ITWH-Datenbank {:s} wurde nicht gefunden!\nAbbruch!'.format(database_HE))
+        return None
+
+    kennung = fingerabdruck(dbHE, database_HE)
+    if kennung is None:
+        return False
+    lauf, groesse, geaendert = kennung
+    vorhanden = lauf_vorhanden(dbQK, lauf)
+    if vorhanden is None:
+        return False
+
+    if vorhanden and not neu_einlesen:
+        del dbHE
+        logger.debug(u'Ergebnisse von {} aus dem Zwischenspeicher (Lauf {})'.format(database_HE, lauf))
+    else:
+        daten = ergebnisse_lesen(dbHE)
+        del dbHE
+        if daten is None:
+            return False
+        knoten, kanten = daten
+
+        if not lauf_loeschen(dbQK, lauf):
+            return False
+        if not ergebnisse_schreiben(dbQK, lauf, os.path.basename(database_HE), knoten, kanten):
+            return False
+        if not lauf_eintragen(dbQK, lauf, database_HE, groesse, geaendert):
+            return False
+
+        dbQK.commit()
+
+    ergebnislayer(database_QKan, lauf, qml_choice, qmlfileResults)
+
+    del dbQK
+
+
+# ------------------------------------------------------------------------------
+# Vergleich mehrerer Läufe
+
+# Layer der Vergleichssichten (Modul ergebniscache)
+layer_vergleich = [(u'ResultsSch_Maximum', u'Überstau Schächte (Maximum)'),
+                   (u'ResultsHal_Maximum', u'Auslastung Haltungen (Maximum)'),
+                   (u'ResultsSch_Differenz', u'Überstau Schächte (Differenz)'),
+                   (u'ResultsHal_Differenz', u'Auslastung Haltungen (Differenz)')]
+
+
+def ergebnisse_parallel_lesen(dateien, anzahl=4):
+    '''Liest die Ergebnisse mehrerer HE-Ergebnisdatenbanken in mehreren Threads mit je einer
+    eigenen Verbindung.
+
+    :dateien:   Pfade der HE-Ergebnisdatenbanken
+    :type dateien: list
+
+    :anzahl:    Anzahl der Threads
+    :type anzahl: int
+
+    :returns:   Pfad -> (Datensätze Schächte, Datensätze Haltungen) oder None im Fehlerfall
+    :rtype:     dict
+    '''
+    auftraege = Queue()
+    for database_HE in dateien:
+        auftraege.put(database_HE)
+    ergebnisse = {}
+
+    def lesen():
+        while True:
+            try:
+                database_HE = auftraege.get_nowait()
+            except Empty:
+                break
+            daten = None
+            try:
+                dbHE = FBConnection(database_HE)
+                daten = ergebnisse_lesen(dbHE)
+                del dbHE
+            except BaseException as err:
+                logger.error(u'Ergebnisse aus {} konnten nicht gelesen werden: {}'.format(database_HE, repr(err)))
+            ergebnisse[database_HE] = daten
+
+    threads = [threading.Thread(target=lesen, name=u'HE-Ergebnisse {}'.format(nr + 1))
+               for nr in range(max(1, min(anzahl, len(dateien))))]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return ergebnisse
+
+
+def importResultsMehrfach(dateien_HE, database_QKan, epsg=25832, bezug=None, parallel_lesen=4,
+                          neu_einlesen=False):
+    '''Importiert die Ergebnisse mehrerer Simulationsläufe (z.B. Modellregen oder Szenarien) für
+    den Vergleich. Alle Läufe stehen anschließend gleichzeitig in den Tabellen ResultsSch und
+    ResultsHal sowie in den Sichten für Maximum und Differenz zum Bezugslauf zur Verfügung. Die
+    Sichten berücksichtigen nur die Läufe aus dateien_HE, nicht weitere gespeicherte Läufe.
+
+    Bereits importierte, unveränderte HE-Ergebnisdatenbanken werden nicht erneut gelesen, die
+    übrigen werden parallel gelesen und in einer Transaktion geschrieben.
+
+    :dateien_HE:    Pfade der HE-Ergebnisdatenbanken
+    :type dateien_HE: list
+
+    :bezug:         HE-Ergebnisdatenbank des Bezugslaufes für die Differenzen. Voreinstellung:
+                    die erste in dateien_HE.
+    :type bezug:    string
+
+    :parallel_lesen: Anzahl der gleichzeitig gelesenen HE-Ergebnisdatenbanken
+    :type parallel_lesen: int
+
+    :returns:       Pfad -> Kennung des Laufes oder None im Fehlerfall
+    :rtype:         dict
+    '''
+
+    fehlend = [database_HE for database_HE in dateien_HE if not os.path.exists(database_HE)]
+    if fehlend:
+        fehlermeldung(u"Fehler in QKan_Import_from_HE",
+                      u'ITWH-Datenbank {:s} wurde nicht gefunden!\nAbbruch!'.format(u', '.join(fehlend)))
+        return None
+
+    dbQK = DBConnection(dbname=database_QKan)  # Datenbankobjekt der QKan-Datenbank zum Schreiben
+    if not dbQK.connected:
+        return None
+
+    if not ergebnistabellen_anlegen(dbQK, epsg):
+        return None
+
+    laeufe = {}
+    lesen = []
+    for database_HE in dateien_HE:
+        dbHE = FBConnection(database_HE)
+        kennung = fingerabdruck(dbHE, database_HE)
+        del dbHE
+        if kennung is None:
+            return None
+        lauf, groesse, geaendert = kennung
+        laeufe[database_HE] = lauf
+        vorhanden = lauf_vorhanden(dbQK, lauf)
+        if vorhanden is None:
+            return None
+        if neu_einlesen or not vorhanden:
+            lesen.append((database_HE, lauf, groesse, geaendert))
+    logger.debug(u'Vergleich: {} Läufe, davon {} aus dem Zwischenspeicher'.format(
+        len(dateien_HE), len(dateien_HE) - len(lesen)))
+
+    if lesen:
+        ergebnisse = ergebnisse_parallel_lesen([database_HE for database_HE, lauf, groesse, geaendert in lesen],
+                                               parallel_lesen)
+        fehlerhaft = [database_HE for database_HE, daten in ergebnisse.items() if daten is None]
+        if fehlerhaft:
+            fehlermeldung(u"Fehler in QKan_Import_Results",
+                          u'Ergebnisse konnten nicht gelesen werden aus: {}'.format(u', '.join(fehlerhaft)))
+            return None
+
+        # Die Geometrien werden für alle Läufe nur einmal gelesen
+        geometrien = (_geometrien(dbQK, u'SELECT schnam, geop FROM schaechte', u'QKan_Import_Results (6)'),
+                      _geometrien(dbQK, u'SELECT haltnam, geom FROM haltungen', u'QKan_Import_Results (8)'))
+        if None in geometrien:
+            return None
+
+        for database_HE, lauf, groesse, geaendert in lesen:
+            knoten, kanten = ergebnisse[database_HE]
+            if not lauf_loeschen(dbQK, lauf):
+                return None
+            if not ergebnisse_schreiben(dbQK, lauf, os.path.basename(database_HE), knoten, kanten, geometrien):
+                return None
+            if not lauf_eintragen(dbQK, lauf, database_HE, groesse, geaendert):
+                return None
+
+    lauf_bezug = laeufe[bezug if bezug in laeufe else dateien_HE[0]]
+    if not bezug_setzen(dbQK, lauf_bezug):
+        return None
+    if not vergleich_setzen(dbQK, list(laeufe.values())):
+        return None
+    if not sichten_anlegen(dbQK):
+        return None
+
+    dbQK.commit()
     del dbQK
-    del dbHE
+
+    return laeufe
+
+
+def vergleichslayer(database_QKan, lauf_bezug, qml_choice, qmlfileResults):
+    '''Zeigt den Bezugslauf in den Ergebnislayern an und lädt die Layer der Vergleichssichten,
+    falls noch nicht geladen.'''
+    ergebnislayer(database_QKan, lauf_bezug, qml_choice, qmlfileResults)
+
+    geladen = [lay.name() for lay in iface.legendInterface().layers()]
+    for sicht, name in layer_vergleich:
+        if name not in geladen:
+            _layer_laden(database_QKan, sicht, name)
@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+
+'''
+
+  Stapelweises Schreiben in die QKan-Datenbank
+  ============================================
+
+  Beim Import aus HYSTEM-EXTRAN werden die Datensätze nicht mehr einzeln als formatierte
+  INSERT-Anweisungen geschrieben, sondern je Zieltabelle gesammelt und mit Parameterbindung
+  über executemany in die SpatiaLite-Datenbank geschrieben. Die Anweisung wird dabei nur einmal
+  übersetzt, Zahlen werden nicht als Text formatiert und Sonderzeichen in Namen und Kommentaren
+  (z.B. Hochkommata) führen nicht mehr zu fehlerhaften SQL-Anweisungen.
+
+  Für Tabellen, deren Datensätze beim erneuten Import ersetzt werden (z.B. Abflussparameter),
+  werden die Schlüssel der zu löschenden Datensätze in einer temporären Tabelle mit Primärschlüssel
+  gesammelt und vor den neuen Datensätzen mit einer DELETE-Anweisung je Tabelle gelöscht.
+
+  | Dateiname            : stapel.py
+  | Date                 : Oktober 2018
+  | Copyright            : (C) 2018 by Joerg Hoettges
+  | Email                : hoettges@fh-aachen.de
+  | git sha              : $Format:%H$
+
+  This program is free software; you can redistribute it and/or modify
+  it under the terms of the GNU General Public License as published by
+  the Free Software Foundation; either version 2 of the License, or
+  (at your option) any later version.
+
+'''
+
+import logging
+from collections import OrderedDict
+from decimal import Decimal
+
+from qkan.database.qkan_utils import fehlermeldung
+
+logger = logging.getLogger(u'QKan')
+
+# Temporäre Tabelle mit den Schlüsseln der zu ersetzenden oder zu ändernden Datensätze
+sql_schluessel = u'''CREATE TEMP TABLE IF NOT EXISTS stapel_schluessel (
+    tabelle TEXT, name TEXT, PRIMARY KEY (tabelle, name))'''
+
+
+def _parameter(wert):
+    '''Wandelt einen Wert aus der HE-Datenbank in einen an SQLite bindbaren Parameter um.
+
+    Der Import verwendet für fehlende Werte die Zeichenkette 'NULL', Firebird liefert
+    NUMERIC-Felder als Decimal.
+    '''
+    if wert is None or wert == u'NULL':
+        return None
+    if isinstance(wert, Decimal):
+        return float(wert)
+    return wert
+
+
+class StapelSchreiber:
+    '''Sammelt Datensätze je INSERT-Anweisung und schreibt sie gemeinsam mit executemany.
+
+    Die Reihenfolge der Anweisungen beim Schreiben entspricht der Reihenfolge, in der sie
+    zum ersten Mal verwendet wurden. Das commit erfolgt durch den Aufrufer, so dass mehrere
+    Tabellen in einer Transaktion geschrieben werden können.
+
+    Die temporäre Tabelle für ersetzen wird im Konstruktor angelegt. Da Python 2 vor einer
+    CREATE-Anweisung eine offene Transaktion abschließt, muss der StapelSchreiber vor dem ersten
+    schreibenden Zugriff angelegt werden.
+    '''
+
+    def __init__(self, dbQK, mit_ersetzen=True, melden=fehlermeldung):
+        '''
+        :dbQK:          Datenbankobjekt der QKan-Datenbank
+        :type dbQK:     DBConnection
+
+        :mit_ersetzen:  Temporäre Tabelle für ersetzen anlegen
+        :type mit_ersetzen: Boolean
+
+        :melden:        Wird bei einem Fehler beim Schreiben mit (Titel, Text) aufgerufen
+        :type melden:   function
+        '''
+        self.dbQK = dbQK
+        self.melden = melden
+        self.stapel = OrderedDict()             # INSERT-Anweisung -> Liste der Parametertupel
+        self.schluessel = False                 # Temporäre Tabelle angelegt
+        self.schluessel_vorgemerkt = False      # Temporäre Tabelle nach dem Schreiben leeren
+        if mit_ersetzen:
+            self.schluessel_anlegen()
+
+    def schluessel_anlegen(self):
+        '''Legt die temporäre Tabelle für die Schlüssel der zu ersetzenden Datensätze an.
+
+        :returns:   Erfolg
+        :rtype:     Boolean
+        '''
+        if not self.schluessel:
+            self.schluessel = self.dbQK.sql(sql_schluessel, u'stapel.schluessel_anlegen')
+        return self.schluessel
+
+    def einfuegen(self, sql, werte):
+        '''Merkt einen Datensatz zum Schreiben vor.
+
+        :sql:       INSERT-Anweisung mit Platzhaltern (?)
+        :type sql:  string
+
+        :werte:     Werte zu den Platzhaltern
+        :type werte: tuple
+        '''
+        self.stapel.setdefault(sql, []).append(tuple(_parameter(wert) for wert in werte))
+
+    def vorhandene(self, tabelle, spalte, repref):
+        '''Liest die in der Tabelle vorhandenen Schlüssel.
+
+        :returns:   Menge der Schlüssel oder None im Fehlerfall
+        :rtype:     set
+        '''
+        if not self.dbQK.sql(u'SELECT DISTINCT {} FROM {}'.format(spalte, tabelle), repref):
+            return None
+        return set(el[0] for el in self.dbQK.fetchall())
+
+    def ersetzen(self, tabelle, spalte, namen, repref, vorhanden=None):
+        '''Merkt das Löschen der in der Tabelle bereits vorhandenen Datensätze zu den angegebenen
+        Schlüsseln vor, so dass die anschließend vorgemerkten Datensätze diese ersetzen.
+
+        Die vorhandenen Schlüssel werden mit einer Abfrage gelesen und über eine Menge abgeglichen.
+        Die zu ersetzenden Schlüssel werden in die temporäre Tabelle eingefügt und anschließend
+        mit einer DELETE-Anweisung gelöscht, so dass die Tabelle nur einmal durchsucht wird. Ein
+        Index auf der Schlüsselspalte ist dafür nicht erforderlich.
+
+        :tabelle:   Name der QKan-Tabelle
+        :spalte:    Schlüsselspalte, z.B. apnam
+        :namen:     Schlüssel der neuen Datensätze
+        :vorhanden: Beim paketweisen Import die einmal mit vorhandene gelesenen Schlüssel. Die
+                    ersetzten Schlüssel werden daraus entfernt.
+
+        :returns:   Erfolg
+        :rtype:     Boolean
+        '''
+        if vorhanden is None:
+            vorhanden = self.vorhandene(tabelle, spalte, repref)
+            if vorhanden is None:
+                return False
+        ersetzt = []
+        for name in namen:
+            if name in vorhanden:
+                ersetzt.append(name)
+                vorhanden.discard(name)
+        if len(ersetzt) == 0:
+            return True
+        if not self.schluessel_vormerken(tabelle, ersetzt):
+            return False
+
+        sql = u'''DELETE FROM {tabelle} WHERE {spalte} IN
+                  (SELECT name FROM temp.stapel_schluessel WHERE tabelle = ?)'''.format(tabelle=tabelle,
+                                                                                    spalte=spalte)
+        if sql not in self.stapel:
+            self.einfuegen(sql, (tabelle,))
+        return True
+
+    def schluessel_vormerken(self, tabelle, namen):
+        '''Merkt Schlüssel zum Einfügen in die temporäre Tabelle vor. Die danach vorgemerkten
+        Anweisungen finden sie mit (SELECT name FROM temp.stapel_schluessel WHERE tabelle = ?).
+        Nach dem Schreiben wird die temporäre Tabelle geleert.
+
+        :tabelle:   Name der QKan-Tabelle
+        :namen:     Schlüssel
+
+        :returns:   Erfolg
+        :rtype:     Boolean
+        '''
+        if not self.schluessel_anlegen():
+            return False
+        sql = u'INSERT OR IGNORE INTO temp.stapel_schluessel (tabelle, name) VALUES (?, ?)'
+        for name in namen:
+            self.einfuegen(sql, (tabelle, name))
+        self.schluessel_vorgemerkt = True
+        return True
+
+    def anzahl(self):
+        '''Anzahl der vorgemerkten Datensätze'''
+        return sum(len(liste) for liste in self.stapel.values())
+
+    def schreiben(self, repref):
+        '''Schreibt alle vorgemerkten Datensätze. Anschließend ist der Stapel leer.
+
+        :returns:   Erfolg
+        :rtype:     Boolean
+        '''
+        for sql, liste in self.stapel.items():
+            try:
+                self.dbQK.cursl.executemany(sql, liste)
+            except BaseException as err:
+                self.melden(u'SQL-Fehler in {}'.format(repref),
+                            u'{}\nAnweisung: {}\nErster Datensatz: {}'.format(repr(err), sql, repr(liste[0])))
+                return False
+            logger.debug(u'{}: {} Datensätze geschrieben'.format(repref, len(liste)))
+        self.stapel.clear()
+
+        if self.schluessel_vorgemerkt:
+            if not self.dbQK.sql(u'DELETE FROM temp.stapel_schluessel', u'{} (Schlüssel)'.format(repref)):
+                return False
+            self.schluessel_vorgemerkt = False
+        return True
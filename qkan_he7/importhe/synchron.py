@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+
+'''
+
+  Inkrementeller Import aus HYSTEM-EXTRAN
+  =======================================
+
+  Für jede HE-Datenbank wird nach einem erfolgreichen Import der Stand der HE-Tabellen
+  (größter Zeitstempel LASTMODIFIED und größte ID) in einer json-Datei neben der
+  QKan-Datenbank gespeichert. Ein inkrementeller Import liest danach nur die Datensätze, die
+  seitdem geändert (LASTMODIFIED) oder neu angelegt (ID) wurden. Haltungen, Pumpen und Wehre
+  werden zusätzlich gelesen, wenn sich einer ihrer Schächte geändert hat, damit die Geometrie
+  aktuell bleibt. Die gelesenen Datensätze ersetzen gleichnamige Objekte in QKan.
+
+  Gelöschte Objekte werden vom inkrementellen Import nicht erkannt.
+
+  | Dateiname            : synchron.py
+  | Date                 : Oktober 2018
+  | Copyright            : (C) 2018 by Joerg Hoettges
+  | Email                : hoettges@fh-aachen.de
+  | git sha              : $Format:%H$
+
+  This program is free software; you can redistribute it and/or modify
+  it under the terms of the GNU General Public License as published by
+  the Free Software Foundation; either version 2 of the License, or
+  (at your option) any later version.
+
+'''
+
+import json
+import logging
+import os
+import time
+
+logger = logging.getLogger(u'QKan')
+
+# HE-Tabellen, deren Stand gespeichert wird
+tabellen_he = [u'ROHR', u'SCHACHT', u'SPEICHERSCHACHT', u'AUSLASS', u'PUMPE', u'WEHR',
+               u'TEILEINZUGSGEBIET', u'SONDERPROFIL', u'ABFLUSSPARAMETER']
+
+# Abfrage des Standes einer HE-Tabelle
+sql_stand = u'SELECT MAX(LASTMODIFIED), MAX(ID) FROM {}'
+
+# Abfragen des Imports (Schlüssel in abfragen_he) mit der HE-Tabelle, deren Stand gilt, und dem
+# Tabellennamen in der Abfrage. Bei Haltungen, Pumpen und Wehren werden auch die Objekte mit
+# geänderten Schächten gelesen.
+abhaengigkeiten = [
+    (u'haltungen', u'ROHR', u'ROHR', True),
+    (u'schaechte', u'SCHACHT', u'SCHACHT', False),
+    (u'speicher', u'SPEICHERSCHACHT', u'SPEICHERSCHACHT', False),
+    (u'auslaesse', u'AUSLASS', u'AUSLASS', False),
+    (u'pumpen', u'PUMPE', u'PUMPE', True),
+    (u'wehre', u'WEHR', u'WEHR', True),
+    (u'einzugsgebiete', u'TEILEINZUGSGEBIET', u'teileinzugsgebiet', False),
+    (u'speicherkennlinien', u'SPEICHERSCHACHT', u'SPEICHERSCHACHT', False),
+    (u'profildaten', u'SONDERPROFIL', u'SONDERPROFIL', False),
+    (u'abflussparameter', u'ABFLUSSPARAMETER', u'ABFLUSSPARAMETER', False),
+]
+
+
+def syncdatei(database_QKan):
+    '''Name der Datei mit dem Stand der importierten HE-Datenbanken'''
+    return database_QKan + u'.sync.json'
+
+
+def lese_stand(database_QKan, database_HE):
+    '''Liest den Stand des letzten Imports der HE-Datenbank in die QKan-Datenbank.
+
+    :returns:   HE-Tabelle -> [LASTMODIFIED, größte ID]. Leer, falls noch kein Import erfolgt ist.
+    :rtype:     dict
+    '''
+    dateiname = syncdatei(database_QKan)
+    if not os.path.exists(dateiname):
+        return {}
+    try:
+        with open(dateiname, 'r') as filesync:
+            daten = json.loads(filesync.read())
+    except BaseException as err:
+        logger.error(u'Sync-Datei {} konnte nicht gelesen werden: {}'.format(dateiname, repr(err)))
+        return {}
+    return daten.get(os.path.abspath(database_HE), {}).get(u'tabellen', {})
+
+
+def schreibe_stand(database_QKan, database_HE, stand):
+    '''Speichert den Stand der HE-Datenbank nach einem erfolgreichen Import.
+
+    :stand:     HE-Tabelle -> [LASTMODIFIED, größte ID]
+    :type stand: dict
+    '''
+    dateiname = syncdatei(database_QKan)
+    daten = {}
+    if os.path.exists(dateiname):
+        try:
+            with open(dateiname, 'r') as filesync:
+                daten = json.loads(filesync.read())
+        except BaseException as err:
+            logger.error(u'Sync-Datei {} wird neu angelegt: {}'.format(dateiname, repr(err)))
+            daten = {}
+    daten[os.path.abspath(database_HE)] = {
+        u'tabellen': stand,
+        u'zeit': time.strftime(u'%Y-%m-%d %H:%M:%S', time.localtime()),
+    }
+    try:
+        with open(dateiname, 'w') as filesync:
+            filesync.write(json.dumps(daten, indent=2))
+    except BaseException as err:
+        logger.error(u'Sync-Datei {} konnte nicht geschrieben werden: {}'.format(dateiname, repr(err)))
+
+
+def stand_lesen(daten):
+    '''Wandelt das Ergebnis der Abfrage sql_stand in einen speicherbaren Stand um.
+
+    :returns:   [LASTMODIFIED als Text, größte ID] oder None für eine leere Tabelle
+    :rtype:     list
+    '''
+    if not daten or daten[0][0] is None:
+        return None
+    zeit, maxid = daten[0]
+    if hasattr(zeit, 'strftime'):
+        zeit = zeit.strftime(u'%Y-%m-%d %H:%M:%S')
+    elif isinstance(zeit, bytes):
+        zeit = zeit.decode('iso-8859-1')
+    return [zeit, None if maxid is None else int(maxid)]
+
+
+def _geaendert(stand, tabelle, alias):
+    '''Bedingung für geänderte oder neue Datensätze einer HE-Tabelle'''
+    zeit, maxid = stand[tabelle]
+    bedingung = u"{alias}.LASTMODIFIED > '{zeit}'".format(alias=alias, zeit=zeit)
+    if maxid is not None:
+        bedingung += u' OR {alias}.ID > {maxid}'.format(alias=alias, maxid=maxid)
+    return bedingung
+
+
+def bedingungen(stand):
+    '''Erzeugt die Bedingungen für den inkrementellen Import.
+
+    :stand:     Stand des letzten Imports, siehe lese_stand
+    :type stand: dict
+
+    :returns:   Abfrage -> WHERE-Bedingung. Abfragen ohne gespeicherten Stand fehlen und
+                werden vollständig gelesen.
+    :rtype:     dict
+    '''
+    knoten = []
+    for tabelle in (u'SCHACHT', u'SPEICHERSCHACHT', u'AUSLASS'):
+        if tabelle in stand:
+            knoten.append(u'SELECT NAME FROM {tab} WHERE {bed}'.format(
+                tab=tabelle, bed=_geaendert(stand, tabelle, tabelle)))
+        else:
+            knoten.append(u'SELECT NAME FROM {}'.format(tabelle))
+    knoten = u' UNION '.join(knoten)
+
+    ergebnis = {}
+    for abfrage, tabelle, alias, mit_knoten in abhaengigkeiten:
+        if tabelle not in stand:
+            continue
+        bedingung = _geaendert(stand, tabelle, alias)
+        if mit_knoten:
+            bedingung += u' OR {alias}.SCHACHTOBEN IN ({knoten}) OR {alias}.SCHACHTUNTEN IN ({knoten})'.format(
+                alias=alias, knoten=knoten)
+        ergebnis[abfrage] = u'\n    WHERE {}\n    '.format(bedingung)
+    return ergebnis
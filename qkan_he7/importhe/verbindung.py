@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+
+'''
+
+  Datenbankverbindung mit eigener Fehlermeldung
+  =============================================
+
+  DBConnection und FBConnection zeigen SQL-Fehler mit fehlermeldung in der Meldungsleiste an.
+  Beim Import im Hintergrund (Modul hintergrund) ist das aus dem Import-Thread nicht zulässig.
+  Die Importfunktionen verwenden die Verbindungen deshalb über MeldendeVerbindung, die SQL-Fehler
+  an die übergebene Funktion melden weitergibt. Im GUI-Thread ist das fehlermeldung selbst,
+  im Import-Thread eine Funktion, die die Meldung an den GUI-Thread übergibt.
+
+  | Dateiname            : verbindung.py
+  | Date                 : Oktober 2018
+  | Copyright            : (C) 2018 by Joerg Hoettges
+  | Email                : hoettges@fh-aachen.de
+  | git sha              : $Format:%H$
+
+  This program is free software; you can redistribute it and/or modify
+  it under the terms of the GNU General Public License as published by
+  the Free Software Foundation; either version 2 of the License, or
+  (at your option) any later version.
+
+'''
+
+import logging
+
+logger = logging.getLogger(u'QKan')
+
+
+class MeldendeVerbindung:
+    '''Führt SQL-Anweisungen direkt über den Cursor der Verbindung aus und meldet Fehler an melden.
+    Alle übrigen Attribute (fetchall, commit, consl, ...) werden von der Verbindung übernommen.
+    Die Verbindung wird geschlossen, sobald das Objekt gelöscht wird.
+    '''
+
+    def __init__(self, db, melden, cursor):
+        '''
+        :db:            Verbindung zur QKan- oder HE-Datenbank
+        :type db:       DBConnection, FBConnection
+
+        :melden:        Wird bei einem SQL-Fehler mit (Titel, Text) aufgerufen
+        :type melden:   function
+
+        :cursor:        Name des Cursors der Verbindung ('cursl' bzw. 'curfb')
+        :type cursor:   string
+        '''
+        self.db = db
+        self.melden = melden
+        self.cursor = getattr(db, cursor)
+
+    def __getattr__(self, name):
+        return getattr(self.db, name)
+
+    def sql(self, sql, repref=u'allgemein'):
+        '''Führt eine SQL-Anweisung aus.
+
+        :returns:   Erfolg
+        :rtype:     Boolean
+        '''
+        try:
+            self.cursor.execute(sql)
+        except BaseException as err:
+            logger.error(u'SQL-Fehler in {}: {}\n{}'.format(repref, repr(err), sql))
+            self.melden(u'SQL-Fehler in {}'.format(repref), u'{}\nSQL:\n{}'.format(repr(err), sql))
+            return False
+        return True
@@ -0,0 +1,418 @@
+# -*- coding: utf-8 -*-
+
+'''
+
+  Zusammenführen mehrerer HE-Datenbanken
+  ======================================
+
+  Import mehrerer HE-Datenbanken (z.B. getrennt verwalteter Stadtteile) in eine QKan-Datenbank.
+  Alle HE-Datenbanken werden gleichzeitig gelesen (Modul lesen), geschrieben wird nacheinander
+  in einer gemeinsamen Transaktion. Räumliche Indizes werden nur einmal am Ende neu aufgebaut
+  (Modul massenimport).
+
+  Gleiche Objektnamen in verschiedenen HE-Datenbanken werden über eine Kennung je HE-Datenbank
+  unterschieden (Voreinstellung: Dateiname ohne Endung). Es gibt zwei Verfahren:
+
+  - 'praefix': Alle Namen von Schächten, Haltungen, Pumpen, Wehren, Teileinzugsgebieten, Flächen,
+    Einzeleinleitern und Außengebieten erhalten die Kennung als Präfix ("Kennung_Name").
+  - 'teilgebiet': Die Namen bleiben erhalten. Nur Namen, die bereits in einer vorher gelesenen
+    HE-Datenbank vorkommen, erhalten das Präfix. Alle Objekte werden dem Teilgebiet mit dem
+    Namen der Kennung zugeordnet.
+
+  Verweise (z.B. Schacht oben einer Haltung) werden jeweils mit umbenannt. Profile, Abflussparameter
+  und Bodenklassen gelten für alle HE-Datenbanken gemeinsam.
+
+  | Dateiname            : zusammenfuehren.py
+  | Date                 : Oktober 2018
+  | Copyright            : (C) 2018 by Joerg Hoettges
+  | Email                : hoettges@fh-aachen.de
+  | git sha              : $Format:%H$
+
+  This program is free software; you can redistribute it and/or modify
+  it under the terms of the GNU General Public License as published by
+  the Free Software Foundation; either version 2 of the License, or
+  (at your option) any later version.
+
+'''
+
+import logging
+import os
+from collections import OrderedDict
+
+from qkan.database.dbfunc import DBConnection
+from qkan.database.fbfunc import FBConnection
+from qkan.database.qkan_utils import fehlermeldung, evalNodeTypes
+
+from import_from_he import (abfragen_he, Ablauf, geoparameter, importQuelle, importAbschliessen,
+                            srid_qkan, zoombereich)
+from lesen import ParallelLeser
+from massenimport import Massenimport
+from stapel import StapelSchreiber
+from verbindung import MeldendeVerbindung
+
+logger = logging.getLogger(u'QKan')
+
+# Umzubenennende Spalten je Abfrage (abfragen_he und Modul flaechen): Spalte -> Objektart
+umbenennen_spalten = {
+    u'haltungen': {0: u'haltung', 1: u'knoten', 2: u'knoten', 10: u'gebiet'},
+    u'schaechte': {0: u'knoten'},
+    u'speicher': {0: u'knoten'},
+    u'auslaesse': {0: u'knoten'},
+    u'pumpen': {0: u'pumpe', 1: u'knoten', 2: u'knoten', 4: u'knoten'},
+    u'wehre': {0: u'wehr', 1: u'knoten', 2: u'knoten'},
+    u'einzugsgebiete': {0: u'gebiet'},
+    u'speicherkennlinien': {0: u'knoten'},
+    u'flaechen': {0: u'flaeche', 1: u'haltung'},
+    u'einleiter': {0: u'einleiter', 1: u'haltung'},
+    u'aussengebiete': {0: u'aussengebiet', 1: u'knoten'},
+}
+
+# Namen je Objektart zur Erkennung von Namenskonflikten (nur Verfahren 'teilgebiet')
+abfragen_namen = OrderedDict([
+    (u'knoten', u'''SELECT NAME FROM SCHACHT
+    UNION SELECT NAME FROM SPEICHERSCHACHT
+    UNION SELECT NAME FROM AUSLASS'''),
+    (u'haltung', u'SELECT NAME FROM ROHR'),
+    (u'pumpe', u'SELECT NAME FROM PUMPE'),
+    (u'wehr', u'SELECT NAME FROM WEHR'),
+    (u'gebiet', u'SELECT NAME FROM TEILEINZUGSGEBIET'),
+    (u'flaeche', u'SELECT NAME FROM FLAECHE'),
+    (u'einleiter', u'SELECT NAME FROM EINZELEINLEITER'),
+    (u'aussengebiet', u'SELECT NAME FROM AUSSENGEBIET'),
+])
+
+# Objektarten, die nur mit Flächen gelesen werden
+namen_flaechen = [u'flaeche', u'einleiter', u'aussengebiet']
+
+# Tabellen mit Teilgebiet: Abfrage -> (QKan-Tabelle, Schlüsselspalte)
+teilgebiet_tabellen = {
+    u'haltungen': (u'haltungen', u'haltnam'),
+    u'schaechte': (u'schaechte', u'schnam'),
+    u'speicher': (u'schaechte', u'schnam'),
+    u'auslaesse': (u'schaechte', u'schnam'),
+    u'pumpen': (u'pumpen', u'pnam'),
+    u'wehre': (u'wehre', u'wnam'),
+    u'flaechen': (u'flaechen', u'flnam'),
+    u'einleiter': (u'einleit', u'elnam'),
+    u'aussengebiete': (u'aussengebiete', u'gebnam'),
+}
+
+
+class Namensraum:
+    '''Umbenennung der Objekte einer HE-Datenbank beim Zusammenführen.
+
+    Die Namen werden in den gelesenen Datensätzen ersetzt, bevor der Import sie verarbeitet.
+    Sie liegen dann noch als Text in iso-8859-1 vor.
+    '''
+
+    def __init__(self, kennung, teilgebiet=None, umbenennen=None):
+        '''
+        :kennung:       Kennung der HE-Datenbank, Präfix der umbenannten Namen
+        :type kennung:  string
+
+        :teilgebiet:    Teilgebiet, dem alle Objekte zugeordnet werden, oder None
+        :type teilgebiet: string
+
+        :umbenennen:    Objektart -> Menge der umzubenennenden Namen. Bei None werden alle
+                        Namen umbenannt.
+        :type umbenennen: dict
+        '''
+        self.kennung = kennung
+        self.praefix = kennung + u'_'
+        self.teilgebiet = teilgebiet
+        self.umbenennen = umbenennen
+        self.objekte = OrderedDict()        # Abfrage -> Liste der geschriebenen Namen
+
+    def name(self, art, wert):
+        '''Neuer Name eines Objekts'''
+        if wert is None:
+            return None
+        if self.umbenennen is not None and wert not in self.umbenennen.get(art, ()):
+            return wert
+        if isinstance(wert, bytes):
+            return self.praefix.encode('iso-8859-1') + wert
+        return self.praefix + wert
+
+    def anwenden(self, abfrage, daten):
+        '''Ersetzt die Namen in den Datensätzen einer Abfrage.
+
+        :abfrage:   Name der Abfrage (Schlüssel in umbenennen_spalten)
+        :daten:     Datensätze oder None im Fehlerfall
+
+        :returns:   Datensätze mit den neuen Namen
+        :rtype:     list
+        '''
+        if daten is None or abfrage not in umbenennen_spalten:
+            return daten
+        spalten = umbenennen_spalten[abfrage]
+        ergebnis = []
+        for attr in daten:
+            attr = list(attr)
+            for nr, art in spalten.items():
+                attr[nr] = self.name(art, attr[nr])
+            ergebnis.append(tuple(attr))
+
+        # Namen für die Zuordnung zum Teilgebiet merken
+        if self.teilgebiet is not None and abfrage in teilgebiet_tabellen:
+            self.objekte.setdefault(abfrage, []).extend(
+                attr[0].decode('iso-8859-1') if isinstance(attr[0], bytes) else attr[0]
+                for attr in ergebnis if attr[0] is not None)
+        return ergebnis
+
+
+class UmbenennenderLeser:
+    '''Liefert die Ergebnisse eines ParallelLeser mit den Namen des Namensraums.'''
+
+    def __init__(self, leser, namensraum):
+        self.leser = leser
+        self.namensraum = namensraum
+
+    def ergebnis(self, name):
+        return self.namensraum.anwenden(name, self.leser.ergebnis(name))
+
+    def beenden(self):
+        self.leser.beenden()
+
+
+def namensraeume(kennungen, namen, strategie):
+    '''Legt die Namensräume der HE-Datenbanken fest.
+
+    :kennungen:     Kennungen der HE-Datenbanken in der Reihenfolge des Imports
+    :type kennungen: list
+
+    :namen:         Je HE-Datenbank: Objektart -> Menge der Namen (nur Verfahren 'teilgebiet')
+    :type namen:    list of dict
+
+    :strategie:     'praefix' oder 'teilgebiet'
+    :type strategie: string
+
+    :rtype:         list of Namensraum
+    '''
+    if strategie == u'praefix':
+        return [Namensraum(kennung) for kennung in kennungen]
+
+    belegt = {}                             # Objektart -> bereits vergebene Namen
+    ergebnis = []
+    for kennung, namen_quelle in zip(kennungen, namen):
+        umbenennen = {}
+        for art, menge in namen_quelle.items():
+            umbenennen[art] = menge & belegt.setdefault(art, set())
+        namensraum = Namensraum(kennung, teilgebiet=kennung, umbenennen=umbenennen)
+        for art, menge in namen_quelle.items():
+            belegt[art].update(namensraum.name(art, wert) for wert in menge)
+            if umbenennen[art]:
+                logger.info(u'Zusammenführen: {} Namen ({}) aus {} umbenannt'.format(
+                    len(umbenennen[art]), art, kennung))
+        ergebnis.append(namensraum)
+    return ergebnis
+
+
+def teilgebiet_zuordnen(schreiber, namensraum):
+    '''Ordnet alle geschriebenen Objekte eines Namensraums seinem Teilgebiet zu.
+
+    :returns:   Anzahl der zugeordneten Objekte oder None im Fehlerfall
+    :rtype:     int
+    '''
+    schreiber.einfuegen(u"""INSERT INTO teilgebiete (tgnam, kommentar)
+        SELECT ?, ? WHERE NOT EXISTS (SELECT 1 FROM teilgebiete WHERE tgnam = ?)""",
+                        (namensraum.teilgebiet, u'Zusammenführen aus HE', namensraum.teilgebiet))
+    # Je Tabelle eine UPDATE-Anweisung über die Schlüssel in der temporären Tabelle
+    anzahl = 0
+    for abfrage, namen in namensraum.objekte.items():
+        tabelle, spalte = teilgebiet_tabellen[abfrage]
+        if not schreiber.schluessel_vormerken(tabelle, namen):
+            return None
+        sql = u'''UPDATE {tabelle} SET teilgebiet = ? WHERE {spalte} IN
+                  (SELECT name FROM temp.stapel_schluessel WHERE tabelle = ?)'''.format(tabelle=tabelle,
+                                                                                    spalte=spalte)
+        if sql not in schreiber.stapel:
+            schreiber.einfuegen(sql, (namensraum.teilgebiet, tabelle))
+        anzahl += len(namen)
+    if not schreiber.schreiben(u'zusammenfuehren_he (1)'):
+        return None
+    return anzahl
+
+
+def importZusammenfuehren(quellen, database_QKan, projectfile, epsg, **optionen):
+    '''Zusammenführen mehrerer HE-Datenbanken in eine QKan-Datenbank. Anschließend wird die
+    Projektdatei geschrieben und geladen.
+
+    Parameter siehe importZusammenfuehrenDB und import_from_he.importAbschliessen.
+
+    :returns: void
+    '''
+
+    ergebnis = importZusammenfuehrenDB(quellen, database_QKan, epsg, **optionen)
+    if ergebnis is None:
+        return None
+
+    zoom, srid = ergebnis
+    importAbschliessen(database_QKan, projectfile, zoom, srid)
+
+
+def importZusammenfuehrenDB(quellen, database_QKan, epsg, strategie=u'teilgebiet', dbtyp=u'SpatiaLite',
+                            massenimport=True, parallel_lesen=3, mit_flaechen=False, rueckmeldung=None,
+                            abbruch=None, melden=fehlermeldung):
+    '''Import mehrerer HE-Datenbanken in eine QKan-Datenbank in einer Transaktion.
+
+    :quellen:       Pfade der HE-Datenbanken oder (Pfad, Kennung). Ohne Kennung wird der
+                    Dateiname ohne Endung verwendet.
+    :type quellen:  list
+
+    :strategie:     Behandlung gleicher Namen: 'praefix' oder 'teilgebiet' (siehe oben)
+    :type strategie: string
+
+    Die übrigen Parameter entsprechen import_from_he.importKanaldatenDB. Ein inkrementeller
+    Import ist beim Zusammenführen nicht möglich.
+
+    :returns:       ((xmin, xmax, ymin, ymax) aller Schächte, EPSG-Code der QKan-Datenbank) oder
+                    None bei Fehler oder Abbruch
+    :rtype:         tuple
+    '''
+
+    quellen = [(quelle, os.path.splitext(os.path.basename(quelle))[0]) if not isinstance(quelle, (tuple, list))
+               else tuple(quelle) for quelle in quellen]
+    kennungen = [kennung for database_HE, kennung in quellen]
+    if len(set(kennungen)) != len(kennungen):
+        melden(u"Fehler beim Zusammenführen von HE-Datenbanken",
+               u'Die Kennungen der HE-Datenbanken sind nicht eindeutig: {}'.format(u', '.join(kennungen)))
+        return None
+    if strategie not in (u'praefix', u'teilgebiet'):
+        melden(u'Programmfehler!', u'Unbekanntes Verfahren zum Zusammenführen: {}'.format(strategie))
+        return None
+
+    # ------------------------------------------------------------------------------
+    # Datenbankverbindungen. SQL-Fehler werden an melden übergeben (Modul verbindung).
+
+    dbQK = DBConnection(dbname=database_QKan, epsg=epsg)
+    if not dbQK.connected:
+        return None
+    dbQK = MeldendeVerbindung(dbQK, melden, u'cursl')
+
+    schreiber = StapelSchreiber(dbQK, melden=melden)
+
+    geoformat, geo_param = geoparameter(dbtyp, epsg, melden)
+    if geoformat is None:
+        return None
+
+    # Alle HE-Datenbanken werden gleichzeitig gelesen. Die Verbindung dbHE je HE-Datenbank dient
+    # für die paketweise gelesenen Tabellen und den Zoombereich.
+    # Die Threads aller HE-Datenbanken werden auch bei einem Fehler oder Abbruch beendet. Ohne
+    # erfolgreichen commit wird die Transaktion zurückgesetzt, die PRAGMAs des Massenimports werden
+    # wiederhergestellt und die Verbindungen zu den HE-Datenbanken freigegeben.
+    verbindungen = []
+    alle_leser = []
+    massen = None
+    erfolg = False
+    try:
+        for database_HE, kennung in quellen:
+            dbHE = FBConnection(database_HE)
+            if dbHE is None:
+                melden(u"Fehler beim Zusammenführen von HE-Datenbanken",
+                       u'ITWH-Datenbank {:s} wurde nicht gefunden!\nAbbruch!'.format(database_HE))
+                return None
+            dbHE = MeldendeVerbindung(dbHE, melden, u'curfb')
+
+            abfragen = OrderedDict()
+            if strategie == u'teilgebiet':
+                for art, sql in abfragen_namen.items():
+                    if mit_flaechen or art not in namen_flaechen:
+                        abfragen[u'namen_' + art] = sql
+            for name, sql in abfragen_he.items():
+                abfragen[name] = sql.format(bedingung=u'')
+
+            leser = ParallelLeser(database_HE, abfragen, anzahl=parallel_lesen, dbHE=dbHE, melden=melden)
+            leser.starten()
+            verbindungen.append(dbHE)
+            alle_leser.append(leser)
+
+        # Namenskonflikte auflösen
+        namen = []
+        if strategie == u'teilgebiet':
+            for leser in alle_leser:
+                namen_quelle = {}
+                for art in abfragen_namen:
+                    if mit_flaechen or art not in namen_flaechen:
+                        daten = leser.ergebnis(u'namen_' + art)
+                        if daten is None:
+                            return None
+                        namen_quelle[art] = set(attr[0] for attr in daten if attr[0] is not None)
+                namen.append(namen_quelle)
+        raeume = namensraeume(kennungen, namen, strategie)
+
+        # Räumliche Indizes werden nur einmal nach allen HE-Datenbanken aufgebaut
+        if massenimport and dbtyp == u'SpatiaLite':
+            tabellen = [u'haltungen', u'schaechte', u'pumpen', u'wehre']
+            if mit_flaechen:
+                tabellen += [u'flaechen', u'linkfl', u'einleit', u'linksw', u'aussengebiete']
+            massen = Massenimport(dbQK, tabellen)
+            massen.pragmas_setzen()
+            if not massen.indizes_aussetzen():
+                return None
+
+        schritte = (15 if mit_flaechen else 11) + (1 if strategie == u'teilgebiet' else 0)
+        ablauf = Ablauf(dbQK, alle_leser, massen, schritte * len(quellen), rueckmeldung, abbruch)
+
+        # ------------------------------------------------------------------------------
+        # HE-Datenbanken nacheinander schreiben
+
+        for (database_HE, kennung), dbHE, leser, namensraum in zip(quellen, verbindungen, alle_leser, raeume):
+            logger.debug(u'Zusammenführen: {} aus {}'.format(kennung, database_HE))
+            ablauf.quelle = kennung
+            if not importQuelle(dbHE, dbQK, schreiber, UmbenennenderLeser(leser, namensraum), ablauf, epsg,
+                                geoformat, geo_param, mit_flaechen, namensraum):
+                return None
+            leser.beenden()
+
+            if namensraum.teilgebiet is not None:
+                anzahl = teilgebiet_zuordnen(schreiber, namensraum)
+                if anzahl is None:
+                    return None
+                if not ablauf.weiter(u'teilgebiete', anzahl):
+                    return None
+
+        if massen is not None:
+            if not massen.indizes_wiederherstellen():
+                melden(u"Fehler beim Zusammenführen von HE-Datenbanken",
+                       u'Räumliche Indizes konnten nicht neu aufgebaut werden!\nAbbruch!')
+                return None
+
+        # Alle HE-Datenbanken in einer Transaktion
+        dbQK.commit()
+        erfolg = True
+    finally:
+        for leser in alle_leser:
+            leser.beenden()
+        if not erfolg:
+            dbQK.consl.rollback()
+            if massen is not None:
+                massen.pragmas_zuruecksetzen()
+            dbHE = None
+            del alle_leser[:]
+            del verbindungen[:]
+
+    if massen is not None:
+        massen.pragmas_zuruecksetzen()
+
+    # Schachttypen auswerten
+    evalNodeTypes(dbQK)                     # in qkan.database.qkan_utils
+
+    # ------------------------------------------------------------------------------
+    # Zoom-Bereich über alle HE-Datenbanken und Projektionssystem
+
+    bereiche = [zoom for zoom in (zoombereich(dbHE, melden) for dbHE in verbindungen)
+                if zoom is not None and None not in zoom]
+    if bereiche:
+        zoom = (min(el[0] for el in bereiche), max(el[1] for el in bereiche),
+                min(el[2] for el in bereiche), max(el[3] for el in bereiche))
+    else:
+        zoom = None
+
+    srid = srid_qkan(dbQK)
+    if srid is None:
+        return None
+
+    del verbindungen
+    del dbQK
+
+    return zoom, srid
@@ -0,0 +1,547 @@
+# -*- coding: utf-8 -*-
+
+"""
+  Benchmark für den Datenaustausch mit HYSTEM-EXTRAN
+  ==================================================
+
+  Erzeugt ein synthetisches Kanalnetz einstellbarer Größe (Schächte, Haltungen, Speicher mit
+  Kennlinien, Auslässe, Pumpen, Wehre, Sonderprofile, Flächen, Einzeleinleiter, Außengebiete,
+  Ergebnisse) in einer SQLite-Datenbank, die anstelle der HE-Firebird-Datenbank gelesen wird,
+  und misst die Laufzeiten von
+
+  - importKanaldatenDB (je geschriebener Tabelle),
+  - exportKanaldaten (je Abschnitt, Export in ein Ladeskript, s. exporthe/sqlskript.py),
+  - importResults (neu eingelesen und aus dem Zwischenspeicher).
+
+  Die Ergebnisse werden als JSON ausgegeben und können zwischen Versionen verglichen werden.
+  Es wird keine Netzwerkverbindung und kein Firebird-Server benötigt. Die Module werden wie in
+  QGIS geladen, d.h. das Skript läuft in der Python-Umgebung von QGIS 2 mit installiertem
+  QKan-Plugin (Pfad der Plugins mit --plugins). QGIS wird dabei nicht gestartet: Meldungsleiste
+  und Legende werden durch eine Attrappe ersetzt, Layer werden nicht geladen. Das Ladeskript des
+  Exports wird nicht ausgeführt, weil es Firebird-spezifische Anweisungen enthält.
+
+  Aufruf (Beispiel):
+
+      python scripts/benchmark_he.py --schaechte 20000 --flaechen 2 --ausgabe bench.json
+
+  | Dateiname            : benchmark_he.py
+  | Date                 : Oktober 2018
+  | Copyright            : (C) 2018 by Joerg Hoettges
+  | Email                : hoettges@fh-aachen.de
+  | git sha              : $Format:%H$
+
+  This program is free software; you can redistribute it and/or modify
+  it under the terms of the GNU General Public License as published by
+  the Free Software Foundation; either version 2 of the License, or
+  (at your option) any later version.
+
+"""
+
+from __future__ import print_function
+
+import argparse
+import itertools
+import json
+import logging
+import math
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+logger = logging.getLogger(u'QKan')
+
+verzeichnis_plugin = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, u'qkan_he7')
+
+# ------------------------------------------------------------------------------
+# Tabellen der HE-Datenbank (nur die beim Import und Export verwendeten Spalten)
+
+schema_he = [
+    (u'ITWH$PROGINFO', u'NEXTID INTEGER, VERSION TEXT'),
+    (u'SCHACHT', u'''ID INTEGER PRIMARY KEY, NAME TEXT, XKOORDINATE REAL, YKOORDINATE REAL, SOHLHOEHE REAL,
+        DECKELHOEHE REAL, DURCHMESSER REAL, DRUCKDICHTERDECKEL INTEGER, KANALART INTEGER,
+        PLANUNGSSTATUS INTEGER, KOMMENTAR TEXT, LASTMODIFIED TEXT'''),
+    (u'SPEICHERSCHACHT', u'''ID INTEGER PRIMARY KEY, NAME TEXT, XKOORDINATE REAL, YKOORDINATE REAL,
+        SOHLHOEHE REAL, GELAENDEHOEHE REAL, UEBERSTAUFLAECHE REAL, PLANUNGSSTATUS INTEGER, KOMMENTAR TEXT,
+        LASTMODIFIED TEXT'''),
+    (u'AUSLASS', u'''ID INTEGER PRIMARY KEY, NAME TEXT, XKOORDINATE REAL, YKOORDINATE REAL, SOHLHOEHE REAL,
+        GELAENDEHOEHE REAL, TYP INTEGER, PLANUNGSSTATUS INTEGER, KOMMENTAR TEXT, LASTMODIFIED TEXT'''),
+    (u'ROHR', u'''ID INTEGER PRIMARY KEY, NAME TEXT, SCHACHTOBEN TEXT, SCHACHTUNTEN TEXT, GEOMETRIE1 REAL,
+        GEOMETRIE2 REAL, LAENGE REAL, SOHLHOEHEOBEN REAL, SOHLHOEHEUNTEN REAL, TEILEINZUGSGEBIET TEXT,
+        PROFILTYP INTEGER, SONDERPROFILBEZEICHNUNG TEXT, KANALART INTEGER, RAUIGKEITSBEIWERT REAL,
+        PLANUNGSSTATUS INTEGER, KOMMENTAR TEXT, LASTMODIFIED TEXT'''),
+    (u'PUMPE', u'''ID INTEGER PRIMARY KEY, NAME TEXT, SCHACHTOBEN TEXT, SCHACHTUNTEN TEXT, TYP INTEGER,
+        STEUERSCHACHT TEXT, EINSCHALTHOEHE REAL, AUSSCHALTHOEHE REAL, PLANUNGSSTATUS INTEGER, KOMMENTAR TEXT,
+        LASTMODIFIED TEXT'''),
+    (u'WEHR', u'''ID INTEGER PRIMARY KEY, NAME TEXT, SCHACHTOBEN TEXT, SCHACHTUNTEN TEXT, TYP INTEGER,
+        SCHWELLENHOEHE REAL, GEOMETRIE1 REAL, GEOMETRIE2 REAL, UEBERFALLBEIWERT REAL, PLANUNGSSTATUS INTEGER,
+        KOMMENTAR TEXT, LASTMODIFIED TEXT'''),
+    (u'TEILEINZUGSGEBIET', u'''ID INTEGER PRIMARY KEY, NAME TEXT, EINWOHNERDICHTE REAL, WASSERVERBRAUCH REAL,
+        STUNDENMITTEL REAL, FREMDWASSERANTEIL REAL, FLAECHE REAL, KOMMENTAR TEXT, LASTMODIFIED TEXT'''),
+    (u'SONDERPROFIL', u'ID INTEGER PRIMARY KEY, NAME TEXT, KOMMENTAR TEXT, LASTMODIFIED TEXT'),
+    (u'TABELLENINHALTE', u'ID INTEGER, KEYWERT REAL, WERT REAL, REIHENFOLGE INTEGER'),
+    (u'ABFLUSSPARAMETER', u'''ID INTEGER PRIMARY KEY, NAME TEXT, ABFLUSSBEIWERTANFANG REAL,
+        ABFLUSSBEIWERTENDE REAL, MULDENVERLUST REAL, BENETZUNGSVERLUST REAL, BENETZUNGSPEICHERSTART REAL,
+        MULDENAUFFUELLGRADSTART REAL, TYP INTEGER, BODENKLASSE TEXT, KOMMENTAR TEXT, LASTMODIFIED TEXT'''),
+    (u'BODENKLASSE', u'''ID INTEGER PRIMARY KEY, NAME TEXT, INFILTRATIONSRATEANFANG REAL,
+        INFILTRATIONSRATEENDE REAL, INFILTRATIONSRATESTART REAL, RUECKGANGSKONSTANTE REAL,
+        REGENERATIONSKONSTANTE REAL, SAETTIGUNGSWASSERGEHALT REAL, KOMMENTAR TEXT, LASTMODIFIED TEXT'''),
+    (u'FLAECHE', u'''ID INTEGER PRIMARY KEY, NAME TEXT, HALTUNG TEXT, GROESSE REAL, REGENSCHREIBER TEXT,
+        BERECHNUNGSPEICHERKONSTANTE INTEGER, ANZAHLSPEICHER INTEGER, SPEICHERKONSTANTE REAL,
+        SCHWERPUNKTLAUFZEIT REAL, FLIESSZEITOBERFLAECHE REAL, LAENGSTEFLIESSZEITKANAL REAL,
+        PARAMETERSATZ TEXT, NEIGUNGSKLASSE INTEGER, KOMMENTAR TEXT, LASTMODIFIED TEXT'''),
+    (u'EINZELEINLEITER', u'''ID INTEGER PRIMARY KEY, NAME TEXT, ROHR TEXT, XKOORDINATE REAL, YKOORDINATE REAL,
+        HERKUNFT INTEGER, EINWOHNER REAL, ZUFLUSSDIREKT REAL, KOMMENTAR TEXT, LASTMODIFIED TEXT'''),
+    (u'AUSSENGEBIET', u'''ID INTEGER PRIMARY KEY, NAME TEXT, SCHACHT TEXT, HOEHEOBEN REAL, HOEHEUNTEN REAL,
+        XKOORDINATE REAL, YKOORDINATE REAL, GESAMTFLAECHE REAL, CNMITTELWERT REAL, BASISZUFLUSS REAL,
+        FLIESSLAENGE REAL, REGENSCHREIBER TEXT, KOMMENTAR TEXT, LASTMODIFIED TEXT'''),
+    (u'LAU_MAX_S', u'KNOTEN TEXT, WASSERSTAND REAL, UEBERSTAUVOLUMEN REAL'),
+    (u'LANGZEITKNOTEN', u'KNOTEN TEXT, HAEUFIGKEITUEBERSTAU REAL, ANZAHLUEBERSTAU REAL'),
+    (u'LAU_MAX_EL', u'''KANTE TEXT, AUSLASTUNG REAL, DURCHFLUSS REAL, GESCHWINDIGKEIT REAL, WASSERSTANDOBEN REAL,
+        WASSERSTANDUNTEN REAL'''),
+    (u'LANGZEITKANTEN', u'KANTE TEXT, HAEUFIGKEITVOLLFUELLUNG REAL, ANZAHLVOLLFUELLUNG REAL'),
+]
+
+# Namen der Tabellen mit Objekten (für den Index auf NAME)
+tabellen_namen = [u'SCHACHT', u'SPEICHERSCHACHT', u'AUSLASS', u'ROHR', u'PUMPE', u'WEHR', u'TEILEINZUGSGEBIET',
+                  u'SONDERPROFIL', u'ABFLUSSPARAMETER', u'BODENKLASSE', u'FLAECHE', u'EINZELEINLEITER',
+                  u'AUSSENGEBIET']
+
+STAND = u'2018-10-01 12:00:00'
+HE_VERSION = u'7.9.0'
+
+
+class SQLiteHE:
+    '''SQLite-Datenbank mit den Tabellen der HE-Datenbank anstelle von qkan.database.fbfunc.FBConnection.
+
+    Texte werden wie bei Firebird als Bytes geliefert.
+    '''
+
+    def __init__(self, database_HE):
+        self.database_HE = database_HE
+        self.confb = sqlite3.connect(database_HE, check_same_thread=False)
+        self.confb.text_factory = bytes
+        self.curfb = self.confb.cursor()
+
+    def __del__(self):
+        try:
+            self.confb.close()
+        except BaseException:
+            pass
+
+    def sql(self, sql, repref=None):
+        try:
+            self.curfb.execute(sql)
+        except sqlite3.Error as err:
+            logger.error(u'Benchmark: SQL-Fehler in {}: {}\n{}'.format(repref, repr(err), sql))
+            return False
+        return True
+
+    def fetchone(self):
+        return self.curfb.fetchone()
+
+    def fetchall(self):
+        return self.curfb.fetchall()
+
+    def commit(self):
+        self.confb.commit()
+
+
+class Attrappe(object):
+    '''Ersetzt iface, Meldungsleiste, Fortschrittsbalken usw. Jeder Aufruf liefert wieder die Attrappe.'''
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __getattr__(self, name):
+        return self
+
+    def __call__(self, *args, **kwargs):
+        return self
+
+    def __iter__(self):
+        return iter(())
+
+    def layers(self):
+        # Die Ergebnislayer gelten als geladen, damit importResults keine Layer anlegt
+        return [_Layer(u'Überstau Schächte'), _Layer(u'Auslastung Haltungen')]
+
+
+class _Layer:
+    def __init__(self, name):
+        self._name = name
+
+    def name(self):
+        return self._name
+
+    def setSubsetString(self, auswahl):
+        pass
+
+
+# ------------------------------------------------------------------------------
+# Synthetisches Kanalnetz
+
+def erzeuge_he(database_HE, schaechte=1000, speicher=0.02, pumpen=0.01, wehre=0.01, sonderprofile=10,
+               flaechen=1., einleiter=0.2, aussengebiete=0.01, kennlinie=10, seed=1):
+    '''Erzeugt eine SQLite-Datenbank mit einem synthetischen Kanalnetz in den Tabellen der HE-Datenbank.
+
+    Die Schächte liegen in Reihen auf einem Raster. Die Haltungen verbinden die Schächte einer Reihe
+    zu Strängen, die in einen Sammler am Rand münden; der Sammler endet in einem Auslass. Ein Teil
+    der Schächte wird als Speicher mit Kennlinie angelegt und über eine Pumpe oder ein Wehr
+    zusätzlich mit dem nächsten Strang verbunden.
+
+    :schaechte:     Anzahl der Schächte (einschließlich Speicher)
+    :speicher, pumpen, wehre, einleiter, aussengebiete: Anteil bezogen auf die Schächte
+    :flaechen:      Flächen je Haltung
+    :sonderprofile: Anzahl der Sonderprofile
+    :kennlinie:     Stützstellen je Speicher- und Profilkennlinie
+
+    :returns:       Anzahl der Datensätze je Tabelle
+    :rtype:         dict
+    '''
+    zufall = random.Random(seed)
+    if os.path.exists(database_HE):
+        os.remove(database_HE)
+    con = sqlite3.connect(database_HE)
+    cur = con.cursor()
+    for tabelle, spalten in schema_he:
+        cur.execute(u'CREATE TABLE "{}" ({})'.format(tabelle, spalten))
+    for tabelle in tabellen_namen:
+        cur.execute(u'CREATE INDEX "IX_{0}_NAME" ON "{0}" (NAME)'.format(tabelle))
+
+    daten = dict((tabelle, []) for tabelle, spalten in schema_he)
+    ids = itertools.count(1)
+
+    # Kataloge
+    daten[u'BODENKLASSE'] = [(next(ids), u'BK{}'.format(nr), 10., 1., 5., 0.5, 0.1, 0.3, u'', STAND)
+                             for nr in range(3)]
+    daten[u'ABFLUSSPARAMETER'] = [(next(ids), u'AP{}'.format(nr), 0.2, 0.9, 1.5, 0.5, 0., 0., nr % 2,
+                                   u'BK{}'.format(nr % 3), u'', STAND) for nr in range(6)]
+    anzahl_gebiete = max(1, schaechte // 500)
+    daten[u'TEILEINZUGSGEBIET'] = [(next(ids), u'TG{}'.format(nr), 50., 150., 14., 10., 20., u'', STAND)
+                                   for nr in range(anzahl_gebiete)]
+    profile = []
+    for nr in range(sonderprofile):
+        id_profil = next(ids)
+        profile.append(u'SP{}'.format(nr))
+        daten[u'SONDERPROFIL'].append((id_profil, profile[-1], u'', STAND))
+        for st in range(kennlinie):
+            hoehe = float(st) / max(kennlinie - 1, 1)
+            daten[u'TABELLENINHALTE'].append((id_profil, hoehe, 2. * math.sqrt(max(hoehe * (1. - hoehe), 0.)), st))
+
+    # Schächte auf einem Raster, Reihe für Reihe
+    breite = max(2, int(math.sqrt(schaechte)))
+    abstand = 40.
+    knoten = []                             # (Name, x, y, Sohlhöhe, Deckelhöhe)
+    for nr in range(schaechte):
+        reihe, spalte = divmod(nr, breite)
+        x = 350000. + spalte * abstand + zufall.uniform(-5., 5.)
+        y = 5650000. + reihe * abstand + zufall.uniform(-5., 5.)
+        sohle = 100. + 0.005 * abstand * spalte + 0.01 * abstand * (schaechte // breite - reihe)
+        knoten.append((u'S{}'.format(nr), x, y, sohle, sohle + zufall.uniform(2., 4.)))
+
+    ist_speicher = set(zufall.sample(range(schaechte), int(schaechte * speicher)))
+    for nr, (name, x, y, sohle, deckel) in enumerate(knoten):
+        if nr in ist_speicher:
+            id_speicher = next(ids)
+            daten[u'SPEICHERSCHACHT'].append((id_speicher, name, x, y, sohle, deckel, 100., 0, u'', STAND))
+            for st in range(kennlinie):
+                daten[u'TABELLENINHALTE'].append((id_speicher, 0.3 * st, 20. + 5. * st, st))
+        else:
+            daten[u'SCHACHT'].append((next(ids), name, x, y, sohle, deckel, 1000., 0, 1 + nr % 3, 0, u'', STAND))
+
+    # Auslass am Ende des Sammlers (erste Spalte der letzten Reihe)
+    if knoten:
+        ende = knoten[(schaechte - 1) // breite * breite]
+        auslass = (u'A0', ende[1] - abstand, ende[2], ende[3] - 1., ende[4] - 1.)
+        daten[u'AUSLASS'].append((next(ids), auslass[0], auslass[1], auslass[2], auslass[3], auslass[4], 0, 0,
+                                  u'', STAND))
+
+    def rohr(name, oben, unten, profil=None):
+        laenge = math.hypot(unten[1] - oben[1], unten[2] - oben[2])
+        if profil is None:
+            hoehe = zufall.choice((0.3, 0.4, 0.5, 0.6, 0.8, 1.0))
+            werte = (hoehe, hoehe, 1, None)
+        else:
+            werte = (1.2, 1.0, 68, profil)
+        tg = u'TG{}'.format(zufall.randrange(anzahl_gebiete))
+        daten[u'ROHR'].append((next(ids), name, oben[0], unten[0], werte[0], werte[1], laenge, oben[3], unten[3],
+                               tg, werte[2], werte[3], 1 + len(daten[u'ROHR']) % 3, 1.5, 0, u'', STAND))
+
+    # Stränge je Reihe (Fließrichtung zur ersten Spalte) und Sammler entlang der ersten Spalte
+    haltungen = []
+    for nr, oben in enumerate(knoten):
+        reihe, spalte = divmod(nr, breite)
+        if spalte > 0:
+            unten = knoten[nr - 1]
+        elif nr + breite < schaechte:
+            unten = knoten[nr + breite]
+        else:
+            unten = auslass
+        profil = profile[nr % len(profile)] if profile and nr % 50 == 0 else None
+        rohr(u'H{}'.format(nr), oben, unten, profil)
+        haltungen.append((u'H{}'.format(nr), oben, unten))
+
+    # Pumpen und Wehre an Speichern zum Strang der nächsten Reihe
+    for nr in sorted(ist_speicher):
+        if nr + breite >= schaechte:
+            continue
+        unten = knoten[nr + breite]
+        if len(daten[u'PUMPE']) < schaechte * pumpen:
+            daten[u'PUMPE'].append((next(ids), u'P{}'.format(nr), knoten[nr][0], unten[0], 1 + nr % 3,
+                                    knoten[nr][0], knoten[nr][3] + 1.5, knoten[nr][3] + 0.5, 0, u'', STAND))
+        elif len(daten[u'WEHR']) < schaechte * wehre:
+            daten[u'WEHR'].append((next(ids), u'W{}'.format(nr), knoten[nr][0], unten[0], 1, knoten[nr][3] + 1.,
+                                   1., 2., 0.6, 0, u'', STAND))
+
+    # Flächen, Einzeleinleiter und Außengebiete an den Haltungen bzw. Schächten
+    anzahl_flaechen = int(len(haltungen) * flaechen)
+    for nr in range(anzahl_flaechen):
+        name, oben, unten = haltungen[nr % len(haltungen)]
+        typ = zufall.randrange(3)
+        daten[u'FLAECHE'].append((next(ids), u'F{}'.format(nr), name, zufall.uniform(0.01, 0.5), u'1', typ,
+                                  3, 5., 10., 8., 12., u'AP{}'.format(nr % 6), 1 + nr % 4, u'', STAND))
+    for nr in range(int(len(haltungen) * einleiter)):
+        name, oben, unten = haltungen[zufall.randrange(len(haltungen))]
+        daten[u'EINZELEINLEITER'].append((next(ids), u'E{}'.format(nr), name, oben[1] + 5., oben[2] + 5.,
+                                          nr % 2, 20., 0.5, u'', STAND))
+    for nr in range(int(schaechte * aussengebiete)):
+        name, x, y, sohle, deckel = knoten[zufall.randrange(schaechte)]
+        daten[u'AUSSENGEBIET'].append((next(ids), u'AG{}'.format(nr), name, deckel + 20., deckel, x - 200., y,
+                                       zufall.uniform(1., 50.), 70., 0.01, 800., u'1', u'', STAND))
+
+    # Ergebnisse einer Langzeitsimulation
+    for name, x, y, sohle, deckel in knoten:
+        ueberstau = zufall.random() < 0.1
+        daten[u'LAU_MAX_S'].append((name, deckel if ueberstau else sohle + 0.5,
+                                    zufall.uniform(1., 100.) if ueberstau else 0.))
+        daten[u'LANGZEITKNOTEN'].append((name, zufall.uniform(0.1, 2.) if ueberstau else 0.,
+                                         zufall.randrange(1, 20) if ueberstau else 0))
+
+    for name, oben, unten in haltungen:
+        auslastung = zufall.uniform(0.1, 1.5)
+        daten[u'LAU_MAX_EL'].append((name, auslastung, zufall.uniform(0.01, 2.), zufall.uniform(0.3, 3.),
+                                     oben[3] + auslastung * 0.5, unten[3] + auslastung * 0.5))
+        daten[u'LANGZEITKANTEN'].append((name, zufall.uniform(0.1, 2.) if auslastung > 1. else 0.,
+                                         zufall.randrange(1, 20) if auslastung > 1. else 0))
+
+    daten[u'ITWH$PROGINFO'] = [(next(ids), HE_VERSION)]
+
+    for tabelle, zeilen in daten.items():
+        if zeilen:
+            platzhalter = u', '.join([u'?'] * len(zeilen[0]))
+            cur.executemany(u'INSERT INTO "{}" VALUES ({})'.format(tabelle, platzhalter), zeilen)
+    con.commit()
+    con.close()
+
+    return dict((tabelle, len(zeilen)) for tabelle, zeilen in daten.items())
+
+
+def erzeuge_vorlage(dbtemplate_HE):
+    '''Leere Vorlage der HE-Datenbank für den Export'''
+    erzeuge_he(dbtemplate_HE, schaechte=0, sonderprofile=0)
+
+
+# ------------------------------------------------------------------------------
+# Zeitmessung
+
+class Stoppuhr:
+    '''Misst die Dauer der Abschnitte zwischen zwei Meldungen.'''
+
+    def __init__(self):
+        self.abschnitte = []
+        self.start = self.letzte = time.time()
+
+    def melden(self, abschnitt, anzahl=None):
+        jetzt = time.time()
+        eintrag = {u'abschnitt': abschnitt, u'sekunden': round(jetzt - self.letzte, 4)}
+        if anzahl is not None:
+            eintrag[u'anzahl'] = anzahl
+        self.abschnitte.append(eintrag)
+        self.letzte = jetzt
+
+    def ergebnis(self, erfolg):
+        ende = time.time()
+        if self.abschnitte and ende - self.letzte > 0.0005:
+            self.abschnitte.append({u'abschnitt': u'(Abschluss)', u'sekunden': round(ende - self.letzte, 4)})
+        return {u'erfolg': bool(erfolg), u'sekunden': round(ende - self.start, 4), u'abschnitte': self.abschnitte}
+
+
+def module_laden(plugins):
+    '''Lädt die Module des Plugins mit SQLite anstelle von Firebird und ohne QGIS-Oberfläche.
+
+    :returns:   (import_from_he, k_qkhe, results_from_he)
+    '''
+    if plugins is not None:
+        sys.path.insert(0, plugins)
+
+    import qgis.utils
+    qgis.utils.iface = Attrappe()
+
+    for unterverzeichnis in (u'importhe', u'exporthe'):
+        sys.path.insert(0, os.path.abspath(os.path.join(verzeichnis_plugin, unterverzeichnis)))
+
+    import import_from_he
+    import k_qkhe
+    import lesen
+    import results_from_he
+    import sqlskript
+
+    for modul in (import_from_he, k_qkhe, lesen, results_from_he, sqlskript):
+        modul.FBConnection = SQLiteHE
+    k_qkhe.QProgressBar = Attrappe
+
+    return import_from_he, k_qkhe, results_from_he
+
+
+def messe_import(import_from_he, database_HE, database_QKan, epsg, optionen):
+    if os.path.exists(database_QKan):
+        os.remove(database_QKan)
+    uhr = Stoppuhr()
+
+    def rueckmeldung(tabelle, anzahl, schritt, schritte):
+        uhr.melden(tabelle, anzahl)
+
+    ergebnis = import_from_he.importKanaldatenDB(database_HE, database_QKan, epsg, rueckmeldung=rueckmeldung,
+                                                 **optionen)
+    return uhr.ergebnis(ergebnis is not None)
+
+
+def messe_export(k_qkhe, database_QKan, database_HE, dbtemplate_HE, skriptdatei, epsg):
+    from qkan.database.dbfunc import DBConnection
+
+    uhr = Stoppuhr()
+    original = k_qkhe.fortschritt
+
+    def fortschritt(text, prozent=0):
+        uhr.melden(text)
+
+    k_qkhe.fortschritt = fortschritt
+    try:
+        dbQK = DBConnection(dbname=database_QKan, epsg=epsg)
+        check_export = dict((u'{}_{}'.format(art, tabelle), art != u'combine')
+                            for art in (u'export', u'modify', u'combine')
+                            for tabelle in (u'schaechte', u'auslaesse', u'speicher', u'haltungen', u'pumpen',
+                                            u'wehre', u'rohrprofile', u'speicherkennlinien', u'bodenklassen',
+                                            u'abflussparameter', u'regenschreiber', u'flaechenrw',
+                                            u'einleitdirekt', u'aussengebiete'))
+        erfolg = k_qkhe.exportKanaldaten(Attrappe(), database_HE, dbtemplate_HE, dbQK, [], True,
+                                         check_export=check_export, skriptdatei=skriptdatei)
+        del dbQK
+    finally:
+        k_qkhe.fortschritt = original
+    return uhr.ergebnis(erfolg is not False and os.path.exists(skriptdatei))
+
+
+def messe_ergebnisse(results_from_he, database_HE, database_QKan, epsg, neu_einlesen=True):
+    uhr = Stoppuhr()
+    erfolg = results_from_he.importResults(database_HE, database_QKan, u'uebh', None, epsg,
+                                           neu_einlesen=neu_einlesen)
+    return uhr.ergebnis(erfolg is not False)
+
+
+def git_stand():
+    try:
+        return subprocess.check_output([u'git', u'rev-parse', u'--short', u'HEAD'],
+                                       cwd=verzeichnis_plugin).decode('ascii').strip()
+    except BaseException:
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=u'Benchmark für Import und Export HYSTEM-EXTRAN')
+    parser.add_argument(u'--schaechte', type=int, default=5000, help=u'Anzahl der Schächte')
+    parser.add_argument(u'--speicher', type=float, default=0.02, help=u'Anteil Speicherschächte')
+    parser.add_argument(u'--pumpen', type=float, default=0.01, help=u'Anteil Pumpen')
+    parser.add_argument(u'--wehre', type=float, default=0.01, help=u'Anteil Wehre')
+    parser.add_argument(u'--sonderprofile', type=int, default=10, help=u'Anzahl Sonderprofile')
+    parser.add_argument(u'--flaechen', type=float, default=1., help=u'Flächen je Haltung')
+    parser.add_argument(u'--einleiter', type=float, default=0.2, help=u'Einzeleinleiter je Haltung')
+    parser.add_argument(u'--aussengebiete', type=float, default=0.01, help=u'Anteil Außengebiete')
+    parser.add_argument(u'--kennlinie', type=int, default=10, help=u'Stützstellen je Kennlinie')
+    parser.add_argument(u'--seed', type=int, default=1)
+    parser.add_argument(u'--epsg', type=int, default=25832)
+    parser.add_argument(u'--wiederholungen', type=int, default=1, help=u'Anzahl der Messungen je Stufe')
+    parser.add_argument(u'--stufen', default=u'import,export,ergebnisse',
+                        help=u'Auszuführende Stufen, durch Komma getrennt')
+    parser.add_argument(u'--ohne-massenimport', action=u'store_true')
+    parser.add_argument(u'--parallel-lesen', type=int, default=3)
+    parser.add_argument(u'--ohne-flaechen', action=u'store_true', help=u'Flächen beim Import nicht lesen')
+    parser.add_argument(u'--plugins', default=os.environ.get(u'QGIS_PLUGINPATH'),
+                        help=u'Verzeichnis der QGIS-Plugins mit QKan')
+    parser.add_argument(u'--verzeichnis', help=u'Arbeitsverzeichnis (Voreinstellung: temporär)')
+    parser.add_argument(u'--nur-erzeugen', action=u'store_true', help=u'Nur die HE-Datenbank erzeugen')
+    parser.add_argument(u'--ausgabe', help=u'JSON-Datei (Voreinstellung: Standardausgabe)')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+
+    verzeichnis = args.verzeichnis or tempfile.mkdtemp(prefix=u'qkan_benchmark_')
+    if not os.path.isdir(verzeichnis):
+        os.makedirs(verzeichnis)
+    database_HE = os.path.join(verzeichnis, u'synthetisch.idbf')
+    dbtemplate_HE = os.path.join(verzeichnis, u'vorlage.idbf')
+    database_QKan = os.path.join(verzeichnis, u'synthetisch.sqlite')
+
+    uhr = Stoppuhr()
+    anzahl = erzeuge_he(database_HE, args.schaechte, args.speicher, args.pumpen, args.wehre, args.sonderprofile,
+                        args.flaechen, args.einleiter, args.aussengebiete, args.kennlinie, args.seed)
+    erzeugen = uhr.ergebnis(True)
+
+    bericht = {
+        u'version': git_stand(),
+        u'python': platform.python_version(),
+        u'plattform': platform.platform(),
+        u'zeitpunkt': time.strftime(u'%Y-%m-%dT%H:%M:%S'),
+        u'parameter': vars(args),
+        u'netz': anzahl,
+        u'erzeugen_sekunden': erzeugen[u'sekunden'],
+        u'stufen': {},
+    }
+
+    if not args.nur_erzeugen:
+        erzeuge_vorlage(dbtemplate_HE)
+        import_from_he, k_qkhe, results_from_he = module_laden(args.plugins)
+        optionen = dict(massenimport=not args.ohne_massenimport, parallel_lesen=args.parallel_lesen,
+                        mit_flaechen=not args.ohne_flaechen)
+        stufen = [stufe.strip() for stufe in args.stufen.split(u',') if stufe.strip()]
+
+        for nr in range(args.wiederholungen):
+            if u'import' in stufen or not os.path.exists(database_QKan):
+                messung = messe_import(import_from_he, database_HE, database_QKan, args.epsg, optionen)
+                if u'import' in stufen:
+                    bericht[u'stufen'].setdefault(u'import', []).append(messung)
+            if u'export' in stufen:
+                bericht[u'stufen'].setdefault(u'export', []).append(
+                    messe_export(k_qkhe, database_QKan, os.path.join(verzeichnis, u'export.idbf'), dbtemplate_HE,
+                                 os.path.join(verzeichnis, u'export.sql'), args.epsg))
+            if u'ergebnisse' in stufen:
+                bericht[u'stufen'].setdefault(u'ergebnisse', []).append(
+                    messe_ergebnisse(results_from_he, database_HE, database_QKan, args.epsg))
+                # Erneute Auswahl derselben Ergebnisse aus dem Zwischenspeicher
+                bericht[u'stufen'].setdefault(u'ergebnisse_cache', []).append(
+                    messe_ergebnisse(results_from_he, database_HE, database_QKan, args.epsg, neu_einlesen=False))
+
+        # Zusammenfassung: kürzeste Laufzeit je Stufe
+        bericht[u'minimum_sekunden'] = dict((stufe, min(messung[u'sekunden'] for messung in messungen))
+                                            for stufe, messungen in bericht[u'stufen'].items())
+
+    text = json.dumps(bericht, indent=2, sort_keys=True)
+    if args.ausgabe:
+        with open(args.ausgabe, 'w') as fileausgabe:
+            fileausgabe.write(text)
+    else:
+        print(text)
+
+    if args.verzeichnis is None:
+        shutil.rmtree(verzeichnis, ignore_errors=True)
+    return 0
+
+
+if __name__ == u'__main__':
+    sys.exit(main())